@@ -0,0 +1,150 @@
+########################################################################
+# $HeadURL $
+# File: BoundedTaskPool.py
+########################################################################
+""" :mod: BoundedTaskPool
+    =====================
+
+    .. module: BoundedTaskPool
+    :synopsis: run keyed tasks concurrently with a thread limit and a per task timeout
+
+    BoundedTaskPool executes a set of independent tasks, each registered under a key
+    ( e.g. a CE or SE name ), in at most maxThreads threads and returns their results
+    once all of them are over or timed out, so that the total time is driven by the
+    slowest task and not by the sum of all of them.
+
+    Python threads cannot be killed: a task running longer than the timeout is
+    abandoned, S_ERROR( "Timed out" ) is returned for its key and the key stays busy
+    until the task really finishes. Tasks submitted for a busy key are refused, so a
+    hanging resource never piles up threads cycle after cycle.
+
+    Usage::
+
+      pool = BoundedTaskPool( maxThreads = 10 )
+      results = pool.execute( { "CE1" : ( ce1.submitJob, ( executable, '', 10 ) ),
+                                "CE2" : ( ce2.submitJob, ( executable, '', 5 ) ) }, timeout = 120 )
+      # results == { "CE1" : S_OK( ... ), "CE2" : S_ERROR( "Timed out" ) }
+"""
+__RCSID__ = "$Id$"
+# # imports
+import time
+import Queue
+import threading
+from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
+
+# # message of the result of a task abandoned after the timeout
+TIMED_OUT = "Timed out"
+
+class BoundedTaskPool( object ):
+  """
+  .. class:: BoundedTaskPool
+
+  bounded pool of threads executing keyed tasks with timeouts
+  """
+  def __init__( self, maxThreads = 10 ):
+    """ c'tor
+
+    :param self: self reference
+    :param int maxThreads: max number of tasks executed at the same time
+    """
+    self.maxThreads = max( 1, int( maxThreads ) )
+    self.__lock = threading.Lock()
+    # # keys of the abandoned tasks still running
+    self.__busy = set()
+
+  def busyKeys( self ):
+    """ keys of the timed out tasks still running """
+    with self.__lock:
+      return set( self.__busy )
+
+  def execute( self, tasks, timeout = None ):
+    """ execute :tasks: and wait for their results
+
+    :param self: self reference
+    :param dict tasks: { key : ( callable, args ) } or { key : ( callable, args, kwargs ) }
+    :param float timeout: max execution time of a single task in seconds, None for no limit
+    :return: dictionary { key : S_OK/S_ERROR }, the callable results or S_ERROR in case of exception,
+             timeout or busy key
+    """
+    results = {}
+    pending = Queue.Queue()
+    done = Queue.Queue()
+    busy = self.busyKeys()
+    for key, task in tasks.items():
+      if key in busy:
+        results[key] = S_ERROR( "Previous task for %s still running" % str( key ) )
+      else:
+        pending.put( ( key, task ) )
+    # # key -> start time of the started tasks
+    started = {}
+    # # keys of the tasks over
+    finished = set()
+    nTasks = pending.qsize()
+    for _i in range( min( self.maxThreads, nTasks ) ):
+      self.__spawn( pending, done, started, finished )
+
+    while len( results ) < len( tasks ):
+      waitTime = 1.
+      if timeout:
+        now = time.time()
+        with self.__lock:
+          startTimes = [ ( startTime, key ) for key, startTime in started.items()
+                         if key not in results and key not in finished ]
+        for startTime, key in startTimes:
+          if now - startTime < timeout:
+            waitTime = min( waitTime, timeout - now + startTime )
+            continue
+          with self.__lock:
+            if key in finished:
+              continue
+            self.__busy.add( key )
+          results[key] = S_ERROR( TIMED_OUT )
+          # # replace the stuck thread
+          if not pending.empty():
+            self.__spawn( pending, done, started, finished )
+        if len( results ) == len( tasks ):
+          break
+      try:
+        key, result = done.get( True, max( waitTime, 0.01 ) )
+      except Queue.Empty:
+        continue
+      if key not in results:
+        results[key] = result
+    return results
+
+  def __spawn( self, pending, done, started, finished ):
+    """ start a new worker thread """
+    worker = threading.Thread( target = self.__work, args = ( pending, done, started, finished ) )
+    worker.setDaemon( True )
+    worker.start()
+
+  def __work( self, pending, done, started, finished ):
+    """ worker thread body, executes pending tasks until there is none left
+
+    :param Queue pending: queue of ( key, task ) tuples
+    :param Queue done: queue of ( key, result ) tuples
+    :param dict started: key -> start time
+    :param set finished: keys of the tasks over
+    """
+    while True:
+      try:
+        key, task = pending.get_nowait()
+      except Queue.Empty:
+        return
+      function, args = task[0], task[1]
+      kwargs = task[2] if len( task ) > 2 else {}
+      with self.__lock:
+        started[key] = time.time()
+      try:
+        result = function( *args, **kwargs )
+        if not isinstance( result, dict ) or "OK" not in result:
+          result = S_OK( result )
+      except Exception, error:
+        result = S_ERROR( "Exception in task for %s: %s" % ( str( key ), str( error ) ) )
+      done.put( ( key, result ) )
+      with self.__lock:
+        finished.add( key )
+        if key in self.__busy:
+          # # this task was abandoned and its thread replaced
+          self.__busy.discard( key )
+          return
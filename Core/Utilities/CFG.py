@@ -2,8 +2,8 @@
 __RCSID__ = "$Id$"
 
 import types
-import copy
 import os
+import re
 try:
   import zipfile
   gZipEnabled = True
@@ -67,6 +67,9 @@ except Exception:
 
 #START OF CFG MODULE
 
+# Tokens of the cfg syntax: section start and end, option definition and value appending
+gTokenRE = re.compile( r"[{}=]|\+=" )
+
 class CFG( object ):
 
   def __init__( self ):
@@ -76,6 +79,7 @@ class CFG( object ):
     self.__orderedList = []
     self.__commentDict = {}
     self.__dataDict = {}
+    self.__sharedSections = set()
     self.reset()
 
   @gCFGSynchro
@@ -86,6 +90,8 @@ class CFG( object ):
     self.__orderedList = []
     self.__commentDict = {}
     self.__dataDict = {}
+    # Subsections also referenced by other CFGs, copied before being handed out (see __unshare)
+    self.__sharedSections = set()
 
   @gCFGSynchro
   def createNewSection( self, sectionName, comment = "", contents = False ):
@@ -129,6 +135,7 @@ class CFG( object ):
     if sectionName not in self.listSections():
       raise KeyError( "Section %s does not exist" % sectionName )
     self.__dataDict[ sectionName ] = oCFGToClone.clone()
+    self.__sharedSections.discard( sectionName )
 
   @gCFGSynchro
   def setOption( self, optionName, value, comment = "" ):
@@ -152,6 +159,7 @@ class CFG( object ):
       return parentSection.setOption( recDict[ 'levelsBelow' ], value, comment )
     self.__addEntry( optionName, comment )
     self.__dataDict[ optionName ] = str( value )
+    self.__sharedSections.discard( optionName )
 
   def __addEntry( self, entryName, comment ):
     """
@@ -214,6 +222,7 @@ class CFG( object ):
       del( cfg.__commentDict[ end ] )
       del( cfg.__dataDict[ end ] )
       cfg.__orderedList.remove( end )
+      cfg.__sharedSections.discard( end )
       return True
     return False
 
@@ -246,6 +255,8 @@ class CFG( object ):
       newCfg.__commentDict[ newEnd ] = oldCfg.__commentDict[ oldEnd ]
       refKeyPos = oldCfg.__orderedList.index( oldEnd )
       newCfg.__orderedList.insert( refKeyPos + 1, newEnd )
+      if oldEnd in oldCfg.__sharedSections:
+        newCfg.__sharedSections.add( newEnd )
 
       return True
     else:
@@ -338,13 +349,45 @@ class CFG( object ):
     if pathList[0] in self.__dataDict:
       if len( pathList ) == 1:
         return { 'key' : pathList[0],
-                 'value' : self.__dataDict[ pathList[0] ],
+                 'value' : self.__unshare( pathList[0] ),
                  'comment' : self.__commentDict[ pathList[0] ] }
       else:
-        return self.__dataDict[ pathList[0] ].__recurse( pathList[1:] )
+        return self.__unshare( pathList[0] ).__recurse( pathList[1:] )
     else:
       return False
 
+  def __unshare( self, key ):
+    """
+    Get an entry, copying it first if it is a section shared with other CFGs.
+    Only the first level of the section is copied, its own subsections becoming
+    shared between the copy and the original.
+
+    @type key: string
+    @param key: Name of the entry
+    @return: String/CFG with the contents
+    """
+    if key not in self.__sharedSections:
+      return self.__dataDict[ key ]
+    return self.__unshareSection( key )
+
+  @gCFGSynchro
+  def __unshareSection( self, key ):
+    """
+    Replace a shared section by a copy of its first level
+    """
+    if key in self.__sharedSections:
+      sharedCFG = self.__dataDict[ key ]
+      copiedCFG = CFG()
+      copiedCFG.__orderedList = list( sharedCFG.__orderedList )
+      copiedCFG.__commentDict = dict( sharedCFG.__commentDict )
+      copiedCFG.__dataDict = dict( sharedCFG.__dataDict )
+      subSections = [ entry for entry, value in sharedCFG.__dataDict.items() if isinstance( value, CFG ) ]
+      sharedCFG.__sharedSections.update( subSections )
+      copiedCFG.__sharedSections = set( subSections )
+      self.__dataDict[ key ] = copiedCFG
+      self.__sharedSections.discard( key )
+    return self.__dataDict[ key ]
+
   @gCFGSynchro
   def getRecursive( self, path, levelsAbove = 0 ):
     """
@@ -457,7 +500,7 @@ class CFG( object ):
     for op in self.listOptions():
       resVal[ op ] = self[ op ]
     for sec in self.listSections():
-      resVal[ sec ] = self[ sec ].getAsDict()
+      resVal[ sec ] = self.__dataDict[ sec ].getAsDict()
     return resVal
 
   @gCFGSynchro
@@ -539,9 +582,13 @@ class CFG( object ):
       refKeyPos = oldCfg.__orderedList.index( oldEnd )
       oldCfg.__orderedList.remove( oldEnd )
       newCfg.__orderedList.insert( refKeyPos, newEnd )
+      newCfg.__sharedSections.discard( newEnd )
+      if oldEnd in oldCfg.__sharedSections:
+        newCfg.__sharedSections.add( newEnd )
 
       del( oldCfg.__dataDict[ oldEnd ] )
       del( oldCfg.__commentDict[ oldEnd ] )
+      oldCfg.__sharedSections.discard( oldEnd )
       return True
     else:
       return False
@@ -559,7 +606,7 @@ class CFG( object ):
       if not subDict:
         return False
       return subDict[ 'value' ]
-    return self.__dataDict[ key ]
+    return self.__unshare( key )
 
   def __iter__( self ):
     """
@@ -649,15 +696,17 @@ class CFG( object ):
     """
     indentation = "  "
     cfgString = ""
+    sections = set( self.listSections() )
+    options = set( self.listOptions() )
     for entryName in self.__orderedList:
       if entryName in self.__commentDict:
         for commentLine in List.fromChar( self.__commentDict[ entryName ], "\n" ):
           cfgString += "%s#%s\n" % ( tabLevelString, commentLine )
-      if entryName in self.listSections():
+      if entryName in sections:
         cfgString += "%s%s\n%s{\n" % ( tabLevelString, entryName, tabLevelString )
         cfgString += self.__dataDict[ entryName ].serialize( "%s%s" % ( tabLevelString, indentation ) )
         cfgString += "%s}\n" % tabLevelString
-      elif entryName in self.listOptions():
+      elif entryName in options:
         valueList = List.fromChar( self.__dataDict[ entryName ] )
         if len( valueList ) == 0:
           cfgString += "%s%s = \n" % ( tabLevelString, entryName )
@@ -677,12 +726,12 @@ class CFG( object ):
     @return: CFG copy
     """
     clonedCFG = CFG()
-    clonedCFG.__orderedList = copy.deepcopy( self.__orderedList )
-    clonedCFG.__commentDict = copy.deepcopy( self.__commentDict )
+    clonedCFG.__orderedList = list( self.__orderedList )
+    clonedCFG.__commentDict = dict( self.__commentDict )
     for option in self.listOptions():
-      clonedCFG.__dataDict[ option ] = self[ option ]
+      clonedCFG.__dataDict[ option ] = self.__dataDict[ option ]
     for section in self.listSections():
-      clonedCFG.__dataDict[ section ] = self[ section ].clone()
+      clonedCFG.__dataDict[ section ] = self.__dataDict[ section ].clone()
     return clonedCFG
 
   @gCFGSynchro
@@ -690,37 +739,59 @@ class CFG( object ):
     """
     Generate a CFG by merging with the contents of another CFG.
 
+    Only the sections present in both CFGs are merged, the others are not copied but
+    shared between their CFG and the merged one. Shared sections are copied level by
+    level when they are accessed through the CFGs (copy on write), so modifying one
+    of the CFGs through its methods doesn't modify the other.
+
     @type cfgToMergeWith: CFG
     @param cfgToMergeWith: CFG with the contents to merge with. This contents are more
                             preemtive than this CFG ones
     @return: CFG with the result of the merge
     """
     mergedCFG = CFG()
-    for option in self.listOptions():
-      mergedCFG.setOption( option,
-                           self[ option ],
-                           self.getComment( option ) )
-    for option in cfgToMergeWith.listOptions():
-      mergedCFG.setOption( option,
-                           cfgToMergeWith[ option ],
-                           cfgToMergeWith.getComment( option ) )
-    for section in self.listSections():
-      if section in cfgToMergeWith.listSections():
-        oSectionCFG = self[ section ].mergeWith( cfgToMergeWith[ section ] )
-        mergedCFG.createNewSection( section,
-                                    cfgToMergeWith.getComment( section ),
-                                    oSectionCFG )
+    for cfg in ( self, cfgToMergeWith ):
+      for option in cfg.listOptions():
+        if option not in mergedCFG.__dataDict:
+          mergedCFG.__orderedList.append( option )
+        mergedCFG.__commentDict[ option ] = cfg.__commentDict[ option ]
+        mergedCFG.__dataDict[ option ] = cfg.__dataDict[ option ]
+    sections = self.listSections()
+    sectionsToMergeWith = cfgToMergeWith.listSections()
+    commonSections = set( sections ) & set( sectionsToMergeWith )
+    for section in sections:
+      if section in commonSections:
+        sectionCFG = self.__dataDict[ section ].mergeWith( cfgToMergeWith.__dataDict[ section ] )
+        mergedCFG.__addMergedSection( section, cfgToMergeWith.__commentDict[ section ], sectionCFG )
       else:
-        mergedCFG.createNewSection( section,
-                                    self.getComment( section ),
-                                    self[ section ].clone() )
-    for section in cfgToMergeWith.listSections():
-      if section not in self.listSections():
-        mergedCFG.createNewSection( section,
-                                    cfgToMergeWith.getComment( section ),
-                                    cfgToMergeWith[ section ] )
+        mergedCFG.__addMergedSection( section, self.__commentDict[ section ], self.__dataDict[ section ] )
+        mergedCFG.__sharedSections.add( section )
+        self.__sharedSections.add( section )
+    for section in sectionsToMergeWith:
+      if section not in commonSections:
+        mergedCFG.__addMergedSection( section, cfgToMergeWith.__commentDict[ section ],
+                                      cfgToMergeWith.__dataDict[ section ] )
+        mergedCFG.__sharedSections.add( section )
+        cfgToMergeWith.__sharedSections.add( section )
     return mergedCFG
 
+  def __addMergedSection( self, sectionName, comment, sectionCFG ):
+    """
+    Add a section to a CFG being merged, the section name being valid
+
+    @type sectionName: string
+    @param sectionName: Name of the section
+    @type comment: string
+    @param comment: Comment for the section
+    @type sectionCFG: CFG
+    @param sectionCFG: Contents of the section
+    """
+    if sectionName in self.__dataDict:
+      raise KeyError( "%s key already exists" % sectionName )
+    self.__orderedList.append( sectionName )
+    self.__commentDict[ sectionName ] = comment
+    self.__dataDict[ sectionName ] = sectionCFG
+
   def getModifications( self, newerCfg, ignoreMask = None, parentPath = "" ):
     """
     Compare two cfgs
@@ -772,7 +843,7 @@ class CFG( object ):
         continue
       if newSection not in oldSections:
         modList.append( ( 'addSec', newSection, iPos,
-                          str( newerCfg[ newSection ] ),
+                          str( newerCfg.__dataDict[ newSection ] ),
                           newerCfg.getComment( newSection ) ) )
       else:
         modified = False
@@ -780,8 +851,8 @@ class CFG( object ):
           modified = True
         elif newerCfg.getComment( newSection ) != self.getComment( newSection ):
           modified = True
-        subMod = self[ newSection ].getModifications( newerCfg[ newSection ],
-                                                      ignoreMask, newSecPath )
+        subMod = self.__dataDict[ newSection ].getModifications( newerCfg.__dataDict[ newSection ],
+                                                                 ignoreMask, newSecPath )
         if subMod:
           modified = True
         if modified:
@@ -890,6 +961,11 @@ class CFG( object ):
     """
     Load the contents of the CFG from a string
 
+    Every line is scanned once for the cfg tokens ( {, }, = and += ), the text found
+    between them being kept as a list of fragments. Sections and options with plain
+    new names are added directly, anything else (paths, duplicated or empty names)
+    goes through createNewSection, setOption and appendToOption.
+
     @type data: string
     @param data: Contents of the CFG
     @return: This CFG
@@ -897,42 +973,59 @@ class CFG( object ):
     self.reset()
     levelList = []
     currentLevel = self
-    currentlyParsedString = ""
+    parsedFragments = []
     currentComment = ""
     for line in data.split( "\n" ):
       line = line.strip()
-      if len( line ) < 1:
+      if not line:
         continue
       commentPos = line.find( "#" )
       if commentPos > -1:
         currentComment += "%s\n" % line[ commentPos: ].replace( "#", "" )
         line = line[ :commentPos ]
-      for index in range( len( line ) ):
-        if line[ index ] == "{":
-          currentlyParsedString = currentlyParsedString.strip()
-          currentLevel.createNewSection( currentlyParsedString, currentComment )
+      position = 0
+      while True:
+        tokenMatch = gTokenRE.search( line, position )
+        if not tokenMatch:
+          parsedFragments.append( line[ position: ] )
+          break
+        tokenPos = tokenMatch.start()
+        parsedFragments.append( line[ position:tokenPos ] )
+        token = tokenMatch.group()
+        if token == "{":
+          sectionName = "".join( parsedFragments ).strip()
           levelList.append( currentLevel )
-          currentLevel = currentLevel[ currentlyParsedString ]
-          currentlyParsedString = ""
+          if sectionName and sectionName.find( "/" ) == -1 and sectionName not in currentLevel.__dataDict:
+            sectionCFG = CFG()
+            currentLevel.__orderedList.append( sectionName )
+            currentLevel.__commentDict[ sectionName ] = currentComment
+            currentLevel.__dataDict[ sectionName ] = sectionCFG
+            currentLevel = sectionCFG
+          else:
+            currentLevel.createNewSection( sectionName, currentComment )
+            currentLevel = currentLevel[ sectionName ]
+          parsedFragments = []
           currentComment = ""
-        elif line[ index ] == "}":
+        elif token == "}":
           currentLevel = levelList.pop()
-        elif line[ index ] == "=":
-          lFields = line.split( "=" )
-          currentLevel.setOption( lFields[0].strip(),
-           "=".join( lFields[1:] ).strip(),
-           currentComment )
-          currentlyParsedString = ""
+        elif token == "=":
+          optionName = line[ :tokenPos ].strip()
+          value = line[ tokenPos + 1: ].strip()
+          if optionName and optionName.find( "/" ) == -1 and optionName not in currentLevel.__dataDict:
+            currentLevel.__orderedList.append( optionName )
+            currentLevel.__commentDict[ optionName ] = currentComment
+            currentLevel.__dataDict[ optionName ] = str( value )
+          else:
+            currentLevel.setOption( optionName, value, currentComment )
+          parsedFragments = []
           currentComment = ""
           break
-        elif line[ index: index + 2 ] == "+=":
-          valueList = line.split( "+=" )
-          currentLevel.appendToOption( valueList[0].strip(), ", %s" % "+=".join( valueList[1:] ).strip() )
-          currentlyParsedString = ""
+        else:
+          currentLevel.appendToOption( line[ :tokenPos ].strip(), ", %s" % line[ tokenPos + 2: ].strip() )
+          parsedFragments = []
           currentComment = ""
           break
-        else:
-          currentlyParsedString += line[ index ]
+        position = tokenMatch.end()
     return self
 
   @gCFGSynchro
@@ -75,6 +75,8 @@ class Node( object ):
     self.makeProperty( "name", name, True )
     self.makeProperty( "visited", False )
     self.__edges = list()
+    # # same edges, for membership checks
+    self.__edgeSet = set()
     rwAttrs = rwAttrs if type( rwAttrs ) == dict else {}
     for attr, value in rwAttrs.items():
       self.makeProperty( attr, value, False )
@@ -86,7 +88,7 @@ class Node( object ):
     """ in operator for edges """
     if not isinstance( edge, Edge ):
       raise TypeError( "edge should be an instance or subclass of Edge" )
-    return edge in self.__edges
+    return edge in self.__edgeSet
 
   def __iter__( self ):
     """ edges iterator """
@@ -102,6 +104,7 @@ class Node( object ):
       raise TypeError( "supplied edge argument should be an Edge instance or subclass" )
     if edge not in self:
       self.__edges.append( edge )
+      self.__edgeSet.add( edge )
 
   def connect( self, other, rwAttrs = None, roAttrs = None ):
     """ connect self to Node :other: with edge attibutes rw :rwAttrs: and ro :roAttrs:"""
@@ -110,6 +113,7 @@ class Node( object ):
     edge = Edge( self, other, rwAttrs, roAttrs )
     if edge not in self:
       self.__edges.append( edge )
+      self.__edgeSet.add( edge )
     return edge
 
 class Edge( object ):
@@ -159,6 +163,11 @@ class Graph( object ):
   .. class:: Graph
 
   a generic directed graph with attributes attached to its nodes and edges
+
+  nodes and edges are kept in lists (their order is the walk order) and indexed:
+  sets for the in operator, dicts by name for getNode and getEdge and an adjacency
+  map { fromNode.name : { toNode.name : edge } } for getEdgeBetween, the first node,
+  edge or edge between two nodes added being the one returned in case of duplicated names
   """
   # # metaclass
   __metaclass__ = DynamicProps
@@ -180,6 +189,12 @@ class Graph( object ):
     edges = edges if edges else list()
     self.__nodes = []
     self.__edges = []
+    # # indexes
+    self.__nodeSet = set()
+    self.__edgeSet = set()
+    self.__nodesByName = {}
+    self.__edgesByName = {}
+    self.__adjacency = {}
     for edge in edges:
       if edge not in self:
         self.addEdge( edge )
@@ -189,7 +204,11 @@ class Graph( object ):
 
   def __contains__( self, obj ):
     """ in operator for edges and nodes """
-    return bool( obj in self.__nodes or obj in self.__edges )
+    try:
+      return bool( obj in self.__nodeSet or obj in self.__edgeSet )
+    except TypeError:
+      # # unhashable, can't be a node nor an edge
+      return False
 
   def nodes( self ):
     """ get nodes dict """
@@ -197,9 +216,7 @@ class Graph( object ):
 
   def getNode( self, nodeName ):
     """ get node :nodeName: """
-    for node in self.__nodes:
-      if node.name == nodeName:
-        return node
+    return self.__nodesByName.get( nodeName )
 
   def edges( self ):
     """ get edges dict """
@@ -207,9 +224,12 @@ class Graph( object ):
 
   def getEdge( self, edgeName ):
     """ get edge :edgeName: """
-    for edge in self.__edges:
-      if edge.name == edgeName:
-        return edge
+    return self.__edgesByName.get( edgeName )
+
+  def getEdgeBetween( self, fromNodeName, toNodeName ):
+    """ get edge going from node :fromNodeName: to node :toNodeName: """
+    return self.__adjacency.get( fromNodeName, {} ).get( toNodeName )
+
   @property
   def PREORDER( self ):
     """ PREORDER getter """
@@ -246,6 +266,8 @@ class Graph( object ):
       raise TypeError( "supplied argument should be a Node instance" )
     if node not in self:
       self.__nodes.append( node )
+      self.__nodeSet.add( node )
+      self.__nodesByName.setdefault( node.name, node )
       if not hasattr( node, "graph" ):
         node.makeProperty( "graph", self )
       else:
@@ -266,6 +288,9 @@ class Graph( object ):
       self.addNode( edge.toNode )
     if edge not in self:
       self.__edges.append( edge )
+      self.__edgeSet.add( edge )
+      self.__edgesByName.setdefault( edge.name, edge )
+      self.__adjacency.setdefault( edge.fromNode.name, {} ).setdefault( edge.toNode.name, edge )
     if not hasattr( edge, "graph" ):
       edge.makeProperty( "graph", self )
     else:
@@ -0,0 +1,193 @@
+########################################################################
+# $HeadURL $
+# File: MaskMatcher.py
+########################################################################
+""" :mod: MaskMatcher
+    =================
+
+    .. module: MaskMatcher
+    :synopsis: match a string against many regular expressions at once
+
+    MaskMatcher holds a set of regular expression masks, each registered under a key,
+    and returns the keys of all the masks found by re.search in a given string,
+    exactly as looping over all the compiled masks would do.
+
+    To avoid running every regular expression on every string, the masks are indexed
+    by the literal text any of their matches has to contain:
+
+    * masks anchored at the beginning of the string with a literal prefix are kept in
+      a trie of path components ( '/' separated ), so only the masks whose prefix
+      directories are the leading directories of the string are considered;
+    * for the other masks the longest literal run of the top level pattern is used as
+      a cheap substring pre-filter;
+    * masks for which no literal can be extracted safely ( case insensitive, locale or
+      unicode flags, top level alternations, ... ) are always tried.
+"""
+__RCSID__ = "$Id$"
+# # imports
+import re
+import sre_parse
+import sre_constants
+
+class MaskMatcher( object ):
+  """
+  .. class:: MaskMatcher
+
+  regular expression masks indexed by their literal prefixes
+  """
+  def __init__( self, masks = None ):
+    """ c'tor
+
+    :param self: self reference
+    :param list masks: list of ( key, mask ) tuples, mask being a string or a compiled regex
+    """
+    # # key -> list of ( order, compiled regex, prefix ) for all the masks of that key
+    self.__masks = {}
+    # # trie of path components, each node is a [ children dict, list of entries ] pair
+    self.__trie = [ {}, [] ]
+    # # entries without a literal prefix: ( order, key, compiled regex, required literal or None )
+    self.__unanchored = []
+    # # insertion counter keeping the order of the results
+    self.__order = 0
+    for key, mask in masks or []:
+      self.addMask( key, mask )
+
+  def __len__( self ):
+    """ number of masks """
+    return sum( [ len( entries ) for entries in self.__masks.values() ] )
+
+  def __contains__( self, key ):
+    """ in operator for keys """
+    return key in self.__masks
+
+  def keys( self ):
+    """ keys of the registered masks in insertion order """
+    return [ key for key, _regex in self.items() ]
+
+  def items( self ):
+    """ list of ( key, compiled regex ) tuples in insertion order """
+    items = []
+    for key, entries in self.__masks.items():
+      items += [ ( order, key, regex ) for order, regex, _prefix in entries ]
+    return [ ( key, regex ) for _order, key, regex in sorted( items ) ]
+
+  def getMasks( self, key ):
+    """ compiled regexes registered for :key: """
+    return [ regex for _order, regex, _prefix in self.__masks.get( key, [] ) ]
+
+  def addMask( self, key, mask ):
+    """ add a mask for :key: next to the already registered ones
+
+    :param self: self reference
+    :param key: any hashable returned by match()
+    :param mixed mask: regular expression string or compiled regex
+    """
+    regex = mask if hasattr( mask, "search" ) else re.compile( mask )
+    order = self.__order
+    self.__order += 1
+    prefix, literal = self.analyse( regex )
+    self.__masks.setdefault( key, [] ).append( ( order, regex, prefix ) )
+    if prefix is None:
+      self.__unanchored.append( ( order, key, regex, literal ) )
+    else:
+      self.__trieNode( prefix, create = True )[1].append( ( order, key, regex, prefix ) )
+
+  def setMask( self, key, mask ):
+    """ replace all the masks of :key: by :mask: """
+    self.removeMask( key )
+    self.addMask( key, mask )
+
+  def removeMask( self, key ):
+    """ remove all the masks registered for :key: """
+    entries = self.__masks.pop( key, [] )
+    for _order, _regex, prefix in entries:
+      if prefix is None:
+        self.__unanchored = [ entry for entry in self.__unanchored if entry[1] != key ]
+      else:
+        node = self.__trieNode( prefix )
+        if node:
+          node[1] = [ entry for entry in node[1] if entry[1] != key ]
+    return len( entries )
+
+  def match( self, string ):
+    """ get the keys of all the masks found in :string:, in insertion order
+
+    :param self: self reference
+    :param str string: string to check, i.e. LFN
+    """
+    found = []
+    for order, key, regex, literal in self.__unanchored:
+      if literal is not None and literal not in string:
+        continue
+      if regex.search( string ):
+        found.append( ( order, key ) )
+    node = self.__trie
+    # # only complete components ( followed by '/' ) are walked
+    for component in [ None ] + string.split( "/" )[:-1]:
+      if component is not None:
+        node = node[0].get( component )
+        if not node:
+          break
+      for order, key, regex, prefix in node[1]:
+        if string.startswith( prefix ) and regex.search( string ):
+          found.append( ( order, key ) )
+    found.sort()
+    return [ key for _order, key in found ]
+
+  def __trieNode( self, prefix, create = False ):
+    """ get the trie node for the leading complete components of :prefix: """
+    node = self.__trie
+    for component in prefix.split( "/" )[:-1]:
+      if component not in node[0]:
+        if not create:
+          return None
+        node[0][component] = [ {}, [] ]
+      node = node[0][component]
+    return node
+
+  @staticmethod
+  def analyse( regex ):
+    """ get the literal prefix of an anchored regex and the longest literal any match contains
+
+    :param regex: compiled regex
+    :return: tuple ( prefix, literal ), prefix is None if the regex is not anchored at the
+             beginning of the string, literal is None if no literal could be extracted
+    """
+    if regex.flags & ( re.IGNORECASE | re.LOCALE | re.UNICODE ):
+      return None, None
+    try:
+      parsed = sre_parse.parse( regex.pattern, regex.flags )
+    except ( sre_constants.error, TypeError ):
+      return None, None
+    if parsed.pattern.flags & ( sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_LOCALE |
+                                sre_constants.SRE_FLAG_UNICODE ):
+      return None, None
+    toChar = unichr if isinstance( regex.pattern, unicode ) else chr
+    items = list( parsed )
+    anchored = False
+    if items and items[0][0] == sre_constants.AT:
+      if items[0][1] == sre_constants.AT_BEGINNING_STRING:
+        anchored = True
+      elif items[0][1] == sre_constants.AT_BEGINNING:
+        anchored = not parsed.pattern.flags & sre_constants.SRE_FLAG_MULTILINE
+    # # literal runs of the top level sequence, all of them are mandatory parts of any match
+    runs = []
+    current = []
+    for op, av in items:
+      if op == sre_constants.LITERAL:
+        current.append( toChar( av ) )
+      elif current:
+        runs.append( "".join( current ) )
+        current = []
+    if current:
+      runs.append( "".join( current ) )
+    literal = max( runs, key = len ) if runs else None
+    prefix = None
+    if anchored:
+      prefix = []
+      for op, av in items[1:]:
+        if op != sre_constants.LITERAL:
+          break
+        prefix.append( toChar( av ) )
+      prefix = "".join( prefix )
+    return prefix, literal
@@ -712,7 +712,7 @@ class MySQL:
         cmdRet.append( ( cmd, cursor.execute( cmd ) ) )
       connection.commit()
     except Exception, error:
-      self.logger.execption( error )
+      self.logger.exception( error )
       # # rollback, put back connection to the pool
       connection.rollback()
       return S_ERROR( error )
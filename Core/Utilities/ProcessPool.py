@@ -95,11 +95,42 @@ The first types of callbacks could be used in case various callable objects are
 so you probably want to handle them differently dependin on their results, while the second types are for
 executing same type of callables in subprocesses and  hence you are expecting the same type of results
 everywhere.
+
+Chunked mode and worker state
+-----------------------------
+
+For many small tasks the cost of the default mode is dominated by the pickling of whole :ProcessTask:
+instances (callbacks included) travelling back and forth and by the thread started for every task.
+Passing :chunkSize: to the constructor switches the pool to the chunked mode::
+
+  pool = ProcessPool( minSize, maxSize, maxQueuedRequests, chunkSize = 100 )
+
+in which:
+
+- tasks are buffered and sent to the workers :chunkSize: at a time in a single queue message holding only
+  the callable, its arguments and the time out, :ProcessTask: instances and their callbacks stay in the
+  parent process, partial chunks are sent by :ProcessPool.processResults: (so in daemon mode within a
+  second) or explicitly by :ProcessPool.flushTasks:,
+- tasks are executed one after the other in the worker main thread, only their results and exceptions
+  are sent back, one message per chunk,
+- the single watchdog thread of the worker enforces the tasks' time outs: a task running for more than
+  its :timeOut: gets S_ERROR( "Timed out" ), the tasks of its chunk not yet started are queued again
+  and the worker exits, as a stuck thread can't be stopped, a new worker is spawned when needed.
+
+In both modes an :initializer: callable (with :initArgs:) can be given to the constructor. It is called
+once in every worker before it starts processing tasks, its return value (DB connections, clients...)
+is kept for the whole worker life and tasks obtain it with::
+
+  from DIRAC.Core.Utilities.ProcessPool import getWorkerState
+  state = getWorkerState()
+
+so expensive objects are built once per worker and not once per task.
 """
 
 __RCSID__ = "$Id$"
 
 import multiprocessing
+import cPickle
 import sys
 import time
 import threading
@@ -128,6 +159,15 @@ except ImportError:
     """ dummy S_ERROR """
     return { 'OK' : False, 'Message' : mess }
 
+## state built by the initializer in the worker process
+gWorkerState = None
+
+def getWorkerState():
+  """ get the value returned by the :ProcessPool: initializer in the current worker,
+  None if there is no initializer or outside of a worker
+  """
+  return gWorkerState
+
 class WorkingProcess( multiprocessing.Process ):
   """
   .. class:: WorkingProcess
@@ -139,20 +179,28 @@ class WorkingProcess( multiprocessing.Process ):
   defined a separate threading.Timer thread is started killing execution (and destroying worker) 
   after :ProcessTask.__timeOut: seconds.
 
+  In chunked mode the messages read from :pendingQueue: are lists of tasks, executed one after the
+  other in the main thread, their pickled results being pushed back at once when the chunk is done.
+  The per task time outs are then enforced by the watchdog thread.
+
   Main execution could also terminate in a few different ways:
   * on every failed read attempt (from empty  :pendingQueue:), the  idle loop counter is increased,
   worker is terminated when counter is reaching a value of 10;
   * when stopEvent is set (so ProcessPool is in draining mode),
-  * when parent process PID is set to 1 (init process, parent process with ProcessPool is dead).
+  * when parent process PID is set to 1 (init process, parent process with ProcessPool is dead),
+  * in chunked mode, when a task has exceeded its time out.
   """
 
-  def __init__( self, pendingQueue, resultsQueue, stopEvent ):
+  def __init__( self, pendingQueue, resultsQueue, stopEvent, chunked = False, initializer = None, initArgs = None ):
     """ c'tor
 
     :param self: self refernce
     :param multiprocessing.Queue pendingQueue: queue storing ProcessTask before exection
     :param multiprocessing.Queue resultsQueue: queue storing callbacks and exceptionCallbacks
     :param multiprocessing.Event stopEvent: event to stop processing
+    :param bool chunked: flag to read chunks of tasks instead of ProcessTask instances
+    :param callable initializer: function called once before processing, its return value is the worker state
+    :param tuple initArgs: initializer arguments
     """
     multiprocessing.Process.__init__( self )
     ## daemonize
@@ -167,19 +215,31 @@ class WorkingProcess( multiprocessing.Process ):
     self.__resultsQueue = resultsQueue
     ## stop event
     self.__stopEvent = stopEvent
+    ## chunked mode flag
+    self.__chunked = chunked
+    ## worker state initializer
+    self.__initializer = initializer
+    self.__initArgs = initArgs or ()
     ## placeholder for watchdog thread
     self.__watchdogThread = None
     ## placeholder for process thread
     self.__processThread = None
     ## placeholder for current task
     self.task = None
+    ## chunked mode: lock, chunk being processed, position and deadline of current task, pickled results
+    self.__chunkLock = None
+    self.__chunk = None
+    self.__chunkPosition = 0
+    self.__chunkResults = []
+    self.__deadline = None
     ## start yourself at least    
     self.start()
 
   def __watchdog( self ):
     """ watchdog thread target
 
-    terminating/killing WorkingProcess when parent process is dead
+    terminating/killing WorkingProcess when parent process is dead or, in chunked mode,
+    when current task has exceeded its time out
 
     :param self: self reference
     """
@@ -191,8 +251,34 @@ class WorkingProcess( multiprocessing.Process ):
         time.sleep(30)
         ## now you're dead
         os.kill( self.pid, signal.SIGKILL )
-      ## wake me up in 5 seconds
-      time.sleep(5)
+      ## task timed out?
+      if self.__chunked:
+        self.__checkDeadline()
+      ## wake me up in a second
+      time.sleep(1)
+
+  def __checkDeadline( self ):
+    """ time out current task of the chunk: send back results processed so far together with
+    S_ERROR( "Timed out" ), requeue not yet started tasks and exit, as running task can't be stopped
+
+    :param self: self reference
+    """
+    self.__chunkLock.acquire()
+    if self.__deadline is None or time.time() < self.__deadline:
+      self.__chunkLock.release()
+      return
+    ## lock is kept until exit, so main thread won't send anything more
+    taskKey = self.__chunk[self.__chunkPosition][0]
+    self.__chunkResults.append( self.__pickleResult( taskKey, S_ERROR( "Timed out" ), None ) )
+    self.__resultsQueue.put( self.__chunkResults )
+    notStarted = self.__chunk[self.__chunkPosition+1:]
+    if notStarted:
+      self.__pendingQueue.put( notStarted )
+    ## flush queues before leaving
+    for queue in ( self.__resultsQueue, self.__pendingQueue ):
+      queue.close()
+      queue.join_thread()
+    os._exit( 1 )
 
   def isWorking( self ):
     """ check if process is being executed
@@ -216,14 +302,78 @@ class WorkingProcess( multiprocessing.Process ):
     if self.task:
       self.task.process()
 
+  @staticmethod
+  def __pickleResult( taskKey, taskResult, taskException ):
+    """ pickle results of a task, done here and not in the results queue feeder thread
+    where an unpicklable result would be silently lost together with its whole chunk
+
+    :param int taskKey: task key in the ProcessPool
+    :param mixed taskResult: task result
+    :param dict taskException: S_ERROR( "Exception" ) if task has raised an exception
+    """
+    try:
+      return cPickle.dumps( ( taskKey, taskResult, taskException ), cPickle.HIGHEST_PROTOCOL )
+    except Exception, error:
+      return cPickle.dumps( ( taskKey, S_ERROR( "Unpicklable task result: %s" % str( error ) ), None ),
+                            cPickle.HIGHEST_PROTOCOL )
+
+  def __processChunk( self, chunk ):
+    """ execute tasks of a chunk one after the other and send back their results
+
+    :param self: self reference
+    :param list chunk: list of ( taskKey, taskFunction, args, kwargs, timeOut, sendResult ) tuples
+    """
+    self.__chunkLock.acquire()
+    try:
+      self.__chunk = chunk
+      self.__chunkResults = []
+    finally:
+      self.__chunkLock.release()
+
+    for position, ( taskKey, taskFunction, args, kwargs, timeOut, sendResult ) in enumerate( chunk ):
+      self.__chunkLock.acquire()
+      try:
+        self.__chunkPosition = position
+        self.__deadline = time.time() + timeOut if timeOut else None
+      finally:
+        self.__chunkLock.release()
+
+      task = ProcessTask( taskFunction, args, kwargs, usePoolCallbacks = True )
+      task.process()
+      if sendResult:
+        result = self.__pickleResult( taskKey, task.taskResults(), task.taskException() )
+      else:
+        result = self.__pickleResult( taskKey, None, None )
+
+      ## blocks forever if task has just been timed out by the watchdog
+      self.__chunkLock.acquire()
+      try:
+        self.__deadline = None
+        self.__chunkResults.append( result )
+      finally:
+        self.__chunkLock.release()
+
+    self.__chunkLock.acquire()
+    try:
+      self.__resultsQueue.put( self.__chunkResults )
+      self.__chunk = None
+      self.__chunkResults = []
+    finally:
+      self.__chunkLock.release()
+    return len( chunk )
+
   def run( self ):
     """ task execution
 
     reads and executes ProcessTask :task: out of pending queue and then pushes it
-    to the results queue for callback execution
+    to the results queue for callback execution, in chunked mode reads and executes
+    chunks of tasks
 
     :param self: self reference
     """
+    global gWorkerState
+    ## lock for chunk processing
+    self.__chunkLock = threading.Lock()
     ## start watchdog thread
     self.__watchdogThread = threading.Thread( target = self.__watchdog )
     self.__watchdogThread.daemon = True
@@ -236,6 +386,14 @@ class WorkingProcess( multiprocessing.Process ):
       lr._openAll()
       lr._setAllEvents()
 
+    ## build worker state
+    if self.__initializer:
+      try:
+        gWorkerState = self.__initializer( *self.__initArgs )
+      except Exception:
+        if gLogger:
+          gLogger.exception( "Exception in initializer of pool worker" )
+
     ## zero processed task counter
     taskCounter = 0
     ## zero idle loop counter
@@ -264,11 +422,19 @@ class WorkingProcess( multiprocessing.Process ):
 
       ## toggle __working flag
       self.__working.value = 1
-      ## save task
-      self.task = task
       ## reset idle loop counter
       idleLoopCount = 0
 
+      ## chunk of tasks
+      if self.__chunked:
+        taskCounter += self.__processChunk( task )
+        self.__taskCounter = taskCounter
+        self.__working.value = 0
+        continue
+
+      ## save task
+      self.task = task
+
       ## process task in a separate thread
       self.__processThread = threading.Thread( target = self.__processTask )
       self.__processThread.start()
@@ -461,6 +627,28 @@ class ProcessTask( object ):
     """ set taskResult to result """
     self.__taskResult = result
 
+  def setProcessed( self, taskResult, taskException = None ):
+    """ set results of a task processed elsewhere (in chunked mode only results are sent back)
+
+    :param self: self reference
+    :param mixed taskResult: task result
+    :param dict taskException: S_ERROR( "Exception" ) if task has raised an exception
+    """
+    self.__done = True
+    self.__taskResult = taskResult
+    self.__taskException = taskException
+    self.__exceptionRaised = taskException is not None
+
+  def getChunkItem( self, taskKey ):
+    """ get what is sent to the worker in chunked mode: key, callable, arguments, time out
+    and a flag telling if results are used by callbacks
+
+    :param self: self reference
+    :param int taskKey: task key in the ProcessPool
+    """
+    return ( taskKey, self.__taskFunction, self.__taskArgs, self.__taskKwArgs, self.__timeOut,
+             bool( self.hasCallback() or self.hasPoolCallback() ) )
+
   def process( self ):
     """ execute task
 
@@ -535,11 +723,21 @@ class ProcessPool( object ):
 
   :warn: Be carefull and choose wisely :timeout: argument to :ProcessPool.finalize:. Too short time period can
   cause that all workers will be killed.  
+
+  Chunked mode
+  ------------
+
+  When :chunkSize: is set, queued tasks are kept in the :ProcessPool: (in a dict indexed by a task key) and
+  only their callables and arguments are buffered and put into :pendingQueue: by chunks of :chunkSize:,
+  :maxQueuedRequests: being then a number of chunks. Workers send back lists of pickled
+  ( taskKey, taskResult, taskException ) tuples, used to set the results of the tasks kept here before
+  executing their callbacks.
   
   
   """
   def __init__( self, minSize = 2, maxSize = 0, maxQueuedRequests = 10,
-                strictLimits = True, poolCallback=None, poolExceptionCallback=None ):
+                strictLimits = True, poolCallback=None, poolExceptionCallback=None,
+                chunkSize = 0, initializer = None, initArgs = None ):
     """ c'tor
 
     :param self: self reference
@@ -549,6 +747,9 @@ class ProcessPool( object ):
     :param bool strictLimits: flag to workers overcommitment
     :param callable poolCallbak: results callback
     :param callable poolExceptionCallback: exception callback
+    :param int chunkSize: number of tasks per pending queue message, 0 (default) to send whole ProcessTasks
+    :param callable initializer: function called once in every worker, its return value is the worker state
+    :param tuple initArgs: initializer arguments
     """
     ## min workers
     self.__minSize = max( 1, minSize )
@@ -564,6 +765,17 @@ class ProcessPool( object ):
     ## pool exception callback
     self.__poolExceptionCallback = poolExceptionCallback
 
+    ## tasks per message, 0 for not chunked mode
+    self.__chunkSize = max( 0, chunkSize )
+    ## worker state initializer
+    self.__initializer = initializer
+    self.__initArgs = initArgs
+    ## chunked mode: lock, tasks not yet sent, tasks being processed and key of the last one
+    self.__chunkLock = threading.Lock()
+    self.__chunkBuffer = []
+    self.__tasksInFlight = {}
+    self.__taskKey = 0
+
     ## pending queue
     self.__pendingQueue = multiprocessing.Queue( self.__maxQueuedRequests )
     ## results queue
@@ -672,7 +884,9 @@ class ProcessPool( object ):
     """
     self.__prListLock.acquire()
     try:
-      worker = WorkingProcess( self.__pendingQueue, self.__resultsQueue, self.__stopEvent )
+      worker = WorkingProcess( self.__pendingQueue, self.__resultsQueue, self.__stopEvent,
+                               chunked = bool( self.__chunkSize ),
+                               initializer = self.__initializer, initArgs = self.__initArgs )
       while worker.pid == None:
         time.sleep(0.1)
       self.__workersDict[ worker.pid ] = worker
@@ -726,6 +940,9 @@ class ProcessPool( object ):
     if usePoolCallbacks and ( self.__poolCallback or self.__poolExceptionCallback ):
       task.enablePoolCallbacks()
 
+    if self.__chunkSize:
+      return self.__queueChunkedTask( task, blocking )
+
     self.__prListLock.acquire()
     try:
       self.__pendingQueue.put( task, block = blocking )
@@ -740,6 +957,57 @@ class ProcessPool( object ):
     time.sleep( 0.1 )
     return S_OK()
 
+  def __queueChunkedTask( self, task, blocking = True ):
+    """ add task to the chunk being built, send the chunk if it's full
+
+    :param self: self reference
+    :param ProcessTask task: new task to execute
+    :param bool blocking: flag to block if necessary and new empty slot is available
+    """
+    self.__chunkLock.acquire()
+    try:
+      self.__taskKey += 1
+      self.__tasksInFlight[ self.__taskKey ] = task
+      self.__chunkBuffer.append( task.getChunkItem( self.__taskKey ) )
+      if len( self.__chunkBuffer ) < self.__chunkSize:
+        return S_OK()
+      try:
+        self.__pendingQueue.put( self.__chunkBuffer, block = blocking )
+      except Queue.Full:
+        ## chunk is kept to be sent later, without this task
+        self.__chunkBuffer.pop()
+        del self.__tasksInFlight[ self.__taskKey ]
+        return S_ERROR( "Queue is full" )
+      self.__chunkBuffer = []
+    finally:
+      self.__chunkLock.release()
+
+    self.__spawnNeededWorkingProcesses()
+    return S_OK()
+
+  def flushTasks( self, blocking = True ):
+    """ send tasks of not yet full chunk to the workers (chunked mode only)
+
+    :param self: self reference
+    :param bool blocking: flag to block if necessary and new empty slot is available
+    """
+    if not self.__chunkSize:
+      return S_OK( 0 )
+    self.__chunkLock.acquire()
+    try:
+      flushed = len( self.__chunkBuffer )
+      if flushed:
+        try:
+          self.__pendingQueue.put( self.__chunkBuffer, block = blocking )
+        except Queue.Full:
+          return S_ERROR( "Queue is full" )
+        self.__chunkBuffer = []
+    finally:
+      self.__chunkLock.release()
+    if flushed:
+      self.__spawnNeededWorkingProcesses()
+    return S_OK( flushed )
+
   def createAndQueueTask( self,
                           taskFunction,
                           args = None,
@@ -791,11 +1059,71 @@ class ProcessPool( object ):
     """
     return not self.__pendingQueue.empty() or self.getNumWorkingProcesses()
 
+  def getNumTasksInFlight( self ):
+    """ count tasks queued and not yet processed back (chunked mode only)
+
+    :param self: self reference
+    """
+    self.__chunkLock.acquire()
+    try:
+      return len( self.__tasksInFlight )
+    finally:
+      self.__chunkLock.release()
+
+  def __executeCallbacks( self, task ):
+    """ execute task and pool callbacks
+
+    :param self: self reference
+    :param ProcessTask task: processed task
+    """
+    try:
+      task.doExceptionCallback()
+      task.doCallback()
+      if task.usePoolCallbacks():
+        if self.__poolExceptionCallback and task.exceptionRaised():
+          self.__poolExceptionCallback( task.getTaskID(), task.taskException() )
+        if self.__poolCallback and task.taskResults():
+          self.__poolCallback( task.getTaskID(), task.taskResults() )
+    except Exception:
+      pass
+
+  def __processChunkedResults( self ):
+    """ chunked mode processResults: send not yet full chunk, read all results available
+    and execute callbacks of their tasks
+
+    :param self: self reference
+    """
+    self.flushTasks( blocking = False )
+    self.__cleanDeadProcesses()
+    if not self.__pendingQueue.empty():
+      self.__spawnNeededWorkingProcesses()
+    processed = 0
+    while True:
+      try:
+        chunkResults = self.__resultsQueue.get( block = False )
+      except Queue.Empty:
+        break
+      for pickledResult in chunkResults:
+        taskKey, taskResult, taskException = cPickle.loads( pickledResult )
+        self.__chunkLock.acquire()
+        try:
+          task = self.__tasksInFlight.pop( taskKey, None )
+        finally:
+          self.__chunkLock.release()
+        if not task:
+          continue
+        task.setProcessed( taskResult, taskException )
+        self.__executeCallbacks( task )
+        processed += 1
+    return processed
+
   def processResults( self ):
     """ execute tasks' callbacks removing them from results queue
 
     :param self: self reference
     """
+    if self.__chunkSize:
+      return self.__processChunkedResults()
     processed = 0
     while True:
       self.__cleanDeadProcesses()
@@ -807,16 +1135,7 @@ class ProcessPool( object ):
       ## get task
       task = self.__resultsQueue.get()
       ## execute callbacks
-      try:
-        task.doExceptionCallback()
-        task.doCallback()
-        if task.usePoolCallbacks():
-          if self.__poolExceptionCallback and task.exceptionRaised():
-            self.__poolExceptionCallback( task.getTaskID(), task.taskException() )
-          if self.__poolCallback and task.taskResults():
-            self.__poolCallback( task.getTaskID(), task.taskResults() )
-      except Exception, error:
-        pass
+      self.__executeCallbacks( task )
       processed += 1
     return processed
 
@@ -826,6 +1145,13 @@ class ProcessPool( object ):
     :param self: self reference
     """
     start = time.time()
+    if self.__chunkSize:
+      ## results come back by chunks, no need to wait for idle workers
+      while self.processResults() or self.getNumTasksInFlight():
+        time.sleep( 0.1 )
+        if time.time() - start > timeout:
+          break
+      return
     while self.getNumWorkingProcesses() or not self.__pendingQueue.empty():
       self.processResults()      
       time.sleep( 1 )
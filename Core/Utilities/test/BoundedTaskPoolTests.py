@@ -0,0 +1,85 @@
+########################################################################
+# $HeadURL $
+# File: BoundedTaskPoolTests.py
+########################################################################
+""" :mod: BoundedTaskPoolTests
+    ==========================
+
+    .. module: BoundedTaskPoolTests
+    :synopsis: tests for BoundedTaskPool class
+"""
+__RCSID__ = "$Id$"
+# # imports
+import time
+import threading
+import unittest
+# # SUT
+from DIRAC.Core.Utilities.BoundedTaskPool import BoundedTaskPool
+
+class BoundedTaskPoolTests( unittest.TestCase ):
+  """
+  .. class:: BoundedTaskPoolTests
+  """
+  def setUp( self ):
+    """ test setup """
+    self.lock = threading.Lock()
+    self.running = 0
+    self.maxRunning = 0
+
+  def sleeper( self, sleepTime, value = None ):
+    """ task sleeping :sleepTime: and counting concurrent executions """
+    with self.lock:
+      self.running += 1
+      self.maxRunning = max( self.maxRunning, self.running )
+    time.sleep( sleepTime )
+    with self.lock:
+      self.running -= 1
+    if value == "raise":
+      raise ValueError( "bad value" )
+    return { "OK" : True, "Value" : value }
+
+  def testResults( self ):
+    """ results, exceptions and plain return values """
+    pool = BoundedTaskPool( 4 )
+    results = pool.execute( { "a" : ( self.sleeper, ( 0.01, 1 ) ),
+                              "b" : ( self.sleeper, ( 0.01, ), { "value" : "raise" } ),
+                              "c" : ( len, ( [ 1, 2 ], ) ) } )
+    self.assertEqual( results["a"], { "OK" : True, "Value" : 1 } )
+    self.assertEqual( results["b"]["OK"], False )
+    self.assertEqual( results["c"], { "OK" : True, "Value" : 2 } )
+    self.assertEqual( pool.execute( {} ), {} )
+
+  def testConcurrency( self ):
+    """ at most maxThreads tasks at the same time, total time driven by the slowest batch """
+    pool = BoundedTaskPool( 5 )
+    startTime = time.time()
+    results = pool.execute( dict( [ ( i, ( self.sleeper, ( 0.2, i ) ) ) for i in range( 20 ) ] ) )
+    elapsed = time.time() - startTime
+    self.assertEqual( sorted( [ result["Value"] for result in results.values() ] ), range( 20 ) )
+    self.assertEqual( self.maxRunning, 5 )
+    self.assertTrue( elapsed < 2., elapsed )
+
+  def testTimeout( self ):
+    """ slow tasks time out, their keys stay busy until they are over """
+    pool = BoundedTaskPool( 2 )
+    startTime = time.time()
+    results = pool.execute( { "slow" : ( self.sleeper, ( 1., ) ),
+                              "fast1" : ( self.sleeper, ( 0.05, 1 ) ),
+                              "fast2" : ( self.sleeper, ( 0.05, 2 ) ),
+                              "fast3" : ( self.sleeper, ( 0.05, 3 ) ) }, timeout = 0.3 )
+    self.assertTrue( time.time() - startTime < 0.8 )
+    self.assertEqual( results["slow"], { "OK" : False, "Message" : "Timed out" } )
+    self.assertEqual( [ results["fast%d" % i]["Value"] for i in ( 1, 2, 3 ) ], [ 1, 2, 3 ] )
+    self.assertEqual( pool.busyKeys(), set( [ "slow" ] ) )
+    results = pool.execute( { "slow" : ( self.sleeper, ( 0., ) ) } )
+    self.assertEqual( results["slow"]["OK"], False )
+    time.sleep( 1. )
+    self.assertEqual( pool.busyKeys(), set() )
+    results = pool.execute( { "slow" : ( self.sleeper, ( 0., 4 ) ) } )
+    self.assertEqual( results["slow"]["Value"], 4 )
+
+# # test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( BoundedTaskPoolTests )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
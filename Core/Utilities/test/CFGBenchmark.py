@@ -0,0 +1,70 @@
+########################################################################
+# $HeadURL $
+# File: CFGBenchmark.py
+########################################################################
+""" :mod: CFGBenchmark
+    ==================
+
+    .. module: CFGBenchmark
+    :synopsis: CFG parse and merge times compared with their former implementations
+
+    Generated configurations of 10k to 1M options are parsed, then merged as done by
+    ConfigurationData.sync (the whole CS with a small local cfg) and with another
+    generated configuration overlapping it.
+
+    usage: python CFGBenchmark.py [nOptions,nOptions...]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import sys
+import time
+# # SUT
+from DIRAC.Core.Utilities.CFG import CFG
+# # former implementations and generated configurations
+from CFGTests import legacyLoadFromBuffer, legacyMergeWith, generateCFGString
+
+LOCAL_CFG = """DIRAC
+{
+  Setup = Certification
+  Security
+  {
+    UseServerCertificate = yes
+  }
+}
+LocalSite
+{
+  Site = LCG.Site00001.org
+}
+"""
+
+def timeIt( function, *args ):
+  """ elapsed time and result """
+  start = time.time()
+  result = function( *args )
+  return time.time() - start, result
+
+def benchmark( sizes = ( 10000, 100000, 1000000 ) ):
+  """ print parse and merge times, check both implementations agree """
+  localCFG = CFG().loadFromBuffer( LOCAL_CFG )
+  print "%-10s %-22s %10s %10s %8s" % ( "options", "operation", "former", "current", "speedup" )
+  for nOptions in sizes:
+    data = generateCFGString( nOptions, 1 )
+    otherData = generateCFGString( nOptions / 2, 2 )
+
+    legacyTime, legacyCFG = timeIt( legacyLoadFromBuffer, data )
+    newTime, cfg = timeIt( CFG().loadFromBuffer, data )
+    assert cfg.serialize() == legacyCFG.serialize()
+    print "%-10d %-22s %9.3fs %9.3fs %7.1fx" % ( nOptions, "parse", legacyTime, newTime, legacyTime / newTime )
+
+    otherCFG = CFG().loadFromBuffer( otherData )
+    for name, cfgToMergeWith in ( ( "merge local cfg", localCFG ), ( "merge overlapping cfg", otherCFG ) ):
+      legacyTime, legacyMerged = timeIt( legacyMergeWith, cfg, cfgToMergeWith )
+      newTime, merged = timeIt( cfg.mergeWith, cfgToMergeWith )
+      assert merged.serialize() == legacyMerged.serialize()
+      print "%-10d %-22s %9.3fs %9.3fs %7.1fx" % ( nOptions, name, legacyTime, newTime, legacyTime / newTime )
+
+if __name__ == "__main__":
+  if len( sys.argv ) > 1:
+    benchmark( [ int( size ) for size in sys.argv[1].split( "," ) ] )
+  else:
+    benchmark()
@@ -0,0 +1,271 @@
+########################################################################
+# $HeadURL $
+# File: CFGTests.py
+########################################################################
+""" :mod: CFGTests
+    ==============
+
+    .. module: CFGTests
+    :synopsis: equivalence tests of CFG parser and merge with their former implementations
+
+    The cfg files of the DIRAC tree (ConfigTemplates, installation cfgs, releases.cfg),
+    generated configurations and random token soups are parsed and merged with the
+    current CFG and with the former character by character parser and copying merge,
+    which are kept here as references.
+"""
+__RCSID__ = "$Id$"
+# # imports
+import os
+import random
+import unittest
+# # SUT
+from DIRAC.Core.Utilities.CFG import CFG
+
+def legacyLoadFromBuffer( data ):
+  """ former CFG.loadFromBuffer: character by character parsing """
+  cfg = CFG()
+  levelList = []
+  currentLevel = cfg
+  currentlyParsedString = ""
+  currentComment = ""
+  for line in data.split( "\n" ):
+    line = line.strip()
+    if len( line ) < 1:
+      continue
+    commentPos = line.find( "#" )
+    if commentPos > -1:
+      currentComment += "%s\n" % line[ commentPos: ].replace( "#", "" )
+      line = line[ :commentPos ]
+    for index in range( len( line ) ):
+      if line[ index ] == "{":
+        currentlyParsedString = currentlyParsedString.strip()
+        currentLevel.createNewSection( currentlyParsedString, currentComment )
+        levelList.append( currentLevel )
+        currentLevel = currentLevel[ currentlyParsedString ]
+        currentlyParsedString = ""
+        currentComment = ""
+      elif line[ index ] == "}":
+        currentLevel = levelList.pop()
+      elif line[ index ] == "=":
+        lFields = line.split( "=" )
+        currentLevel.setOption( lFields[0].strip(), "=".join( lFields[1:] ).strip(), currentComment )
+        currentlyParsedString = ""
+        currentComment = ""
+        break
+      elif line[ index: index + 2 ] == "+=":
+        valueList = line.split( "+=" )
+        currentLevel.appendToOption( valueList[0].strip(), ", %s" % "+=".join( valueList[1:] ).strip() )
+        currentlyParsedString = ""
+        currentComment = ""
+        break
+      else:
+        currentlyParsedString += line[ index ]
+  return cfg
+
+def legacyMergeWith( cfg, cfgToMergeWith ):
+  """ former CFG.mergeWith: full copy of the merged tree """
+  mergedCFG = CFG()
+  for option in cfg.listOptions():
+    mergedCFG.setOption( option, cfg[ option ], cfg.getComment( option ) )
+  for option in cfgToMergeWith.listOptions():
+    mergedCFG.setOption( option, cfgToMergeWith[ option ], cfgToMergeWith.getComment( option ) )
+  for section in cfg.listSections():
+    if section in cfgToMergeWith.listSections():
+      mergedCFG.createNewSection( section, cfgToMergeWith.getComment( section ),
+                                  legacyMergeWith( cfg[ section ], cfgToMergeWith[ section ] ) )
+    else:
+      mergedCFG.createNewSection( section, cfg.getComment( section ), cfg[ section ].clone() )
+  for section in cfgToMergeWith.listSections():
+    if section not in cfg.listSections():
+      mergedCFG.createNewSection( section, cfgToMergeWith.getComment( section ), cfgToMergeWith[ section ] )
+  return mergedCFG
+
+def generateCFGString( nOptions, seed = 1 ):
+  """ CS like configuration with about :nOptions: options: sites, CEs and queues,
+  systems and their agents with multi valued options
+  """
+  rand = random.Random( seed )
+  lines = [ "# generated configuration", "DIRAC", "{", "  Setup = Production",
+            "  Configuration", "  {", "    Servers = dips://cs1.example.org:9135/Configuration/Server",
+            "    Servers += dips://cs2.example.org:9135/Configuration/Server", "  }", "}" ]
+  options = 3
+  lines += [ "Resources", "{", "Sites", "{", "LCG", "{" ]
+  site = 0
+  while options < nOptions * 0.8:
+    lines += [ "  # site %d" % site, "  LCG.Site%05d.org" % site, "  {", "    Name = SITE%05d" % site,
+               "    SE = SITE%05d-disk, SITE%05d-tape" % ( site, site ), "    CE = ce01.site%05d.org" % site,
+               "    CEs", "    {" ]
+    options += 3
+    for ce in range( rand.randint( 1, 3 ) ):
+      lines += [ "      ce%02d.site%05d.org" % ( ce, site ), "      {", "        CEType = CREAM",
+                 "        SubmissionMode = Direct", "        OS = ScientificCERNSLC_Carbon_6.4",
+                 "        Queues", "        {" ]
+      options += 3
+      for queue in range( rand.randint( 1, 4 ) ):
+        lines += [ "          queue%d" % queue, "          {",
+                   "            maxCPUTime = %d" % rand.choice( [ 2880, 5760, 8640 ] ),
+                   "            SI00 = %d" % rand.randint( 1000, 3000 ),
+                   "            MaxTotalJobs = %d" % rand.randint( 100, 5000 ),
+                   "            MaxWaitingJobs = 50 # per queue", "          }" ]
+        options += 4
+      lines += [ "        }", "      }" ]
+    lines += [ "    }", "  }" ]
+    site += 1
+  lines += [ "}", "}", "}", "Systems", "{" ]
+  component = 0
+  while options < nOptions:
+    lines += [ "  System%04d" % component, "  {", "    Production", "    {", "      Agents", "      {",
+               "        Agent%04d" % component, "        {", "          PollingTime = 120",
+               "          Status = Active", "          Sites = %s" % ", ".join( [ "LCG.Site%05d.org" % i
+                                                                                 for i in range( 5 ) ] ),
+               "          Sites += LCG.Site%05d.org" % component, "        }", "      }", "    }", "  }" ]
+    options += 4
+    component += 1
+  lines += [ "}" ]
+  return "\n".join( lines ) + "\n"
+
+def repositoryCFGFiles():
+  """ cfg files of the DIRAC tree """
+  topDir = os.path.abspath( os.path.join( os.path.dirname( __file__ ), "..", "..", ".." ) )
+  cfgFiles = []
+  for dirPath, _dirNames, fileNames in os.walk( topDir ):
+    cfgFiles += [ os.path.join( dirPath, fileName ) for fileName in fileNames if fileName.endswith( ".cfg" ) ]
+  return sorted( cfgFiles )
+
+def tokenSoup( rand ):
+  """ random lines made of cfg tokens, names, paths and comments """
+  pieces = [ "Sec", "Opt", "Name", "a/b", "Sec/Sub", " ", "value", ",", "+", "#", "{", "}", "=", "+=",
+             "Opt = value", "Opt += value", "Name = a = b", "Sec {", "Sec/Sub {", "Sub {", "}" ]
+  lines = []
+  for _i in range( rand.randint( 1, 8 ) ):
+    lines.append( "".join( [ rand.choice( pieces ) for _j in range( rand.randint( 0, 3 ) ) ] ) )
+  return "\n".join( lines )
+
+class CFGEquivalenceTests( unittest.TestCase ):
+  """
+  .. class:: CFGEquivalenceTests
+
+  """
+  def assertSameCFG( self, cfg, refCFG, path = "" ):
+    """ same entries in the same order, same comments (not stripped as in CFG.__eq__) and values """
+    self.assertEqual( cfg.listAll(), refCFG.listAll(), path )
+    for key in refCFG.listAll():
+      self.assertEqual( cfg.getComment( key ), refCFG.getComment( key ), "%s/%s" % ( path, key ) )
+      if isinstance( refCFG[ key ], CFG ):
+        self.assertTrue( isinstance( cfg[ key ], CFG ), "%s/%s" % ( path, key ) )
+        self.assertSameCFG( cfg[ key ], refCFG[ key ], "%s/%s" % ( path, key ) )
+      else:
+        self.assertEqual( cfg[ key ], refCFG[ key ], "%s/%s" % ( path, key ) )
+
+  def assertSameOutcome( self, function, refFunction, *args ):
+    """ same CFG or same exception """
+    try:
+      refCFG = refFunction( *args )
+    except Exception, refError:
+      try:
+        function( *args )
+      except Exception, error:
+        self.assertEqual( ( type( error ), str( error ) ), ( type( refError ), str( refError ) ) )
+        return None
+      self.fail( "%s not raised" % repr( refError ) )
+    cfg = function( *args )
+    self.assertSameCFG( cfg, refCFG )
+    self.assertEqual( cfg.serialize(), refCFG.serialize() )
+    return cfg
+
+  def testRepositoryFiles( self ):
+    """ parse, round trip and merge of the cfg files of the tree """
+    cfgFiles = repositoryCFGFiles()
+    self.assertTrue( cfgFiles )
+    buffers = [ open( cfgFile ).read() for cfgFile in cfgFiles ]
+    cfgs = []
+    for data in buffers:
+      cfg = self.assertSameOutcome( lambda data: CFG().loadFromBuffer( data ), legacyLoadFromBuffer, data )
+      self.assertEqual( CFG().loadFromBuffer( cfg.serialize() ).serialize(), cfg.serialize() )
+      cfgs.append( cfg )
+    for cfg in cfgs:
+      for cfgToMergeWith in cfgs:
+        self.assertSameOutcome( lambda cfg, cfgToMergeWith: cfg.mergeWith( cfgToMergeWith ),
+                                legacyMergeWith, cfg, cfgToMergeWith )
+
+  def testGenerated( self ):
+    """ parse and merge of generated configurations overlapping partly """
+    cfgs = []
+    for nOptions, seed in ( ( 2000, 1 ), ( 3000, 2 ) ):
+      data = generateCFGString( nOptions, seed )
+      cfgs.append( self.assertSameOutcome( lambda data: CFG().loadFromBuffer( data ), legacyLoadFromBuffer, data ) )
+    self.assertSameOutcome( lambda cfg, cfgToMergeWith: cfg.mergeWith( cfgToMergeWith ), legacyMergeWith, *cfgs )
+    cfgs.reverse()
+    self.assertSameOutcome( lambda cfg, cfgToMergeWith: cfg.mergeWith( cfgToMergeWith ), legacyMergeWith, *cfgs )
+
+  def testTokenSoup( self ):
+    """ same result or same exception for random lines of tokens """
+    rand = random.Random( 3 )
+    for _i in range( 2000 ):
+      data = tokenSoup( rand )
+      self.assertSameOutcome( lambda data: CFG().loadFromBuffer( data ), legacyLoadFromBuffer, data )
+    for _i in range( 500 ):
+      try:
+        cfg = legacyLoadFromBuffer( tokenSoup( rand ) )
+        cfgToMergeWith = legacyLoadFromBuffer( tokenSoup( rand ) )
+      except Exception:
+        continue
+      self.assertSameOutcome( lambda cfg, cfgToMergeWith: cfg.mergeWith( cfgToMergeWith ),
+                              legacyMergeWith, cfg, cfgToMergeWith )
+
+class CFGCopyOnWriteTests( unittest.TestCase ):
+  """
+  .. class:: CFGCopyOnWriteTests
+
+  sections shared by merged CFGs
+  """
+  def setUp( self ):
+    self.cfg = CFG().loadFromBuffer( generateCFGString( 500, 1 ) )
+    self.cfgToMergeWith = CFG().loadFromBuffer( "Local\n{\n  Option = 1\n  Sub\n  {\n    Deep = 2\n  }\n}\n"
+                                                "DIRAC\n{\n  Setup = Certification\n}\n" )
+    self.before = ( self.cfg.serialize(), self.cfgToMergeWith.serialize() )
+    self.merged = self.cfg.mergeWith( self.cfgToMergeWith )
+    self.mergedBefore = self.merged.serialize()
+
+  def assertUnchanged( self ):
+    self.assertEqual( ( self.cfg.serialize(), self.cfgToMergeWith.serialize() ), self.before )
+
+  def testModifyMerged( self ):
+    """ modifications of the merged CFG don't reach the CFGs it comes from """
+    self.merged.setOption( "Resources/Sites/LCG/LCG.Site00000.org/CEs/ce00.site00000.org/CEType", "HTCondorCE" )
+    self.merged[ "Resources" ][ "Sites" ].createNewSection( "DIRAC" )
+    self.merged.appendToOption( "Local/Sub/Deep", ", 3" )
+    self.merged.deleteKey( "Systems/System0000/Production" )
+    self.merged.renameKey( "Local/Sub", "Local/Renamed" )
+    self.merged[ "Local/Renamed" ].setOption( "New", "4" )
+    self.merged.setOption( "DIRAC/Configuration/Servers", "dips://cs3.example.org:9135/Configuration/Server" )
+    self.assertUnchanged()
+    self.assertEqual( self.merged.getOption( "Resources/Sites/LCG/LCG.Site00000.org/CEs/ce00.site00000.org/CEType" ),
+                      "HTCondorCE" )
+    self.assertEqual( self.merged.getOption( "Local/Renamed/Deep" ), "2, 3" )
+    self.assertEqual( self.merged.getOption( "Local/Renamed/New" ), "4" )
+    self.assertEqual( self.merged.getOption( "DIRAC/Setup" ), "Certification" )
+
+  def testModifySources( self ):
+    """ modifications of the CFGs merged don't reach the merged CFG """
+    self.cfg.setOption( "Resources/Sites/LCG/LCG.Site00001.org/Name", "CHANGED" )
+    self.cfg.deleteKey( "Systems" )
+    self.cfgToMergeWith[ "Local" ][ "Sub" ].setOption( "Deep", "CHANGED" )
+    self.assertEqual( self.merged.serialize(), self.mergedBefore )
+    self.assertEqual( self.cfg.getOption( "Resources/Sites/LCG/LCG.Site00001.org/Name" ), "CHANGED" )
+
+  def testMergeChain( self ):
+    """ merging again a merged CFG, as done for the local CFG """
+    again = self.merged.mergeWith( CFG().loadFromBuffer( "Local\n{\n  Sub\n  {\n    Deep = 5\n  }\n}\n" ) )
+    self.assertEqual( again.getOption( "Local/Sub/Deep" ), "5" )
+    again.setOption( "Local/Option", "6" )
+    self.assertEqual( self.merged.getOption( "Local/Option" ), "1" )
+    self.assertEqual( self.merged.serialize(), self.mergedBefore )
+    self.assertUnchanged()
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = unittest.TestSuite( [ gTestLoader.loadTestsFromTestCase( CFGEquivalenceTests ),
+                                 gTestLoader.loadTestsFromTestCase( CFGCopyOnWriteTests ) ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
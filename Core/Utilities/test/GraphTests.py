@@ -326,6 +326,41 @@ class GraphTests( unittest.TestCase ):
     nodes.sort( key = lambda node: node.clockC )
     self.assertEqual( nodesSorted, nodes, "bfs failed" )
 
+  def testIndexes( self ):
+    """ getNode getEdge getEdgeBetween in """
+    gr = Graph( "testGraph", self.nodes, self.edges )
+
+    # # edges by name and between nodes
+    for edge in self.edges:
+      self.assertEqual( gr.getEdge( edge.name ), edge )
+      self.assertEqual( gr.getEdgeBetween( edge.fromNode.name, edge.toNode.name ), edge )
+    self.assertEqual( gr.getEdgeBetween( "2", "1" ), None )
+    self.assertEqual( gr.getEdgeBetween( "1", "4" ), None )
+    self.assertEqual( gr.getNode( "4" ), None )
+    self.assertEqual( gr.getEdge( "1-4" ), None )
+
+    # # new edge indexed
+    aloneEdge = gr.connect( self.nodes[0], self.aloneNode )
+    self.assertEqual( gr.getNode( "4" ), self.aloneNode )
+    self.assertEqual( gr.getEdge( "1-4" ), aloneEdge )
+    self.assertEqual( gr.getEdgeBetween( "1", "4" ), aloneEdge )
+
+    # # duplicated names: both in, first one returned as by a scan
+    twinNode = Node( "4" )
+    twinEdge = gr.connect( self.nodes[0], twinNode )
+    self.assertEqual( twinNode in gr, True )
+    self.assertEqual( twinEdge in gr, True )
+    self.assertEqual( len( gr.nodes() ), 5 )
+    self.assertEqual( len( gr.edges() ), 4 )
+    self.assertEqual( gr.getNode( "4" ), self.aloneNode )
+    self.assertEqual( gr.getEdge( "1-4" ), aloneEdge )
+    self.assertEqual( gr.getEdgeBetween( "1", "4" ), aloneEdge )
+
+    # # neither nodes nor edges
+    self.assertEqual( Node( "1" ) in gr, False )
+    self.assertEqual( "1" in gr, False )
+    self.assertEqual( [] in gr, False )
+
 
 
 
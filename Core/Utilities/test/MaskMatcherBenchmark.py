@@ -0,0 +1,72 @@
+########################################################################
+# $HeadURL $
+# File: MaskMatcherBenchmark.py
+########################################################################
+""" :mod: MaskMatcherBenchmark
+    ==========================
+
+    .. module: MaskMatcherBenchmark
+    :synopsis: compare MaskMatcher with the linear loop over all the FileMasks
+
+    usage: python MaskMatcherBenchmark.py [nMasks] [nLFNs]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import re
+import sys
+import time
+import random
+# # SUT
+from DIRAC.Core.Utilities.MaskMatcher import MaskMatcher
+
+def makeMasks( nMasks, rand ):
+  """ FileMasks looking like production ones: mostly anchored on a bookkeeping path """
+  masks = []
+  for i in range( nMasks ):
+    year = rand.choice( [ "2010", "2011", "2012", "2013" ] )
+    kind = rand.choice( [ "MC", "data", "validation" ] )
+    if i % 10 == 0:
+      # # some unanchored ones
+      masks.append( ".*/%08d/.*\.dst$" % i )
+    else:
+      masks.append( "^/lhcb/%s/%s/%s/%08d/.*\.(dst|sim)$" % ( kind, year, rand.choice( [ "DST", "SIM", "RAW" ] ), i ) )
+  return masks
+
+def makeLFNs( nLFNs, nMasks, rand ):
+  """ LFNs of the productions above """
+  lfns = []
+  for _i in range( nLFNs ):
+    lfns.append( "/lhcb/%s/%s/%s/%08d/0000/%08d_%08d_1.%s" % ( rand.choice( [ "MC", "data", "validation" ] ),
+                                                               rand.choice( [ "2010", "2011", "2012", "2013" ] ),
+                                                               rand.choice( [ "DST", "SIM", "RAW" ] ),
+                                                               rand.randint( 0, nMasks ),
+                                                               rand.randint( 0, nMasks ),
+                                                               rand.randint( 0, 10000 ),
+                                                               rand.choice( [ "dst", "sim", "raw" ] ) ) )
+  return lfns
+
+def benchmark( nMasks = 500, nLFNs = 20000 ):
+  """ time the linear loop and the MaskMatcher and check they agree """
+  rand = random.Random( 1 )
+  filters = [ ( transID, re.compile( mask ) ) for transID, mask in enumerate( makeMasks( nMasks, rand ) ) ]
+  lfns = makeLFNs( nLFNs, nMasks, rand )
+
+  start = time.time()
+  linear = [ [ transID for transID, regex in filters if regex.search( lfn ) ] for lfn in lfns ]
+  linearTime = time.time() - start
+
+  start = time.time()
+  matcher = MaskMatcher( filters )
+  buildTime = time.time() - start
+  start = time.time()
+  matched = [ matcher.match( lfn ) for lfn in lfns ]
+  matcherTime = time.time() - start
+
+  print "%d masks, %d LFNs, %d matches" % ( nMasks, nLFNs, sum( [ len( m ) for m in matched ] ) )
+  print "linear loop : %8.3f s %10.0f LFNs/s" % ( linearTime, nLFNs / linearTime )
+  print "MaskMatcher : %8.3f s %10.0f LFNs/s ( build %.3f s )" % ( matcherTime, nLFNs / matcherTime, buildTime )
+  print "results identical: %s" % ( linear == matched )
+
+if __name__ == "__main__":
+  args = [ int( arg ) for arg in sys.argv[1:3] ]
+  benchmark( *args )
@@ -0,0 +1,85 @@
+########################################################################
+# $HeadURL $
+# File: MaskMatcherTests.py
+########################################################################
+""" :mod: MaskMatcherTests
+    =======================
+
+    .. module: MaskMatcherTests
+    :synopsis: tests for MaskMatcher class
+"""
+__RCSID__ = "$Id$"
+# # imports
+import re
+import random
+import unittest
+# # SUT
+from DIRAC.Core.Utilities.MaskMatcher import MaskMatcher
+
+# # masks covering anchored, unanchored, flagged and alternation cases
+MASKS = [ '^/lhcb/MC/2012/', '^/lhcb/MC', '/lhcb/data/.*\.dst$', 'DST', '^/lhcb/(MC|data)/', '(?i)^/LHCB/mc',
+          '^/lhcb/user/a/', '(?m)^/lhcb/', 'x*', '^/lhcb/MC/2012/DST/.*\.dst$', '\.dst$', '^/lhcb/M', '^lhcb',
+          '^/', '^/lhcb/MC/201[12]', 'Sim08|user', '^(/lhcb/MC)', '\A/lhcb/data' ]
+COMPONENTS = [ 'lhcb', 'MC', 'data', '2012', '2011', 'DST', 'user', 'a', 'b', 'LHCb', 'Sim08' ]
+
+def randomLFN( rand ):
+  """ random LFN made of COMPONENTS """
+  lfn = "/" + "/".join( [ rand.choice( COMPONENTS ) for _i in range( rand.randint( 0, 6 ) ) ] )
+  if rand.random() < 0.5:
+    lfn += rand.choice( [ ".dst", ".DST", ".sim" ] )
+  if rand.random() < 0.05:
+    lfn = lfn[1:]
+  return lfn
+
+class MaskMatcherTests( unittest.TestCase ):
+  """
+  .. class:: MaskMatcherTests
+  """
+  def setUp( self ):
+    """ test setup """
+    self.rand = random.Random( 12345 )
+    self.filters = [ ( transID, re.compile( mask ) ) for transID, mask in enumerate( MASKS ) ]
+
+  def linear( self, lfn ):
+    """ reference: plain loop over all the masks """
+    return [ transID for transID, regex in self.filters if regex.search( lfn ) ]
+
+  def testAnalyse( self ):
+    """ literal prefix and literal extraction """
+    self.assertEqual( MaskMatcher.analyse( re.compile( "^/lhcb/MC/.*\.dst$" ) ), ( "/lhcb/MC/", "/lhcb/MC/" ) )
+    self.assertEqual( MaskMatcher.analyse( re.compile( "/lhcb/.*DST" ) ), ( None, "/lhcb/" ) )
+    self.assertEqual( MaskMatcher.analyse( re.compile( "^.*DST" ) ), ( "", "DST" ) )
+    self.assertEqual( MaskMatcher.analyse( re.compile( "(?m)^/lhcb" ) ), ( None, "/lhcb" ) )
+    self.assertEqual( MaskMatcher.analyse( re.compile( "(?i)^/lhcb" ) ), ( None, None ) )
+    self.assertEqual( MaskMatcher.analyse( re.compile( "^a|b" ) ), ( None, None ) )
+
+  def testMatch( self ):
+    """ same results as the linear loop """
+    matcher = MaskMatcher( self.filters )
+    self.assertEqual( len( matcher ), len( MASKS ) )
+    self.assertEqual( matcher.keys(), range( len( MASKS ) ) )
+    for _i in range( 5000 ):
+      lfn = randomLFN( self.rand )
+      self.assertEqual( matcher.match( lfn ), self.linear( lfn ), lfn )
+
+  def testUpdates( self ):
+    """ incremental updates """
+    matcher = MaskMatcher()
+    for transID, mask in enumerate( MASKS ):
+      matcher.addMask( transID, mask )
+    self.assertEqual( matcher.removeMask( 3 ), 1 )
+    self.assertEqual( matcher.removeMask( 3 ), 0 )
+    self.assertEqual( 3 in matcher, False )
+    matcher.setMask( 0, "^/lhcb/data/" )
+    self.assertEqual( matcher.getMasks( 0 )[0].pattern, "^/lhcb/data/" )
+    self.filters = [ ( transID, regex ) for transID, regex in self.filters if transID not in ( 0, 3 ) ]
+    self.filters.append( ( 0, re.compile( "^/lhcb/data/" ) ) )
+    for _i in range( 5000 ):
+      lfn = randomLFN( self.rand )
+      self.assertEqual( matcher.match( lfn ), self.linear( lfn ), lfn )
+
+# # test execution
+if __name__ == "__main__":
+  testLoader = unittest.TestLoader()
+  suite = testLoader.loadTestsFromTestCase( MaskMatcherTests )
+  unittest.TextTestRunner( verbosity = 3 ).run( suite )
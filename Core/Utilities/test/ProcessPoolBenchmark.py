@@ -0,0 +1,66 @@
+########################################################################
+# $HeadURL $
+# File: ProcessPoolBenchmark.py
+########################################################################
+""" :mod: ProcessPoolBenchmark
+    ==========================
+
+    .. module: ProcessPoolBenchmark
+    :synopsis: ProcessPool throughput (tasks per second) across chunk sizes
+
+    Small tasks (a few microseconds of work on a state built by the worker initializer) are
+    queued and their results processed by a pool callback. The default mode, throttled by
+    ProcessPool.queueTask, is run with less tasks.
+
+    usage: python ProcessPoolBenchmark.py [nTasks] [nWorkers] [chunkSize,chunkSize...]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import sys
+import time
+# # SUT
+from DIRAC.Core.Utilities.ProcessPool import ProcessPool, getWorkerState
+
+def initializer():
+  """ worker state: a lookup table standing for a client or a DB connection """
+  return dict( [ ( i, i * i ) for i in range( 1000 ) ] )
+
+def smallTask( i ):
+  """ a few microseconds of work """
+  state = getWorkerState()
+  return sum( [ state[( i + j ) % 1000] for j in range( 10 ) ] )
+
+class Collector( object ):
+  """ pool callback counting results """
+  def __init__( self ):
+    self.results = 0
+  def __call__( self, taskID, taskResult ):
+    self.results += 1
+
+def run( nTasks, nWorkers, chunkSize ):
+  """ queue :nTasks: tasks, wait for their results, return tasks per second """
+  collector = Collector()
+  pool = ProcessPool( nWorkers, nWorkers, 4 * nWorkers, poolCallback = collector,
+                      chunkSize = chunkSize, initializer = initializer )
+  start = time.time()
+  for i in range( nTasks ):
+    pool.createAndQueueTask( smallTask, args = ( i, ), taskID = i, usePoolCallbacks = True )
+  pool.processAllResults( 600 )
+  elapsed = time.time() - start
+  pool.finalize( 10 )
+  assert collector.results == nTasks, ( collector.results, nTasks )
+  return nTasks / elapsed
+
+def benchmark( nTasks = 100000, nWorkers = 4, chunkSizes = ( 1, 10, 100, 1000 ) ):
+  """ print throughput of default and chunked modes """
+  print "%d workers" % nWorkers
+  defaultTasks = 50
+  print "%-12s %8d tasks %10.1f tasks/s" % ( "default", defaultTasks, run( defaultTasks, nWorkers, 0 ) )
+  for chunkSize in chunkSizes:
+    print "%-12s %8d tasks %10.1f tasks/s" % ( "chunk %d" % chunkSize, nTasks, run( nTasks, nWorkers, chunkSize ) )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 100000,
+             int( args[1] ) if len( args ) > 1 else 4,
+             [ int( size ) for size in args[2].split( "," ) ] if len( args ) > 2 else ( 1, 10, 100, 1000 ) )
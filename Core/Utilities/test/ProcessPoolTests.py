@@ -36,7 +36,7 @@ Script.parseCommandLine()
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 ## SUT
-from DIRAC.Core.Utilities.ProcessPool import ProcessPool
+from DIRAC.Core.Utilities.ProcessPool import ProcessPool, getWorkerState
 import threading
 
 def ResultCallback( task, taskResult ):
@@ -75,6 +75,19 @@ class CallableClass( object ):
       raise Exception("testException")
     return self.timeWait
 
+def WorkerInitializer( name ):
+  """ worker state initializer """
+  return { "name" : name, "pid" : os.getpid(), "tasks" : 0 }
+
+def StatefulFunc( taskID, timeWait = 0, raiseException = False ):
+  """ global function using worker state """
+  state = getWorkerState()
+  state["tasks"] += 1
+  time.sleep( timeWait )
+  if raiseException:
+    raise Exception( "testException" )
+  return ( taskID, state["name"], state["pid"], os.getpid(), state["tasks"] )
+
 ## global locked lock 
 gLock = threading.Lock()
 # make sure it is locked
@@ -363,6 +376,79 @@ class TaskTimeOutTests( unittest.TestCase ):
     gLock.release()
 
 
+########################################################################
+class ChunkedProcessPoolTests( unittest.TestCase ):
+  """
+  .. class:: ChunkedProcessPoolTests
+
+  test case for ProcessPool in chunked mode
+  """
+
+  def setUp( self ):
+    """c'tor
+
+    :param self: self reference
+    """
+    self.results = {}
+    self.exceptions = {}
+    self.processPool = ProcessPool( 2, 4, 8,
+                                    poolCallback = self.poolCallback,
+                                    poolExceptionCallback = self.poolExceptionCallback,
+                                    chunkSize = 10,
+                                    initializer = WorkerInitializer,
+                                    initArgs = ( "chunked", ) )
+
+  def tearDown( self ):
+    self.processPool.finalize( 2 )
+
+  def poolCallback( self, taskID, taskResult ):
+    self.results[taskID] = taskResult
+
+  def poolExceptionCallback( self, taskID, taskException ):
+    self.exceptions[taskID] = taskException
+
+  def testResults( self ):
+    """ results and exceptions of all tasks, partial chunk included """
+    for i in range( 95 ):
+      result = self.processPool.createAndQueueTask( StatefulFunc, taskID = i, args = ( i, 0, i == 50 ),
+                                                    usePoolCallbacks = True )
+      self.assertTrue( result["OK"] )
+    self.processPool.processAllResults( 30 )
+    self.assertEqual( self.processPool.getNumTasksInFlight(), 0 )
+    self.assertEqual( sorted( self.results ), [ i for i in range( 95 ) if i != 50 ] )
+    self.assertEqual( [ self.results[i][0] for i in range( 10 ) ], range( 10 ) )
+    self.assertEqual( self.exceptions.keys(), [ 50 ] )
+    self.assertEqual( self.exceptions[50]["Message"], "Exception" )
+    self.assertEqual( self.exceptions[50]["Value"], "testException" )
+
+  def testWorkerState( self ):
+    """ initializer called once per worker, state kept across tasks """
+    for i in range( 200 ):
+      self.processPool.createAndQueueTask( StatefulFunc, taskID = i, args = ( i, ), usePoolCallbacks = True )
+    self.processPool.processAllResults( 30 )
+    self.assertEqual( len( self.results ), 200 )
+    tasksPerWorker = {}
+    for _taskID, name, statePid, pid, tasks in self.results.values():
+      self.assertEqual( name, "chunked" )
+      ## state built in the worker itself
+      self.assertEqual( statePid, pid )
+      tasksPerWorker.setdefault( pid, [] ).append( tasks )
+    for tasks in tasksPerWorker.values():
+      self.assertEqual( sorted( tasks ), range( 1, len( tasks ) + 1 ) )
+
+  def testTimeOut( self ):
+    """ timed out task ends its worker, the rest of its chunk is processed elsewhere """
+    for i in range( 20 ):
+      timeWait = 30 if i == 3 else 0
+      self.processPool.createAndQueueTask( StatefulFunc, taskID = i, args = ( i, timeWait ),
+                                           timeOut = 1, usePoolCallbacks = True )
+    start = time.time()
+    self.processPool.processAllResults( 20 )
+    self.assertTrue( time.time() - start < 10 )
+    self.assertEqual( sorted( self.results ), range( 20 ) )
+    self.assertEqual( self.results[3], { "OK" : False, "Message" : "Timed out" } )
+    self.assertEqual( len( [ result for result in self.results.values() if isinstance( result, tuple ) ] ), 19 )
+
 ## SUT suite execution
 if __name__ == "__main__":
 
@@ -370,6 +456,7 @@ if __name__ == "__main__":
   suitePPCT = testLoader.loadTestsFromTestCase( ProcessPoolCallbacksTests )  
   suiteTCT = testLoader.loadTestsFromTestCase( TaskCallbacksTests )
   suiteTTOT = testLoader.loadTestsFromTestCase( TaskTimeOutTests )
-  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT ] )
+  suiteCPPT = testLoader.loadTestsFromTestCase( ChunkedProcessPoolTests )
+  suite = unittest.TestSuite( [ suitePPCT, suiteTCT, suiteTTOT, suiteCPPT ] )
   unittest.TextTestRunner(verbosity=3).run(suite)
 
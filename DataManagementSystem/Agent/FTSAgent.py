@@ -13,6 +13,8 @@
 
     DIRAC agent propagating scheduled RMS request in FTS
 
+    Active FTSJobs of all the requests are polled first, in bulk (see FTSMonitor).
+
     Request processing phases (each in a separate thread):
 
     1. MONITOR
@@ -56,6 +58,7 @@ from DIRAC.DataManagementSystem.Client.FTSJob import FTSJob
 from DIRAC.DataManagementSystem.Client.DataManager import DataManager
 from DIRAC.DataManagementSystem.private.FTSGraph import FTSGraph
 from DIRAC.DataManagementSystem.private.FTSHistoryView import FTSHistoryView
+from DIRAC.DataManagementSystem.private.FTSMonitor import FTSMonitor
 from DIRAC.DataManagementSystem.Client.FTSFile import FTSFile
 # # from RMS
 from DIRAC.RequestManagementSystem.Client.ReqClient import ReqClient
@@ -100,6 +103,11 @@ class FTSAgent( AgentModule ):
   MAX_ATTEMPT = 256
   # # stage flag
   STAGE_FILES = False
+  # # max FTSJobs per status query
+  MAX_JOBS_PER_STATUS_QUERY = 100
+  # # min and max delays between two polls of an FTSJob
+  MIN_POLLING_INTERVAL = 0
+  MAX_POLLING_INTERVAL = 1800
 
   # # placeholder for FTS client
   __ftsClient = None
@@ -111,6 +119,8 @@ class FTSAgent( AgentModule ):
   __rssClient = None
   # # placeholder for FTSGraph
   __ftsGraph = None
+  # # placeholder for FTSMonitor
+  __ftsMonitor = None
   # # graph regeneration time delta
   __ftsGraphValidStamp = None
   # # r/w access valid stamp
@@ -146,6 +156,14 @@ class FTSAgent( AgentModule ):
 
 
 
+  def ftsMonitor( self ):
+    """ FTSJobs bulk monitor """
+    if not self.__ftsMonitor:
+      self.__ftsMonitor = FTSMonitor( maxJobsPerCall = self.MAX_JOBS_PER_STATUS_QUERY,
+                                      minPollingInterval = self.MIN_POLLING_INTERVAL,
+                                      maxPollingInterval = self.MAX_POLLING_INTERVAL )
+    return self.__ftsMonitor
+
   @classmethod
   def rssClient( cls ):
     """ RSS client getter """
@@ -209,11 +227,7 @@ class FTSAgent( AgentModule ):
   @classmethod
   def putFTSJobs( cls, ftsJobsList ):
     """ put back fts jobs to the FTSDB """
-    for ftsJob in ftsJobsList:
-      put = cls.ftsClient().putFTSJob( ftsJob )
-      if not put["OK"]:
-        return put
-    return S_OK()
+    return cls.ftsClient().putFTSJobList( ftsJobsList )
 
   @staticmethod
   def updateFTSFileDict( ftsFilesDict, toUpdateDict ):
@@ -247,9 +261,11 @@ class FTSAgent( AgentModule ):
       return ftsHistory
     ftsHistory = ftsHistory["Value"]
 
+    # # built with its SEs R/W access outside of the lock, only swapped under it
+    ftsGraph = FTSGraph( "FTSGraph", ftsHistory )
     try:
       self.updateLock().acquire()
-      self.__ftsGraph = FTSGraph( "FTSGraph", ftsHistory )
+      self.__ftsGraph = ftsGraph
     finally:
       self.updateLock().release()
 
@@ -265,13 +281,7 @@ class FTSAgent( AgentModule ):
     # # save graph stamp
     self.__ftsGraphValidStamp = datetime.datetime.now() + datetime.timedelta( seconds = self.FTSGRAPH_REFRESH )
 
-    # # refresh SE R/W access
-    try:
-      self.updateLock().acquire()
-      self.__ftsGraph.updateRWAccess()
-    finally:
-      self.updateLock().release()
-    # # save rw access stamp
+    # # SE R/W access has been read by FTSGraph c'tor, save rw access stamp
     self.__rwAccessValidStamp = datetime.datetime.now() + datetime.timedelta( seconds = self.RW_REFRESH )
 
     return S_OK()
@@ -301,6 +311,12 @@ class FTSAgent( AgentModule ):
     self.MAX_ATTEMPT = self.am_getOption( "MaxTransferAttempts", self.MAX_ATTEMPT )
     log.info( "Max transfer attempts          = %s" % self.MAX_ATTEMPT )
 
+    self.MAX_JOBS_PER_STATUS_QUERY = self.am_getOption( "MaxJobsPerStatusQuery", self.MAX_JOBS_PER_STATUS_QUERY )
+    log.info( "Max FTSJobs/status query       = %s" % self.MAX_JOBS_PER_STATUS_QUERY )
+    self.MIN_POLLING_INTERVAL = self.am_getOption( "MinPollingInterval", self.MIN_POLLING_INTERVAL )
+    self.MAX_POLLING_INTERVAL = self.am_getOption( "MaxPollingInterval", self.MAX_POLLING_INTERVAL )
+    log.info( "FTSJob polling interval        = %s - %s s" % ( self.MIN_POLLING_INTERVAL, self.MAX_POLLING_INTERVAL ) )
+
     # # thread pool
     self.MIN_THREADS = self.am_getOption( "MinThreads", self.MIN_THREADS )
     self.MAX_THREADS = self.am_getOption( "MaxThreads", self.MAX_THREADS )
@@ -388,9 +404,12 @@ class FTSAgent( AgentModule ):
     # # update R/W access in FTSGraph if expired
     if now > self.__rwAccessValidStamp:
       log.info( "updating expired R/W access for SEs..." )
+      ftsGraph = self.__ftsGraph
+      rwAccess = ftsGraph.rwAccessSnapshot()
       try:
         self.updateLock().acquire()
-        self.__ftsGraph.updateRWAccess()
+        if rwAccess["OK"]:
+          ftsGraph.setRWAccess( rwAccess["Value"] )
       finally:
         self.updateLock().release()
         self.__rwAccessValidStamp = now + datetime.timedelta( seconds = self.RW_REFRESH )
@@ -413,16 +432,30 @@ class FTSAgent( AgentModule ):
     log.info( " => from internal cache: %s" % ( len( self.__reqCache ) ) )
     log.info( " =>   new read from RMS: %s" % ( len( requestNames ) - len( self.__reqCache ) ) )
 
+    requests = []
     for requestName in requestNames:
       request = self.getRequest( requestName )
       if not request["OK"]:
         log.error( request["Message"] )
         continue
       request = request["Value"]
+      # # select  FTSJobs, by default all in TRANS_STATES and INIT_STATES
+      ftsJobs = self.ftsClient().getFTSJobsForRequest( request.RequestID )
+      if not ftsJobs["OK"]:
+        log.error( ftsJobs["Message"] )
+        continue
+      ftsJobs = [ftsJob for ftsJob in ftsJobs.get( "Value", [] ) if ftsJob.Status not in FTSJob.FINALSTATES]
+      requests.append( ( request, ftsJobs ) )
+
+    # # poll FTSJobs in bulk
+    polled = self.ftsMonitor().prefetch( [ ftsJob for _request, requestJobs in requests for ftsJob in requestJobs ] )
+    log.info( "%s FTSJobs polled" % len( polled["Value"] ) )
+
+    for request, ftsJobs in requests:
       sTJId = request.RequestName
       while True:
         queue = self.threadPool().generateJobAndQueueIt( self.processRequest,
-                                                         args = ( request, ),
+                                                         args = ( request, ftsJobs ),
                                                          sTJId = sTJId )
         if queue["OK"]:
           log.info( "request '%s' enqueued for execution" % sTJId )
@@ -434,10 +467,11 @@ class FTSAgent( AgentModule ):
     self.threadPool().processAllResults()
     return S_OK()
 
-  def processRequest( self, request ):
+  def processRequest( self, request, ftsJobs = None ):
     """ process one request
 
     :param Request request: ReqDB.Request
+    :param list ftsJobs: its FTSJobs not in a final state, read from FTSDB if not given
     """
     log = self.log.getSubLogger( request.RequestName )
 
@@ -454,12 +488,13 @@ class FTSAgent( AgentModule ):
       return self.putRequest( request )
 
     log.info( 'start processRequest' )
-    # # select  FTSJobs, by default all in TRANS_STATES and INIT_STATES
-    ftsJobs = self.ftsClient().getFTSJobsForRequest( request.RequestID )
-    if not ftsJobs["OK"]:
-      log.error( ftsJobs["Message"] )
-      return ftsJobs
-    ftsJobs = [ftsJob for ftsJob in ftsJobs.get( "Value", [] ) if ftsJob.Status not in FTSJob.FINALSTATES]
+    if ftsJobs is None:
+      # # select  FTSJobs, by default all in TRANS_STATES and INIT_STATES
+      ftsJobs = self.ftsClient().getFTSJobsForRequest( request.RequestID )
+      if not ftsJobs["OK"]:
+        log.error( ftsJobs["Message"] )
+        return ftsJobs
+      ftsJobs = [ftsJob for ftsJob in ftsJobs.get( "Value", [] ) if ftsJob.Status not in FTSJob.FINALSTATES]
 
     # # Use a try: finally: for making sure FTS jobs are put back before returnin
     try:
@@ -755,7 +790,7 @@ class FTSAgent( AgentModule ):
     return S_OK( ftsJobs )
 
   def __monitorJob( self, request, ftsJob ):
-    """ execute FTSJob.monitorFTS2 for a given :ftsJob:
+    """ monitor a given :ftsJob: if polled in this cycle,
         if ftsJob is in a final state, finalize it
 
     :param Request request: ReqDB.Request instance
@@ -767,7 +802,11 @@ class FTSAgent( AgentModule ):
     # # this will be returned
     ftsFilesDict = dict( [ ( k, list() ) for k in ( "toRegister", "toSubmit", "toFail", "toReschedule", "toUpdate" ) ] )
 
-    monitor = ftsJob.monitorFTS2()
+    if not self.ftsMonitor().polled( ftsJob ):
+      log.info( "FTSJob not due for polling" )
+      return S_OK( ftsFilesDict )
+
+    monitor = self.ftsMonitor().monitorJob( ftsJob )
     if not monitor["OK"]:
       gMonitor.addMark( "FTSMonitorFail", 1 )
       log.error( monitor["Message"] )
@@ -810,7 +849,7 @@ class FTSAgent( AgentModule ):
     # # this will be returned
     ftsFilesDict = dict( [ ( k, list() ) for k in ( "toRegister", "toSubmit", "toFail", "toReschedule", "toUpdate" ) ] )
 
-    monitor = ftsJob.monitorFTS2( full = True )
+    monitor = self.ftsMonitor().monitorJob( ftsJob, full = True )
     if not monitor["OK"]:
       log.error( monitor["Message"] )
       return monitor
@@ -7,6 +7,7 @@ __RCSID__ = "$Id$"
 from DIRAC                                                import S_OK, S_ERROR, gLogger, gConfig
 from DIRAC.DataManagementSystem.Client.DataManager       import DataManager
 from DIRAC.Resources.Storage.StorageElement               import StorageElement
+from DIRAC.Resources.Storage.StorageElementPool           import StorageElementPool
 from DIRAC.Resources.Catalog.FileCatalog                  import FileCatalog
 from DIRAC.Resources.Utilities                            import Utils
 from DIRAC.Core.Utilities.List                            import sortList
@@ -54,6 +55,8 @@ class DataIntegrityClient( Client ):
     self.setServer( 'DataManagement/DataIntegrity' )
     self.dm = DataManager()
     self.fc = FileCatalog()
+    # the SEs of the replicas are checked in parallel
+    self.sePool = StorageElementPool()
 
   ##########################################################################
   #
@@ -127,16 +130,17 @@ class DataIntegrityClient( Client ):
       files = len( sePfns[site] )
       gLogger.info( '%s %s' % ( site.ljust( 20 ), str( files ).rjust( 20 ) ) )
 
+    seMetadata = self.sePool.executePerSE( 'getFileMetadata', sePfns )
     for se in sortList( sePfns.keys() ):
       pfns = sePfns[se]
       pfnDict = {}
       for pfn in pfns:
         pfnDict[pfn] = pfnLfns[pfn]
       sizeMismatch = []
-      res = self.__checkPhysicalFileMetadata( pfnDict, se )
+      res = self.__checkPhysicalFileMetadata( pfnDict, se, seMetadata[se] )
       if not res['OK']:
-        gLogger.error( 'Failed to get physical file metadata.', res['Message'] )
-        return res
+        gLogger.error( 'Failed to get physical file metadata.', '%s: %s' % ( se, res['Message'] ) )
+        continue
       for pfn, metadata in res['Value'].items():
         if catalogMetadata.has_key( pfnLfns[pfn] ):
           if ( metadata['Size'] != catalogMetadata[pfnLfns[pfn]]['Size'] ) and ( metadata['Size'] != 0 ):
@@ -145,14 +149,11 @@ class DataIntegrityClient( Client ):
         self.__reportProblematicReplicas( sizeMismatch, se, 'CatalogPFNSizeMismatch' )
     return S_OK()
 
-  def __checkPhysicalFileMetadata( self, pfnLfns, se ):
-    """ Check obtain the physical file metadata and check the files are available
+  def __checkPhysicalFileMetadata( self, pfnLfns, se, res ):
+    """ Check the physical file metadata obtained from the SE and check the files are available
     """
     gLogger.info( 'Checking the integrity of %s physical files at %s' % ( len( pfnLfns ), se ) )
 
-
-    res = StorageElement( se ).getFileMetadata( pfnLfns.keys() )
-
     if not res['OK']:
       gLogger.error( 'Failed to get metadata for pfns.', res['Message'] )
       return res
@@ -26,6 +26,7 @@ from DIRAC.AccountingSystem.Client.Types.DataOperation import DataOperation
 from DIRAC.Core.Utilities.Adler import fileAdler, compareAdler
 from DIRAC.Core.Utilities.File import makeGuid, getSize
 from DIRAC.Core.Utilities.List import randomize
+from DIRAC.Core.Utilities.BoundedTaskPool import BoundedTaskPool, TIMED_OUT
 from DIRAC.Core.Utilities.SiteSEMapping import getSEsForSite, isSameSiteSE, getSEsForCountry
 from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
 from DIRAC.Resources.Storage.StorageElement import StorageElement
@@ -444,6 +445,9 @@ class DataManager( object ):
     self.thirdPartyProtocols = ['SRM2', 'DIP']
     self.resourceStatus = ResourceStatus()
     self.ignoreMissingInFC = Operations().getValue( 'DataManagement/IgnoreMissingInFC', False )
+    # replicas are removed from several SEs at once, each SE with its own timeout
+    self.seTimeout = Operations().getValue( 'DataManagement/SETimeout', 600 )
+    self.sePool = BoundedTaskPool( Operations().getValue( 'DataManagement/MaxSEThreads', 10 ) )
 
   def setAccountingClient( self, client ):
     """ Set Accounting Client instance
@@ -1331,6 +1335,9 @@ class DataManager( object ):
     """ Remove the file (all replicas) from Storage Elements and file catalogue
 
         'lfn' is the file to be removed
+
+        A file with a replica at an SE which did not answer within DataManagement/SETimeout is
+        Failed, its replicas there being kept in the catalogue while their removal may still complete
     """
     if force == None:
       force = self.ignoreMissingInFC
@@ -1396,7 +1403,13 @@ class DataManager( object ):
     return S_OK( resDict )
 
   def __removeFile( self, lfnDict ):
-    """ remove file """
+    """ remove file
+
+        The replicas are removed from all their SEs at once, their catalog entries being
+        removed once the SE answered. The removal at an SE which timed out goes on in the
+        background: the replicas are kept in the catalog and the files are Failed, the
+        removal being retried later.
+    """
     storageElementDict = {}
     # # sorted and reversed
     for lfn, repDict in sorted( lfnDict.items(), reverse = True ):
@@ -1404,9 +1417,18 @@ class DataManager( object ):
         storageElementDict.setdefault( se, [] ).append( ( lfn, pfn ) )
     failed = {}
     successful = {}
+    results = self.sePool.execute( dict( [( storageElementName, ( self.__removeStorageReplicas,
+                                                                  ( storageElementName, fileTuple ) ) )
+                                          for storageElementName, fileTuple in storageElementDict.items()] ),
+                                   timeout = self.seTimeout )
     for storageElementName in sorted( storageElementDict ):
       fileTuple = storageElementDict[storageElementName]
-      res = self.__removeReplica( storageElementName, fileTuple )
+      res = results[storageElementName]
+      if res['OK']:
+        res = self.__removeCatalogReplicas( storageElementName, *res['Value'] )
+      elif res['Message'] == TIMED_OUT:
+        res = S_ERROR( "Removal at %s timed out after %s s, it may still complete: replicas kept in the catalog" % \
+                       ( storageElementName, self.seTimeout ) )
       if not res['OK']:
         errStr = res['Message']
         for lfn, pfn in fileTuple:
@@ -1480,6 +1502,16 @@ class DataManager( object ):
 
   def __removeReplica( self, storageElementName, fileTuple ):
     """ remove replica """
+    res = self.__removeStorageReplicas( storageElementName, fileTuple )
+    if not res['OK']:
+      return res
+    return self.__removeCatalogReplicas( storageElementName, *res['Value'] )
+
+  def __removeStorageReplicas( self, storageElementName, fileTuple ):
+    """ remove the ( lfn, pfn ) replicas of fileTuple from the SE
+
+    :return: S_OK( ( { lfn : catalog pfn }, removed lfns, { lfn : error } ) )
+    """
     lfnDict = {}
     failed = {}
     for lfn, pfn in fileTuple:
@@ -1498,7 +1530,11 @@ class DataManager( object ):
       return S_ERROR( errStr )
     for lfn, error in res['Value']['Failed'].items():
       failed[lfn] = error
-    replicaTuples = [( lfn, lfnDict[lfn], storageElementName ) for lfn in res['Value']['Successful']]
+    return S_OK( ( lfnDict, res['Value']['Successful'].keys(), failed ) )
+
+  def __removeCatalogReplicas( self, storageElementName, lfnDict, removedLFNs, failed ):
+    """ remove the catalog entries of the replicas removed from the SE by __removeStorageReplicas """
+    replicaTuples = [( lfn, lfnDict[lfn], storageElementName ) for lfn in removedLFNs]
     successful = {}
     res = self.__removeCatalogReplica( replicaTuples )
     if not res['OK']:
@@ -139,6 +139,24 @@ class FTSClient( Client ):
       return ftsJobJSON
     return self.ftsManager.putFTSJob( ftsJobJSON['Value'] )
 
+  def putFTSJobList( self, ftsJobList ):
+    """ put FTSJobs into FTSDB in one call
+
+    :param list ftsJobList: list with FTSJob instances
+    """
+    ftsJobJSONList = []
+    for ftsJob in ftsJobList:
+      isValid = self.ftsValidator.validate( ftsJob )
+      if not isValid['OK']:
+        self.log.error( isValid['Message'] )
+        return isValid
+      ftsJobJSON = ftsJob.toJSON()
+      if not ftsJobJSON['OK']:
+        self.log.error( ftsJobJSON['Message'] )
+        return ftsJobJSON
+      ftsJobJSONList.append( ftsJobJSON['Value'] )
+    return self.ftsManager.putFTSJobList( ftsJobJSONList )
+
   def getFTSJob( self, ftsJobID ):
     """ get FTS job, change its status to 'Assigned'
 
@@ -483,6 +483,12 @@ class FTSJob( Record ):
     if returnCode != 0:
       return S_ERROR( errStr )
 
+    return self.parseMonitorOutput( outputStr, full )
+
+  def parseMonitorOutput( self, outputStr, full = False ):
+    """ update job and files from glite-transfer-status --verbose output :outputStr:
+    (with -l for :full:), finalize job if it is in a final state and :full: is set
+    """
     outputStr = outputStr.replace( "'" , "" ).replace( "<", "" ).replace( ">", "" )
 
     # # set FTS job status
@@ -0,0 +1,136 @@
+""" Test cases for the removal of files by the DataManager, the replicas being removed from their
+    SEs in parallel: stub catalog and StorageElements, one of them hanging past the SE timeout
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+import unittest
+
+from DIRAC                                            import S_OK, gLogger
+from DIRAC.Core.Utilities.BoundedTaskPool             import BoundedTaskPool
+from DIRAC.DataManagementSystem.Client                import DataManager as dmModule
+from DIRAC.DataManagementSystem.Client.DataManager    import DataManager
+
+LFNS = [ '/lhcb/data/2012/RAW/file%d.raw' % i for i in range( 3 ) ]
+
+class StubCatalog( object ):
+  """ FileCatalog on a dictionary LFN -> { SE : PFN } """
+  def __init__( self, replicas ):
+    self.replicas = replicas
+
+  def exists( self, lfns ):
+    return S_OK( { 'Successful' : dict( [ ( lfn, lfn in self.replicas ) for lfn in lfns ] ), 'Failed' : {} } )
+
+  def getPathPermissions( self, paths ):
+    return S_OK( { 'Successful' : dict.fromkeys( paths, { 'Write' : True } ), 'Failed' : {} } )
+
+  def getReplicas( self, lfns, allStatus = False ):
+    return S_OK( { 'Successful' : dict( [ ( lfn, dict( self.replicas[lfn] ) ) for lfn in lfns ] ), 'Failed' : {} } )
+
+  def removeReplica( self, replicaDict ):
+    for lfn, replica in replicaDict.items():
+      del self.replicas[lfn][replica['SE']]
+    return S_OK( { 'Successful' : dict.fromkeys( replicaDict, True ), 'Failed' : {} } )
+
+  def removeFile( self, lfns ):
+    failed = dict( [ ( lfn, 'Replicas left' ) for lfn in lfns if self.replicas[lfn] ] )
+    for lfn in lfns:
+      if lfn not in failed:
+        del self.replicas[lfn]
+    return S_OK( { 'Successful' : dict.fromkeys( [ lfn for lfn in lfns if lfn not in failed ], True ),
+                   'Failed' : failed } )
+
+class StubStorageElement( object ):
+  """ StorageElement whose removals are recorded, those at the SEs of hanging waiting for release """
+  removed = []
+  hanging = []
+  release = threading.Event()
+
+  def __init__( self, name ):
+    self.name = name
+
+  def getPfnForLfn( self, lfn ):
+    return S_OK( { 'Successful' : { lfn : 'srm://%s%s' % ( self.name, lfn ) }, 'Failed' : {} } )
+
+  def isValid( self ):
+    return S_OK()
+
+  def removeFile( self, pfns ):
+    if self.name in self.hanging:
+      self.release.wait()
+    self.removed.extend( pfns )
+    return S_OK( { 'Successful' : dict.fromkeys( pfns, True ), 'Failed' : {} } )
+
+  def getPfnForProtocol( self, pfn, protocol = None, withPort = True ):
+    return S_OK( { 'Successful' : { pfn : pfn }, 'Failed' : {} } )
+
+  def getFileSize( self, pfns ):
+    return S_OK( { 'Successful' : dict.fromkeys( pfns, 1 ), 'Failed' : {} } )
+
+class StubDataStoreClient( object ):
+  def addRegister( self, register ):
+    return S_OK()
+
+  def commit( self ):
+    return S_OK()
+
+class ParallelRemoval( unittest.TestCase ):
+  """ DataManager.removeFile """
+
+  def setUp( self ):
+    self.seClass = dmModule.StorageElement
+    self.dataStoreClient = dmModule.gDataStoreClient
+    dmModule.StorageElement = StubStorageElement
+    dmModule.gDataStoreClient = StubDataStoreClient()
+    StubStorageElement.removed = []
+    StubStorageElement.hanging = []
+    StubStorageElement.release.clear()
+    self.catalog = StubCatalog( dict( [ ( lfn, { 'CERN-RAW' : lfn, 'CNAF-RAW' : lfn, 'PIC-RAW' : lfn } )
+                                        for lfn in LFNS ] ) )
+    self.dm = DataManager.__new__( DataManager )
+    self.dm.log = gLogger.getSubLogger( 'DataManager' )
+    self.dm.fc = self.catalog
+    self.dm.registrationProtocol = ['SRM2', 'DIP']
+    self.dm.ignoreMissingInFC = False
+    self.dm.seTimeout = 0.5
+    self.dm.sePool = BoundedTaskPool( 3 )
+
+  def tearDown( self ):
+    StubStorageElement.release.set()
+    dmModule.StorageElement = self.seClass
+    dmModule.gDataStoreClient = self.dataStoreClient
+
+  def test_removal( self ):
+    result = self.dm.removeFile( LFNS )
+    self.assert_( result['OK'], result )
+    self.assertEqual( sorted( result['Value']['Successful'] ), LFNS )
+    self.assertEqual( result['Value']['Failed'], {} )
+    self.assertEqual( len( StubStorageElement.removed ), 9 )
+    self.assertEqual( self.catalog.replicas, {} )
+
+  def test_timedOutSE( self ):
+    """ the replicas at the SE which timed out are kept in the catalog, the others are removed """
+    StubStorageElement.hanging = [ 'CNAF-RAW' ]
+    result = self.dm.removeFile( LFNS )
+    self.assert_( result['OK'], result )
+    self.assertEqual( result['Value']['Successful'], {} )
+    self.assertEqual( sorted( result['Value']['Failed'] ), LFNS )
+    for error in result['Value']['Failed'].values():
+      self.assert_( 'Removal at CNAF-RAW timed out after 0.5 s, it may still complete' in error, error )
+    self.assertEqual( self.catalog.replicas, dict( [ ( lfn, { 'CNAF-RAW' : lfn } ) for lfn in LFNS ] ) )
+    self.assertEqual( self.dm.sePool.busyKeys(), set( [ 'CNAF-RAW' ] ) )
+    # the removal goes on at the SE once it answers, the catalog is left alone
+    StubStorageElement.release.set()
+    for _i in range( 50 ):
+      if not self.dm.sePool.busyKeys():
+        break
+      time.sleep( 0.1 )
+    self.assertEqual( self.dm.sePool.busyKeys(), set() )
+    self.assertEqual( len( StubStorageElement.removed ), 9 )
+    self.assertEqual( self.catalog.replicas, dict( [ ( lfn, { 'CNAF-RAW' : lfn } ) for lfn in LFNS ] ) )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ParallelRemoval )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
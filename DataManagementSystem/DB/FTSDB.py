@@ -22,6 +22,7 @@
 # # imports
 from MySQLdb import cursors
 import decimal
+import time
 from MySQLdb import Error as MySQLdbError
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gLogger
@@ -32,6 +33,7 @@ from DIRAC.Core.Utilities.List import stringListToString, intListToString
 from DIRAC.DataManagementSystem.Client.FTSJob import FTSJob
 from DIRAC.DataManagementSystem.Client.FTSFile import FTSFile
 from DIRAC.DataManagementSystem.private.FTSHistoryView import FTSHistoryView
+from DIRAC.DataManagementSystem.private.FTSChannelHistory import FTSChannelHistory
 
 ########################################################################
 class FTSDB( DB ):
@@ -39,6 +41,11 @@ class FTSDB( DB ):
   .. class:: FTSDB
 
   database holding FTS jobs and their files
+
+  FTS history is served by a FTSChannelHistory fed by putFTSJob, setFTSJobStatus and
+  deleteFTSJob, reloaded from the FTSJob table every :historyReload: seconds (catching up
+  with FTSJobs put through other FTSDB instances), FTSHistoryView being read
+  only when this fails
   """
 
   def __init__( self, systemInstance = "Default", maxQueueSize = 10 ):
@@ -54,6 +61,10 @@ class FTSDB( DB ):
     self.getIdLock = LockRing().getLock( "FTSDBLock" )
     # # max attempt for reschedule
     self.maxAttempt = 100
+    # # sliding window FTS history
+    self.channelHistory = FTSChannelHistory()
+    self.historyReload = FTSHistoryView.INTERVAL
+    self.__historyLoadTime = 0
     # # check tables
 
   def createTables( self, toCreate = None, force = False ):
@@ -259,20 +270,42 @@ class FTSDB( DB ):
 
     :param FTSJob ftsJob: FTSJob instance
     """
-    ftsJobSQL = ftsJob.toSQL()
-    if not ftsJobSQL['OK']:
-      return ftsJobSQL
-    putJob = [ ftsJobSQL['Value'] ]
+    return self.putFTSJobList( [ ftsJob ] )
 
-    for ftsFile in [ ftsFile.toSQL() for ftsFile in ftsJob ]:
-      if not ftsFile['OK']:
-        return ftsFile
-      putJob.append( ftsFile['Value'] )
+  def putFTSJobList( self, ftsJobList ):
+    """ put FTSJobs to the db (INSERT or UPDATE) in one transaction
 
-    putJob = self._transaction( putJob )
-    if not putJob['OK']:
-      self.log.error( putJob['Message'] )
-    return putJob
+    :param list ftsJobList: list with FTSJob instances
+    """
+    putJobs = []
+    selectJobs = []
+    for i, ftsJob in enumerate( ftsJobList ):
+      ftsJobSQL = ftsJob.toSQL()
+      if not ftsJobSQL['OK']:
+        return ftsJobSQL
+      putJobs.append( ftsJobSQL['Value'] )
+      # # FTSJob row as written, for the FTS history (numbered, the results being keyed by query)
+      selectJob = "SELECT %s, %d AS `PutOrder` FROM `FTSJob` WHERE `FTSJobID` = %s;" % \
+                  ( ",".join( [ "`%s`" % column for column in FTSChannelHistory.COLUMNS ] ), i,
+                    ftsJob.FTSJobID if ftsJob.FTSJobID else "LAST_INSERT_ID()" )
+      putJobs.append( selectJob )
+      selectJobs.append( selectJob )
+
+      for ftsFile in [ ftsFile.toSQL() for ftsFile in ftsJob ]:
+        if not ftsFile['OK']:
+          return ftsFile
+        putJobs.append( ftsFile['Value'] )
+
+    if not putJobs:
+      return S_OK()
+    putJobs = self._transaction( putJobs )
+    if not putJobs['OK']:
+      self.log.error( putJobs['Message'] )
+      return putJobs
+    for selectJob in selectJobs:
+      for row in putJobs['Value'].get( selectJob, [] ):
+        self.channelHistory.putJob( row )
+    return putJobs
 
   def getFTSJob( self, ftsJobID = None ):
     """ get FTSJob given FTSJobID """
@@ -304,6 +337,7 @@ class FTSDB( DB ):
     if not setAssigned['OK']:
       self.log.error( setAssigned['Message'] )
       return setAssigned
+    self.channelHistory.setJobStatus( ftsJobID, status )
     return setAssigned
 
   def deleteFTSJob( self, ftsJobID ):
@@ -312,6 +346,8 @@ class FTSDB( DB ):
     delete = self._transaction( [ delete ] )
     if not delete['OK']:
       self.log.error( delete['Message'] )
+      return delete
+    self.channelHistory.deleteJob( ftsJobID )
     return delete
 
   def getFTSJobIDs( self, statusList = [ "Submitted", "Active", "Ready" ] ):
@@ -401,7 +437,27 @@ class FTSDB( DB ):
       return trn
     return S_OK( [ FTSFile( fileDict ) for fileDict in trn['Value'][query] ] )
 
+  def loadChannelHistory( self ):
+    """ (re)load FTS history from FTSJobs updated over the last FTSHistoryView.INTERVAL """
+    query = "SELECT %s FROM `FTSJob` WHERE `LastUpdate` > ( UTC_TIMESTAMP() - INTERVAL %s SECOND );" % \
+            ( ",".join( [ "`%s`" % column for column in FTSChannelHistory.COLUMNS ] ), self.channelHistory.interval )
+    loadTime = time.time()
+    query = self._transaction( [ query ] )
+    if not query['OK']:
+      self.log.error( "loadChannelHistory: %s" % query['Message'] )
+      return query
+    self.channelHistory.load( query['Value'].values()[0] if query['Value'] else [] )
+    self.__historyLoadTime = loadTime
+    return S_OK()
+
   def getFTSHistory( self ):
+    """ FTS history as list of FTSHistoryViews """
+    if time.time() - self.__historyLoadTime > self.historyReload:
+      if not self.loadChannelHistory()['OK']:
+        return self.getFTSHistoryView()
+    return S_OK( self.channelHistory.getHistory() )
+
+  def getFTSHistoryView( self ):
     """ query FTSHistoryView, return list of FTSHistoryViews """
     query = self._transaction( [ "SELECT * FROM `FTSHistoryView`;" ] )
     if not query['OK']:
@@ -255,6 +255,36 @@ class FTSManagerHandler( RequestHandler ):
       gLogger.exception( error )
       return S_ERROR( error )
 
+  types_putFTSJobList = [ ListType ]
+  @classmethod
+  def export_putFTSJobList( self, ftsJobJSONList ):
+    """ put FTSJobs (serialized in JSON) into FTSDB in one go """
+
+    ftsJobs = []
+    for ftsJobJSON in ftsJobJSONList:
+      ftsFiles = ftsJobJSON.pop( "FTSFiles", [] )
+      try:
+        ftsJob = FTSJob( ftsJobJSON )
+        for ftsFile in ftsFiles:
+          ftsJob.addFile( FTSFile( ftsFile ) )
+      except Exception, error:
+        gLogger.exception( error )
+        return S_ERROR( error )
+
+      isValid = self.ftsValidator.validate( ftsJob )
+      if not isValid['OK']:
+        gLogger.error( isValid['Message'] )
+        return isValid
+      ftsJobs.append( ftsJob )
+    try:
+      put = self.ftsDB.putFTSJobList( ftsJobs )
+      if not put['OK']:
+        return S_ERROR( put['Message'] )
+      return S_OK()
+    except Exception, error:
+      gLogger.exception( error )
+      return S_ERROR( error )
+
   types_getFTSJob = [ [IntType, LongType] ]
   @classmethod
   def export_getFTSJob( self, ftsJobID ):
@@ -0,0 +1,168 @@
+########################################################################
+# $HeadURL $
+# File: FTSChannelHistory.py
+########################################################################
+""" :mod: FTSChannelHistory
+    =======================
+
+    .. module: FTSChannelHistory
+    :synopsis: sliding window FTS channel statistics
+
+    FTSJobs figures over the last FTSHistoryView.INTERVAL seconds, kept up to date
+    as FTSJobs are put, change status or are deleted instead of being aggregated
+    from the FTSJob table by FTSHistoryView.
+
+    Each FTSJob counts once, for its (SourceSE, TargetSE, Status), in the time bucket
+    of its LastUpdate. Bucket sums enter the running totals when FTSJobs are put and
+    leave them when the bucket gets out of the window, so that getHistory is linear
+    in the number of channels. The window starts at bucket boundaries: with 1 second
+    buckets it is the one of FTSHistoryView, with wider ones it can be up to a
+    bucket width longer.
+"""
+__RCSID__ = "$Id $"
+
+# # imports
+import calendar
+import datetime
+import threading
+# # from DMS
+from DIRAC.DataManagementSystem.private.FTSHistoryView import FTSHistoryView
+
+########################################################################
+class FTSChannelHistory( object ):
+  """
+  .. class:: FTSChannelHistory
+
+  rolling counters of FTSJobs, files, bytes and failures per channel and status
+  """
+  # # FTSJob columns used
+  COLUMNS = ( "FTSJobID", "SourceSE", "TargetSE", "Status", "FTSServer", "Files", "Size",
+              "FailedFiles", "FailedSize", "Completeness", "LastUpdate" )
+
+  def __init__( self, interval = FTSHistoryView.INTERVAL, bucketWidth = 60 ):
+    """ c'tor
+
+    :param int interval: window length in seconds
+    :param int bucketWidth: bucket width in seconds
+    """
+    self.interval = interval
+    self.bucketWidth = bucketWidth
+    self.__lock = threading.RLock()
+    self.clear()
+
+  def clear( self ):
+    """ forget everything """
+    with self.__lock:
+      # # ftsJobID -> ( bucket, ( sourceSE, targetSE, status ), counters )
+      self.__jobs = {}
+      # # bucket -> { key : sums }
+      self.__buckets = {}
+      # # bucket -> set of ftsJobIDs
+      self.__bucketJobs = {}
+      # # key -> sums over the window
+      self.__totals = {}
+      # # key -> FTSServer
+      self.__servers = {}
+
+  @staticmethod
+  def toSeconds( lastUpdate ):
+    """ UTC datetime :lastUpdate: to seconds since epoch """
+    return calendar.timegm( lastUpdate.timetuple() )
+
+  def __bucket( self, seconds ):
+    """ bucket holding (seconds-bucketWidth, seconds] """
+    return ( seconds - 1 ) // self.bucketWidth
+
+  def load( self, rows ):
+    """ replace content with FTSJob :rows:, dicts with COLUMNS keys """
+    with self.__lock:
+      self.clear()
+      for row in rows:
+        self.putJob( row )
+
+  def putJob( self, row ):
+    """ put FTSJob :row: (dict with COLUMNS keys), replacing its former values """
+    with self.__lock:
+      ftsJobID = row["FTSJobID"]
+      self.__remove( ftsJobID )
+      key = ( row["SourceSE"], row["TargetSE"], row["Status"] )
+      counters = ( 1, row["Files"] or 0, row["Size"] or 0, row["FailedFiles"] or 0,
+                   row["FailedSize"] or 0, row["Completeness"] or 0.0 )
+      bucket = self.__bucket( self.toSeconds( row["LastUpdate"] ) )
+      self.__add( ftsJobID, bucket, key, counters )
+      if row["FTSServer"]:
+        self.__servers[key] = row["FTSServer"]
+
+  def setJobStatus( self, ftsJobID, status ):
+    """ :status: for FTSJob :ftsJobID:, its LastUpdate unchanged """
+    with self.__lock:
+      if ftsJobID not in self.__jobs:
+        return
+      bucket, key, counters = self.__jobs[ftsJobID]
+      if key[2] == status:
+        return
+      self.__remove( ftsJobID )
+      newKey = ( key[0], key[1], status )
+      self.__add( ftsJobID, bucket, newKey, counters )
+      if key in self.__servers and newKey not in self.__servers:
+        self.__servers[newKey] = self.__servers[key]
+
+  def deleteJob( self, ftsJobID ):
+    """ forget FTSJob :ftsJobID: """
+    with self.__lock:
+      self.__remove( ftsJobID )
+
+  def __add( self, ftsJobID, bucket, key, counters ):
+    """ add :counters: of :ftsJobID: to :bucket: and totals """
+    self.__jobs[ftsJobID] = ( bucket, key, counters )
+    self.__bucketJobs.setdefault( bucket, set() ).add( ftsJobID )
+    for sums in ( self.__buckets.setdefault( bucket, {} ).setdefault( key, [ 0, 0, 0, 0, 0, 0.0 ] ),
+                  self.__totals.setdefault( key, [ 0, 0, 0, 0, 0, 0.0 ] ) ):
+      for i, counter in enumerate( counters ):
+        sums[i] += counter
+
+  def __remove( self, ftsJobID ):
+    """ remove counters of :ftsJobID: from its bucket and totals """
+    if ftsJobID not in self.__jobs:
+      return
+    bucket, key, counters = self.__jobs.pop( ftsJobID )
+    self.__bucketJobs[bucket].discard( ftsJobID )
+    for sumsDict in ( self.__buckets[bucket], self.__totals ):
+      sums = sumsDict[key]
+      for i, counter in enumerate( counters ):
+        sums[i] -= counter
+      if not sums[0]:
+        del sumsDict[key]
+
+  def __expire( self, now ):
+    """ drop buckets out of the window ending at :now: seconds """
+    firstBucket = ( now - self.interval ) // self.bucketWidth
+    for bucket in sorted( self.__buckets ):
+      if bucket >= firstBucket:
+        break
+      for key, sums in self.__buckets.pop( bucket ).items():
+        totals = self.__totals[key]
+        for i, counter in enumerate( sums ):
+          totals[i] -= counter
+        if not totals[0]:
+          del self.__totals[key]
+      for ftsJobID in self.__bucketJobs.pop( bucket ):
+        del self.__jobs[ftsJobID]
+
+  def getHistory( self, now = None ):
+    """ FTSHistoryViews for FTSJobs updated in the window ending at :now: (UTC datetime, default utcnow)
+
+    :return: list of FTSHistoryView instances, as read from FTSHistoryView
+    """
+    now = now if now else datetime.datetime.utcnow()
+    with self.__lock:
+      self.__expire( self.toSeconds( now ) )
+      history = []
+      for key, sums in self.__totals.items():
+        nJobs, files, size, failedFiles, failedSize, completeness = sums
+        history.append( FTSHistoryView( { "SourceSE": key[0], "TargetSE": key[1], "Status": key[2],
+                                          "FTSServer": self.__servers.get( key ), "FTSJobs": nJobs,
+                                          "Files": files, "Size": size,
+                                          "FailedFiles": failedFiles, "FailedSize": failedSize,
+                                          "Completeness": completeness / nJobs } ) )
+      return history
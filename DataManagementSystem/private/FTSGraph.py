@@ -88,6 +88,12 @@ class FTSGraph( Graph ):
   .. class:: FTSGraph
 
   graph holding FTS transfers (edges) and sites (nodes)
+
+  SE lookups go through two indexes built from the sites SEs on first use and dropped
+  each time a site or a route is added: SE -> sites (in nodes order) and
+  ( sourceSE, targetSE ) -> route, the latter filled as routes are looked up,
+  giving the same answers as scanning nodes and edges; updateRWAccess and setRWAccess
+  keep sites SEs, anything changing them by other means should call resetIndexes
   """
   # # rss client
   __rssClient = None
@@ -108,6 +114,9 @@ class FTSGraph( Graph ):
     :param int accFailedFiles: acceptable failed files
     :param str schedulingType: scheduling type
     """
+    self.__seSites = None
+    self.__siteRoutes = None
+    self.__routes = None
     Graph.__init__( self, name )
     self.log = gLogger.getSubLogger( name, True )
     self.accFailureRate = accFailureRate
@@ -219,46 +228,121 @@ class FTSGraph( Graph ):
   #  return self.__resources
 
   def updateRWAccess( self ):
-    """ get RSS R/W for :seList:
+    """ get RSS R/W access of all the sites SEs and set it """
+    rwAccess = self.rwAccessSnapshot()
+    if not rwAccess["OK"]:
+      return rwAccess
+    return self.setRWAccess( rwAccess["Value"] )
+
+  def rwAccessSnapshot( self ):
+    """ RSS R/W access of all the sites SEs, without changing the graph
+
+    one RSS call per access type for all the SEs, one per SE if it fails (e.g. an SE not known
+    to RSS), the new SEs dicts being built for setRWAccess to only swap them
 
-    :param list seList: SE list
+    :return: S_OK( [ ( site, { se : { "read" : bool, "write" : bool } } ) ] )
     """
-    self.log.debug( "updateRWAccess: updating RW access..." )
-    for site in self.nodes():
-      seList = site.SEs.keys()
-      rwDict = dict.fromkeys( seList )
-      for se in rwDict:
-        rwDict[se] = { "read": False, "write": False  }
-      for se in seList:
-        rAccess = self.rssClient().getStorageElementStatus( se, "ReadAccess" )
-        self.log.debug( "se read %s %s" % ( se, rAccess ) )
-        if not rAccess["OK"]:
-          self.log.error( rAccess["Message"] )
-          continue
-        rwDict[se]["read"] = True if rAccess["Value"][se]["ReadAccess"] in ( "Active", "Degraded" ) else False
-        wAccess = self.rssClient().getStorageElementStatus( se, "WriteAccess" )
-        self.log.debug( "se write %s %s" % ( se, wAccess ) )
-        if not wAccess["OK"]:
-          self.log.error( wAccess["Message"] )
-          continue
-        rwDict[se]["write"] = True if wAccess["Value"][se]["WriteAccess"] in ( "Active", "Degraded" ) else False
+    self.log.debug( "rwAccessSnapshot: reading RW access..." )
+    sites = list( self.nodes() )
+    seList = sorted( set( [ se for site in sites for se in site.SEs ] ) )
+    access = {}
+    for accessType in ( "ReadAccess", "WriteAccess" ):
+      access[accessType] = self.__getAccess( seList, accessType )
+    sitesRWAccess = []
+    for site in sites:
+      rwDict = {}
+      for se in site.SEs:
+        # # as when SEs were read one by one, write access is not set if read access is unknown
+        read = access["ReadAccess"].get( se )
+        write = access["WriteAccess"].get( se ) if read is not None else None
+        rwDict[se] = { "read": bool( read ), "write": bool( write ) }
         self.log.debug( "Site '%s' SE '%s' read %s write %s " % ( site.name, se,
                                                                   rwDict[se]["read"], rwDict[se]["write"] ) )
+      sitesRWAccess.append( ( site, rwDict ) )
+    return S_OK( sitesRWAccess )
+
+  def __getAccess( self, seList, accessType ):
+    """ { se : True if :accessType: is Active or Degraded } for SEs of :seList: known to RSS """
+    access = {}
+    if not seList:
+      return access
+    seStatus = self.rssClient().getStorageElementStatus( seList, accessType )
+    if seStatus["OK"]:
+      seStatus = [ seStatus ]
+    else:
+      self.log.warn( "%s of %s SEs: %s, reading them one by one" % ( accessType, len( seList ),
+                                                                    seStatus["Message"] ) )
+      seStatus = [ self.rssClient().getStorageElementStatus( se, accessType ) for se in seList ]
+    for status in seStatus:
+      if not status["OK"]:
+        self.log.error( status["Message"] )
+        continue
+      for se, statusDict in status["Value"].items():
+        if accessType in statusDict:
+          access[se] = statusDict[accessType] in ( "Active", "Degraded" )
+    return access
+
+  def setRWAccess( self, sitesRWAccess ):
+    """ set sites SEs R/W access read by rwAccessSnapshot, sites SEs dicts are swapped
+
+    :param list sitesRWAccess: [ ( site, SEs dict ) ]
+    """
+    for site, rwDict in sitesRWAccess:
       site.SEs = rwDict
     return S_OK()
 
+  def addNode( self, node ):
+    """ add site :node:, dropping SE indexes """
+    Graph.addNode( self, node )
+    self.resetIndexes()
+
+  def addEdge( self, edge ):
+    """ add route :edge:, dropping SE indexes """
+    Graph.addEdge( self, edge )
+    self.resetIndexes()
+
+  def resetIndexes( self ):
+    """ drop SE -> sites and SEs -> route indexes, rebuilt on next lookup """
+    self.__seSites = None
+    self.__siteRoutes = None
+    self.__routes = None
+
+  def __buildIndexes( self ):
+    """ build SE -> sites and ( fromSite, toSite ) -> ( position, route ) indexes """
+    seSites = {}
+    for site in self.nodes():
+      for se in site.SEs:
+        seSites.setdefault( se, [] ).append( site )
+    siteRoutes = {}
+    for position, route in enumerate( self.edges() ):
+      siteRoutes.setdefault( ( route.fromNode, route.toNode ), ( position, route ) )
+    self.__seSites = seSites
+    self.__siteRoutes = siteRoutes
+    self.__routes = {}
+
   def findSiteForSE( self, se ):
     """ return FTSSite for a given SE """
-    for node in self.nodes():
-      if se in node:
-        return S_OK( node )
+    if self.__seSites is None:
+      self.__buildIndexes()
+    if se in self.__seSites:
+      return S_OK( self.__seSites[se][0] )
     return S_ERROR( "StorageElement %s not found" % se )
 
   def findRoute( self, fromSE, toSE ):
     """ find route between :fromSE: and :toSE: """
-    for edge in self.edges():
-      if fromSE in edge.fromNode.SEs and toSE in edge.toNode.SEs:
-        return S_OK( edge )
+    if self.__routes is None:
+      self.__buildIndexes()
+    key = ( fromSE, toSE )
+    if key not in self.__routes:
+      # # first route in edges order, an SE could be at several sites
+      candidates = [ self.__siteRoutes[( fromSite, toSite )]
+                     for fromSite in self.__seSites.get( fromSE, [] )
+                     for toSite in self.__seSites.get( toSE, [] )
+                     if ( fromSite, toSite ) in self.__siteRoutes ]
+      self.__routes[key] = min( candidates )[1] if candidates else None
+    route = self.__routes[key]
+    if route is not None:
+      return S_OK( route )
     return S_ERROR( "FTSGraph: unable to find route between '%s' and '%s'" % ( fromSE, toSE ) )
 
   def ftsSites( self ):
@@ -76,7 +76,7 @@ class FTSHistoryView( object ):
 
   def __setattr__( self, name, value ):
     """ bweare of tpyos!!! """
-    if not name.startswith( "_" ) and name not in dir( self ):
+    if not name.startswith( "_" ) and not hasattr( self.__class__, name ):
       raise AttributeError( "'%s' has no attribute '%s'" % ( self.__class__.__name__, name ) )
     try:
       object.__setattr__( self, name, value )
@@ -0,0 +1,219 @@
+########################################################################
+# $HeadURL $
+# File: FTSMonitor.py
+########################################################################
+""" :mod: FTSMonitor
+    ================
+
+    .. module: FTSMonitor
+    :synopsis: bulk FTSJob status polling grouped by FTS server
+
+    FTSMonitor polls FTSJobs in bulk once per FTSAgent cycle (prefetch), one
+    transport call per FTS server and per maxJobsPerCall FTSJobs, then serves
+    the outputs to FTSJob.parseMonitorOutput (monitorJob). FTSJobs reaching
+    a final state are polled again, in bulk as well, for their files.
+
+    Polling is adaptive: an FTSJob is polled again after a delay growing with
+    its age (ageFactor times the time since its submission, between min and
+    max polling intervals), FTSJobs nearly complete being polled every
+    minPollingInterval.
+
+    Transports query one FTS server about many FTSJobs, GliteTransferStatus
+    running glite-transfer-status.
+"""
+__RCSID__ = "$Id $"
+
+# # imports
+import calendar
+import datetime
+import re
+# # from DIRAC
+from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.Grid import executeGridCommand
+# # from DMS
+from DIRAC.DataManagementSystem.Client.FTSJob import FTSJob
+
+########################################################################
+class FTSTransport( object ):
+  """
+  .. class:: FTSTransport
+
+  query FTS server about FTSJobs
+  """
+  def getStatus( self, ftsServer, ftsGUIDs, full = False ):
+    """ glite-transfer-status --verbose like output (-l for :full:) for :ftsGUIDs: at :ftsServer:
+
+    :return: S_OK( { ftsGUID : S_OK( outputStr ) or S_ERROR } ) or S_ERROR
+    """
+    raise NotImplementedError( "getStatus has to be implemented in FTSTransport subclasses" )
+
+########################################################################
+class GliteTransferStatus( FTSTransport ):
+  """
+  .. class:: GliteTransferStatus
+
+  one glite-transfer-status call for many FTSJobs, their outputs starting with
+  'Request ID:', FTSJobs missing from the output (or all of them if the call
+  failed) are queried one by one
+  """
+  # # FTS job output start
+  requestID = re.compile( r"^\s*Request ID:\s+(\S+)", re.M )
+
+  def __init__( self ):
+    """ c'tor """
+    self.log = gLogger.getSubLogger( "GliteTransferStatus" )
+
+  @staticmethod
+  def command( ftsServer, ftsGUIDs, full ):
+    """ glite-transfer-status command """
+    return [ "glite-transfer-status", "--verbose", "-s", ftsServer ] + list( ftsGUIDs ) + ( [ "-l" ] if full else [] )
+
+  def split( self, outputStr ):
+    """ { ftsGUID : output } for glite-transfer-status output of many FTSJobs """
+    starts = [ ( match.start(), match.group( 1 ) ) for match in self.requestID.finditer( outputStr ) ]
+    ends = [ start for start, _ftsGUID in starts[1:] ] + [ len( outputStr ) ]
+    return dict( [ ( ftsGUID, outputStr[start:end] ) for ( start, ftsGUID ), end in zip( starts, ends ) ] )
+
+  def __execute( self, ftsServer, ftsGUIDs, full ):
+    """ run glite-transfer-status, S_OK( outputStr ) or S_ERROR """
+    monitor = executeGridCommand( "", self.command( ftsServer, ftsGUIDs, full ) )
+    if not monitor["OK"]:
+      return monitor
+    returnCode, outputStr, errStr = monitor["Value"]
+    if returnCode != 0:
+      return S_ERROR( errStr )
+    return S_OK( outputStr )
+
+  def getStatus( self, ftsServer, ftsGUIDs, full = False ):
+    """ statuses of :ftsGUIDs: at :ftsServer: """
+    statuses = {}
+    if len( ftsGUIDs ) > 1:
+      monitor = self.__execute( ftsServer, ftsGUIDs, full )
+      if monitor["OK"]:
+        statuses = dict( [ ( ftsGUID, S_OK( outputStr ) )
+                           for ftsGUID, outputStr in self.split( monitor["Value"] ).items() if ftsGUID in ftsGUIDs ] )
+      else:
+        self.log.warn( "bulk status query failed, querying FTSJobs one by one: %s" % monitor["Message"] )
+    for ftsGUID in ftsGUIDs:
+      if ftsGUID not in statuses:
+        statuses[ftsGUID] = self.__execute( ftsServer, [ ftsGUID ], full )
+    return S_OK( statuses )
+
+########################################################################
+class FTSMonitor( object ):
+  """
+  .. class:: FTSMonitor
+
+  bulk and adaptive FTSJobs polling
+  """
+  def __init__( self, transport = None, maxJobsPerCall = 100,
+                minPollingInterval = 0, maxPollingInterval = 1800, ageFactor = 0.1, nearlyComplete = 80 ):
+    """ c'tor
+
+    :param FTSTransport transport: transport, GliteTransferStatus by default
+    :param int maxJobsPerCall: max FTSJobs in one transport call
+    :param int minPollingInterval: min delay in seconds between two polls of an FTSJob
+    :param int maxPollingInterval: max delay in seconds between two polls of an FTSJob
+    :param float ageFactor: delay between polls as a fraction of FTSJob age
+    :param int nearlyComplete: completeness from which FTSJobs are polled every minPollingInterval
+    """
+    self.log = gLogger.getSubLogger( "FTSMonitor" )
+    self.transport = transport if transport else GliteTransferStatus()
+    self.maxJobsPerCall = maxJobsPerCall
+    self.minPollingInterval = minPollingInterval
+    self.maxPollingInterval = maxPollingInterval
+    self.ageFactor = ageFactor
+    self.nearlyComplete = nearlyComplete
+    # # FTSGUID -> next poll time
+    self.__nextPoll = {}
+    # # ( FTSGUID, full ) -> transport output
+    self.__outputs = {}
+    # # FTSGUIDs polled in this cycle
+    self.__polled = set()
+
+  @staticmethod
+  def toSeconds( dateTime ):
+    """ UTC datetime to seconds since epoch """
+    return calendar.timegm( dateTime.timetuple() )
+
+  def pollingInterval( self, ftsJob, now ):
+    """ delay before next poll of :ftsJob: """
+    if ftsJob.Completeness >= self.nearlyComplete:
+      return self.minPollingInterval
+    age = max( 0, now - self.toSeconds( ftsJob.SubmitTime ) )
+    return min( self.maxPollingInterval, max( self.minPollingInterval, age * self.ageFactor ) )
+
+  def isDue( self, ftsJob, now ):
+    """ is it time to poll :ftsJob:? """
+    return now >= self.__nextPoll.get( ftsJob.FTSGUID, 0 )
+
+  def polled( self, ftsJob ):
+    """ has :ftsJob: been polled by last prefetch? """
+    return ftsJob.FTSGUID in self.__polled
+
+  def __query( self, ftsJobs, full ):
+    """ get transport outputs for :ftsJobs: """
+    byServer = {}
+    for ftsJob in ftsJobs:
+      byServer.setdefault( ftsJob.FTSServer, [] ).append( ftsJob.FTSGUID )
+    for ftsServer, ftsGUIDs in byServer.items():
+      for i in range( 0, len( ftsGUIDs ), self.maxJobsPerCall ):
+        chunk = ftsGUIDs[i:i + self.maxJobsPerCall]
+        statuses = self.transport.getStatus( ftsServer, chunk, full )
+        if not statuses["OK"]:
+          self.log.error( "unable to get FTSJobs statuses at %s: %s" % ( ftsServer, statuses["Message"] ) )
+          statuses = dict.fromkeys( chunk, statuses )
+        else:
+          statuses = statuses["Value"]
+        for ftsGUID in chunk:
+          self.__outputs[( ftsGUID, full )] = statuses.get( ftsGUID, S_ERROR( "FTSJob %s status not returned" % ftsGUID ) )
+
+  def prefetch( self, ftsJobs, now = None ):
+    """ poll due :ftsJobs:, updating their status and completeness
+
+    :param list ftsJobs: all the FTSJobs to monitor
+    :param datetime now: UTC time, default utcnow
+    :return: S_OK( list of polled FTSJobs )
+    """
+    now = self.toSeconds( now if now else datetime.datetime.utcnow() )
+    ftsJobs = [ ftsJob for ftsJob in ftsJobs if ftsJob.FTSGUID ]
+    due = [ ftsJob for ftsJob in ftsJobs if self.isDue( ftsJob, now ) ]
+    self.__outputs = {}
+    self.__polled = set( [ ftsJob.FTSGUID for ftsJob in due ] )
+
+    self.__query( due, False )
+    final = []
+    for ftsJob in due:
+      output = self.__outputs[( ftsJob.FTSGUID, False )]
+      if not output["OK"]:
+        continue
+      try:
+        ftsJob.parseMonitorOutput( output["Value"] )
+      except Exception, error:
+        self.log.exception( "unable to parse FTSJob %s status" % ftsJob.FTSGUID, lException = error )
+        self.__outputs[( ftsJob.FTSGUID, False )] = S_ERROR( str( error ) )
+        continue
+      self.__nextPoll[ftsJob.FTSGUID] = now + self.pollingInterval( ftsJob, now )
+      if ftsJob.Status in FTSJob.FINALSTATES:
+        final.append( ftsJob )
+    self.__query( final, True )
+
+    # # forget FTSJobs no longer monitored
+    ftsGUIDs = set( [ ftsJob.FTSGUID for ftsJob in ftsJobs ] )
+    for ftsGUID in self.__nextPoll.keys():
+      if ftsGUID not in ftsGUIDs:
+        del self.__nextPoll[ftsGUID]
+    return S_OK( due )
+
+  def monitorJob( self, ftsJob, full = False ):
+    """ FTSJob.monitorFTS2 using output got by prefetch if any """
+    if not ftsJob.FTSGUID:
+      return S_ERROR( "FTSGUID not set, FTS job not submitted?" )
+    output = self.__outputs.get( ( ftsJob.FTSGUID, full ) )
+    if not output:
+      output = self.transport.getStatus( ftsJob.FTSServer, [ ftsJob.FTSGUID ], full )
+      if output["OK"]:
+        output = output["Value"].get( ftsJob.FTSGUID, S_ERROR( "FTSJob %s status not returned" % ftsJob.FTSGUID ) )
+    if not output["OK"]:
+      return output
+    return ftsJob.parseMonitorOutput( output["Value"], full )
@@ -130,14 +130,14 @@ class FTSStrategy( object ):
 
     :param list ftsHistoryViews: list of FTSHistoryViews
     """
-    ftsGraph = None
+    # # built with its SEs R/W access outside of the lock, only swapped under it
+    ftsGraph = FTSGraph( "FTSGraph",
+                         ftsHistoryViews,
+                         cls.acceptableFailureRate,
+                         cls.acceptableFailedFiles,
+                         cls.schedulingType )
     try:
       cls.graphLock().acquire()
-      ftsGraph = FTSGraph( "FTSGraph",
-                           ftsHistoryViews,
-                           cls.acceptableFailureRate,
-                           cls.acceptableFailedFiles,
-                           cls.schedulingType )
       if ftsGraph:
         cls.ftsGraph = ftsGraph
     finally:
@@ -146,12 +146,15 @@ class FTSStrategy( object ):
 
   def updateRWAccess( self ):
     """ update RW access in FTS graph """
-    updateRWAccess = S_OK()
+    # # RSS is read outside of the lock, SEs dicts are only swapped under it
+    ftsGraph = self.ftsGraph
+    updateRWAccess = ftsGraph.rwAccessSnapshot()
+    if not updateRWAccess["OK"]:
+      self.log.error( updateRWAccess["Message"] )
+      return updateRWAccess
     try:
       self.graphLock().acquire()
-      updateRWAccess = self.ftsGraph.updateRWAccess()
-      if not updateRWAccess["OK"]:
-        self.log.error( updateRWAccess["Message"] )
+      updateRWAccess = ftsGraph.setRWAccess( updateRWAccess["Value"] )
     finally:
       self.graphLock().release()
     return updateRWAccess
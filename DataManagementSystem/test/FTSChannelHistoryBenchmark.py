@@ -0,0 +1,91 @@
+########################################################################
+# $HeadURL $
+# File: FTSChannelHistoryBenchmark.py
+########################################################################
+""" :mod: FTSChannelHistoryBenchmark
+    ================================
+
+    .. module: FTSChannelHistoryBenchmark
+    :synopsis: FTSHistoryView aggregation vs FTSChannelHistory on a large FTSJob table
+
+    An in memory sqlite FTSJob table is filled with FTSJobs updated over the last two
+    intervals between 30 SEs, then FTSHistoryView fields are evaluated and compared
+    with FTSChannelHistory reads, loading and updates.
+
+    usage: python FTSChannelHistoryBenchmark.py [nJobs] [nUpdates]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import datetime
+import random
+import sys
+import time
+# # SUT
+from DIRAC.DataManagementSystem.private.FTSChannelHistory import FTSChannelHistory
+# # from DIRAC
+from DIRAC.DataManagementSystem.private.FTSHistoryView import FTSHistoryView
+# # FTSJob table and comparison
+from FTSChannelHistoryTests import FTSJobTable, historyDict
+
+STATUSES = ( "Submitted", "Ready", "Active", "Finished", "FinishedDirty", "Failed", "Canceled" )
+
+def timeIt( function, *args ):
+  """ elapsed time and result """
+  start = time.time()
+  result = function( *args )
+  return time.time() - start, result
+
+def generateRows( nJobs, now, seed = 1 ):
+  """ :nJobs: FTSJob rows updated over the two intervals before :now: """
+  rand = random.Random( seed )
+  ses = [ "SE%02d-DISK" % i for i in range( 30 ) ]
+  for ftsJobID in xrange( 1, nJobs + 1 ):
+    sourceSE, targetSE = rand.sample( ses, 2 )
+    files = rand.randint( 1, 100 )
+    failedFiles = rand.choice( ( 0, 0, 0, rand.randint( 1, files ) ) )
+    yield ( ftsJobID, sourceSE, targetSE, rand.choice( STATUSES ),
+            "https://fts.%s.org:8443/glite-data-transfer-fts/services/FileTransfer" % targetSE,
+            files, files * 10 ** 9, failedFiles, failedFiles * 10 ** 9, float( rand.randint( 0, 100 ) ),
+            now - datetime.timedelta( seconds = rand.randint( 0, 2 * FTSHistoryView.INTERVAL ) ) )
+
+def updates( channelHistory, table, ftsJobIDs, now ):
+  """ new status and LastUpdate for :ftsJobIDs: """
+  for ftsJobID in ftsJobIDs:
+    row = table.getJob( ftsJobID )
+    row["Status"] = "Finished"
+    row["LastUpdate"] = now
+    channelHistory.putJob( row )
+
+def benchmark( nJobs = 1000000, nUpdates = 10000 ):
+  """ print view and FTSChannelHistory times """
+  now = datetime.datetime.utcnow().replace( second = 0, microsecond = 0 )
+  cutoff = now - datetime.timedelta( seconds = FTSHistoryView.INTERVAL )
+  table = FTSJobTable()
+  table.connection.executemany( "INSERT INTO `FTSJob` ( %s ) VALUES ( %s )" % ( ",".join( FTSChannelHistory.COLUMNS ),
+                                                                             ",".join( [ "?" ] * len( FTSChannelHistory.COLUMNS ) ) ),
+                                generateRows( nJobs, now ) )
+  channelHistory = FTSChannelHistory()
+
+  viewTime, expected = timeIt( table.getHistory, cutoff )
+  selectTime, rows = timeIt( lambda: [ dict( zip( row.keys(), row ) ) for row in
+                                       table.connection.execute( "SELECT %s FROM `FTSJob` WHERE `LastUpdate` > ?" %
+                                                                 ",".join( FTSChannelHistory.COLUMNS ), ( cutoff, ) ) ] )
+  loadTime, _load = timeIt( channelHistory.load, rows )
+  readTime, history = timeIt( channelHistory.getHistory, now )
+  assert historyDict( history ) == historyDict( expected )
+
+  ftsJobIDs = [ row["FTSJobID"] for row in random.Random( 2 ).sample( rows, min( nUpdates, len( rows ) ) ) ]
+  lookupTime, _rows = timeIt( lambda: [ table.getJob( ftsJobID ) for ftsJobID in ftsJobIDs ] )
+  updateTime, _updates = timeIt( updates, channelHistory, table, ftsJobIDs, now )
+  updateTime -= lookupTime
+
+  print "%d FTSJobs, %d in the window, %d channel statuses" % ( nJobs, len( rows ), len( expected ) )
+  print "%-40s %10.4fs" % ( "FTSHistoryView query", viewTime )
+  print "%-40s %10.4fs" % ( "FTSChannelHistory.getHistory", readTime )
+  print "%-40s %10.4fs" % ( "FTSChannelHistory reload (select + load)", selectTime + loadTime )
+  print "%-40s %10.2fus" % ( "FTSChannelHistory.putJob per FTSJob", 1e6 * updateTime / len( ftsJobIDs ) )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 1000000,
+             int( args[1] ) if len( args ) > 1 else 10000 )
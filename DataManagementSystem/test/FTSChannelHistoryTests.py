@@ -0,0 +1,175 @@
+########################################################################
+# $HeadURL $
+# File: FTSChannelHistoryTests.py
+########################################################################
+""" :mod: FTSChannelHistoryTests
+    ============================
+
+    .. module: FTSChannelHistoryTests
+    :synopsis: test cases for FTSChannelHistory
+
+    FTSChannelHistory compared with FTSHistoryView on generated FTSJob histories,
+    the view fields being evaluated by an in memory sqlite database holding the
+    FTSJob table.
+"""
+__RCSID__ = "$Id$"
+# # imports
+import datetime
+import random
+import sqlite3
+import unittest
+# # SUT
+from DIRAC.DataManagementSystem.private.FTSChannelHistory import FTSChannelHistory
+# # from DIRAC
+from DIRAC.DataManagementSystem.private.FTSHistoryView import FTSHistoryView
+
+# # minute aligned
+START = datetime.datetime( 2013, 6, 1 )
+
+class FTSJobTable( object ):
+  """ FTSJob table in an in memory sqlite database, updated as FTSDB does """
+
+  def __init__( self ):
+    """ c'tor """
+    self.connection = sqlite3.connect( ":memory:", detect_types = sqlite3.PARSE_DECLTYPES )
+    self.connection.row_factory = sqlite3.Row
+    self.connection.text_factory = str
+    self.connection.execute( "CREATE TABLE `FTSJob` ( `FTSJobID` INTEGER PRIMARY KEY, `SourceSE` TEXT, `TargetSE` TEXT, "
+                             "`Status` TEXT, `FTSServer` TEXT, `Files` INTEGER, `Size` INTEGER, `FailedFiles` INTEGER, "
+                             "`FailedSize` INTEGER, `Completeness` REAL, `LastUpdate` TIMESTAMP )" )
+
+  def getJob( self, ftsJobID ):
+    """ FTSJob row as selected back by FTSDB.putFTSJob """
+    row = self.connection.execute( "SELECT %s FROM `FTSJob` WHERE `FTSJobID` = ?" % ",".join( FTSChannelHistory.COLUMNS ),
+                                   ( ftsJobID, ) ).fetchone()
+    return dict( zip( row.keys(), row ) )
+
+  def putJob( self, ftsJobID, values, lastUpdate ):
+    """ INSERT or UPDATE of non null :values:, as FTSJob.toSQL """
+    columns = [ column for column in values if values[column] ]
+    if self.connection.execute( "SELECT 1 FROM `FTSJob` WHERE `FTSJobID` = ?", ( ftsJobID, ) ).fetchone():
+      self.connection.execute( "UPDATE `FTSJob` SET %s, `LastUpdate` = ? WHERE `FTSJobID` = ?" %
+                               ",".join( [ "`%s` = ?" % column for column in columns ] ),
+                               [ values[column] for column in columns ] + [ lastUpdate, ftsJobID ] )
+    else:
+      self.connection.execute( "INSERT INTO `FTSJob` ( `FTSJobID`, %s, `LastUpdate` ) VALUES ( ?, %s, ? )" %
+                               ( ",".join( columns ), ",".join( [ "?" ] * len( columns ) ) ),
+                               [ ftsJobID ] + [ values[column] for column in columns ] + [ lastUpdate ] )
+    return self.getJob( ftsJobID )
+
+  def setJobStatus( self, ftsJobID, status ):
+    """ as FTSDB.setFTSJobStatus """
+    self.connection.execute( "UPDATE `FTSJob` SET `Status` = ? WHERE `FTSJobID` = ?", ( status, ftsJobID ) )
+
+  def deleteJob( self, ftsJobID ):
+    """ as FTSDB.deleteFTSJob """
+    self.connection.execute( "DELETE FROM `FTSJob` WHERE `FTSJobID` = ?", ( ftsJobID, ) )
+
+  def getHistory( self, cutoff ):
+    """ FTSHistoryView fields for FTSJobs updated after :cutoff: """
+    viewDesc = FTSHistoryView.viewDesc()
+    fields = viewDesc["Fields"].items()
+    query = "SELECT %s FROM %s WHERE `FTSJob`.`LastUpdate` > ? GROUP BY %s" % ( ",".join( [ expr for _name, expr in fields ] ),
+                                                                                 viewDesc["SelectFrom"],
+                                                                                 ",".join( viewDesc["GroupBy"] ) )
+    return [ FTSHistoryView( dict( zip( [ name for name, _expr in fields ], row ) ) )
+             for row in self.connection.execute( query, ( cutoff, ) ) ]
+
+def generateEvents( nJobs, duration, seed = 1 ):
+  """ time ordered FTSJob events: ( seconds after START, kind, ftsJobID, values ) """
+  rand = random.Random( seed )
+  ses = [ "SE%02d-DISK" % i for i in range( 8 ) ]
+  events = []
+  for ftsJobID in range( 1, nJobs + 1 ):
+    sourceSE, targetSE = rand.sample( ses, 2 )
+    files = rand.randint( 1, 100 )
+    size = files * rand.randint( 1, 10 ** 9 )
+    values = { "SourceSE": sourceSE, "TargetSE": targetSE, "Status": "Submitted",
+               "FTSServer": "https://fts.%s.org:8443/glite-data-transfer-fts/services/FileTransfer" % targetSE,
+               "Files": files, "Size": size, "FailedFiles": 0, "FailedSize": 0, "Completeness": 0 }
+    when = rand.randint( 0, duration )
+    events.append( ( when, "put", ftsJobID, dict( values ) ) )
+    for status in rand.sample( [ "Ready", "Active", "Hold" ], rand.randint( 0, 3 ) ) + \
+                  [ rand.choice( [ "Finished", "FinishedDirty", "Failed", "Canceled", "Active" ] ) ]:
+      when += rand.randint( 0, 1200 )
+      values["Status"] = status
+      values["Completeness"] = min( 100, values["Completeness"] + rand.randint( 0, 60 ) )
+      if status in ( "FinishedDirty", "Failed" ):
+        values["FailedFiles"] = rand.randint( 1, files )
+        values["FailedSize"] = values["FailedFiles"] * size / files
+      events.append( ( when, "put", ftsJobID, dict( values ) ) )
+    if rand.random() < 0.1:
+      events.append( ( when + rand.randint( 0, 600 ), "status", ftsJobID, "Assigned" ) )
+    if rand.random() < 0.05:
+      events.append( ( when + rand.randint( 0, 600 ), "delete", ftsJobID, None ) )
+  events.sort()
+  return events
+
+def historyDict( history ):
+  """ { ( SourceSE, TargetSE, Status ) : figures } for list of FTSHistoryViews :history: """
+  return dict( [ ( ( view.SourceSE, view.TargetSE, view.Status ),
+                   ( view.FTSJobs, view.Files, view.Size, view.FailedFiles, view.FailedSize,
+                     round( view.Completeness, 6 ), view.FTSServer ) ) for view in history ] )
+
+########################################################################
+class FTSChannelHistoryTests( unittest.TestCase ):
+  """
+  .. class:: FTSChannelHistoryTests
+
+  """
+  def replay( self, bucketWidth, checkEvery ):
+    """ replay generated events, comparing with the view every :checkEvery: seconds """
+    table = FTSJobTable()
+    channelHistory = FTSChannelHistory( bucketWidth = bucketWidth )
+    events = generateEvents( 1500, 3 * FTSHistoryView.INTERVAL )
+    nextCheck = checkEvery
+    checks = 0
+    for when, kind, ftsJobID, values in events + [ ( 4 * FTSHistoryView.INTERVAL + 1, "end", None, None ) ]:
+      while nextCheck < when:
+        now = START + datetime.timedelta( seconds = nextCheck )
+        # # view over whole buckets
+        cutoff = nextCheck - FTSHistoryView.INTERVAL
+        cutoff = START + datetime.timedelta( seconds = cutoff - cutoff % bucketWidth )
+        expected = historyDict( table.getHistory( cutoff ) )
+        self.assertEqual( historyDict( channelHistory.getHistory( now ) ), expected )
+        checks += len( expected )
+        nextCheck += checkEvery
+      lastUpdate = START + datetime.timedelta( seconds = when )
+      if kind == "put":
+        channelHistory.putJob( table.putJob( ftsJobID, values, lastUpdate ) )
+      elif kind == "status":
+        table.setJobStatus( ftsJobID, values )
+        channelHistory.setJobStatus( ftsJobID, values )
+      elif kind == "delete":
+        table.deleteJob( ftsJobID )
+        channelHistory.deleteJob( ftsJobID )
+    self.assertTrue( checks > 1000 )
+    # # all gone
+    self.assertEqual( channelHistory.getHistory( START + datetime.timedelta( seconds = 6 * FTSHistoryView.INTERVAL ) ), [] )
+    return table, channelHistory
+
+  def testSecondBuckets( self ):
+    """ 1 second buckets: FTSHistoryView window """
+    self.replay( 1, 97 )
+
+  def testMinuteBuckets( self ):
+    """ 1 minute buckets: window starting at a minute, including at minute ends """
+    self.replay( 60, 113 )
+    self.replay( 60, 300 )
+
+  def testLoad( self ):
+    """ load from FTSJob rows """
+    table, channelHistory = self.replay( 60, 1800 )
+    now = START + datetime.timedelta( seconds = 3 * FTSHistoryView.INTERVAL )
+    rows = [ table.getJob( row[0] ) for row in table.connection.execute( "SELECT `FTSJobID` FROM `FTSJob`" ) ]
+    channelHistory.load( rows )
+    expected = historyDict( table.getHistory( now - datetime.timedelta( seconds = FTSHistoryView.INTERVAL ) ) )
+    self.assertTrue( expected )
+    self.assertEqual( historyDict( channelHistory.getHistory( now ) ), expected )
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( FTSChannelHistoryTests )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
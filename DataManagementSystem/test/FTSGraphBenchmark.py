@@ -0,0 +1,62 @@
+########################################################################
+# $HeadURL $
+# File: FTSGraphBenchmark.py
+########################################################################
+""" :mod: FTSGraphBenchmark
+    =======================
+
+    .. module: FTSGraphBenchmark
+    :synopsis: FTSGraph build and lookup times on synthetic grids
+
+    Synthetic grids of thousands of SEs (ten per site, one out of ten of them also
+    hosted at two other sites) are built, then random SE pairs are looked up with
+    findSiteForSE and findRoute and with the former scans of nodes and edges.
+
+    usage: python FTSGraphBenchmark.py [nSEs,nSEs...] [nLookups]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import random
+import sys
+import time
+# # SUT
+from DIRAC.DataManagementSystem.private.FTSGraph import FTSGraph
+# # synthetic grids and former lookups
+from FTSGraphTests import syntheticGrid, buildFTSGraph, legacyFindSiteForSE, legacyFindRoute
+
+def timeIt( function, *args ):
+  """ elapsed time and result """
+  start = time.time()
+  result = function( *args )
+  return time.time() - start, result
+
+def lookups( findSiteForSE, findRoute, graph, pairs ):
+  """ findSiteForSE and findRoute for SE :pairs: """
+  results = []
+  for fromSE, toSE in pairs:
+    results.append( findSiteForSE( graph, fromSE ).get( "Value" ) )
+    results.append( findRoute( graph, fromSE, toSE ).get( "Value" ) )
+  return results
+
+def benchmark( sizes = ( 1000, 2000, 5000 ), nLookups = 1000 ):
+  """ print build and lookup times, check indexed and former lookups agree """
+  rand = random.Random( 1 )
+  print "%-8s %-6s %-8s %10s %-12s %10s %10s %8s" % ( "SEs", "sites", "routes", "build",
+                                                      "lookups", "former", "current", "speedup" )
+  for nSEs in sizes:
+    sitesDict = syntheticGrid( nSEs, sesPerSite = 10, sharedSEs = nSEs / 10 )
+    buildTime, graph = timeIt( buildFTSGraph, sitesDict )
+    ses = sorted( set( [ se for ses in sitesDict.values() for se in ses ] ) ) + [ "UNKNOWN-SE" ]
+    pairs = [ ( rand.choice( ses ), rand.choice( ses ) ) for _i in range( nLookups ) ]
+
+    legacyTime, legacyResults = timeIt( lookups, legacyFindSiteForSE, legacyFindRoute, graph, pairs )
+    newTime, results = timeIt( lookups, FTSGraph.findSiteForSE, FTSGraph.findRoute, graph, pairs )
+    assert [ id( result ) for result in results ] == [ id( result ) for result in legacyResults ]
+    print "%-8d %-6d %-8d %9.3fs %-12d %9.3fs %9.3fs %7.1fx" % ( nSEs, len( graph.nodes() ), len( graph.edges() ),
+                                                               buildTime, nLookups, legacyTime, newTime,
+                                                               legacyTime / newTime )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( [ int( size ) for size in args[0].split( "," ) ] if len( args ) > 0 else ( 1000, 2000, 5000 ),
+             int( args[1] ) if len( args ) > 1 else 1000 )
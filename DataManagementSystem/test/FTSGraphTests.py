@@ -22,12 +22,132 @@ from DIRAC.Core.Base.Script import parseCommandLine
 parseCommandLine()
 
 # # imports
+import random
+import threading
+import time
 import unittest
 # # SUT
-from DIRAC.DataManagementSystem.private.FTSGraph import FTSGraph
+from DIRAC.DataManagementSystem.private import FTSGraph as FTSGraphModule
+from DIRAC.DataManagementSystem.private.FTSGraph import FTSGraph, Site, Route
 # # from DIRAC
+from DIRAC import S_OK, S_ERROR
+from DIRAC.DataManagementSystem.Client.FTSSite import FTSSite
 from DIRAC.DataManagementSystem.private.FTSHistoryView import FTSHistoryView
 
+def syntheticGrid( nSEs, sesPerSite = 10, sharedSEs = 0, seed = 1 ):
+  """ { site : [ SEs ] } for :nSEs: SEs, :sharedSEs: of them hosted at two more random sites """
+  rand = random.Random( seed )
+  nSites = max( 1, nSEs / sesPerSite )
+  sitesDict = dict( [ ( "LCG.Site%05d.org" % site, [] ) for site in range( nSites ) ] )
+  siteNames = sorted( sitesDict )
+  for se in range( nSEs ):
+    seName = "SE%06d-DISK" % se
+    sitesDict[siteNames[se % nSites]].append( seName )
+    if se < sharedSEs:
+      for siteName in rand.sample( siteNames, min( 2, nSites ) ):
+        if seName not in sitesDict[siteName]:
+          sitesDict[siteName].append( seName )
+  return sitesDict
+
+class StubRSS( object ):
+  """ RSS client counting its calls, each taking :latency: seconds, SEs being active unless
+  given a status in :statuses: { ( se, statusType ) : status }, lookups of :unknownSEs: fail
+  as RSS cache misses do
+  """
+  def __init__( self, statuses = None, unknownSEs = (), latency = 0.0 ):
+    """ c'tor """
+    self.statuses = statuses if statuses else {}
+    self.unknownSEs = set( unknownSEs )
+    self.latency = latency
+    self.calls = 0
+
+  def getStorageElementStatus( self, elementName, statusType ):
+    """ RSS status of SE or SEs :elementName: """
+    self.calls += 1
+    if self.latency:
+      time.sleep( self.latency )
+    seList = elementName if isinstance( elementName, list ) else [ elementName ]
+    if self.unknownSEs.intersection( seList ):
+      return S_ERROR( "Cache misses: %s" % sorted( self.unknownSEs.intersection( seList ) ) )
+    return S_OK( dict( [ ( se, { statusType : self.statuses.get( ( se, statusType ), "Active" ) } )
+                         for se in seList ] ) )
+
+class SyntheticFTSGraph( FTSGraph ):
+  """ FTSGraph with FTS sites, SEs and their statuses not taken from CS and RSS """
+  def __init__( self, name, sitesDict, ftsHistoryViews = None, rss = None ):
+    """ c'tor """
+    self.sitesDict = sitesDict
+    self.rss = rss if rss else StubRSS()
+    FTSGraph.__init__( self, name, ftsHistoryViews )
+
+  def ftsSites( self ):
+    """ one FTS site per site """
+    return S_OK( [ FTSSite( site, "https://fts.%s:8443/glite-data-transfer-fts/services/FileTransfer" % site )
+                   for site in sorted( self.sitesDict ) ] )
+
+  def rssClient( self ):
+    """ RSS stub """
+    return self.rss
+
+class TimedLock( object ):
+  """ lock recording how long it is held """
+  def __init__( self ):
+    """ c'tor """
+    self.lock = threading.Lock()
+    self.acquired = None
+    self.holdTimes = []
+
+  def acquire( self ):
+    """ acquire the lock """
+    self.lock.acquire()
+    self.acquired = time.time()
+
+  def release( self ):
+    """ release the lock """
+    self.holdTimes.append( time.time() - self.acquired )
+    self.lock.release()
+
+def buildFTSGraph( sitesDict, ftsHistoryViews = None, rss = None ):
+  """ FTSGraph over :sitesDict: """
+  getStorageElementSiteMapping = FTSGraphModule.getStorageElementSiteMapping
+  FTSGraphModule.getStorageElementSiteMapping = lambda *args: S_OK( sitesDict )
+  try:
+    return SyntheticFTSGraph( "syntheticGraph", sitesDict, ftsHistoryViews, rss )
+  finally:
+    FTSGraphModule.getStorageElementSiteMapping = getStorageElementSiteMapping
+
+def legacyFindSiteForSE( graph, se ):
+  """ former FTSGraph.findSiteForSE: scan of all the sites """
+  for node in graph.nodes():
+    if se in node:
+      return S_OK( node )
+  return S_ERROR( "StorageElement %s not found" % se )
+
+def legacyFindRoute( graph, fromSE, toSE ):
+  """ former FTSGraph.findRoute: scan of all the routes """
+  for edge in graph.edges():
+    if fromSE in edge.fromNode.SEs and toSE in edge.toNode.SEs:
+      return S_OK( edge )
+  return S_ERROR( "FTSGraph: unable to find route between '%s' and '%s'" % ( fromSE, toSE ) )
+
+def legacyRWAccess( graph ):
+  """ former FTSGraph.updateRWAccess: two RSS calls per SE of each site, { site : SEs dict } """
+  sitesRWAccess = {}
+  for site in graph.nodes():
+    rwDict = {}
+    for se in site.SEs:
+      rwDict[se] = { "read": False, "write": False }
+      rAccess = graph.rssClient().getStorageElementStatus( se, "ReadAccess" )
+      if not rAccess["OK"]:
+        continue
+      rwDict[se]["read"] = rAccess["Value"][se]["ReadAccess"] in ( "Active", "Degraded" )
+      wAccess = graph.rssClient().getStorageElementStatus( se, "WriteAccess" )
+      if not wAccess["OK"]:
+        continue
+      rwDict[se]["write"] = wAccess["Value"][se]["WriteAccess"] in ( "Active", "Degraded" )
+    sitesRWAccess[site.name] = rwDict
+  return sitesRWAccess
+
 
 ########################################################################
 class FTSGraphTests( unittest.TestCase ):
@@ -73,10 +193,143 @@ class FTSGraphTests( unittest.TestCase ):
     route = graph.findRoute( "RAL-FOO", "CERN-BAR" )
     self.assertEqual( route["OK"], False, "findRoute failed for unknown source and target SEs" )
 
+class FTSGraphIndexesTests( unittest.TestCase ):
+  """
+  .. class:: FTSGraphIndexesTests
+
+  indexed lookups vs scans on a synthetic grid
+  """
+  def setUp( self ):
+    """ test set up """
+    self.sitesDict = syntheticGrid( 200, sesPerSite = 10, sharedSEs = 30 )
+    self.graph = buildFTSGraph( self.sitesDict )
+    ses = sorted( set( [ se for ses in self.sitesDict.values() for se in ses ] ) )
+    self.ses = ses[:40] + [ "UNKNOWN-SE" ]
+
+  def tearDown( self ):
+    """ test case tear down """
+    del self.graph
+
+  def assertSameResult( self, result, legacyResult ):
+    """ same S_OK value (identity) or same S_ERROR message """
+    self.assertEqual( result["OK"], legacyResult["OK"] )
+    if result["OK"]:
+      self.assertTrue( result["Value"] is legacyResult["Value"] )
+    else:
+      self.assertEqual( result["Message"], legacyResult["Message"] )
+
+  def assertSameLookups( self ):
+    """ findSiteForSE and findRoute answer as scans do """
+    for fromSE in self.ses:
+      self.assertSameResult( self.graph.findSiteForSE( fromSE ), legacyFindSiteForSE( self.graph, fromSE ) )
+      for toSE in self.ses:
+        self.assertSameResult( self.graph.findRoute( fromSE, toSE ), legacyFindRoute( self.graph, fromSE, toSE ) )
+
+  def testLookups( self ):
+    """ lookups, repeated ones served from the route index """
+    self.assertEqual( len( self.graph.nodes() ), 20 )
+    self.assertEqual( len( self.graph.edges() ), 400 )
+    self.assertSameLookups()
+    self.assertSameLookups()
+    self.graph.updateRWAccess()
+    self.assertSameLookups()
+
+  def testTopologyChange( self ):
+    """ indexes follow new sites and routes """
+    site = Site( "LCG.New.org", { "SEs" : dict.fromkeys( [ "NEW-DISK", self.ses[0] ], { "read": True, "write": True } ) } )
+    self.graph.addNode( site )
+    self.ses.append( "NEW-DISK" )
+    self.assertSameLookups()
+    for otherSite in list( self.graph.nodes() ):
+      self.graph.addEdge( Route( site, otherSite ) )
+      self.graph.addEdge( Route( otherSite, site ) )
+    self.assertSameLookups()
+    # # SEs changed by hand
+    site.SEs = { "OTHER-DISK" : { "read": True, "write": True } }
+    self.graph.resetIndexes()
+    self.ses.append( "OTHER-DISK" )
+    self.assertSameLookups()
+
+class FTSGraphRWAccessTests( unittest.TestCase ):
+  """
+  .. class:: FTSGraphRWAccessTests
+
+  SEs R/W access read in bulk from a stub RSS vs the former per SE calls
+  """
+  def setUp( self ):
+    """ test set up """
+    self.sitesDict = syntheticGrid( 500, sesPerSite = 10, sharedSEs = 50 )
+    ses = sorted( set( [ se for ses in self.sitesDict.values() for se in ses ] ) )
+    rand = random.Random( 5 )
+    statuses = dict( [ ( ( se, statusType ), rand.choice( ( "Active", "Degraded", "Probing", "Banned" ) ) )
+                       for se in ses for statusType in ( "ReadAccess", "WriteAccess" ) ] )
+    self.rss = StubRSS( statuses )
+    self.graph = buildFTSGraph( self.sitesDict, rss = self.rss )
+    self.ses = ses
+
+  def tearDown( self ):
+    """ test case tear down """
+    del self.graph
+
+  def sitesRWAccess( self ):
+    """ { site : SEs dict } of the graph """
+    return dict( [ ( site.name, site.SEs ) for site in self.graph.nodes() ] )
+
+  def testBulkAccess( self ):
+    """ two RSS calls for all the SEs, same access as the per SE calls """
+    self.assertEqual( self.rss.calls, 2 )
+    self.rss.calls = 0
+    legacy = legacyRWAccess( self.graph )
+    self.assertEqual( self.rss.calls, 2 * sum( [ len( ses ) for ses in self.sitesDict.values() ] ) )
+    self.rss.calls = 0
+    self.assertEqual( self.graph.updateRWAccess()["OK"], True )
+    self.assertEqual( self.rss.calls, 2 )
+    self.assertEqual( self.sitesRWAccess(), legacy )
+    self.assertEqual( set( [ access["read"] for ses in legacy.values() for access in ses.values() ] ),
+                      set( [ True, False ] ) )
+
+  def testUnknownSEs( self ):
+    """ SEs read one by one when the bulk lookup fails """
+    self.rss.unknownSEs = set( self.ses[:3] )
+    legacy = legacyRWAccess( self.graph )
+    self.rss.calls = 0
+    self.graph.updateRWAccess()
+    self.assertEqual( self.rss.calls, 2 + 2 * len( self.ses ) )
+    self.assertEqual( self.sitesRWAccess(), legacy )
+    for se in self.ses[:3]:
+      self.assertEqual( self.graph.findSiteForSE( se )["Value"].SEs[se], { "read": False, "write": False } )
+
+  def testLockHoldTime( self ):
+    """ with the snapshot read outside of the lock, the lock is only held to swap SEs dicts """
+    self.rss.latency = 0.0002
+    lock = TimedLock()
+    lock.acquire()
+    try:
+      legacy = legacyRWAccess( self.graph )
+    finally:
+      lock.release()
+    legacyHoldTime = lock.holdTimes[-1]
+    self.rss.calls = 0
+    start = time.time()
+    rwAccess = self.graph.rwAccessSnapshot()
+    self.assertEqual( rwAccess["OK"], True )
+    lock.acquire()
+    try:
+      self.graph.setRWAccess( rwAccess["Value"] )
+    finally:
+      lock.release()
+    elapsed = time.time() - start
+    holdTime = lock.holdTimes[-1]
+    self.assertEqual( self.rss.calls, 2 )
+    self.assertEqual( self.sitesRWAccess(), legacy )
+    # # 1100 calls holding the lock before, none now
+    self.assertTrue( legacyHoldTime > 1100 * self.rss.latency )
+    self.assertTrue( holdTime < legacyHoldTime / 100, "lock held %.6fs vs %.6fs" % ( holdTime, legacyHoldTime ) )
+    self.assertTrue( holdTime < elapsed )
 
 # # test execution
 if __name__ == "__main__":
   gTestLoader = unittest.TestLoader()
-  gSuite = gTestLoader.loadTestsFromTestCase( FTSGraphTests )
-  gSuite = unittest.TestSuite( [ gSuite ] )
+  gSuite = unittest.TestSuite( [ gTestLoader.loadTestsFromTestCase( testCase )
+                                 for testCase in ( FTSGraphTests, FTSGraphIndexesTests, FTSGraphRWAccessTests ) ] )
   unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
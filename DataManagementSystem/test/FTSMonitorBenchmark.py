@@ -0,0 +1,87 @@
+########################################################################
+# $HeadURL $
+# File: FTSMonitorBenchmark.py
+########################################################################
+""" :mod: FTSMonitorBenchmark
+    =========================
+
+    .. module: FTSMonitorBenchmark
+    :synopsis: per FTSJob vs bulk and adaptive FTSJob status polling
+
+    FTSJobs submitted over the last hours to a few FTS servers are polled by an FTSAgent
+    running every two minutes for an hour, either one status call per FTSJob and cycle
+    (as FTSJob.monitorFTS2) or with FTSMonitor. Each call to the fake FTS servers costs
+    a fixed latency, standing for glite-transfer-status start up and authentication.
+
+    usage: python FTSMonitorBenchmark.py [nJobs] [nServers] [latency]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import datetime
+import sys
+import time
+# # SUT
+from DIRAC.DataManagementSystem.private.FTSMonitor import FTSMonitor
+# # from DIRAC
+from DIRAC.DataManagementSystem.Client.FTSJob import FTSJob
+# # fake FTS servers
+from FTSMonitorTests import FakeFTSTransport, NOW, ftsGUID, ftsServerURL
+
+class SlowFTSTransport( FakeFTSTransport ):
+  """ fake FTS servers answering after :latency: seconds """
+
+  def __init__( self, latency ):
+    """ c'tor """
+    FakeFTSTransport.__init__( self )
+    self.latency = latency
+
+  def getStatus( self, ftsServer, ftsGUIDs, full = False ):
+    """ wait, then answer """
+    time.sleep( self.latency )
+    return FakeFTSTransport.getStatus( self, ftsServer, ftsGUIDs, full )
+
+def makeFTSJobs( transport, nJobs, nServers ):
+  """ :nJobs: active FTSJobs submitted every 10 seconds before NOW """
+  ftsJobs = []
+  for i in range( nJobs ):
+    ftsJob = FTSJob()
+    ftsJob.FTSGUID = ftsGUID( i + 1 )
+    ftsJob.FTSServer = ftsServerURL( i % nServers )
+    ftsJob.SubmitTime = NOW - datetime.timedelta( seconds = 10 * i )
+    ftsJobs.append( ftsJob )
+    transport.setJob( ftsJob.FTSServer, ftsJob.FTSGUID, "Active", { "Active": 6, "Finished": 4 } )
+  return ftsJobs
+
+def perJob( transport, ftsJobs, cycles ):
+  """ one status call per FTSJob and cycle """
+  for _cycle in cycles:
+    for ftsJob in ftsJobs:
+      ftsJob.parseMonitorOutput( transport.getStatus( ftsJob.FTSServer, [ ftsJob.FTSGUID ] )["Value"][ftsJob.FTSGUID]["Value"] )
+
+def bulk( monitor, ftsJobs, cycles ):
+  """ FTSMonitor.prefetch and monitorJob for polled FTSJobs """
+  for cycle in cycles:
+    for ftsJob in monitor.prefetch( ftsJobs, cycle )["Value"]:
+      monitor.monitorJob( ftsJob )
+
+def benchmark( nJobs = 500, nServers = 4, latency = 0.01 ):
+  """ print calls and times """
+  cycles = [ NOW + datetime.timedelta( minutes = minutes ) for minutes in range( 0, 60, 2 ) ]
+  print "%d FTSJobs, %d FTS servers, %d cycles, %.3fs per call" % ( nJobs, nServers, len( cycles ), latency )
+  print "%-30s %10s %10s" % ( "polling", "calls", "time" )
+  for name, run in ( ( "per FTSJob", lambda transport, ftsJobs: perJob( transport, ftsJobs, cycles ) ),
+                     ( "FTSMonitor bulk", lambda transport, ftsJobs: bulk( FTSMonitor( transport, ageFactor = 0 ),
+                                                                           ftsJobs, cycles ) ),
+                     ( "FTSMonitor bulk + adaptive", lambda transport, ftsJobs: bulk( FTSMonitor( transport ),
+                                                                                      ftsJobs, cycles ) ) ):
+    transport = SlowFTSTransport( latency )
+    ftsJobs = makeFTSJobs( transport, nJobs, nServers )
+    start = time.time()
+    run( transport, ftsJobs )
+    print "%-30s %10d %9.2fs" % ( name, sum( transport.calls.values() ), time.time() - start )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 500,
+             int( args[1] ) if len( args ) > 1 else 4,
+             float( args[2] ) if len( args ) > 2 else 0.01 )
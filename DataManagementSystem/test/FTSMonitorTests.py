@@ -0,0 +1,205 @@
+########################################################################
+# $HeadURL $
+# File: FTSMonitorTests.py
+########################################################################
+""" :mod: FTSMonitorTests
+    =====================
+
+    .. module: FTSMonitorTests
+    :synopsis: test cases for FTSMonitor
+
+    FTSMonitor polling FTSJobs spread over several FTS servers through a fake
+    transport, answering as glite-transfer-status --verbose does and counting
+    the calls made to each server.
+"""
+__RCSID__ = "$Id$"
+# # imports
+import datetime
+import unittest
+# # SUT
+from DIRAC.DataManagementSystem.private.FTSMonitor import FTSMonitor, FTSTransport, GliteTransferStatus
+# # from DIRAC
+from DIRAC import S_OK, S_ERROR
+from DIRAC.DataManagementSystem.Client.FTSJob import FTSJob
+
+NOW = datetime.datetime( 2013, 6, 1, 12 )
+
+def ftsServerURL( i ):
+  """ FTS server URL """
+  return "https://fts%02d.example.org:8443/glite-data-transfer-fts/services/FileTransfer" % i
+
+def ftsGUID( i ):
+  """ valid FTSGUID """
+  return "%08X-0000-0000-0000-%012X" % ( i, i )
+
+def statusOutput( ftsGUID, status, summary ):
+  """ glite-transfer-status --verbose output """
+  lines = [ "Request ID:\t%s" % ftsGUID,
+            "Status:\t\t%s" % status,
+            "Channel:\tSE-SE",
+            "Client DN:\t/DC=org/CN=fake",
+            "Reason:\t\t<None>",
+            "Submit time:\t2013-06-01 11:00:00.000",
+            "Files:\t\t%d" % sum( summary.values() ),
+            "Priority:\t3",
+            "VOName:\t\tfake" ]
+  lines += [ "\t%s:\t\t%d" % ( state, summary.get( state, 0 ) )
+             for state in ( "Done", "Active", "Pending", "Ready", "Canceled", "Failed",
+                            "Finishing", "Finished", "Submitted", "Hold", "Waiting" ) ]
+  return "\n".join( lines ) + "\n"
+
+class FakeFTSTransport( FTSTransport ):
+  """ FTS servers stub: { ftsServer : { ftsGUID : ( status, summary ) } }, counting calls per server """
+
+  def __init__( self ):
+    """ c'tor """
+    self.jobs = {}
+    self.calls = {}
+    self.queried = []
+
+  def setJob( self, ftsServer, ftsGUID, status, summary ):
+    """ state of FTS job :ftsGUID: at :ftsServer: """
+    self.jobs.setdefault( ftsServer, {} )[ftsGUID] = ( status, summary )
+
+  def getStatus( self, ftsServer, ftsGUIDs, full = False ):
+    """ outputs of known FTS jobs """
+    self.calls[ftsServer] = self.calls.get( ftsServer, 0 ) + 1
+    self.queried.append( ( ftsServer, list( ftsGUIDs ), full ) )
+    if ftsServer not in self.jobs:
+      return S_ERROR( "unable to contact %s" % ftsServer )
+    jobs = self.jobs[ftsServer]
+    return S_OK( dict( [ ( ftsGUID, S_OK( statusOutput( ftsGUID, *jobs[ftsGUID] ) ) )
+                         for ftsGUID in ftsGUIDs if ftsGUID in jobs ] ) )
+
+########################################################################
+class FTSMonitorTests( unittest.TestCase ):
+  """
+  .. class:: FTSMonitorTests
+
+  """
+  def setUp( self ):
+    """ 250 FTSJobs at 3 FTS servers, submitted 10 to 260 minutes ago """
+    self.transport = FakeFTSTransport()
+    self.ftsJobs = []
+    for i in range( 250 ):
+      ftsJob = FTSJob()
+      ftsJob.FTSGUID = ftsGUID( i + 1 )
+      ftsJob.FTSServer = ftsServerURL( i % 3 )
+      ftsJob.SubmitTime = NOW - datetime.timedelta( minutes = 10 + i )
+      self.ftsJobs.append( ftsJob )
+      self.transport.setJob( ftsJob.FTSServer, ftsJob.FTSGUID, "Active", { "Active": 6, "Finished": 4 } )
+
+  def testGrouping( self ):
+    """ one call per server and maxJobsPerCall FTSJobs """
+    monitor = FTSMonitor( self.transport, maxJobsPerCall = 50 )
+    polled = monitor.prefetch( self.ftsJobs, NOW )
+    self.assertEqual( polled["OK"], True )
+    self.assertEqual( len( polled["Value"] ), 250 )
+    # # 84, 83 and 83 FTSJobs per server
+    self.assertEqual( self.transport.calls, dict.fromkeys( [ ftsServerURL( i ) for i in range( 3 ) ], 2 ) )
+    for ftsServer, ftsGUIDs, full in self.transport.queried:
+      self.assertEqual( full, False )
+      self.assertTrue( len( ftsGUIDs ) <= 50 )
+      self.assertEqual( set( [ ftsJob.FTSServer for ftsJob in self.ftsJobs if ftsJob.FTSGUID in ftsGUIDs ] ),
+                        set( [ ftsServer ] ) )
+    for ftsJob in self.ftsJobs:
+      self.assertEqual( ftsJob.Status, "Active" )
+      self.assertEqual( ftsJob.Completeness, 40 )
+      self.assertEqual( monitor.polled( ftsJob ), True )
+
+    # # monitorJob served from prefetched outputs
+    monitorJob = monitor.monitorJob( self.ftsJobs[0] )
+    self.assertEqual( monitorJob["OK"], True )
+    self.assertEqual( monitorJob["Value"], { "Submitted": 0, "Ready": 0, "Active": 6, "Failed": 0, "Finished": 4, "Canceled": 0 } )
+    self.assertEqual( sum( self.transport.calls.values() ), 6 )
+
+  def testSameAsSingleJob( self ):
+    """ FTSJobs updated as by one call per FTSJob """
+    summaries = ( ( "Submitted", { "Submitted": 10 } ), ( "Active", { "Active": 3, "Finished": 7 } ),
+                  ( "Active", { "Finished": 9, "Failed": 1 } ), ( "Hold", { "Ready": 10 } ) )
+    for i, ftsJob in enumerate( self.ftsJobs ):
+      self.transport.setJob( ftsJob.FTSServer, ftsJob.FTSGUID, *summaries[i % len( summaries )] )
+    monitor = FTSMonitor( self.transport )
+    monitor.prefetch( self.ftsJobs, NOW )
+    self.assertEqual( sum( self.transport.calls.values() ), 3 )
+    for i, ftsJob in enumerate( self.ftsJobs ):
+      single = FTSJob()
+      single.FTSGUID = ftsJob.FTSGUID
+      single.FTSServer = ftsJob.FTSServer
+      output = self.transport.getStatus( single.FTSServer, [ single.FTSGUID ] )["Value"][single.FTSGUID]["Value"]
+      self.assertEqual( single.parseMonitorOutput( output ), monitor.monitorJob( ftsJob ) )
+      self.assertEqual( ( single.Status, single.Completeness ), ( ftsJob.Status, ftsJob.Completeness ) )
+
+  def testFinalJobs( self ):
+    """ FTSJobs in final states polled again with files, in bulk """
+    for ftsJob in self.ftsJobs[:20]:
+      self.transport.setJob( ftsJob.FTSServer, ftsJob.FTSGUID, "Finished", { "Finished": 10 } )
+    monitor = FTSMonitor( self.transport )
+    monitor.prefetch( self.ftsJobs, NOW )
+    self.assertEqual( sum( self.transport.calls.values() ), 6 )
+    fullQueries = [ ftsGUIDs for _ftsServer, ftsGUIDs, full in self.transport.queried if full ]
+    self.assertEqual( sorted( sum( fullQueries, [] ) ), sorted( [ ftsJob.FTSGUID for ftsJob in self.ftsJobs[:20] ] ) )
+
+  def testFailures( self ):
+    """ unreachable server and unknown FTSJobs """
+    unknown = FTSJob()
+    unknown.FTSGUID = ftsGUID( 1000 )
+    unknown.FTSServer = ftsServerURL( 0 )
+    unreachable = FTSJob()
+    unreachable.FTSGUID = ftsGUID( 1001 )
+    unreachable.FTSServer = ftsServerURL( 9 )
+    monitor = FTSMonitor( self.transport )
+    polled = monitor.prefetch( self.ftsJobs + [ unknown, unreachable ], NOW )
+    self.assertEqual( len( polled["Value"] ), 252 )
+    self.assertEqual( ( unknown.Status, unreachable.Status ), ( "Submitted", "Submitted" ) )
+    self.assertEqual( monitor.monitorJob( unknown )["OK"], False )
+    self.assertEqual( monitor.monitorJob( unreachable )["OK"], False )
+    # # not polled again: still due
+    self.assertEqual( monitor.isDue( unknown, FTSMonitor.toSeconds( NOW ) ), True )
+    self.assertEqual( monitor.isDue( self.ftsJobs[0], FTSMonitor.toSeconds( NOW ) ), False )
+
+  def testAdaptivePolling( self ):
+    """ young and nearly complete FTSJobs polled more often """
+    monitor = FTSMonitor( self.transport, minPollingInterval = 60, maxPollingInterval = 1200, ageFactor = 0.1 )
+    now = FTSMonitor.toSeconds( NOW )
+    # # 10 minutes old: 60s, 100 minutes old: 600s, 250 minutes old: 1200s
+    self.assertEqual( monitor.pollingInterval( self.ftsJobs[0], now ), 60 )
+    self.assertEqual( monitor.pollingInterval( self.ftsJobs[90], now ), 600 )
+    self.assertEqual( monitor.pollingInterval( self.ftsJobs[240], now ), 1200 )
+    self.ftsJobs[240].Completeness = 90
+    self.assertEqual( monitor.pollingInterval( self.ftsJobs[240], now ), 60 )
+
+    counts = []
+    polls = dict.fromkeys( [ ftsJob.FTSGUID for ftsJob in self.ftsJobs ], 0 )
+    for minutes in range( 0, 60, 2 ):
+      polled = monitor.prefetch( self.ftsJobs, NOW + datetime.timedelta( minutes = minutes ) )
+      counts.append( len( polled["Value"] ) )
+      self.assertEqual( [ ftsJob for ftsJob in self.ftsJobs if monitor.polled( ftsJob ) ], polled["Value"] )
+      for ftsJob in polled["Value"]:
+        polls[ftsJob.FTSGUID] += 1
+    self.assertEqual( counts[0], 250 )
+    self.assertTrue( sum( counts ) < 250 * len( counts ) / 4 )
+    # # youngest FTSJob polled every few cycles, oldest every 20 minutes
+    self.assertTrue( polls[self.ftsJobs[0].FTSGUID] >= 8 )
+    self.assertEqual( polls[self.ftsJobs[-1].FTSGUID], 3 )
+
+    # # FTSJobs no longer given are forgotten
+    monitor.prefetch( self.ftsJobs[:10], NOW + datetime.timedelta( minutes = 60 ) )
+    self.assertEqual( monitor.isDue( self.ftsJobs[100], FTSMonitor.toSeconds( NOW + datetime.timedelta( minutes = 60 ) ) ),
+                      True )
+
+  def testGliteSplit( self ):
+    """ glite-transfer-status output of many FTSJobs split per FTSJob """
+    outputs = dict( [ ( ftsGUID( i ), statusOutput( ftsGUID( i ), "Active", { "Active": i } ) ) for i in range( 1, 6 ) ] )
+    outputStr = "".join( [ outputs[key] for key in sorted( outputs ) ] )
+    self.assertEqual( GliteTransferStatus().split( outputStr ), outputs )
+    self.assertEqual( GliteTransferStatus().split( "" ), {} )
+    self.assertEqual( GliteTransferStatus.command( ftsServerURL( 0 ), [ ftsGUID( 1 ), ftsGUID( 2 ) ], True ),
+                      [ "glite-transfer-status", "--verbose", "-s", ftsServerURL( 0 ), ftsGUID( 1 ), ftsGUID( 2 ), "-l" ] )
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( FTSMonitorTests )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
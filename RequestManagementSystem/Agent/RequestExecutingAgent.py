@@ -59,6 +59,8 @@ class RequestExecutingAgent( AgentModule ):
   __requestCache = {}
   # # requests/cycle
   __requestsPerCycle = 100
+  # # requests read at once from RequestDB, 0 to read them one by one
+  __bulkRequest = 10
   # # minimal nb of subprocess running
   __minProcess = 2
   # # maximal nb of subprocess executed same time
@@ -85,6 +87,8 @@ class RequestExecutingAgent( AgentModule ):
     # # ProcessPool related stuff
     self.__requestsPerCycle = self.am_getOption( "RequestsPerCycle", self.__requestsPerCycle )
     self.log.info( "Requests/cycle = %d" % self.__requestsPerCycle )
+    self.__bulkRequest = self.am_getOption( "BulkRequest", self.__bulkRequest )
+    self.log.info( "Bulk request size = %d" % self.__bulkRequest )
     self.__minProcess = self.am_getOption( "MinProcess", self.__minProcess )
     self.log.info( "ProcessPool min process = %d" % self.__minProcess )
     self.__maxProcess = self.am_getOption( "MaxProcess", 4 )
@@ -222,6 +226,22 @@ class RequestExecutingAgent( AgentModule ):
     """
     return S_OK()
 
+  def getRequests( self, numberOfRequest ):
+    """ read at most :numberOfRequest: waiting requests from RequestClient
+
+    :param int numberOfRequest: max number of requests
+    :return: S_OK( [ Request, ... ] ), empty if there is no waiting request
+    """
+    if self.__bulkRequest <= 0:
+      getRequest = self.requestClient().getRequest()
+      if not getRequest["OK"]:
+        return getRequest
+      return S_OK( [ getRequest["Value"] ] if getRequest["Value"] else [] )
+    getRequests = self.requestClient().getBulkRequests( min( numberOfRequest, self.__bulkRequest ) )
+    if not getRequests["OK"]:
+      return getRequests
+    return S_OK( getRequests["Value"].values() )
+
   def execute( self ):
     """ read requests from RequestClient and enqueue them into ProcessPool """
     gMonitor.addMark( "Iteration", 1 )
@@ -229,69 +249,78 @@ class RequestExecutingAgent( AgentModule ):
     taskCounter = 0
     while taskCounter < self.__requestsPerCycle:
       self.log.debug( "execute: executing %d request in this cycle" % taskCounter )
-      getRequest = self.requestClient().getRequest()
-      if not getRequest["OK"]:
-        self.log.error( "execute: %s" % getRequest["Message"] )
+      getRequests = self.getRequests( self.__requestsPerCycle - taskCounter )
+      if not getRequests["OK"]:
+        self.log.error( "execute: %s" % getRequests["Message"] )
         break
-      if not getRequest["Value"]:
+      if not getRequests["Value"]:
         self.log.info( "execute: no more 'Waiting' requests to process" )
         break
       # # OK, we've got you
-      request = getRequest["Value"]
-      # # set task id
-      taskID = request.RequestName
-      # # save current request in cache
-      res = self.cacheRequest( request )
-      if not res['OK']:
-        self.log.warn( res['Message'] )
-        continue
-      # # serialize to JSON
-      requestJSON = request.toJSON()
-      if not requestJSON["OK"]:
-        self.log.error( "JSON serialization error: %s" % requestJSON["Message"] )
-        break
-      requestJSON = requestJSON["Value"]
-
-      self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
-                                                                    self.processPool().getNumWorkingProcesses() ) )
-
-      looping = 0
-      while True:
-        if not self.processPool().getFreeSlots():
-          if not looping:
-            self.log.info( "No free slots available in processPool, will wait in steps of %d seconds" % self.__poolSleep )
-          time.sleep( self.__poolSleep )
-          looping += 1
-        else:
-          if looping:
-            self.log.info( "Free slot found after %d seconds" % looping * self.__poolSleep )
-          looping = 0
-          self.log.info( "spawning task for request '%s'" % ( request.RequestName ) )
-          timeOut = self.getTimeout( request )
-          enqueue = self.processPool().createAndQueueTask( RequestTask,
-                                                           kwargs = { "requestJSON" : requestJSON,
-                                                                      "handlersDict" : self.handlersDict,
-                                                                      "csPath" : self.__configPath,
-                                                                      "agentName": self.agentName },
-                                                           taskID = taskID,
-                                                           blocking = True,
-                                                           usePoolCallbacks = True,
-                                                           timeOut = timeOut )
-          if not enqueue["OK"]:
-            self.log.error( enqueue["Message"] )
-          else:
-            self.log.debug( "successfully enqueued task '%s'" % taskID )
-            # # update monitor
-            gMonitor.addMark( "Processed", 1 )
-            # # update request counter
-            taskCounter += 1
-            # # task created, a little time kick to proceed
-            time.sleep( 0.1 )
-            break
+      for request in getRequests["Value"]:
+        if self.enqueueRequest( request ):
+          taskCounter += 1
 
     # # clean return
     return S_OK()
 
+  def enqueueRequest( self, request ):
+    """ put :request: into requestCache and wait for a free slot in ProcessPool to execute it
+
+    :param Request request: Request instance
+    :return: True if the request has been enqueued
+    """
+    # # set task id
+    taskID = request.RequestName
+    # # save current request in cache
+    res = self.cacheRequest( request )
+    if not res['OK']:
+      self.log.warn( res['Message'] )
+      return False
+    # # serialize to JSON
+    requestJSON = request.toJSON()
+    if not requestJSON["OK"]:
+      self.log.error( "JSON serialization error: %s" % requestJSON["Message"] )
+      # # give it back as it is
+      self.resetRequest( taskID )
+      return False
+    requestJSON = requestJSON["Value"]
+
+    self.log.info( "processPool tasks idle = %s working = %s" % ( self.processPool().getNumIdleProcesses(),
+                                                                  self.processPool().getNumWorkingProcesses() ) )
+
+    looping = 0
+    while True:
+      if not self.processPool().getFreeSlots():
+        if not looping:
+          self.log.info( "No free slots available in processPool, will wait in steps of %d seconds" % self.__poolSleep )
+        time.sleep( self.__poolSleep )
+        looping += 1
+      else:
+        if looping:
+          self.log.info( "Free slot found after %d seconds" % ( looping * self.__poolSleep ) )
+        looping = 0
+        self.log.info( "spawning task for request '%s'" % ( request.RequestName ) )
+        timeOut = self.getTimeout( request )
+        enqueue = self.processPool().createAndQueueTask( RequestTask,
+                                                         kwargs = { "requestJSON" : requestJSON,
+                                                                    "handlersDict" : self.handlersDict,
+                                                                    "csPath" : self.__configPath,
+                                                                    "agentName": self.agentName },
+                                                         taskID = taskID,
+                                                         blocking = True,
+                                                         usePoolCallbacks = True,
+                                                         timeOut = timeOut )
+        if not enqueue["OK"]:
+          self.log.error( enqueue["Message"] )
+        else:
+          self.log.debug( "successfully enqueued task '%s'" % taskID )
+          # # update monitor
+          gMonitor.addMark( "Processed", 1 )
+          # # task created, a little time kick to proceed
+          time.sleep( 0.1 )
+          return True
+
   def getTimeout( self, request ):
     """ get timeout for request """
     timeout = 0
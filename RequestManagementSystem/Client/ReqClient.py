@@ -124,6 +124,22 @@ class ReqClient( Client ):
       return getRequest
     return S_OK( Request( getRequest["Value"] ) )
 
+  def getBulkRequests( self, numberOfRequest = 10 ):
+    """ get several requests from RequestDB at once, they are all set to 'Assigned'
+
+    :param self: self reference
+    :param int numberOfRequest: max number of requests to get
+
+    :return: S_OK( { requestName : Request instance } ) or S_ERROR
+    """
+    self.log.debug( "getBulkRequests: attempting to get %d requests." % numberOfRequest )
+    getRequests = self.requestManager().getBulkRequests( numberOfRequest )
+    if not getRequests["OK"]:
+      self.log.error( "getBulkRequests: unable to get requests: %s" % getRequests["Message"] )
+      return getRequests
+    return S_OK( dict( [ ( requestName, Request( requestJSON ) )
+                         for requestName, requestJSON in getRequests["Value"].items() ] ) )
+
   def peekRequest( self, requestName ):
     """ peek request """
     self.log.debug( "peekRequest: attempting to get request." )
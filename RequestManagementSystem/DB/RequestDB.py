@@ -273,31 +273,15 @@ class RequestDB( DB ):
       random.shuffle( reqIDs )
       requestID = reqIDs[0]
 
-    selectQuery = [ "SELECT * FROM `Request` WHERE `RequestID` = %s;" % requestID,
-                    "SELECT * FROM `Operation` WHERE `RequestID` = %s;" % requestID ]
-    selectReq = self._transaction( selectQuery )
-    if not selectReq["OK"]:
-      log.error( selectReq["Message"] )
-      return S_ERROR( selectReq["Message"] )
-    selectReq = selectReq["Value"]
-
-    request = Request( selectReq[selectQuery[0]][0] )
+    requests = self.__getRequests( [ requestID ] )
+    if not requests["OK"]:
+      log.error( requests["Message"] )
+      return requests
+    if not requests["Value"]:
+      return S_ERROR( "getRequest: request with RequestID=%s not found" % requestID )
+    request = requests["Value"][0]
     if not requestName:
       log.verbose( "selected request '%s'%s" % ( request.RequestName, ' (Assigned)' if assigned else '' ) )
-    for records in sorted( selectReq[selectQuery[1]], key = lambda k: k["Order"] ):
-      # # order is ro, remove
-      del records["Order"]
-      operation = Operation( records )
-      getFilesQuery = "SELECT * FROM `File` WHERE `OperationID` = %s;" % operation.OperationID
-      getFiles = self._transaction( getFilesQuery )
-      if not getFiles["OK"]:
-        log.error( getFiles["Message"] )
-        return getFiles
-      getFiles = getFiles["Value"][getFilesQuery]
-      for getFile in getFiles:
-        getFileDict = dict( [ ( key, value ) for key, value in getFile.items() if value != None ] )
-        operation.addFile( File( getFileDict ) )
-      request.addOperation( operation )
 
     if assigned:
       setAssigned = self._transaction( "UPDATE `Request` SET `Status` = 'Assigned', `LastUpdate`=UTC_TIMESTAMP() WHERE RequestID = %s;" % requestID )
@@ -307,6 +291,94 @@ class RequestDB( DB ):
 
     return S_OK( request )
 
+  def getBulkRequests( self, numberOfRequest = 10, assigned = True ):
+    """ read several waiting requests for execution at once
+
+    The requests are claimed in a single transaction: the candidate rows still 'Waiting' are locked
+    with SELECT ... FOR UPDATE and flagged 'Assigned' by the UPDATE with the same condition, so that
+    concurrent callers never get the same request. The claimed requests are then read with
+    three queries whatever their number of operations and files.
+
+    :param int numberOfRequest: max number of requests to read
+    :param bool assigned: flag the requests as 'Assigned'
+    :return: S_OK( [ Request, Request, ... ] )
+    """
+    log = self.log.getSubLogger( 'getBulkRequests' )
+    numberOfRequest = max( int( numberOfRequest ), 1 )
+    # # oldest and youngest waiting requests, as in getRequest
+    reqIDsQuery = [ "SELECT `RequestID` FROM `Request` WHERE `Status` = 'Waiting' ORDER BY `LastUpdate` ASC LIMIT %d;"\
+                    % max( 2 * numberOfRequest, 100 ),
+                    "SELECT `RequestID` FROM `Request` WHERE `Status` = 'Waiting' ORDER BY `LastUpdate` DESC LIMIT %d;"\
+                    % max( numberOfRequest, 50 ) ]
+    reqIDs = self._transaction( reqIDsQuery )
+    if not reqIDs["OK"]:
+      log.error( reqIDs["Message"] )
+      return reqIDs
+    reqIDs = list( set( [ reqID["RequestID"] for query in reqIDsQuery for reqID in reqIDs["Value"][query] ] ) )
+    if not reqIDs:
+      return S_OK( [] )
+    random.shuffle( reqIDs )
+    reqIDs = ",".join( [ str( reqID ) for reqID in reqIDs[:numberOfRequest] ] )
+
+    if assigned:
+      claimQuery = [ "SELECT `RequestID` FROM `Request` WHERE `RequestID` IN (%s) AND `Status` = 'Waiting' "\
+                     "FOR UPDATE;" % reqIDs,
+                     "UPDATE `Request` SET `Status` = 'Assigned', `LastUpdate` = UTC_TIMESTAMP() "\
+                     "WHERE `RequestID` IN (%s) AND `Status` = 'Waiting';" % reqIDs ]
+      claimed = self._transaction( claimQuery )
+      if not claimed["OK"]:
+        log.error( claimed["Message"] )
+        return claimed
+      reqIDs = [ reqID["RequestID"] for reqID in claimed["Value"][claimQuery[0]] ]
+    else:
+      reqIDs = [ int( reqID ) for reqID in reqIDs.split( "," ) ]
+    if not reqIDs:
+      return S_OK( [] )
+
+    requests = self.__getRequests( reqIDs )
+    if not requests["OK"]:
+      log.error( requests["Message"] )
+      return requests
+    log.verbose( "selected %d requests%s" % ( len( requests["Value"] ), ' (Assigned)' if assigned else '' ) )
+    return requests
+
+  def __getRequests( self, requestIDs ):
+    """ build Request instances with their operations and files for :requestIDs:
+
+    :param list requestIDs: list of Request.RequestID
+    :return: S_OK( [ Request, ... ] ) ordered as :requestIDs:
+    """
+    reqIDs = ",".join( [ str( int( requestID ) ) for requestID in requestIDs ] )
+    selectQuery = [ "SELECT * FROM `Request` WHERE `RequestID` IN (%s);" % reqIDs,
+                    "SELECT * FROM `Operation` WHERE `RequestID` IN (%s);" % reqIDs,
+                    "SELECT `File`.* FROM `File` JOIN `Operation` ON `File`.`OperationID` = `Operation`.`OperationID` "\
+                    "WHERE `Operation`.`RequestID` IN (%s);" % reqIDs ]
+    selectReq = self._transaction( selectQuery )
+    if not selectReq["OK"]:
+      return S_ERROR( selectReq["Message"] )
+    selectReq = selectReq["Value"]
+
+    filesDict = {}
+    for getFile in selectReq[selectQuery[2]]:
+      getFileDict = dict( [ ( key, value ) for key, value in getFile.items() if value != None ] )
+      filesDict.setdefault( getFile["OperationID"], [] ).append( getFileDict )
+    operationsDict = {}
+    for records in sorted( selectReq[selectQuery[1]], key = lambda k: k["Order"] ):
+      # # order is ro, remove
+      del records["Order"]
+      operation = Operation( records )
+      for getFileDict in sorted( filesDict.get( operation.OperationID, [] ), key = lambda k: k["FileID"] ):
+        operation.addFile( File( getFileDict ) )
+      operationsDict.setdefault( records["RequestID"], [] ).append( operation )
+
+    requestsDict = {}
+    for records in selectReq[selectQuery[0]]:
+      request = Request( records )
+      for operation in operationsDict.get( request.RequestID, [] ):
+        request.addOperation( operation )
+      requestsDict[request.RequestID] = request
+    return S_OK( [ requestsDict[requestID] for requestID in requestIDs if requestID in requestsDict ] )
+
   def peekRequest( self, requestName ):
     """ get request (ro), no update on states
 
@@ -122,6 +122,27 @@ class ReqManagerHandler( RequestHandler ):
       return toJSON
     return S_OK()
 
+  types_getBulkRequests = [ ( IntType, LongType ) ]
+  @classmethod
+  def export_getBulkRequests( cls, numberOfRequest = 10 ):
+    """ Get several requests from the database at once
+
+    :param int numberOfRequest: max number of requests to get
+    :return: S_OK( { requestName : requestJSON } )
+    """
+    getRequests = cls.__requestDB.getBulkRequests( numberOfRequest )
+    if not getRequests["OK"]:
+      gLogger.error( "getBulkRequests: %s" % getRequests["Message"] )
+      return getRequests
+    requestsJSON = {}
+    for request in getRequests["Value"]:
+      toJSON = request.toJSON()
+      if not toJSON["OK"]:
+        gLogger.error( "getBulkRequests: %s" % toJSON["Message"] )
+        return toJSON
+      requestsJSON[request.RequestName] = toJSON["Value"]
+    return S_OK( requestsJSON )
+
   types_peekRequest = [ StringTypes ]
   @classmethod
   def export_peekRequest( cls, requestName = "" ):
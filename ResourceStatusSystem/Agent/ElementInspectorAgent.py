@@ -5,7 +5,6 @@
 
 """
 
-import datetime
 import math
 import Queue
 
@@ -14,6 +13,7 @@ from DIRAC.Core.Base.AgentModule                                import AgentModu
 from DIRAC.Core.Utilities.ThreadPool                            import ThreadPool
 from DIRAC.ResourceStatusSystem.Client.ResourceStatusClient     import ResourceStatusClient
 from DIRAC.ResourceStatusSystem.Client.ResourceManagementClient import ResourceManagementClient
+from DIRAC.ResourceStatusSystem.PolicySystem.PDP                import PDP
 from DIRAC.ResourceStatusSystem.PolicySystem.PEP                import PEP
 
 
@@ -57,9 +57,11 @@ class ElementInspectorAgent( AgentModule ):
     # ElementType, to be defined among Site, Resource or Node
     self.elementType         = ''
     self.elementsToBeChecked = None
+    self.maxElementsPerCycle = 0
     self.threadPool          = None
     self.rsClient            = None
     self.clients             = {}
+    self.cycleClients        = {}
 
 
   def initialize( self ):
@@ -70,6 +72,8 @@ class ElementInspectorAgent( AgentModule ):
     self.threadPool    = ThreadPool( maxNumberOfThreads, maxNumberOfThreads )
        
     self.elementType = self.am_getOption( 'elementType', self.elementType )   
+    # Bounds the elements checked per cycle, 0 means all the elements due
+    self.maxElementsPerCycle = self.am_getOption( 'maxElementsPerCycle', self.maxElementsPerCycle )
     self.rsClient    = ResourceStatusClient()
 
     self.clients[ 'ResourceStatusClient' ]     = self.rsClient
@@ -97,6 +101,16 @@ class ElementInspectorAgent( AgentModule ):
       self.log.error( elementsToBeChecked[ 'Message' ] )
       return elementsToBeChecked
     self.elementsToBeChecked = elementsToBeChecked[ 'Value' ]
+    
+    # The cache lookups of the policies of all the elements are done at once, 
+    # one bulk query per cache table, the policies are evaluated afterwards from
+    # the prefetched results.
+    self.cycleClients = PDP( self.clients ).prefetchCommands( list( self.elementsToBeChecked.queue ) )
+    if not self.cycleClients[ 'OK' ]:
+      self.log.error( self.cycleClients[ 'Message' ] )
+      self.cycleClients = self.clients
+    else:
+      self.cycleClients = self.cycleClients[ 'Value' ]  
        
     queueSize   = self.elementsToBeChecked.qsize()
     pollingTime = self.am_getPollingTime()
@@ -125,41 +139,28 @@ class ElementInspectorAgent( AgentModule ):
   def getElementsToBeChecked( self ):
     """ getElementsToBeChecked
     
-    This method gets all the rows in the <self.elementType>Status table, and then
-    discards entries with TokenOwner != rs_svc. On top of that, there are check
-    frequencies that are applied: depending on the current status of the element,
-    they will be checked more or less often.
+    This method gets from the <self.elementType>Status table the elements with 
+    TokenOwner == rs_svc that are due for a check. There are check frequencies 
+    that are applied: depending on the current status of the element, they will
+    be checked more or less often. The selection is done by the database, and 
+    the most overdue elements come first. If maxElementsPerCycle is set, only
+    that many are checked, the rest being left for the next cycles.
     
     """
     
     toBeChecked = Queue.Queue()
     
-    # We get all the elements, then we filter.
-    elements = self.rsClient.selectStatusElement( self.elementType, 'Status' )
+    elements = self.rsClient.getElementsToBeChecked( self.elementType, self.__checkingFreqs,
+                                                     tokenOwner = 'rs_svc', 
+                                                     limit = self.maxElementsPerCycle )
     if not elements[ 'OK' ]:
       return elements
       
-    utcnow = datetime.datetime.utcnow().replace( microsecond = 0 )  
-       
-    # filter elements by Type
     for element in elements[ 'Value' ]:
       
       # Maybe an overkill, but this way I have NEVER again to worry about order
       # of elements returned by mySQL on tuples
       elemDict = dict( zip( elements[ 'Columns' ], element ) )
-      
-      # This if-clause skips all the elements that are should not be checked yet
-      timeToNextCheck = self.__checkingFreqs[ elemDict[ 'Status' ] ]
-      if utcnow <= elemDict[ 'LastCheckTime' ] + datetime.timedelta( minutes = timeToNextCheck ):
-        continue
-      
-      # We skip the elements with token different than "rs_svc"
-      if elemDict[ 'TokenOwner' ] != 'rs_svc':
-        self.log.verbose( 'Skipping %s ( %s ) with token %s' % ( elemDict[ 'Name' ],
-                                                                 elemDict[ 'StatusType' ],
-                                                                 elemDict[ 'TokenOwner' ]
-                                                               ))
-        continue
               
       # We are not checking if the item is already on the queue or not. It may
       # be there, but in any case, it is not a big problem.
@@ -188,7 +189,7 @@ class ElementInspectorAgent( AgentModule ):
       queue, the loop is finished.
     """
 
-    pep = PEP( clients = self.clients )
+    pep = PEP( clients = self.cycleClients )
     
     while True:
     
@@ -5,6 +5,8 @@
 
 '''
 
+from datetime                                        import datetime, timedelta
+
 from DIRAC                                           import gLogger, S_OK, S_ERROR
 from DIRAC.Core.DISET.RPCClient                      import RPCClient                   
 #from DIRAC.ResourceStatusSystem.DB.ResourceStatusDB  import ResourceStatusDB 
@@ -360,6 +362,60 @@ class ResourceStatusClient( object ):
     meta = { 'onlyUniqueKeys' : True }
     return self._query( 'addIfNotThere', locals() )
 
+  ##############################################################################
+  # Boosters
+  
+  def getElementsToBeChecked( self, element, checkingFreqs, tokenOwner = 'rs_svc', 
+                              limit = None ):
+    '''
+    Gets from <element>Status the rows due for a new check, the most overdue 
+    first. A row is due if its LastCheckTime is older than the checking frequency
+    of its status. The selection is done by the database, one query per status
+    on the ( Status, LastCheckTime ) index, each returning at most `limit` rows.
+    
+    :Parameters:
+      **element** - `string`
+        it has to be a valid element ( ValidElement ), any of the defaults: `Site` \
+        | `Resource` | `Node`
+      **checkingFreqs** - `dict`
+        minutes between two checks per status, rows with other statuses are not
+        selected  
+      **tokenOwner** - `string`
+        token the rows must have
+      **limit** - `[, int]`
+        maximum number of rows returned, the most overdue ones  
+    
+    :return: S_OK( rows ) with the `Columns` key, as the select methods || S_ERROR()
+    '''
+    
+    utcnow = datetime.utcnow().replace( microsecond = 0 )
+    
+    columns, dueRows = [], []
+    for status, checkingFreq in checkingFreqs.items():
+      
+      checkingFreq = timedelta( minutes = checkingFreq )
+      meta = { 'older' : ( 'LastCheckTime', utcnow - checkingFreq ), 'order' : 'LastCheckTime' }
+      if limit:
+        meta[ 'limit' ] = int( limit )
+      
+      statusRows = self.selectStatusElement( element, 'Status', status = status, 
+                                             tokenOwner = tokenOwner, meta = meta )
+      if not statusRows[ 'OK' ]:
+        return statusRows
+      
+      columns = statusRows[ 'Columns' ]
+      lastCheckTime = columns.index( 'LastCheckTime' )
+      # rows of a status are ordered by LastCheckTime, hence by due time
+      dueRows.extend( [ ( row[ lastCheckTime ] + checkingFreq, row ) for row in statusRows[ 'Value' ] ] )
+    
+    dueRows.sort( key = lambda dueRow: dueRow[ 0 ] )
+    if limit:
+      dueRows = dueRows[ :int( limit ) ]
+    
+    result = S_OK( [ row for _dueTime, row in dueRows ] )
+    result[ 'Columns' ] = columns
+    return result
+
   ##############################################################################
   # Protected methods - Use carefully !!
 
@@ -0,0 +1,170 @@
+# $HeadURL $
+''' Test_RSS_Client_ElementsToBeChecked
+
+  ResourceStatusClient.getElementsToBeChecked against a local database seeded
+  with a large number of elements. The database is an in memory sqlite one, the
+  queries being built by the DIRAC MySQL class.
+'''
+
+import datetime
+import random
+import sqlite3
+import unittest
+
+from DIRAC                                          import gLogger, S_OK
+from DIRAC.Core.Utilities.MySQL                     import MySQL
+from DIRAC.ResourceStatusSystem.DB.ResourceStatusDB import ResourceStatusDB
+from DIRAC.ResourceStatusSystem.Client.ResourceStatusClient import ResourceStatusClient
+
+__RCSID__ = '$Id: $'
+
+ELEMENTS       = 50000
+CHECKING_FREQS = { 'Active' : 20, 'Degraded' : 20, 'Probing' : 20, 'Banned' : 15, 'Unknown' : 10, 'Error' : 5 }
+
+################################################################################
+
+class SQLiteMySQL( MySQL ):
+  ''' MySQL on an in memory sqlite database, recording the queries and the rows
+  they return
+  '''
+
+  def __init__( self ):
+    # pylint: disable-msg=W0231
+    self.log        = gLogger.getSubLogger( 'SQLiteMySQL' )
+    self.connection = sqlite3.connect( ':memory:', detect_types = sqlite3.PARSE_DECLTYPES )
+    self.queries    = []
+    self.rows       = 0
+
+  def _MySQL__escapeString( self, myString ):
+    return S_OK( "'%s'" % str( myString ).replace( "'", "''" ) )
+
+  def _query( self, cmd, conn = None, debug = False ):
+    rows = tuple( self.connection.execute( cmd ).fetchall() )
+    self.queries.append( cmd )
+    self.rows += len( rows )
+    return S_OK( rows )
+
+  def createTable( self, tableName, tableDefinition ):
+    ''' sqlite version of the table, TIMESTAMP being converted to datetime '''
+    fields = [ '%s %s' % ( field, fieldType.replace( 'DATETIME', 'TIMESTAMP' ) )
+               for field, fieldType in tableDefinition[ 'Fields' ].items() ]
+    fields.append( 'PRIMARY KEY ( %s )' % ', '.join( tableDefinition[ 'PrimaryKey' ] ) )
+    self.connection.execute( 'CREATE TABLE %s ( %s )' % ( tableName, ', '.join( fields ) ) )
+    for indexName, indexedFields in tableDefinition[ 'Indexes' ].items():
+      self.connection.execute( 'CREATE INDEX %s ON %s ( %s )' % ( indexName, tableName, ', '.join( indexedFields ) ) )
+
+################################################################################
+
+class ElementsToBeChecked_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    '''
+    Setup: ELEMENTS sites checked in the last hour, one out of ten with another
+    token owner. Check times are at half minutes, such that no element becomes
+    due while a test runs.
+    '''
+
+    self.database = SQLiteMySQL()
+    rsDB          = ResourceStatusDB( mySQL = self.database )
+    self.database.createTable( 'SiteStatus', rsDB.getTable( 'SiteStatus' )[ 'Value' ] )
+    self.client   = ResourceStatusClient( serviceIn = rsDB )
+
+    rand     = random.Random( 1234 )
+    statuses = sorted( CHECKING_FREQS ) + [ 'Retired' ]
+    utcnow   = datetime.datetime.utcnow().replace( microsecond = 0 )
+    self.database.connection.executemany( 'INSERT INTO SiteStatus ( Name, StatusType, Status, ElementType, Reason, '
+                                          'DateEffective, LastCheckTime, TokenOwner, TokenExpiration ) '
+                                          'VALUES ( ?, "all", ?, "Site", "Seeded", ?, ?, ?, ? )',
+                                          [ ( 'LCG.Site%06d.org' % i, rand.choice( statuses ), utcnow,
+                                              utcnow - datetime.timedelta( minutes = rand.randint( 0, 60 ), seconds = 30 ),
+                                              'rs_svc' if i % 10 else 'someone',
+                                              datetime.datetime( 9999, 12, 31, 23, 59, 59 ) )
+                                            for i in range( ELEMENTS ) ] )
+
+  def tearDown( self ):
+    '''
+    TearDown
+    '''
+    del self.client
+    del self.database
+
+  def getDueElements( self ):
+    ''' the former selection: all the table, filtered in python '''
+    rows = self.database.connection.execute( 'SELECT Name, Status, LastCheckTime, TokenOwner FROM SiteStatus' )
+    utcnow = datetime.datetime.utcnow().replace( microsecond = 0 )
+    due = []
+    for name, status, lastCheckTime, tokenOwner in rows:
+      if not status in CHECKING_FREQS or tokenOwner != 'rs_svc':
+        continue
+      dueTime = lastCheckTime + datetime.timedelta( minutes = CHECKING_FREQS[ status ] )
+      if utcnow > dueTime:
+        due.append( ( dueTime, name ) )
+    return sorted( due )
+
+  def getNames( self, result ):
+    self.assertTrue( result[ 'OK' ] )
+    return [ row[ result[ 'Columns' ].index( 'Name' ) ] for row in result[ 'Value' ] ]
+
+  def getDueTimes( self, result ):
+    lastCheckTime = result[ 'Columns' ].index( 'LastCheckTime' )
+    status        = result[ 'Columns' ].index( 'Status' )
+    return [ row[ lastCheckTime ] + datetime.timedelta( minutes = CHECKING_FREQS[ row[ status ] ] )
+             for row in result[ 'Value' ] ]
+
+################################################################################
+# Tests
+
+class ElementsToBeChecked_Success( ElementsToBeChecked_TestCase ):
+
+  def test_due( self ):
+    ''' the due elements, most overdue first, only them transferred
+    '''
+    expected = self.getDueElements()
+    self.assertTrue( 0 < len( expected ) < ELEMENTS )
+
+    res = self.client.getElementsToBeChecked( 'Site', CHECKING_FREQS )
+    self.assertEqual( sorted( self.getNames( res ) ), sorted( [ name for _dueTime, name in expected ] ) )
+    self.assertEqual( self.getDueTimes( res ), [ dueTime for dueTime, _name in expected ] )
+    self.assertEqual( self.database.rows, len( expected ) )
+    self.assertEqual( len( self.database.queries ), len( CHECKING_FREQS ) )
+
+  def test_index( self ):
+    ''' the queries use the ( Status, LastCheckTime ) index
+    '''
+    self.client.getElementsToBeChecked( 'Site', CHECKING_FREQS, limit = 100 )
+    for query in self.database.queries:
+      plan = ' '.join( [ str( step ) for step in self.database.connection.execute( 'EXPLAIN QUERY PLAN ' + query ) ] )
+      self.assertTrue( 'StatusLastCheckTime' in plan, plan )
+      self.assertFalse( 'TEMP B-TREE' in plan, plan )
+
+  def test_limit( self ):
+    ''' bounded batches: the most overdue first, all the due elements over a few cycles
+    '''
+    expected = self.getDueElements()
+    limit    = len( expected ) / 4 + 1
+
+    res = self.client.getElementsToBeChecked( 'Site', CHECKING_FREQS, limit = limit )
+    self.assertEqual( self.getDueTimes( res ), [ dueTime for dueTime, _name in expected[ :limit ] ] )
+    self.assertTrue( self.database.rows <= limit * len( CHECKING_FREQS ) )
+
+    # The elements checked get a new LastCheckTime, the next batches take the others
+    checked = []
+    for _cycle in range( 4 ):
+      names = self.getNames( self.client.getElementsToBeChecked( 'Site', CHECKING_FREQS, limit = limit ) )
+      self.assertTrue( len( names ) <= limit )
+      checked.extend( names )
+      self.database.connection.executemany( 'UPDATE SiteStatus SET LastCheckTime = ? WHERE Name = ?',
+                                            [ ( datetime.datetime.utcnow().replace( microsecond = 0 ), name )
+                                              for name in names ] )
+    self.assertEqual( sorted( checked ), sorted( [ name for _dueTime, name in expected ] ) )
+    self.assertEqual( self.getNames( self.client.getElementsToBeChecked( 'Site', CHECKING_FREQS ) ), [] )
+
+################################################################################
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ElementsToBeChecked_TestCase )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( ElementsToBeChecked_Success ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
+
+#...............................................................................
+#EOF
@@ -35,7 +35,9 @@ class ResourceStatusDB( object ):
                      'TokenExpiration' : 'DATETIME NOT NULL DEFAULT "9999-12-31 23:59:59"'
                     },
                     #FIXME: elementType is needed to be part of the key ??
-                    'PrimaryKey' : [ 'Name', 'StatusType' ]#, 'ElementType' ]              
+                    'PrimaryKey' : [ 'Name', 'StatusType' ],#, 'ElementType' ]
+                    # Used to select the elements due for a check  
+                    'Indexes'    : { 'StatusLastCheckTime' : [ 'Status', 'LastCheckTime' ] }              
                                     }
     
   _tablesLike[ 'ElementWithID' ]       = { 'Fields' : 
@@ -415,6 +417,10 @@ class ResourceStatusDB( object ):
       
     for tableName in tablesCreated:
       if tableName in tables:
+        # Indexes added to the schema after the table was created
+        indexesRes = self.__createIndexes( tableName, tables[ tableName ] )
+        if not indexesRes[ 'OK' ]:
+          return indexesRes
         del tables[ tableName ]  
               
     res = self.database._createTables( tables )
@@ -428,6 +434,31 @@ class ResourceStatusDB( object ):
       res[ 'Value' ] = 'Tables created: %s' % ( ','.join( tables.keys() ) )
     return res       
 
+  def __createIndexes( self, tableName, tableDefinition ):
+    '''
+      Adds to an existing table the indexes of its definition it does not have.
+    '''
+    
+    if not 'Indexes' in tableDefinition:
+      return S_OK()
+    
+    # Horrible SQL here too !!
+    indexesRes = self.database._query( "SHOW INDEX FROM `%s`" % tableName )
+    if not indexesRes[ 'OK' ]:
+      return indexesRes
+    # Key_name is the third column
+    indexesCreated = set( [ index[ 2 ] for index in indexesRes[ 'Value' ] ] )
+    
+    for indexName, indexedFields in tableDefinition[ 'Indexes' ].items():
+      if indexName in indexesCreated:
+        continue
+      res = self.database._update( "ALTER TABLE `%s` ADD INDEX `%s` ( `%s` )" % ( tableName, indexName,
+                                                                                  '`, `'.join( indexedFields ) ) )
+      if not res[ 'OK' ]:
+        return res
+      
+    return S_OK()
+
   def __generateTables( self ):
     '''
       Method used to transform the class variables into instance variables,
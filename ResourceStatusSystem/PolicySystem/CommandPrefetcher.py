@@ -0,0 +1,279 @@
+# $HeadURL $
+""" CommandPrefetcher
+
+  CommandPrefetcher is used by the PDP to evaluate the policies of many elements
+  at once. Instead of letting every command of every policy look up its cache
+  table ( DowntimeCache, JobCache, PilotCache... ) for a single element, it:
+
+  1. runs the doCache method of the commands against a RecordingClient, which
+     records the select calls without contacting the ResourceManagement service
+  2. merges the recorded lookups of a cache table into a single bulk select, the
+     ResourceManagementClient accepting lists of values
+  3. returns the clients to be used by the commands, where the ResourceManagementClient
+     is a PrefetchedClient serving the recorded lookups from the prefetched rows
+
+  Lookups that were not recorded and all other calls go to the real client. A
+  write on a cache table ( e.g. addOrModifyJobCache, from doNew ) drops the rows
+  prefetched for it, such that the following lookups see the new values.
+
+"""
+
+import inspect
+import threading
+
+from DIRAC                                                      import gLogger, S_OK, S_ERROR
+from DIRAC.ResourceStatusSystem.Client.ResourceManagementClient import ResourceManagementClient
+from DIRAC.ResourceStatusSystem.Command                         import CommandCaller
+
+__RCSID__  = '$Id: $'
+
+# Prefixes of the ResourceManagementClient methods modifying a table
+WRITE_PREFIXES = ( 'insert', 'update', 'delete', 'addOrModify', 'addIfNotThere' )
+
+
+def getLookupParams( client, methodName, args, kwargs ):
+  """ Maps the arguments of a select call to a dictionary { parameter : value },
+  dropping the parameters set to None. Returns None for calls with meta, which
+  are not prefetched.
+  """
+
+  argNames = inspect.getargspec( getattr( client, methodName ) )[ 0 ][ 1: ]
+  params = dict( zip( argNames, args ) )
+  params.update( kwargs )
+  if params.pop( 'meta', None ) is not None:
+    return None
+  return dict( [ ( key, value ) for key, value in params.items() if value is not None ] )
+
+
+def getLookupKey( methodName, params ):
+  """ Hashable key of a select call
+  """
+
+  items = []
+  for key, value in sorted( params.items() ):
+    if isinstance( value, list ):
+      value = tuple( value )
+    items.append( ( key, value ) )
+  return ( methodName, tuple( items ) )
+
+
+class RecordingClient( object ):
+  """ RecordingClient
+
+  ResourceManagementClient stand-in used while running the commands doCache
+  methods: the select calls are recorded and answered with no rows, any other
+  call fails.
+  """
+
+  def __init__( self, client ):
+    """ Constructor
+
+    :Parameters:
+      **client** - `ResourceManagementClient`
+        real client, used to resolve the select methods arguments
+    """
+
+    self.client  = client
+    # methodName -> { lookupKey : params }
+    self.lookups = {}
+
+  def __getattr__( self, name ):
+
+    if not name.startswith( 'select' ):
+      def notRecorded( *_args, **_kwargs ):
+        return S_ERROR( '%s not available while prefetching' % name )
+      return notRecorded
+
+    def record( *args, **kwargs ):
+      params = getLookupParams( self.client, name, args, kwargs )
+      if params is not None:
+        self.lookups.setdefault( name, {} )[ getLookupKey( name, params ) ] = params
+      result = S_OK( [] )
+      result[ 'Columns' ] = []
+      return result
+    return record
+
+
+class PrefetchedClient( object ):
+  """ PrefetchedClient
+
+  ResourceManagementClient wrapper serving the select calls recorded by a
+  RecordingClient from rows fetched with one bulk select per method.
+  """
+
+  def __init__( self, client ):
+    """ Constructor
+
+    :Parameters:
+      **client** - `ResourceManagementClient`
+        real client, used for the bulk selects and everything not prefetched
+    """
+
+    self.client     = client
+    # methodName -> ( columns, { lookupKey : rows } )
+    self.prefetched = {}
+    self.lock       = threading.Lock()
+
+  def prefetch( self, lookups ):
+    """ Runs the bulk selects. The lookups of a method are grouped by the set of
+    parameters they use, which gives one select per method for the commands of
+    the RSS ( e.g. all JobCommands look up JobCache by site ). The rows of every
+    lookup are then picked from the result of its group through a hash index.
+
+    :Parameters:
+      **lookups** - `dict`
+        { methodName : { lookupKey : params } } as recorded by the RecordingClient
+
+    :return: S_OK( number of bulk selects ) / S_ERROR
+    """
+
+    queries = 0
+    for methodName, methodLookups in lookups.items():
+
+      groups = {}
+      for lookupKey, params in methodLookups.items():
+        groups.setdefault( tuple( sorted( params ) ), [] ).append( ( lookupKey, params ) )
+
+      columns, served = None, {}
+      for paramNames, groupLookups in groups.items():
+
+        query = {}
+        for paramName in paramNames:
+          values = set()
+          for _lookupKey, params in groupLookups:
+            if isinstance( params[ paramName ], ( list, tuple ) ):
+              values.update( params[ paramName ] )
+            else:
+              values.add( params[ paramName ] )
+          query[ paramName ] = sorted( values )
+
+        result = getattr( self.client, methodName )( **query )
+        queries += 1
+        if not result[ 'OK' ]:
+          return result
+
+        columns = result[ 'Columns' ]
+        # Parameters are the lower camel case column names, the lookups of a group
+        # whose parameters are not all columns are not served
+        paramColumns = [ paramName[ 0 ].upper() + paramName[ 1: ] for paramName in paramNames ]
+        if [ column for column in paramColumns if not column in columns ]:
+          continue
+        indexes = [ columns.index( column ) for column in paramColumns ]
+
+        rows = [ tuple( row ) for row in result[ 'Value' ] ]
+        rowsByValues = {}
+        for row in rows:
+          rowsByValues.setdefault( tuple( [ row[ index ] for index in indexes ] ), [] ).append( row )
+
+        for lookupKey, params in groupLookups:
+          values = [ params[ paramName ] for paramName in paramNames ]
+          if [ value for value in values if isinstance( value, ( list, tuple ) ) ]:
+            filters = [ ( index, value if isinstance( value, ( list, tuple ) ) else [ value ] )
+                        for index, value in zip( indexes, values ) ]
+            served[ lookupKey ] = [ row for row in rows
+                                    if all( [ row[ index ] in accepted for index, accepted in filters ] ) ]
+          else:
+            served[ lookupKey ] = rowsByValues.get( tuple( values ), [] )
+
+      self.prefetched[ methodName ] = ( columns, served )
+
+    return S_OK( queries )
+
+  def __getattr__( self, name ):
+
+    if name.startswith( 'select' ):
+      def select( *args, **kwargs ):
+        return self.__select( name, args, kwargs )
+      return select
+
+    for prefix in WRITE_PREFIXES:
+      if name.startswith( prefix ):
+        def write( *args, **kwargs ):
+          with self.lock:
+            self.prefetched.pop( 'select' + name[ len( prefix ): ], None )
+          return getattr( self.client, name )( *args, **kwargs )
+        return write
+
+    return getattr( self.client, name )
+
+  def __select( self, methodName, args, kwargs ):
+    """ Serves a select call from the prefetched rows if it was recorded, calls
+    the real client otherwise.
+    """
+
+    with self.lock:
+      prefetched = self.prefetched.get( methodName )
+
+    params = getLookupParams( self.client, methodName, args, kwargs )
+    if prefetched is None or params is None:
+      return getattr( self.client, methodName )( *args, **kwargs )
+
+    columns, served = prefetched
+    lookupKey = getLookupKey( methodName, params )
+    if not lookupKey in served:
+      return getattr( self.client, methodName )( *args, **kwargs )
+
+    result = S_OK( [ list( row ) for row in served[ lookupKey ] ] )
+    result[ 'Columns' ] = list( columns )
+    return result
+
+
+class CommandPrefetcher( object ):
+  """ CommandPrefetcher
+  """
+
+  def __init__( self, clients = None ):
+    """ Constructor
+
+    :Parameters:
+      **clients** - [ None, `dict` ]
+        clients to be used in the commands, as given to the PDP
+    """
+
+    self.clients = {}
+    if clients is not None:
+      self.clients = clients
+    self.log = gLogger.getSubLogger( 'CommandPrefetcher' )
+
+  def prefetch( self, commands ):
+    """ Prefetches the cache lookups of the commands
+
+    :Parameters:
+      **commands** - `list`
+        list of tuples ( commandTuple, policy args, decisionParams ), as given to
+        CommandCaller.commandInvocation
+
+    :return: S_OK( clients ) / S_ERROR, the clients to be used to run the commands
+    """
+
+    if 'ResourceManagementClient' in self.clients:
+      rmClient = self.clients[ 'ResourceManagementClient' ]
+    else:
+      rmClient = ResourceManagementClient()
+
+    recorder = RecordingClient( rmClient )
+    recordingClients = dict( self.clients )
+    recordingClients[ 'ResourceManagementClient' ] = recorder
+
+    for commandTuple, pArgs, decisionParams in commands:
+      command = CommandCaller.commandInvocation( commandTuple, pArgs, decisionParams, recordingClients )
+      if not command[ 'OK' ] or command[ 'Value' ] is None:
+        continue
+      # Misconfigured elements fail here as they will fail when evaluated
+      command[ 'Value' ].doCache()
+
+    prefetchedClient = PrefetchedClient( rmClient )
+    queries = prefetchedClient.prefetch( recorder.lookups )
+    if not queries[ 'OK' ]:
+      return queries
+
+    lookups = sum( [ len( methodLookups ) for methodLookups in recorder.lookups.values() ] )
+    self.log.verbose( '%d commands, %d lookups prefetched with %d queries' % ( len( commands ), lookups,
+                                                                               queries[ 'Value' ] ) )
+
+    clients = dict( self.clients )
+    clients[ 'ResourceManagementClient' ] = prefetchedClient
+    return S_OK( clients )
+
+#...............................................................................
+#EOF
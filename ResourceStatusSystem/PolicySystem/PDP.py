@@ -8,11 +8,12 @@
 
 """
 
-from DIRAC                                                import gLogger, S_OK, S_ERROR 
-from DIRAC.ResourceStatusSystem.PolicySystem.PolicyCaller import PolicyCaller
-from DIRAC.ResourceStatusSystem.PolicySystem.StateMachine import RSSMachine
-from DIRAC.ResourceStatusSystem.Utilities                 import RssConfiguration
-from DIRAC.ResourceStatusSystem.Utilities.InfoGetter      import InfoGetter
+from DIRAC                                                     import gLogger, S_OK, S_ERROR 
+from DIRAC.ResourceStatusSystem.PolicySystem.CommandPrefetcher import CommandPrefetcher
+from DIRAC.ResourceStatusSystem.PolicySystem.PolicyCaller      import PolicyCaller
+from DIRAC.ResourceStatusSystem.PolicySystem.StateMachine      import RSSMachine
+from DIRAC.ResourceStatusSystem.Utilities                      import RssConfiguration
+from DIRAC.ResourceStatusSystem.Utilities.InfoGetter           import InfoGetter
 
 __RCSID__  = '$Id: $'
 
@@ -41,6 +42,7 @@ class PDP:
     # Helpers to discover policies and RSS metadata in CS
     self.iGetter         = InfoGetter()    
     self.pCaller         = PolicyCaller( clients )
+    self.clients         = clients
   
     # RSS State Machine, used to calculate most penalizing state while merging them
     self.rssMachine      = RSSMachine( 'Unknown' )
@@ -168,6 +170,72 @@ class PDP:
                 )
 
 
+  def takeDecisions( self, decisionParamsList ):
+    """ batch version of takeDecision. The cache lookups done by the commands of
+    the policies that apply to all the elements are prefetched with one bulk query
+    per cache table ( see CommandPrefetcher ), then the decisions are taken as in
+    takeDecision, one element after the other.
+    
+    examples:
+      >>> pdp.takeDecisions( [ { 'element' : 'Site', 'name' : 'MySite', ... }, ... ] )[ 'Value' ]
+          [ S_OK( { 'singlePolicyResults' : ..., 'policyCombinedResult' : ..., 
+                    'decissionParams' : ... } ), ... ]
+    
+    :Parameters:
+      **decisionParamsList** - `list( dict )`
+        list of decisionParams, see setup
+    
+    :return: S_OK( list of takeDecision results, in the same order ) / S_ERROR
+    
+    """
+    
+    clients = self.prefetchCommands( decisionParamsList )
+    if not clients[ 'OK' ]:
+      return clients
+    
+    pCaller      = self.pCaller
+    self.pCaller = PolicyCaller( clients[ 'Value' ] )
+    try:
+      decisions = []
+      for decisionParams in decisionParamsList:
+        self.setup( decisionParams )
+        decisions.append( self.takeDecision() )
+    finally:
+      self.pCaller = pCaller
+      
+    return S_OK( decisions )  
+
+
+  def prefetchCommands( self, decisionParamsList ):
+    """ finds the policies that apply to every element of decisionParamsList and
+    prefetches the cache lookups of their commands. Leaves the PDP setup with the
+    last element.
+    
+    :Parameters:
+      **decisionParamsList** - `list( dict )`
+        list of decisionParams, see setup
+    
+    :return: S_OK( clients ) / S_ERROR, where clients can be given to a PDP or PEP
+      to evaluate the policies of these elements without further cache lookups
+    
+    """
+    
+    commands = []
+    for decisionParams in decisionParamsList:
+      
+      self.setup( decisionParams )
+      policiesThatApply = self.iGetter.getPoliciesThatApply( self.decisionParams )
+      if not policiesThatApply[ 'OK' ]:
+        # takeDecision will return the error for this element 
+        continue
+      
+      for policyDict in policiesThatApply[ 'Value' ]:
+        if policyDict.get( 'command' ) is not None:
+          commands.append( ( policyDict[ 'command' ], policyDict.get( 'args' ), self.decisionParams ) )
+    
+    return CommandPrefetcher( self.clients ).prefetch( commands )
+
+
   def _runPolicies( self, policies ):
     """ Given a list of policy dictionaries, loads them making use of the PolicyCaller
     and evaluates them. This method requires to have run setup previously.
@@ -0,0 +1,192 @@
+# $HeadURL $
+""" PDPBenchmark
+
+  Cache lookups and time needed by the PDP to take the decisions of a grid of
+  sites and CEs, one element after the other ( takeDecision ) and in batch
+  ( takeDecisions, the command results being prefetched ).
+
+  The ResourceManagementClient is a stub serving the DowntimeCache, JobCache and
+  PilotCache tables from memory, counting the lookups and adding a latency to
+  each of them ( the round trip to the ResourceManagement service, 2 ms by
+  default ). The policies that apply to every element are given by a stub InfoGetter:
+
+  - Site     : DTOngoing, DTScheduled, 4 Job policies, PilotInstantEfficiency
+  - Resource : DTOngoing, DTScheduled, PilotInstantEfficiency
+
+  The decisions of both modes are checked to be the same.
+
+  usage: python PDPBenchmark.py [nSites] [cesPerSite] [latencyMs]
+"""
+
+import datetime
+import time
+
+from DIRAC.Core.Base import Script
+Script.parseCommandLine()
+
+from DIRAC                                              import S_OK
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+from DIRAC.Core.Utilities.CFG                           import CFG
+from DIRAC.ResourceStatusSystem.Policy.Configurations   import POLICIESMETA
+from DIRAC.ResourceStatusSystem.PolicySystem.PDP        import PDP
+
+__RCSID__ = '$Id: $'
+
+SITE_POLICIES     = [ 'DTOngoing', 'DTScheduled', 'JobDoneRatio', 'JobEfficiency',
+                      'JobRunningMatchedRatio', 'JobRunningWaitingRatio', 'PilotInstantEfficiency' ]
+RESOURCE_POLICIES = [ 'DTOngoing', 'DTScheduled', 'PilotInstantEfficiency' ]
+
+JOB_COLUMNS   = [ 'Site', 'MaskStatus', 'Efficiency', 'Status', 'LastCheckTime', 'Completed', 'Done',
+                  'Failed', 'Running', 'Matched', 'Received', 'Checking', 'Waiting', 'Staging' ]
+PILOT_COLUMNS = [ 'Site', 'CE', 'PilotsPerJob', 'PilotJobEff', 'Status', 'LastCheckTime', 'Aborted',
+                  'Done', 'Failed' ]
+DT_COLUMNS    = [ 'DowntimeID', 'Element', 'Name', 'StartDate', 'EndDate', 'Severity', 'Description',
+                  'Link', 'DateEffective', 'LastCheckTime' ]
+
+
+class StubResourceManagementClient( object ):
+  """ cache tables in memory, counting the select calls
+  """
+
+  def __init__( self, tables, latency ):
+    self.tables  = tables
+    self.latency = latency
+    self.lookups = 0
+
+  def __select( self, tableName, parameters ):
+    self.lookups += 1
+    time.sleep( self.latency )
+    del parameters[ 'self' ]
+    del parameters[ 'meta' ]
+    columns, rows = self.tables[ tableName ]
+    for key, value in parameters.items():
+      if value is None:
+        continue
+      if not isinstance( value, list ):
+        value = [ value ]
+      index = columns.index( key[ 0 ].upper() + key[ 1: ] )
+      rows  = [ row for row in rows if row[ index ] in value ]
+    result = S_OK( [ list( row ) for row in rows ] )
+    result[ 'Columns' ] = list( columns )
+    return result
+
+  def selectDowntimeCache( self, downtimeID = None, element = None, name = None,
+                           startDate = None, endDate = None, severity = None,
+                           description = None, link = None, dateEffective = None,
+                           lastCheckTime = None, meta = None ):
+    return self.__select( 'DowntimeCache', locals() )
+
+  def selectJobCache( self, site = None, maskStatus = None, efficiency = None,
+                      status = None, lastCheckTime = None, meta = None ):
+    return self.__select( 'JobCache', locals() )
+
+  def selectPilotCache( self, site = None, cE = None, pilotsPerJob = None,
+                        pilotJobEff = None, status = None, lastCheckTime = None,
+                        meta = None ):
+    return self.__select( 'PilotCache', locals() )
+
+
+class StubInfoGetter( object ):
+  """ fixed policies per element, no actions
+  """
+
+  @staticmethod
+  def getPoliciesThatApply( decisionParams ):
+    policyNames = SITE_POLICIES if decisionParams[ 'element' ] == 'Site' else RESOURCE_POLICIES
+    policies = []
+    for policyName in policyNames:
+      policyDict = { 'name' : policyName, 'type' : policyName }
+      policyDict.update( POLICIESMETA[ policyName ] )
+      policies.append( policyDict )
+    return S_OK( policies )
+
+  @staticmethod
+  def getPolicyActionsThatApply( _decisionParams, _singlePolicyResults, _policyCombinedResults ):
+    return S_OK( [] )
+
+
+def makeGrid( nSites, cesPerSite ):
+  """ sites in the local CS, their elements and cache tables, one element out
+  of ten in downtime
+  """
+
+  now      = datetime.datetime.utcnow().replace( microsecond = 0 )
+  elements = []
+  jobRows, pilotRows, dtRows = [], [], []
+  cfg = ''
+  for i in range( nSites ):
+    site = 'LCG.Site%03d.org' % i
+    cfg += '      %s\n      {\n        Name = SITE%03d\n      }\n' % ( site, i )
+    elements.append( { 'element' : 'Site', 'name' : site, 'elementType' : 'Site',
+                       'statusType' : 'all', 'status' : 'Active', 'tokenOwner' : 'rs_svc' } )
+    jobRows.append( ( site, 'Active', 90., 'Good', now, 50 + i % 50, 100, i % 20, 100, 10, 5, 5, 10, 0 ) )
+    pilotRows.append( ( site, 'Multiple', 1., 95., 'Good', now, i % 30, 200, 5 ) )
+    for j in range( cesPerSite ):
+      ce = 'ce%02d.site%03d.org' % ( j, i )
+      elements.append( { 'element' : 'Resource', 'name' : ce, 'elementType' : 'CE',
+                         'statusType' : 'all', 'status' : 'Active', 'tokenOwner' : 'rs_svc' } )
+      pilotRows.append( ( site, ce, 1., 95., 'Good', now, ( i + j ) % 30, 100, 5 ) )
+  for index, element in enumerate( elements ):
+    if index % 10 == 0:
+      name = element[ 'name' ]
+      if element[ 'element' ] == 'Site':
+        name = 'SITE%s' % name[ 8:11 ]
+      dtRows.append( ( '%d' % index, element[ 'element' ], name, now - datetime.timedelta( hours = 1 ),
+                       now + datetime.timedelta( hours = 2 ), 'OUTAGE', 'Intervention %d' % index,
+                       'https://goc.example.org/%d' % index, now, now ) )
+
+  gConfigurationData.mergeWithLocal( CFG().loadFromBuffer( 'Resources\n{\n  Sites\n  {\n    LCG\n    {\n%s    }\n  }\n}\n' % cfg ) )
+  tables = { 'JobCache'      : ( JOB_COLUMNS, jobRows ),
+             'PilotCache'    : ( PILOT_COLUMNS, pilotRows ),
+             'DowntimeCache' : ( DT_COLUMNS, dtRows ) }
+  return elements, tables
+
+
+def summary( decision ):
+  """ what is compared between both modes """
+  if not decision[ 'OK' ]:
+    return decision[ 'Message' ]
+  return ( decision[ 'Value' ][ 'policyCombinedResult' ][ 'Status' ],
+           decision[ 'Value' ][ 'policyCombinedResult' ][ 'Reason' ],
+           [ ( res[ 'Status' ], res[ 'Reason' ] ) for res in decision[ 'Value' ][ 'singlePolicyResults' ] ] )
+
+
+def benchmark( nSites = 100, cesPerSite = 5, latencyMs = 2. ):
+  """ print lookups and time of both modes """
+
+  elements, tables = makeGrid( nSites, cesPerSite )
+  print '%d sites, %d CEs, %d elements, %.1f ms per lookup' % ( nSites, nSites * cesPerSite, len( elements ),
+                                                               latencyMs )
+
+  rmClient = StubResourceManagementClient( tables, latencyMs / 1000. )
+  pdp = PDP( { 'ResourceManagementClient' : rmClient } )
+  pdp.iGetter = StubInfoGetter()
+  startTime = time.time()
+  decisions = []
+  for element in elements:
+    pdp.setup( element )
+    decisions.append( pdp.takeDecision() )
+  elapsed, lookups = time.time() - startTime, rmClient.lookups
+  print '%-22s: %6d lookups, %7.2f s' % ( 'takeDecision', lookups, elapsed )
+
+  rmClient.lookups = 0
+  startTime = time.time()
+  batchDecisions = pdp.takeDecisions( elements )
+  elapsed, lookups = time.time() - startTime, rmClient.lookups
+  assert batchDecisions[ 'OK' ], batchDecisions
+  print '%-22s: %6d lookups, %7.2f s' % ( 'takeDecisions', lookups, elapsed )
+
+  assert [ summary( decision ) for decision in decisions ] == \
+         [ summary( decision ) for decision in batchDecisions[ 'Value' ] ]
+  print 'same decisions, %d elements in downtime' % len( [ decision for decision in decisions
+                                                           if summary( decision )[ 0 ] == 'Banned' ] )
+
+
+if __name__ == '__main__':
+  args = Script.getPositionalArgs()
+  benchmark( int( args[ 0 ] ) if len( args ) > 0 else 100,
+             int( args[ 1 ] ) if len( args ) > 1 else 5,
+             float( args[ 2 ] ) if len( args ) > 2 else 2. )
+
+#...............................................................................
+#EOF
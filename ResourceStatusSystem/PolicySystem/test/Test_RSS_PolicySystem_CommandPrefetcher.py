@@ -0,0 +1,113 @@
+# $HeadURL $
+''' Test_RSS_PolicySystem_CommandPrefetcher
+'''
+
+import unittest
+
+from DIRAC import S_OK
+import DIRAC.ResourceStatusSystem.PolicySystem.CommandPrefetcher as moduleTested
+
+__RCSID__ = '$Id: $'
+
+################################################################################
+
+class StubClient( object ):
+  ''' JobCache in memory, recording the calls
+  '''
+
+  def __init__( self ):
+    self.calls = []
+    self.rows  = [ [ 'Site1', 'Active', 0.9 ], [ 'Site2', 'Banned', 0.1 ], [ 'Site3', 'Active', 0.5 ] ]
+
+  def selectJobCache( self, site = None, maskStatus = None, efficiency = None, meta = None ):
+    self.calls.append( ( 'selectJobCache', site, maskStatus ) )
+    rows = self.rows
+    if site is not None:
+      rows = [ row for row in rows if row[ 0 ] in ( site if isinstance( site, list ) else [ site ] ) ]
+    if maskStatus is not None:
+      rows = [ row for row in rows if row[ 1 ] in ( maskStatus if isinstance( maskStatus, list ) else [ maskStatus ] ) ]
+    result = S_OK( rows )
+    result[ 'Columns' ] = [ 'Site', 'MaskStatus', 'Efficiency' ]
+    return result
+
+  def addOrModifyJobCache( self, site, maskStatus, efficiency ):
+    self.calls.append( ( 'addOrModifyJobCache', site ) )
+    self.rows.append( [ site, maskStatus, efficiency ] )
+    return S_OK()
+
+################################################################################
+
+class CommandPrefetcher_TestCase( unittest.TestCase ):
+
+  def setUp( self ):
+    '''
+    Setup
+    '''
+    self.client   = StubClient()
+    self.recorder = moduleTested.RecordingClient( self.client )
+    self.recorder.selectJobCache( 'Site1' )
+    self.recorder.selectJobCache( site = 'Site2' )
+    self.recorder.selectJobCache( 'Site3', 'Active' )
+    self.prefetched = moduleTested.PrefetchedClient( self.client )
+
+  def tearDown( self ):
+    '''
+    TearDown
+    '''
+    del self.client
+    del self.recorder
+    del self.prefetched
+
+################################################################################
+# Tests
+
+class CommandPrefetcher_Success( CommandPrefetcher_TestCase ):
+
+  def test_record( self ):
+    ''' the recorder does not call the client and returns no rows
+    '''
+    self.assertEqual( self.client.calls, [] )
+    self.assertEqual( len( self.recorder.lookups[ 'selectJobCache' ] ), 3 )
+    res = self.recorder.selectJobCache( 'Site4' )
+    self.assertEqual( ( res[ 'Value' ], res[ 'Columns' ] ), ( [], [] ) )
+    self.assertFalse( self.recorder.addOrModifyJobCache( 'Site4', 'Active', 1. )[ 'OK' ] )
+
+  def test_prefetch( self ):
+    ''' one select per set of parameters, the lookups served from memory
+    '''
+    res = self.prefetched.prefetch( self.recorder.lookups )
+    self.assertEqual( res[ 'Value' ], 2 )
+    self.assertEqual( sorted( self.client.calls ), [ ( 'selectJobCache', [ 'Site1', 'Site2' ], None ),
+                                                     ( 'selectJobCache', [ 'Site3' ], [ 'Active' ] ) ] )
+    del self.client.calls[ : ]
+    for args, kwargs in ( ( ( 'Site1', ), {} ), ( (), { 'site' : 'Site2' } ), ( ( 'Site3', 'Active' ), {} ) ):
+      self.assertEqual( self.prefetched.selectJobCache( *args, **kwargs ), self.client.selectJobCache( *args, **kwargs ) )
+    self.assertEqual( len( self.client.calls ), 3 )
+
+  def test_notPrefetched( self ):
+    ''' lookups not recorded go to the client
+    '''
+    self.prefetched.prefetch( self.recorder.lookups )
+    del self.client.calls[ : ]
+    self.assertEqual( self.prefetched.selectJobCache( 'Site3' )[ 'Value' ], [ [ 'Site3', 'Active', 0.5 ] ] )
+    self.assertEqual( self.client.calls, [ ( 'selectJobCache', 'Site3', None ) ] )
+
+  def test_write( self ):
+    ''' a write drops the prefetched rows of its table
+    '''
+    self.prefetched.prefetch( self.recorder.lookups )
+    self.assertEqual( self.prefetched.selectJobCache( 'Site1' )[ 'Value' ], [ [ 'Site1', 'Active', 0.9 ] ] )
+    self.prefetched.addOrModifyJobCache( 'Site1', 'Banned', 0. )
+    del self.client.calls[ : ]
+    self.assertEqual( len( self.prefetched.selectJobCache( 'Site1' )[ 'Value' ] ), 2 )
+    self.assertEqual( self.client.calls, [ ( 'selectJobCache', 'Site1', None ) ] )
+
+################################################################################
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( CommandPrefetcher_TestCase )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( CommandPrefetcher_Success ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
+
+#...............................................................................
+#EOF
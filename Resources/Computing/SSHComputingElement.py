@@ -9,6 +9,7 @@
 
 from DIRAC.Resources.Computing.ComputingElement          import ComputingElement
 from DIRAC.Resources.Computing.PilotBundle               import bundleProxy, writeScript    
+from DIRAC.Resources.Computing.SSHSessionManager         import gSSHSessionManager
 from DIRAC.Core.Utilities.List                           import uniqueElements
 from DIRAC.Core.Utilities.File                           import makeGuid
 from DIRAC.Core.Utilities.Pfn                            import pfnparse 
@@ -39,8 +40,22 @@ class SSH:
     self.key = key
     if not key:
       self.key = parameters.get( 'SSHKey', '' )
+    # Persistent sessions need a passwordless login
+    self.useSession = not self.password and \
+                      str( parameters.get( 'SSHSession', 'yes' ) ).lower() not in [ 'no', 'false', '0' ]
     self.log = gLogger.getSubLogger( 'SSH' )  
 
+  def __sessionCall( self, method, *args ):
+    """ Execute a command or copy a file through the persistent session to the host
+    """
+    result = getattr( gSSHSessionManager, method )( self.user, self.host, self.key, *args )
+    if not result['OK']:
+      self.log.warn( 'SSH session to %s failed: %s' % ( self.host, result['Message'] ) )
+      if 'Timeout' in result['Message']:
+        return S_OK( ( -1, '', result['Message'] ) )
+      return S_ERROR( ( -1, result['Message'], '' ) )
+    return result
+
   def __ssh_call( self, command, timeout ):
 
     try:
@@ -101,6 +116,12 @@ class SSH:
     if type( cmdSeq ) == type( [] ):
       command = ' '.join( cmdSeq )
 
+    if not timeout:
+      timeout = 999
+    if self.useSession:
+      self.log.debug( "SSH session command %s" % command )
+      return self.__sessionCall( 'execute', command, timeout )
+
     key = ''
     if self.key:
       key = ' -i %s ' % self.key
@@ -131,6 +152,13 @@ class SSH:
   def scpCall( self, timeout, localFile, destinationPath, upload = True ):
     """ Execute scp copy
     """
+    if not timeout:
+      timeout = 999
+    if self.useSession:
+      if upload:
+        return self.__sessionCall( 'put', localFile, destinationPath, timeout )
+      return self.__sessionCall( 'get', localFile, destinationPath, timeout )
+
     key = ''
     if self.key:
       key = ' -i %s ' % self.key
@@ -0,0 +1,292 @@
+########################################################################
+# $HeadURL $
+# File :   SSHSessionManager.py
+########################################################################
+""" Persistent SSH sessions for the SSH Computing Elements
+
+    A session is one long lived ssh process per ( user, host, key ) running a remote
+    shell. Commands are written to its standard input and their output, error and
+    exit status are read back up to a marker, files are copied base64 encoded through
+    the same channel. The connection and key exchange are thus paid once per host
+    instead of once per command or file copy.
+
+    Only key or agent based authentication is supported ( BatchMode ), password
+    authentication keeps using one ssh process per call.
+
+    Sessions are shared process wide through gSSHSessionManager which:
+
+    - checks the health of a session unused for a while before using it
+    - reconnects a session which died or timed out, the command is retried once
+      if the session was found dead before sending it
+    - closes the sessions idle for more than the idle timeout
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import re
+import time
+import uuid
+import errno
+import select
+import base64
+import threading
+import subprocess
+
+from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
+
+SSH_COMMAND = 'ssh'
+# remote shell reading the commands
+REMOTE_SHELL = '/bin/sh'
+# seconds a session can stay unused before being closed
+IDLE_TIMEOUT = 600
+# seconds a session can stay unused before being checked
+CHECK_INTERVAL = 60
+CONNECT_TIMEOUT = 30
+
+def quoteRemotePath( path ):
+  """ :path: quoted for the remote shell, its $VARIABLES and a leading ~ or ~user being
+      expanded as they are in the remote paths of scp
+  """
+  # in double quotes, only $ keeps its meaning
+  quoted = re.sub( r'(["`\\])', r'\\\1', path )
+  match = re.match( r'~([\w.-]*)(/.*)?$', path )
+  if match:
+    # a tilde is not expanded in quotes, nor in all shells when an assignment goes on after it
+    home = '$HOME' if not match.group( 1 ) else '$(echo ~%s)' % match.group( 1 )
+    quoted = home + quoted[len( match.group( 1 ) ) + 1:]
+  return '"%s"' % quoted
+
+class SSHSessionError( Exception ):
+  """ the session is not usable anymore """
+  pass
+
+class SSHSession( object ):
+  """ A remote shell kept open over one ssh connection
+  """
+
+  def __init__( self, user, host, key = '', sshCommand = SSH_COMMAND, connectTimeout = CONNECT_TIMEOUT ):
+    self.user = user
+    self.host = host
+    self.key = key
+    self.sshCommand = sshCommand
+    self.connectTimeout = connectTimeout
+    self.process = None
+    self.lastUsed = time.time()
+    # one command at a time through the remote shell
+    self.lock = threading.RLock()
+
+  def connect( self ):
+    """ Start the ssh process and check the remote shell answers
+    """
+    self.close()
+    command = [ self.sshCommand, '-q', '-T', '-o', 'BatchMode=yes', '-o', 'ServerAliveInterval=60',
+                '-o', 'ConnectTimeout=%d' % self.connectTimeout ]
+    if self.key:
+      command += [ '-i', self.key ]
+    command += [ '-l', self.user, self.host, REMOTE_SHELL ]
+    try:
+      self.process = subprocess.Popen( command, stdin = subprocess.PIPE, stdout = subprocess.PIPE,
+                                       stderr = subprocess.PIPE, close_fds = True )
+    except OSError, error:
+      self.process = None
+      return S_ERROR( 'Cannot start %s: %s' % ( self.sshCommand, str( error ) ) )
+    result = self.check( self.connectTimeout )
+    if not result['OK']:
+      self.close()
+      return S_ERROR( 'Cannot connect to host %s: %s' % ( self.host, result['Message'] ) )
+    return S_OK()
+
+  def isAlive( self ):
+    """ True if the ssh process is running """
+    return self.process is not None and self.process.poll() is None
+
+  def check( self, timeout = 10 ):
+    """ Health check, the remote shell has to answer a trivial command
+    """
+    try:
+      status, output, _error = self.execute( 'echo ok', timeout )
+    except SSHSessionError, error:
+      return S_ERROR( str( error ) )
+    if status != 0 or output.strip() != 'ok':
+      return S_ERROR( 'Unexpected answer from %s: %s' % ( self.host, output ) )
+    return S_OK()
+
+  def close( self ):
+    """ Terminate the ssh process """
+    process, self.process = self.process, None
+    if process is None:
+      return
+    try:
+      process.stdin.close()
+      if process.poll() is None:
+        process.terminate()
+      process.wait()
+    except ( OSError, IOError ):
+      pass
+
+  def execute( self, command, timeout ):
+    """ Execute :command: in the remote shell
+
+    :return: tuple ( exit status, stdout, stderr )
+    :raise SSHSessionError: if the session is broken or the command timed out, the session is closed then
+    """
+    if not self.isAlive():
+      raise SSHSessionError( 'No session to %s' % self.host )
+    marker = 'DIRAC_SSH_%s' % uuid.uuid4().hex
+    # the command does not read the channel, the markers start a new line of each stream
+    script = "( %s\n) </dev/null\nprintf '\\n%s %%d\\n' $?\nprintf '\\n%s\\n' >&2\n" % ( command, marker, marker )
+    self.lastUsed = time.time()
+    try:
+      self.process.stdin.write( script )
+      self.process.stdin.flush()
+    except IOError, error:
+      self.close()
+      raise SSHSessionError( 'Broken session to %s: %s' % ( self.host, str( error ) ) )
+
+    outFd = self.process.stdout.fileno()
+    errFd = self.process.stderr.fileno()
+    streams = { outFd : '', errFd : '' }
+    pending = set( streams )
+    deadline = time.time() + timeout
+    status = None
+    while pending:
+      waitTime = deadline - time.time()
+      if waitTime <= 0:
+        self.close()
+        raise SSHSessionError( 'Timeout executing command on %s' % self.host )
+      try:
+        ready = select.select( list( pending ), [], [], waitTime )[0]
+      except select.error, error:
+        if error.args[0] == errno.EINTR:
+          continue
+        raise
+      for fd in ready:
+        data = os.read( fd, 65536 )
+        if not data:
+          self.close()
+          raise SSHSessionError( 'Session to %s closed' % self.host )
+        streams[fd] += data
+        if fd == outFd:
+          match = re.search( '\n%s (\\d+)\n' % marker, streams[fd] )
+          if match:
+            status = int( match.group( 1 ) )
+            pending.discard( fd )
+        elif streams[fd].endswith( '\n%s\n' % marker ):
+          pending.discard( fd )
+    self.lastUsed = time.time()
+    # drop the markers and the new lines added before them
+    output = streams[outFd][:streams[outFd].rfind( '\n%s' % marker )]
+    error = streams[errFd][:streams[errFd].rfind( '\n%s' % marker )]
+    return status, output, error
+
+  def put( self, localFile, remotePath, timeout ):
+    """ Copy :localFile: to :remotePath:, into it if it is a directory as scp does
+
+    :return: tuple ( exit status, stdout, stderr )
+    """
+    dataFile = open( localFile, 'rb' )
+    try:
+      data = base64.encodestring( dataFile.read() )
+    finally:
+      dataFile.close()
+    eof = 'DIRAC_EOF_%s' % uuid.uuid4().hex
+    command = "dest=%s; if [ -d \"$dest\" ]; then dest=\"$dest/%s\"; fi\n" % ( quoteRemotePath( remotePath ),
+                                                                                os.path.basename( localFile ) )
+    command += "base64 -d > \"$dest\" <<'%s'\n%s%s" % ( eof, data, eof )
+    return self.execute( command, timeout )
+
+  def get( self, localPath, remotePath, timeout ):
+    """ Copy :remotePath: to :localPath:, into it if it is a directory as scp does
+
+    :return: tuple ( exit status, stdout, stderr )
+    """
+    status, output, error = self.execute( "base64 %s" % quoteRemotePath( remotePath ), timeout )
+    if status != 0:
+      return status, '', error
+    if os.path.isdir( localPath ):
+      localPath = os.path.join( localPath, os.path.basename( remotePath ) )
+    dataFile = open( localPath, 'wb' )
+    try:
+      dataFile.write( base64.decodestring( output ) )
+    finally:
+      dataFile.close()
+    return 0, '', error
+
+class SSHSessionManager( object ):
+  """ Process wide registry of the SSH sessions, one per ( user, host, key )
+  """
+
+  def __init__( self, idleTimeout = IDLE_TIMEOUT, checkInterval = CHECK_INTERVAL, sshCommand = SSH_COMMAND ):
+    self.idleTimeout = idleTimeout
+    self.checkInterval = checkInterval
+    self.sshCommand = sshCommand
+    self.__sessions = {}
+    self.__lock = threading.Lock()
+
+  def __getSession( self, user, host, key ):
+    """ Get the session object for ( user, host, key ), close the idle ones """
+    now = time.time()
+    with self.__lock:
+      for sessionKey, session in self.__sessions.items():
+        if now - session.lastUsed > self.idleTimeout and session.lock.acquire( False ):
+          try:
+            session.close()
+            del self.__sessions[sessionKey]
+          finally:
+            session.lock.release()
+      sessionKey = ( user, host, key )
+      if sessionKey not in self.__sessions:
+        self.__sessions[sessionKey] = SSHSession( user, host, key, sshCommand = self.sshCommand )
+      return self.__sessions[sessionKey]
+
+  def __call( self, user, host, key, method, *args ):
+    """ Call a session method with reconnection and retry """
+    session = self.__getSession( user, host, key )
+    with session.lock:
+      for attempt in ( 1, 2 ):
+        if not session.isAlive():
+          result = session.connect()
+          if not result['OK']:
+            return result
+        elif time.time() - session.lastUsed > self.checkInterval and not session.check()['OK']:
+          session.close()
+          continue
+        try:
+          return S_OK( getattr( session, method )( *args ) )
+        except SSHSessionError, error:
+          # a command which timed out is not retried
+          if attempt == 2 or 'Timeout' in str( error ):
+            return S_ERROR( str( error ) )
+    return S_ERROR( 'Cannot get a working session to %s' % host )
+
+  def execute( self, user, host, key, command, timeout ):
+    """ Execute a command on host
+
+    :return: S_OK( ( exit status, stdout, stderr ) ) or S_ERROR
+    """
+    return self.__call( user, host, key, 'execute', command, timeout )
+
+  def put( self, user, host, key, localFile, remotePath, timeout ):
+    """ Copy a local file to host
+
+    :return: S_OK( ( exit status, stdout, stderr ) ) or S_ERROR
+    """
+    return self.__call( user, host, key, 'put', localFile, remotePath, timeout )
+
+  def get( self, user, host, key, localPath, remotePath, timeout ):
+    """ Copy a file from host
+
+    :return: S_OK( ( exit status, stdout, stderr ) ) or S_ERROR
+    """
+    return self.__call( user, host, key, 'get', localPath, remotePath, timeout )
+
+  def closeAll( self ):
+    """ Close all the sessions """
+    with self.__lock:
+      for session in self.__sessions.values():
+        with session.lock:
+          session.close()
+      self.__sessions = {}
+
+gSSHSessionManager = SSHSessionManager()
@@ -0,0 +1,157 @@
+########################################################################
+# $HeadURL $
+# File :   Test_SSHSessionManager.py
+########################################################################
+""" Test harness for the persistent SSH sessions
+
+    A fake ssh executable runs the remote commands locally with /bin/sh and logs
+    every invocation, so that the number of forked ssh processes can be counted:
+    one per host with the sessions, one per command without them.
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import sys
+import stat
+import time
+import signal
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+from DIRAC.Resources.Computing.SSHSessionManager import SSHSessionManager
+
+FAKE_SSH = """#!%(python)s
+# fake ssh: skip the options, log the call and run the command locally
+import os, sys
+args = sys.argv[1:]
+while args and args[0].startswith( '-' ):
+  option = args.pop( 0 )
+  if option in ( '-o', '-i', '-l', '-p' ):
+    args.pop( 0 )
+host = args.pop( 0 )
+logFile = open( %(log)r, 'a' )
+logFile.write( host + '\\n' )
+logFile.close()
+if args:
+  os.execv( '/bin/sh', [ '/bin/sh', '-c', ' '.join( args ) ] )
+os.execv( '/bin/sh', [ '/bin/sh' ] )
+"""
+
+class SSHSessionTestCase( unittest.TestCase ):
+  """ Base class for the SSH session test cases
+  """
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.forkLog = os.path.join( self.workDir, 'forks.log' )
+    self.fakeSSH = os.path.join( self.workDir, 'ssh' )
+    script = open( self.fakeSSH, 'w' )
+    script.write( FAKE_SSH % { 'python' : sys.executable, 'log' : self.forkLog } )
+    script.close()
+    os.chmod( self.fakeSSH, stat.S_IRWXU )
+    self.manager = SSHSessionManager( sshCommand = self.fakeSSH )
+
+  def tearDown( self ):
+    self.manager.closeAll()
+    shutil.rmtree( self.workDir )
+
+  def forks( self ):
+    """ number of fake ssh processes started """
+    if not os.path.exists( self.forkLog ):
+      return 0
+    return len( open( self.forkLog ).readlines() )
+
+class SSHSessionForks( SSHSessionTestCase ):
+
+  def test_perCallBaseline( self ):
+    """ one ssh process per command as with shellCall """
+    for i in range( 50 ):
+      subprocess.call( [ self.fakeSSH, '-q', '-l', 'dirac', 'host%d' % ( i % 5 ), 'true' ] )
+    self.assertEqual( self.forks(), 50 )
+
+  def test_onePerHost( self ):
+    """ one ssh process per host with the sessions """
+    for i in range( 500 ):
+      result = self.manager.execute( 'dirac', 'host%d' % ( i % 5 ), '', 'echo %d' % i, 10 )
+      self.assertTrue( result['OK'] )
+      self.assertEqual( result['Value'], ( 0, '%d\n' % i, '' ) )
+    self.assertEqual( self.forks(), 5 )
+
+  def test_reconnect( self ):
+    """ a dead session is replaced """
+    result = self.manager.execute( 'dirac', 'host', '', 'echo $$', 10 )
+    self.assertTrue( result['OK'] )
+    os.kill( int( result['Value'][1] ), signal.SIGKILL )
+    time.sleep( 0.2 )
+    result = self.manager.execute( 'dirac', 'host', '', 'echo back', 10 )
+    self.assertEqual( result['Value'], ( 0, 'back\n', '' ) )
+    self.assertEqual( self.forks(), 2 )
+
+  def test_idleExpiry( self ):
+    """ idle sessions are closed """
+    self.manager.idleTimeout = 0
+    self.assertTrue( self.manager.execute( 'dirac', 'host', '', 'true', 10 )['OK'] )
+    self.assertTrue( self.manager.execute( 'dirac', 'host', '', 'true', 10 )['OK'] )
+    self.assertEqual( self.forks(), 2 )
+
+class SSHSessionCommands( SSHSessionTestCase ):
+
+  def test_statusAndStreams( self ):
+    result = self.manager.execute( 'dirac', 'host', '', "echo out; echo err >&2; printf 'no newline'; exit 7", 10 )
+    self.assertEqual( result['Value'], ( 7, 'out\nno newline', 'err\n' ) )
+    result = self.manager.execute( 'dirac', 'host', '', "cat; echo $((1+1))", 10 )
+    self.assertEqual( result['Value'], ( 0, '2\n', '' ) )
+
+  def test_timeout( self ):
+    result = self.manager.execute( 'dirac', 'host', '', 'sleep 5', 0.5 )
+    self.assertFalse( result['OK'] )
+    self.assertTrue( 'Timeout' in result['Message'] )
+    self.assertEqual( self.manager.execute( 'dirac', 'host', '', 'echo ok', 10 )['Value'][1], 'ok\n' )
+
+  def test_copy( self ):
+    localFile = os.path.join( self.workDir, 'local.sh' )
+    content = ''.join( [ chr( i ) for i in range( 256 ) ] ) * 100
+    open( localFile, 'wb' ).write( content )
+    remoteDir = os.path.join( self.workDir, 'remote' )
+    os.mkdir( remoteDir )
+    self.assertEqual( self.manager.put( 'dirac', 'host', '', localFile, remoteDir, 10 )['Value'][0], 0 )
+    self.assertEqual( open( os.path.join( remoteDir, 'local.sh' ), 'rb' ).read(), content )
+    copyFile = os.path.join( self.workDir, 'copy' )
+    result = self.manager.get( 'dirac', 'host', '', copyFile, os.path.join( remoteDir, 'local.sh' ), 10 )
+    self.assertEqual( result['Value'][0], 0 )
+    self.assertEqual( open( copyFile, 'rb' ).read(), content )
+    result = self.manager.get( 'dirac', 'host', '', copyFile + '2', os.path.join( remoteDir, 'missing' ), 10 )
+    self.assertNotEqual( result['Value'][0], 0 )
+    self.assertFalse( os.path.exists( copyFile + '2' ) )
+    self.assertEqual( self.forks(), 1 )
+
+  def test_copyExpandedPaths( self ):
+    """ remote paths relative to $HOME or ~ are expanded by the remote shell, as with scp """
+    home = os.path.join( self.workDir, 'home dir' )
+    os.makedirs( os.path.join( home, 'my "pilots"' ) )
+    localFile = os.path.join( self.workDir, 'local.sh' )
+    open( localFile, 'w' ).write( 'echo pilot\n' )
+    formerHome = os.environ.get( 'HOME' )
+    os.environ['HOME'] = home
+    try:
+      for remotePath in ( '$HOME', '~', '~/my "pilots"', '$HOME/my "pilots"/copy.sh' ):
+        result = self.manager.put( 'dirac', 'host', '', localFile, remotePath, 10 )
+        self.assertEqual( result['Value'][0], 0, result )
+      copyFile = os.path.join( self.workDir, 'copy' )
+      result = self.manager.get( 'dirac', 'host', '', copyFile, '~/my "pilots"/local.sh', 10 )
+      self.assertEqual( result['Value'][0], 0 )
+    finally:
+      if formerHome is None:
+        del os.environ['HOME']
+      else:
+        os.environ['HOME'] = formerHome
+    for copy in ( 'local.sh', 'my "pilots"/local.sh', 'my "pilots"/copy.sh' ):
+      self.assertEqual( open( os.path.join( home, copy ) ).read(), 'echo pilot\n' )
+    self.assertEqual( open( copyFile ).read(), 'echo pilot\n' )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( SSHSessionForks )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( SSHSessionCommands ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
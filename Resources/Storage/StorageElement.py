@@ -8,6 +8,7 @@
 __RCSID__ = "$Id$"
 # # custom duty
 import re
+import threading
 from types import ListType, StringType, StringTypes, DictType
 # # from DIRAC
 from DIRAC import gLogger, S_OK, S_ERROR, gConfig
@@ -17,6 +18,62 @@ from DIRAC.Core.Utilities.SiteSEMapping import getSEsForSite
 from DIRAC.Core.Security.ProxyInfo import getVOfromProxyGroup
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Resources.Utilities import Utils
+from DIRAC.ResourceStatusSystem.Client.ResourceStatus import ResourceStatus
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+
+class StorageCache( object ):
+  """
+  .. class:: StorageCache
+
+  process wide cache of the StorageFactory results: resolved SE name, CS options, protocol
+  details and instantiated plugin objects, keyed by thread, SE name, requested protocols
+  and proxy usage, so that creating a StorageElement does not walk the CS and load the
+  plugins again.
+
+  The cache is flushed when the CS version changes. The SE status is not part of the CS,
+  it is refreshed from the RSS ( which has its own cache ) on every hit. Plugin objects are
+  not shared between threads, they keep state between calls.
+  """
+  __cacheLock = threading.Lock()
+  __cache = {}
+  __cacheVersion = None
+  # # max number of cached entries, the cache is flushed beyond
+  maxEntries = 1000
+
+  def getStorages( self, name, protocolList, useProxy ):
+    """ StorageFactory.getStorages, cached
+
+    :param str name: SE name
+    :param list protocolList: requested protocols, all of them if empty
+    :param bool useProxy: use the Proxy storage plugin
+    :return: S_OK( factoryDict ) or S_ERROR, see StorageFactory.getStorages
+    """
+    cacheKey = ( threading.current_thread().ident, name, tuple( protocolList ), bool( useProxy ) )
+    with StorageCache.__cacheLock:
+      currentVersion = gConfigurationData.getVersion()
+      if currentVersion != StorageCache.__cacheVersion or len( StorageCache.__cache ) > self.maxEntries:
+        StorageCache.__cache = {}
+        StorageCache.__cacheVersion = currentVersion
+      factoryDict = StorageCache.__cache.get( cacheKey )
+
+    if factoryDict is None:
+      res = StorageFactory( useProxy ).getStorages( name, protocolList = protocolList )
+      if not res['OK']:
+        return res
+      with StorageCache.__cacheLock:
+        if currentVersion == StorageCache.__cacheVersion:
+          StorageCache.__cache[cacheKey] = res['Value']
+      factoryDict = res['Value']
+    else:
+      res = ResourceStatus().getStorageElementStatus( factoryDict['StorageName'] )
+      if not res['OK']:
+        errStr = "StorageCache.getStorages: Failed to get storage status"
+        gLogger.error( errStr, "%s: %s" % ( factoryDict['StorageName'], res['Message'] ) )
+        return S_ERROR( errStr )
+      factoryDict = dict( factoryDict )
+      factoryDict['StorageOptions'] = dict( factoryDict['StorageOptions'] )
+      factoryDict['StorageOptions'].update( res['Value'][factoryDict['StorageName']] )
+    return S_OK( factoryDict )
 
 class StorageElement:
   """
@@ -120,10 +177,7 @@ class StorageElement:
       useProxy = self.opHelper.getValue( '/Services/StorageElements/%s/UseProxy' % name, False )
 
     self.valid = True
-    if protocols == None:
-      res = StorageFactory( useProxy ).getStorages( name, protocolList = [] )
-    else:
-      res = StorageFactory( useProxy ).getStorages( name, protocolList = protocols )
+    res = StorageCache().getStorages( name, protocols if protocols else [], useProxy )
     if not res['OK']:
       self.valid = False
       self.name = name
@@ -131,7 +185,7 @@ class StorageElement:
     else:
       factoryDict = res['Value']
       self.name = factoryDict['StorageName']
-      self.options = factoryDict['StorageOptions']
+      self.options = dict( factoryDict['StorageOptions'] )
       self.localProtocols = factoryDict['LocalProtocols']
       self.remoteProtocols = factoryDict['RemoteProtocols']
       self.storages = factoryDict['StorageObjects']
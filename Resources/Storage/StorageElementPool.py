@@ -0,0 +1,106 @@
+########################################################################
+# $HeadURL $
+# File: StorageElementPool.py
+########################################################################
+""" :mod: StorageElementPool
+    ========================
+
+    .. module: StorageElementPool
+    :synopsis: execute a StorageElement bulk operation on several SEs at once
+
+    The same StorageElement method ( removeFile, getFileMetadata, exists... ) is
+    called for the files of several SEs in a BoundedTaskPool: at most maxThreads SEs
+    are contacted at the same time and every SE call has its own timeout, so that a
+    hung endpoint delays the request by the timeout only. An SE whose previous call
+    is still running is not contacted again until it returns. A call is not interrupted
+    by its timeout: it goes on in the background and may still complete, the caller
+    must not take its files as untouched.
+
+    The StorageElement objects are created in the worker threads, the storage plugins
+    being cached per thread by the StorageCache.
+
+    Usage::
+
+      pool = StorageElementPool( maxThreads = 5, timeout = 120 )
+      res = pool.execute( 'getFileMetadata', { 'CERN-DST' : [ lfn1, lfn2 ], 'CNAF-DST' : [ lfn1 ] } )
+      # res['Value'] == { 'Successful' : { lfn1 : { 'CERN-DST' : metadata, ... } },
+      #                   'Failed' : { lfn1 : { 'CNAF-DST' : 'getFileMetadata timed out after 120 s, ...' } } }
+"""
+__RCSID__ = "$Id$"
+# # imports
+from types import StringTypes
+# # from DIRAC
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Utilities.BoundedTaskPool import BoundedTaskPool, TIMED_OUT
+from DIRAC.Resources.Storage.StorageElement import StorageElement
+
+class StorageElementPool( object ):
+  """
+  .. class:: StorageElementPool
+
+  concurrent execution of StorageElement methods on several SEs
+  """
+  def __init__( self, maxThreads = 10, timeout = 600, storageElementClass = StorageElement ):
+    """ c'tor
+
+    :param self: self reference
+    :param int maxThreads: max number of SEs contacted at the same time
+    :param float timeout: max time of the call to a single SE in seconds
+    :param storageElementClass: callable returning a StorageElement for an SE name
+    """
+    self.timeout = timeout
+    self.storageElementClass = storageElementClass
+    self.taskPool = BoundedTaskPool( maxThreads )
+    self.log = gLogger.getSubLogger( "StorageElementPool" )
+
+  def execute( self, method, seLFNs, *args, **kwargs ):
+    """ call :method: of every SE of :seLFNs: with its files, extra arguments are passed to all the calls
+
+    :param self: self reference
+    :param str method: StorageElement method name
+    :param dict seLFNs: { SE name : LFN, list of LFNs or { LFN : value } }
+    :return: S_OK( { 'Successful' : { lfn : { SE : value } }, 'Failed' : { lfn : { SE : reason } } } ),
+             an LFN can be Successful at some SEs and Failed at others
+    """
+    results = self.executePerSE( method, seLFNs, *args, **kwargs )
+    successful = {}
+    failed = {}
+    for seName, res in results.items():
+      if not res['OK']:
+        lfns = seLFNs[seName]
+        for lfn in [ lfns ] if type( lfns ) in StringTypes else lfns:
+          failed.setdefault( lfn, {} )[seName] = res['Message']
+        continue
+      for lfn, value in res['Value']['Successful'].items():
+        successful.setdefault( lfn, {} )[seName] = value
+      for lfn, reason in res['Value']['Failed'].items():
+        failed.setdefault( lfn, {} )[seName] = reason
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+  def executePerSE( self, method, seLFNs, *args, **kwargs ):
+    """ call :method: of every SE of :seLFNs: with its files, without merging the results
+
+    :param self: self reference
+    :param str method: StorageElement method name
+    :param dict seLFNs: { SE name : LFN, list of LFNs or { LFN : value } }
+    :return: { SE name : result of the StorageElement call, S_ERROR if it failed or timed out,
+               the error of a timed out call saying it may still complete }
+    """
+    tasks = {}
+    for seName, lfns in seLFNs.items():
+      if type( lfns ) in StringTypes:
+        lfns = [ lfns ]
+      if lfns:
+        tasks[seName] = ( self.__callStorageElement, ( seName, method, lfns ) + args, kwargs )
+    results = self.taskPool.execute( tasks, timeout = self.timeout )
+    for seName, res in results.items():
+      if not res['OK']:
+        if res['Message'] == TIMED_OUT:
+          results[seName] = res = S_ERROR( "%s timed out after %s s, it may still complete" % ( method, self.timeout ) )
+        self.log.warn( "executePerSE: %s failed at %s" % ( method, seName ), res['Message'] )
+    return results
+
+  def __callStorageElement( self, seName, method, lfns, *args, **kwargs ):
+    """ executed in the pool threads: call :method: of SE :seName: """
+    storageElement = self.storageElementClass( seName )
+    return getattr( storageElement, method )( lfns, *args, **kwargs )
@@ -0,0 +1,105 @@
+########################################################################
+# $HeadURL $
+# File: StorageElementBenchmark.py
+########################################################################
+""" :mod: StorageElementBenchmark
+    =============================
+
+    .. module: StorageElementBenchmark
+    :synopsis: cost of StorageElement instantiation with and without the StorageCache
+
+    A few SEs with several DIP protocol sections are defined in a local CS and the
+    same SEs are instantiated many times, as the data management agents do in their
+    request loops:
+
+    - StorageFactory.getStorages for every instantiation, what StorageElement did
+    - StorageElement with the StorageCache
+    - StorageElement with a new CS version for every instantiation, the worst case
+
+    usage: python StorageElementBenchmark.py [nSEs] [nInstantiations]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import time
+# # from DIRAC
+from DIRAC.Core.Base import Script
+Script.parseCommandLine()
+from DIRAC.Core.Utilities.CFG import CFG
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+# # SUT
+from DIRAC.Resources.Storage.StorageFactory import StorageFactory
+from DIRAC.Resources.Storage.StorageElement import StorageElement
+
+SE_CFG = """
+  %(name)s
+  {
+    BackendType = dips
+    ReadAccess = Active
+    WriteAccess = Active
+    RemoveAccess = Active
+    CheckAccess = Active
+    DIP
+    {
+      Host = se%(index)d.example.org
+      Port = 9148
+      Protocol = dips
+      ProtocolName = DIP
+      Path = /DataManagement/StorageElement
+      Access = remote
+    }
+    LocalDIP
+    {
+      Host = localhost
+      Port = 9148
+      Protocol = dips
+      ProtocolName = DIP
+      Path = /data/%(name)s
+      Access = local
+    }
+  }
+"""
+
+def loadLocalCS( nSEs ):
+  """ define nSEs storage elements in the local CS, return their names """
+  names = [ "BENCH%03d-DST" % i for i in range( nSEs ) ]
+  cfg = "Resources\n{\n  StorageElements\n  {\n%s  }\n}\n" % "".join( [ SE_CFG % { "name" : name, "index" : i }
+                                                                         for i, name in enumerate( names ) ] )
+  gConfigurationData.mergeWithLocal( CFG().loadFromBuffer( cfg ) )
+  return names
+
+def timeIt( function, names, nInstantiations ):
+  """ time nInstantiations calls of function( name ) cycling over names """
+  startTime = time.time()
+  for i in range( nInstantiations ):
+    function( i, names[i % len( names )] )
+  return time.time() - startTime
+
+def benchmark( nSEs = 10, nInstantiations = 2000 ):
+  """ print the time per instantiation """
+  names = loadLocalCS( nSEs )
+  for name in names:
+    se = StorageElement( name, vo = "bench" )
+    assert se.valid, se.errorReason
+    assert len( se.storages ) == 2
+
+  def factory( _i, name ):
+    StorageFactory( False ).getStorages( name, protocolList = [] )
+
+  def cached( _i, name ):
+    StorageElement( name, vo = "bench" )
+
+  def newVersion( i, name ):
+    gConfigurationData.setVersion( "bench%d" % i )
+    StorageElement( name, vo = "bench" )
+
+  print "%d SEs, %d instantiations" % ( nSEs, nInstantiations )
+  for title, function in ( ( "StorageFactory.getStorages", factory ),
+                           ( "StorageElement, cached", cached ),
+                           ( "StorageElement, new CS version every time", newVersion ) ):
+    elapsed = timeIt( function, names, nInstantiations )
+    print "%-45s: %8.2f ms per instantiation" % ( title, 1000. * elapsed / nInstantiations )
+
+if __name__ == "__main__":
+  args = Script.getPositionalArgs()
+  benchmark( int( args[0] ) if len( args ) > 0 else 10,
+             int( args[1] ) if len( args ) > 1 else 2000 )
@@ -0,0 +1,147 @@
+########################################################################
+# $HeadURL $
+# File: Test_StorageElementPool.py
+########################################################################
+""" :mod: Test_StorageElementPool
+    =============================
+
+    .. module: Test_StorageElementPool
+    :synopsis: unit tests for StorageElementPool
+
+    The SEs are local directories served by a file storage plugin answering after an
+    injected latency, one of them hanging.
+"""
+__RCSID__ = "$Id$"
+# # imports
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+# # SUT
+from DIRAC.Resources.Storage.StorageElementPool import StorageElementPool
+
+class LatencyFileStorage( object ):
+  """ storage plugin on a local directory, every call taking :latency: seconds """
+  lock = threading.Lock()
+  running = 0
+  maxRunning = 0
+
+  def __init__( self, basePath, latency ):
+    self.basePath = basePath
+    self.latency = latency
+
+  def __call( self, lfns, function ):
+    with LatencyFileStorage.lock:
+      LatencyFileStorage.running += 1
+      LatencyFileStorage.maxRunning = max( LatencyFileStorage.maxRunning, LatencyFileStorage.running )
+    try:
+      time.sleep( self.latency )
+      successful = {}
+      failed = {}
+      for lfn in lfns:
+        path = os.path.join( self.basePath, lfn.lstrip( "/" ) )
+        if not os.path.exists( path ):
+          failed[lfn] = "File does not exist"
+        else:
+          successful[lfn] = function( path )
+      return { "OK" : True, "Value" : { "Successful" : successful, "Failed" : failed } }
+    finally:
+      with LatencyFileStorage.lock:
+        LatencyFileStorage.running -= 1
+
+  def getFileSize( self, lfns ):
+    return self.__call( lfns, os.path.getsize )
+
+  def removeFile( self, lfns ):
+    return self.__call( lfns, os.remove )
+
+class StorageElementPoolTests( unittest.TestCase ):
+  """
+  .. class:: StorageElementPoolTests
+
+  """
+  def setUp( self ):
+    """ 6 SEs with 0.2 s latency, one hanging, all holding the same 3 files """
+    self.baseDir = tempfile.mkdtemp()
+    self.storages = {}
+    for i in range( 6 ):
+      seName = "SE%d" % i
+      sePath = os.path.join( self.baseDir, seName )
+      os.makedirs( os.path.join( sePath, "vo", "data" ) )
+      for lfn in ( "/vo/data/file1", "/vo/data/file2", "/vo/data/file3" ):
+        open( os.path.join( sePath, lfn.lstrip( "/" ) ), "w" ).write( seName )
+      self.storages[seName] = LatencyFileStorage( sePath, 0.2 )
+    self.storages["HUNG-SE"] = LatencyFileStorage( os.path.join( self.baseDir, "SE0" ), 3. )
+    LatencyFileStorage.maxRunning = 0
+    self.lfns = [ "/vo/data/file1", "/vo/data/file2" ]
+
+  def tearDown( self ):
+    shutil.rmtree( self.baseDir )
+
+  def pool( self, maxThreads, timeout ):
+    return StorageElementPool( maxThreads, timeout, storageElementClass = self.storages.get )
+
+  def test_01Parallel( self ):
+    """ the SEs are contacted at the same time, up to maxThreads """
+    pool = self.pool( 3, 10 )
+    seLFNs = dict( [ ( "SE%d" % i, self.lfns ) for i in range( 6 ) ] )
+    startTime = time.time()
+    res = pool.execute( "getFileSize", seLFNs )
+    elapsed = time.time() - startTime
+    self.assertTrue( res["OK"] )
+    self.assertEqual( res["Value"]["Failed"], {} )
+    self.assertEqual( sorted( res["Value"]["Successful"] ), self.lfns )
+    self.assertEqual( res["Value"]["Successful"]["/vo/data/file1"], dict.fromkeys( seLFNs, 3 ) )
+    # # 6 SEs by 3: 2 x 0.2 s instead of 6 x 0.2 s
+    self.assertTrue( elapsed < 0.8, elapsed )
+    self.assertEqual( LatencyFileStorage.maxRunning, 3 )
+
+  def test_02Merge( self ):
+    """ Successful and Failed per LFN and SE """
+    pool = self.pool( 5, 10 )
+    res = pool.execute( "removeFile", { "SE1" : [ "/vo/data/file1", "/vo/data/missing" ],
+                                        "SE2" : "/vo/data/file1",
+                                        "SE3" : { "/vo/data/file3" : True },
+                                        "SE4" : [] } )
+    self.assertTrue( res["OK"] )
+    self.assertEqual( res["Value"]["Successful"], { "/vo/data/file1" : { "SE1" : None, "SE2" : None },
+                                                    "/vo/data/file3" : { "SE3" : None } } )
+    self.assertEqual( res["Value"]["Failed"], { "/vo/data/missing" : { "SE1" : "File does not exist" } } )
+    self.assertFalse( os.path.exists( os.path.join( self.baseDir, "SE1", "vo", "data", "file1" ) ) )
+    self.assertTrue( os.path.exists( os.path.join( self.baseDir, "SE1", "vo", "data", "file2" ) ) )
+
+  def test_03Timeout( self ):
+    """ a hung SE delays the request by its timeout and is refused until it returns """
+    pool = self.pool( 5, 0.5 )
+    seLFNs = { "SE1" : self.lfns, "SE2" : self.lfns, "HUNG-SE" : self.lfns }
+    startTime = time.time()
+    res = pool.execute( "getFileSize", seLFNs )
+    elapsed = time.time() - startTime
+    self.assertTrue( elapsed < 1., elapsed )
+    self.assertEqual( sorted( res["Value"]["Successful"]["/vo/data/file2"] ), [ "SE1", "SE2" ] )
+    self.assertEqual( res["Value"]["Failed"],
+                      dict.fromkeys( self.lfns, { "HUNG-SE" : "getFileSize timed out after 0.5 s, it may still complete" } ) )
+    # # the next call does not wait for the hung SE again
+    startTime = time.time()
+    res = pool.executePerSE( "getFileSize", seLFNs )
+    self.assertTrue( time.time() - startTime < 0.5 )
+    self.assertTrue( res["SE1"]["OK"] )
+    self.assertFalse( res["HUNG-SE"]["OK"] )
+    self.assertTrue( "still running" in res["HUNG-SE"]["Message"] )
+
+  def test_04Exception( self ):
+    """ an unknown SE or method fails for its files only """
+    pool = self.pool( 5, 10 )
+    res = pool.execute( "getFileSize", { "SE1" : self.lfns, "UNKNOWN-SE" : self.lfns } )
+    self.assertTrue( res["OK"] )
+    self.assertEqual( sorted( res["Value"]["Successful"] ), self.lfns )
+    self.assertEqual( sorted( res["Value"]["Failed"] ), self.lfns )
+    self.assertEqual( res["Value"]["Failed"]["/vo/data/file1"].keys(), [ "UNKNOWN-SE" ] )
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( StorageElementPoolTests )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
@@ -9,6 +9,7 @@ from DIRAC.Core.Utilities.List                                    import sortLis
 from DIRAC.DataManagementSystem.Client.DataIntegrityClient        import DataIntegrityClient
 from DIRAC.Resources.Storage.StorageElement                       import StorageElement
 from DIRAC.StorageManagementSystem.DB.StorageManagementDB         import THROTTLING_STEPS, THROTTLING_TIME
+from DIRAC.StorageManagementSystem.Agent.StageScheduler           import StageScheduler
 
 import re
 
@@ -22,6 +23,9 @@ class StageRequestAgent( AgentModule ):
     #self.storageDB = StorageManagementDB()
     # pin lifetime = 1 day
     self.pinLifetime = self.am_getOption( 'PinLifetime', THROTTLING_TIME )
+    # prestage bulks are bounded in number of files and size ( GB )
+    self.stageScheduler = StageScheduler( self.am_getOption( 'MaxFilesPerBulk', 1000 ),
+                                          self.am_getOption( 'MaxBulkSize', 2000. ) )
 
     # This sets the Default Proxy to used as that defined under
     # /Operations/Shifter/DataManager
@@ -81,7 +85,7 @@ class StageRequestAgent( AgentModule ):
       gLogger.info( "StageRequest.submitStageRequests: Completing partially Staged Tasks" )
     for storageElement, seReplicaIDs in seReplicas.items():
       gLogger.debug( 'Staging at %s:' % storageElement, seReplicaIDs )
-      self._issuePrestageRequests( storageElement, seReplicaIDs, allReplicaInfo )
+      self._issuePrestageRequests( storageElement, seReplicaIDs, allReplicaInfo, checkCache = False )
 
     # Check Waiting Replicas and select those found Online and all other Replicas from the same Tasks
     res = self._getOnlineReplicas()
@@ -109,9 +113,9 @@ class StageRequestAgent( AgentModule ):
     allReplicaInfo.update( res['Value']['AllReplicaInfo'] )
 
     gLogger.info( "StageRequest.submitStageRequests: Obtained %s replicas for staging." % len( allReplicaInfo ) )
-    for storageElement, seReplicaIDs in seReplicas.items():
-      gLogger.debug( 'Staging at %s:' % storageElement, seReplicaIDs )
-      self._issuePrestageRequests( storageElement, seReplicaIDs, allReplicaInfo )
+    for storageElement in sorted( seReplicas ):
+      gLogger.debug( 'Staging at %s:' % storageElement, seReplicas[storageElement] )
+      self._issuePrestageRequests( storageElement, seReplicas[storageElement], allReplicaInfo )
     return S_OK()
 
   def _getMissingReplicas( self ):
@@ -208,11 +212,13 @@ class StageRequestAgent( AgentModule ):
         # Do not consider those SE that have the Cache full
         continue
       seReplicas[storageElement] = []
-      for replicaID in sorted( seReplicaIDs ):
+      selectedSize = 0.
+      # Oldest requests first, the usage is only increased when the stage requests are issued
+      for replicaID in sorted( seReplicaIDs, key = lambda replicaID: ( allReplicaInfo[replicaID]['SubmitTime'], replicaID ) ):
         seReplicas[storageElement].append( replicaID )
         replicasToStage.append( replicaID )
-        self.__add( storageElement, allReplicaInfo[replicaID]['Size'] )
-        if not self.__usage( storageElement ) < self.__cache( storageElement ):
+        selectedSize += allReplicaInfo[replicaID]['Size'] / ( 1000 * 1000 * 1000.0 )
+        if not self.__usage( storageElement ) + selectedSize < self.__cache( storageElement ):
           # Stop adding Replicas when the cache is full
           break
 
@@ -246,8 +252,49 @@ class StageRequestAgent( AgentModule ):
     self.storageElementUsage[storageElement]['TotalSize'] += size
     return size
 
-  def _issuePrestageRequests( self, storageElement, seReplicaIDs, allReplicaInfo ):
+  def _issuePrestageRequests( self, storageElement, seReplicaIDs, allReplicaInfo, checkCache = True ):
+    """ Issue the stage requests to the SE in bulks, oldest requests first
+
+        The usage of the SE cache is increased as the bulks are issued and, if checkCache is set,
+        a bulk is cut as soon as it fills the cache, the remaining replicas being left for a later cycle
+    """
+    bulks = self.stageScheduler.getBulks( seReplicaIDs, allReplicaInfo )
+    for bulkNumber, bulk in enumerate( bulks ):
+      deferred = 0
+      if checkCache:
+        fitting = self.__fitInCache( storageElement, bulk, allReplicaInfo )
+        if len( fitting ) < len( bulk ):
+          deferred = len( bulk ) - len( fitting ) + sum( [len( deferredBulk ) for deferredBulk in bulks[bulkNumber + 1:]] )
+          bulk = fitting
+      if bulk:
+        gLogger.verbose( 'StageRequest._issuePrestageRequests: bulk %d/%d for %s, %.3f GB' %
+                         ( bulkNumber + 1, len( bulks ), storageElement, self.stageScheduler.getBulkSize( bulk, allReplicaInfo ) ) )
+        submittedIDs = self.__issuePrestageBulk( storageElement, bulk, allReplicaInfo )
+        for replicaID in submittedIDs:
+          self.__add( storageElement, allReplicaInfo[replicaID]['Size'] )
+      if deferred:
+        gLogger.info( 'StageRequest._issuePrestageRequests: %s cache full ( %s GB ), %s replicas left for a later cycle' %
+                      ( storageElement, self.__cache( storageElement ), deferred ) )
+        break
+    return
+
+  def __fitInCache( self, storageElement, seReplicaIDs, allReplicaInfo ):
+    """ First replicas of seReplicaIDs to stage before the cache of storageElement is full,
+        the last one being the replica which fills it, as in _getOfflineReplicas
+    """
+    fitting = []
+    selectedSize = 0.
+    for replicaID in seReplicaIDs:
+      if not self.__usage( storageElement ) + selectedSize < self.__cache( storageElement ):
+        break
+      fitting.append( replicaID )
+      selectedSize += allReplicaInfo[replicaID]['Size'] / ( 1000 * 1000 * 1000.0 )
+    return fitting
+
+  def __issuePrestageBulk( self, storageElement, seReplicaIDs, allReplicaInfo ):
     """ Make the request to the SE and update the DB
+
+        Returns the list of ReplicaIDs for which a stage request was submitted
     """
     pfnRepIDs = {}
     for replicaID in seReplicaIDs:
@@ -277,12 +324,13 @@ class StageRequestAgent( AgentModule ):
       gLogger.info( "StageRequest._issuePrestageRequests: %s stage request metadata to be updated." % len( stageRequestMetadata ) )
       res = self.stagerClient.insertStageRequest( stageRequestMetadata, self.pinLifetime )
       if not res['OK']:
+        # The replicas are left in their status, to be issued again at a later cycle
         gLogger.error( "StageRequest._issuePrestageRequests: Failed to insert stage request metadata.", res['Message'] )
-        return res
+        return []
       res = self.stagerClient.updateReplicaStatus( updatedPfnIDs, 'StageSubmitted' )
       if not res['OK']:
         gLogger.error( "StageRequest._issuePrestageRequests: Failed to insert replica status.", res['Message'] )
-    return
+    return updatedPfnIDs
 
   def __sortBySE( self, replicaDict ):
 
@@ -293,7 +341,8 @@ class StageRequestAgent( AgentModule ):
       storageElement = info['SE']
       size = info['Size']
       pfn = info['PFN']
-      replicaIDs[replicaID] = {'LFN':lfn, 'PFN':pfn, 'Size':size, 'StorageElement':storageElement}
+      replicaIDs[replicaID] = {'LFN':lfn, 'PFN':pfn, 'Size':size, 'StorageElement':storageElement,
+                               'SubmitTime':info['SubmitTime']}
       if not seReplicas.has_key( storageElement ):
         seReplicas[storageElement] = []
       seReplicas[storageElement].append( replicaID )
@@ -360,7 +409,8 @@ class StageRequestAgent( AgentModule ):
         continue
       if not addReplicas[status].has_key( storageElement ):
         addReplicas[status][storageElement] = []
-      replicaIDs[replicaID] = {'LFN':lfn, 'PFN':pfn, 'Size':size, 'StorageElement':storageElement }
+      replicaIDs[replicaID] = {'LFN':lfn, 'PFN':pfn, 'Size':size, 'StorageElement':storageElement,
+                               'SubmitTime':info['SubmitTime'] }
       addReplicas[status][storageElement].append( replicaID )
 
     waitingReplicas = addReplicas['Waiting']
@@ -404,7 +454,7 @@ class StageRequestAgent( AgentModule ):
       replicaIDs = seReplicas[storageElement]
       size = 0
       for replicaID in replicaIDs:
-        size += self.__add( storageElement, allReplicaInfo[replicaID]['Size'] )
+        size += allReplicaInfo[replicaID]['Size'] / ( 1000 * 1000 * 1000.0 )
 
       gLogger.info( 'StageRequest.__addAssociatedReplicas:  Considering %s GB to be staged at %s' % ( size, storageElement ) )
       totalSize += size
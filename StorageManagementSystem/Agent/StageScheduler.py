@@ -0,0 +1,84 @@
+""" StageScheduler builds the prestage bulks of the StageRequestAgent
+
+    The replicas to stage at a StorageElement are split into bulks bounded both in
+    number of files and in total size, such that:
+
+    - replicas of the same directory ( dataset ) are kept together, as they are most
+      likely written on the same tapes: a directory is only split if it does not fit
+      in a single bulk
+    - the directories with the oldest requests are served first
+"""
+
+import os
+
+__RCSID__ = "$Id$"
+
+GB = 1000 * 1000 * 1000.
+
+class StageScheduler( object ):
+  """ Tape aware ordering and bulking of the replicas to stage
+  """
+
+  def __init__( self, maxFiles = 1000, maxSize = 2000. ):
+    """ c'tor
+
+    :param int maxFiles: max number of files per bulk
+    :param float maxSize: max size of a bulk in GB
+    """
+    self.maxFiles = max( 1, int( maxFiles ) )
+    self.maxSize = float( maxSize )
+
+  @staticmethod
+  def cluster( replicaIDs, replicaInfo ):
+    """ Group the replicas per directory, the directory with the oldest request first
+
+    :param list replicaIDs: replicas to group
+    :param dict replicaInfo: ReplicaID -> dictionary with 'LFN', 'Size' and optionally 'SubmitTime'
+    :return: list of lists of ReplicaIDs sorted by LFN
+    """
+    directories = {}
+    for replicaID in replicaIDs:
+      directories.setdefault( os.path.dirname( replicaInfo[replicaID]['LFN'] ), [] ).append( replicaID )
+    clusters = []
+    for directory, dirReplicaIDs in directories.items():
+      # the SubmitTime of a replica is the one of the first task requesting it
+      oldest = min( [( replicaInfo[replicaID].get( 'SubmitTime' ), replicaID ) for replicaID in dirReplicaIDs] )
+      dirReplicaIDs.sort( key = lambda replicaID: replicaInfo[replicaID]['LFN'] )
+      clusters.append( ( oldest, directory, dirReplicaIDs ) )
+    clusters.sort()
+    return [dirReplicaIDs for _oldest, _directory, dirReplicaIDs in clusters]
+
+  def getBulks( self, replicaIDs, replicaInfo ):
+    """ Split the replicas of a StorageElement into bulks, in the order they should be issued
+
+    :param list replicaIDs: replicas to stage at a StorageElement
+    :param dict replicaInfo: ReplicaID -> dictionary with 'LFN', 'Size' ( bytes ) and optionally 'SubmitTime'
+    :return: list of lists of ReplicaIDs
+    """
+    bulks = []
+    bulk = []
+    bulkSize = 0.
+    for dirReplicaIDs in self.cluster( replicaIDs, replicaInfo ):
+      dirSize = sum( [replicaInfo[replicaID]['Size'] for replicaID in dirReplicaIDs] ) / GB
+      # start a new bulk rather than splitting a directory which fits in one
+      if bulk and ( len( bulk ) + len( dirReplicaIDs ) > self.maxFiles or bulkSize + dirSize > self.maxSize ) \
+         and len( dirReplicaIDs ) <= self.maxFiles and dirSize <= self.maxSize:
+        bulks.append( bulk )
+        bulk = []
+        bulkSize = 0.
+      for replicaID in dirReplicaIDs:
+        size = replicaInfo[replicaID]['Size'] / GB
+        if bulk and ( len( bulk ) >= self.maxFiles or bulkSize + size > self.maxSize ):
+          bulks.append( bulk )
+          bulk = []
+          bulkSize = 0.
+        bulk.append( replicaID )
+        bulkSize += size
+    if bulk:
+      bulks.append( bulk )
+    return bulks
+
+  @staticmethod
+  def getBulkSize( bulk, replicaInfo ):
+    """ Size of a bulk in GB """
+    return sum( [replicaInfo[replicaID]['Size'] for replicaID in bulk] ) / GB
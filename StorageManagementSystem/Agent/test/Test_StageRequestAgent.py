@@ -0,0 +1,202 @@
+""" Test cases for the StageRequestAgent: cycles run against a stub stager client and a stub
+    tape StorageElement, checking the prestage bulks issued and the use of the SE cache
+"""
+
+__RCSID__ = "$Id$"
+
+import datetime
+import unittest
+
+from DIRAC                                                      import S_OK, S_ERROR
+from DIRAC.ConfigurationSystem.Client.ConfigurationData         import gConfigurationData
+from DIRAC.StorageManagementSystem.Agent                        import StageRequestAgent as agentModule
+from DIRAC.StorageManagementSystem.Agent.StageRequestAgent      import StageRequestAgent
+from DIRAC.StorageManagementSystem.Agent.StageScheduler         import StageScheduler, GB
+from DIRAC.StorageManagementSystem.DB.StorageManagementDB       import THROTTLING_STEPS
+
+SE = 'CERN-RAW'
+
+class StubStorageElement( object ):
+  """ Tape StorageElement recording the prestage requests, the PFNs in the order they are sent.
+      Its files are not Cached
+  """
+  requests = []
+
+  def __init__( self, name ):
+    self.name = name
+
+  def prestageFile( self, pfnDict, lifetime = 0 ):
+    self.requests.append( sorted( pfnDict, key = lambda pfn: pfnDict[pfn] ) )
+    return S_OK( { 'Successful' : dict.fromkeys( pfnDict, str( len( self.requests ) ) ), 'Failed' : {} } )
+
+  def getFileMetadata( self, pfnDict ):
+    return S_OK( { 'Successful' : dict( [ ( pfn, { 'Size' : 3 * GB, 'Lost' : False, 'Unavailable' : False,
+                                                   'Cached' : False } ) for pfn in pfnDict ] ),
+                   'Failed' : {} } )
+
+class StubStagerClient( object ):
+  """ StorageManagerClient on a dictionary of replicas: ReplicaID -> LFN, SE, PFN, Size, SubmitTime, Status and Task
+  """
+  def __init__( self, replicas, pinnedSize = 0. ):
+    self.replicas = replicas
+    self.pinnedSize = pinnedSize
+    self.stageRequests = []
+    self.failInsert = False
+
+  def __info( self, status = None, replicaIDs = None ):
+    return S_OK( dict( [ ( replicaID, dict( info ) ) for replicaID, info in self.replicas.items()
+                         if ( not status or info['Status'] == status ) and
+                            ( replicaIDs is None or replicaID in replicaIDs ) ] ) )
+
+  def getSubmittedStagePins( self ):
+    """ pinnedSize and the size of the StageSubmitted replicas """
+    submitted = [ info['Size'] for info in self.replicas.values() if info['Status'] == 'StageSubmitted' ]
+    if not self.pinnedSize and not submitted:
+      return S_OK( {} )
+    return S_OK( { SE : { 'Replicas' : len( submitted ) + 1, 'TotalSize' : self.pinnedSize + sum( submitted ) } } )
+
+  def getStagedReplicas( self ):
+    return self.__info( 'Staged' )
+
+  def getWaitingReplicas( self ):
+    return self.__info( 'Waiting' )
+
+  def getOfflineReplicas( self ):
+    return self.__info( 'Offline' )
+
+  def getAssociatedReplicas( self, replicaIDs ):
+    tasks = set( [ self.replicas[replicaID]['Task'] for replicaID in replicaIDs ] )
+    return self.__info( replicaIDs = [ replicaID for replicaID, info in self.replicas.items() if info['Task'] in tasks ] )
+
+  def insertStageRequest( self, requestDict, pinLifetime ):
+    if self.failInsert:
+      return S_ERROR( 'Connection error' )
+    self.stageRequests.append( requestDict )
+    return S_OK()
+
+  def updateReplicaStatus( self, replicaIDs, status ):
+    for replicaID in replicaIDs:
+      self.replicas[replicaID]['Status'] = status
+    return S_OK()
+
+  def updateReplicaFailure( self, terminalReplicaIDs ):
+    return S_OK()
+
+class StubbedStageRequestAgent( StageRequestAgent ):
+  """ StageRequestAgent as set up by its initialize, with the stub stager client
+  """
+  def __init__( self, stagerClient, maxFiles = 1000, maxSize = 2000. ):
+    self.stagerClient = stagerClient
+    self.pinLifetime = 86400
+    self.stageScheduler = StageScheduler( maxFiles, maxSize )
+
+def offlineReplicas( nFiles, directories = 1, task = None ):
+  """ nFiles replicas of 3 GB Offline at SE, spread over directories, each of them requested by its own task
+      unless task is given, the last directory being requested first
+  """
+  replicas = {}
+  for replicaID in range( 1, nFiles + 1 ):
+    directory = replicaID % directories
+    lfn = '/lhcb/data/2012/RAW/FULL/%06d/%06d_%08d.raw' % ( directory, directory, replicaID )
+    replicas[replicaID] = { 'LFN' : lfn, 'PFN' : 'srm://srm.cern.ch/castor' + lfn, 'SE' : SE, 'Size' : 3 * GB,
+                            'Status' : 'Offline', 'Task' : replicaID if task is None else task,
+                            'SubmitTime' : datetime.datetime( 2013, 1, 1 ) - datetime.timedelta( hours = directory ) }
+  return replicas
+
+class StageRequestAgentTestCase( unittest.TestCase ):
+  """ Base class of the StageRequestAgent test cases
+  """
+
+  def setUp( self ):
+    self.seClass = agentModule.StorageElement
+    agentModule.StorageElement = StubStorageElement
+    StubStorageElement.requests = []
+    # a cache of 30 GB per cycle
+    gConfigurationData.setOptionInCFG( '/Resources/StorageElements/%s/DiskCacheTB' % SE, str( 0.03 * THROTTLING_STEPS ) )
+
+  def tearDown( self ):
+    agentModule.StorageElement = self.seClass
+
+  def runCycle( self, stagerClient, maxFiles = 1000, maxSize = 2000. ):
+    agent = StubbedStageRequestAgent( stagerClient, maxFiles, maxSize )
+    self.assert_( agent.execute()['OK'] )
+    return agent
+
+  def submitted( self, stagerClient ):
+    return sorted( [ replicaID for replicaID, info in stagerClient.replicas.items() if info['Status'] == 'StageSubmitted' ] )
+
+  @staticmethod
+  def pfns( stagerClient, replicaIDs ):
+    return [ stagerClient.replicas[replicaID]['PFN'] for replicaID in replicaIDs ]
+
+class StageRequestBulks( StageRequestAgentTestCase ):
+
+  def testBulks( self ):
+    """ bulks of at most maxFiles, directories kept together, the oldest first """
+    stagerClient = StubStagerClient( offlineReplicas( 9, directories = 3 ) )
+    agent = self.runCycle( stagerClient, maxFiles = 3 )
+    self.assertEqual( StubStorageElement.requests, [ self.pfns( stagerClient, [ 2, 5, 8 ] ),
+                                                     self.pfns( stagerClient, [ 1, 4, 7 ] ),
+                                                     self.pfns( stagerClient, [ 3, 6, 9 ] ) ] )
+    self.assertEqual( self.submitted( stagerClient ), range( 1, 10 ) )
+    self.assertEqual( [ sorted( sum( request.values(), [] ) ) for request in stagerClient.stageRequests ],
+                      [ [ 2, 5, 8 ], [ 1, 4, 7 ], [ 3, 6, 9 ] ] )
+    self.assertAlmostEqual( agent.storageElementUsage[SE]['TotalSize'], 27. )
+
+  def testCacheBudget( self ):
+    """ the last bulk is cut to the cache budget, the rest is left for a later cycle """
+    # the 20 replicas of a single task: all selected, 60 GB for a cache of 30 GB
+    stagerClient = StubStagerClient( offlineReplicas( 20, task = 1 ) )
+    agent = self.runCycle( stagerClient, maxFiles = 8 )
+    self.assertEqual( [ len( request ) for request in StubStorageElement.requests ], [ 8, 2 ] )
+    self.assertEqual( len( self.submitted( stagerClient ) ), 10 )
+    self.assertAlmostEqual( agent.storageElementUsage[SE]['TotalSize'], 30. )
+
+    # the cache is full
+    StubStorageElement.requests = []
+    self.runCycle( stagerClient, maxFiles = 8 )
+    self.assertEqual( StubStorageElement.requests, [] )
+
+  def testPinnedSpace( self ):
+    """ the space of the submitted requests is deducted from the budget """
+    stagerClient = StubStagerClient( offlineReplicas( 20, task = 1 ), pinnedSize = 20 * GB )
+    self.runCycle( stagerClient )
+    self.assertEqual( [ len( request ) for request in StubStorageElement.requests ], [ 4 ] )
+
+  def testMissingReplicas( self ):
+    """ replicas of partially staged tasks are issued whatever the cache usage """
+    replicas = offlineReplicas( 20, task = 1 )
+    for replicaID in range( 1, 5 ):
+      replicas[replicaID]['Status'] = 'Staged'
+    stagerClient = StubStagerClient( replicas, pinnedSize = 100 * GB )
+    self.runCycle( stagerClient, maxFiles = 8 )
+    self.assertEqual( [ len( request ) for request in StubStorageElement.requests ], [ 8, 8 ] )
+    self.assertEqual( self.submitted( stagerClient ), range( 5, 21 ) )
+
+  def testInsertFailure( self ):
+    """ replicas whose stage request is not recorded are neither submitted nor counted in the cache """
+    stagerClient = StubStagerClient( offlineReplicas( 6, task = 1 ) )
+    stagerClient.failInsert = True
+    agent = self.runCycle( stagerClient, maxFiles = 3 )
+    self.assertEqual( len( StubStorageElement.requests ), 2 )
+    self.assertEqual( self.submitted( stagerClient ), [] )
+    self.assertEqual( agent.storageElementUsage[SE]['TotalSize'], 0. )
+
+class StageSchedulerBulks( unittest.TestCase ):
+
+  def testSizeBound( self ):
+    """ a directory larger than a bulk is split, the others are not """
+    replicas = offlineReplicas( 12, directories = 2 )
+    replicas.update( dict( [ ( replicaID + 100, dict( replicas[replicaID],
+                                                      LFN = replicas[replicaID]['LFN'].replace( 'FULL', 'EXPRESS' ) ) )
+                             for replicaID in ( 2, 4 ) ] ) )
+    bulks = StageScheduler( maxFiles = 100, maxSize = 10. ).getBulks( replicas.keys(), replicas )
+    self.assertEqual( [ len( bulk ) for bulk in bulks ], [ 3, 3, 3, 3, 2 ] )
+    self.assertEqual( sorted( bulks[-1] ), [ 102, 104 ] )
+    for bulk in bulks:
+      self.assert_( StageScheduler.getBulkSize( bulk, replicas ) <= 10. )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( StageRequestBulks )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( StageSchedulerBulks ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -18,7 +18,7 @@ import threading
 
 from DIRAC                                        import gLogger, S_OK, S_ERROR
 from DIRAC.Core.Base.DB                           import DB
-from DIRAC.Core.Utilities.List                    import intListToString, stringListToString
+from DIRAC.Core.Utilities.List                    import intListToString, stringListToString, breakListIntoChunks
 
 # Stage Request are issue with a length of "PinLength"
 # However, once Staged, the entry in the StageRequest will set a PinExpiryTime only for "PinLength" / THROTTLING_STEPS
@@ -32,6 +32,8 @@ from DIRAC.Core.Utilities.List                    import intListToString, string
 #
 THROTTLING_TIME = 86400
 THROTTLING_STEPS = 12
+# Max number of replicas per multi-row statement
+REPLICA_CHUNK_SIZE = 1000
 
 class StorageManagementDB( DB ):
 
@@ -518,52 +520,53 @@ class StorageManagementDB( DB ):
   #
 
   def setRequest( self, lfnDict, source, callbackMethod, sourceTaskID, connection = False ):
-    """ This method populates the StorageManagementDB Tasks table with the requested files. """
+    """ This method populates the StorageManagementDB Tasks table with the requested files.
+
+        The existing CacheReplicas are looked up and the missing ones inserted for all the
+        ( SE, LFN ) pairs at once, with a number of statements depending on the number of
+        chunks of REPLICA_CHUNK_SIZE files, not on the number of files.
+    """
     connection = self.__getConnection( connection )
     if not lfnDict:
       return S_ERROR( "No files supplied in request" )
+    seLFNs = {}
+    for se, lfns in lfnDict.items():
+      if type( lfns ) in types.StringTypes:
+        lfns = [lfns]
+      seLFNs[se] = sorted( set( lfns ) )
     # The first step is to create the task in the Tasks table
     res = self._createTask( source, callbackMethod, sourceTaskID, connection = connection )
     if not res['OK']:
       return res
     taskID = res['Value']
     # Get the Replicas which already exist in the CacheReplicas table
-    allReplicaIDs = []
-    taskStates = []
-    for se, lfns in lfnDict.items():
-      if type( lfns ) in types.StringTypes:
-        lfns = [lfns]
-      res = self._getExistingReplicas( se, lfns, connection = connection )
-      if not res['OK']:
-        return res
-      existingReplicas = res['Value']
-      # Insert the CacheReplicas that do not already exist
-      for lfn in lfns:
-        if lfn in existingReplicas.keys():
-          gLogger.verbose( 'StorageManagementDB.setRequest: Replica already exists in CacheReplicas table %s @ %s' % ( lfn, se ) )
-          existingFileState = existingReplicas[lfn][1]
-          taskState = self.__getTaskStateFromReplicaState( existingFileState )
-        else:
-          res = self._insertReplicaInformation( lfn, se, 'Stage', connection = connection )
-          if not res['OK']:
-            self._cleanTask( taskID, connection = connection )
-            return res
-
-          existingReplicas[lfn] = ( res['Value'], 'New' )
-          newFileState = existingReplicas[lfn][1]
-          taskState = self.__getTaskStateFromReplicaState( newFileState )
-        if not taskState in taskStates:
-          taskStates.append( taskState )
-
-      allReplicaIDs.extend( existingReplicas.values() )
+    res = self._getExistingReplicasBulk( seLFNs, connection = connection )
+    if not res['OK']:
+      self._cleanTask( taskID, connection = connection )
+      return res
+    replicas = res['Value']
+    gLogger.verbose( 'StorageManagementDB.setRequest: %d replicas already exist in CacheReplicas table' % len( replicas ) )
+    # Insert the CacheReplicas that do not already exist
+    missing = {}
+    for se, lfns in seLFNs.items():
+      lfns = [lfn for lfn in lfns if ( se, lfn ) not in replicas]
+      if lfns:
+        missing[se] = lfns
+    res = self._insertReplicasBulk( missing, 'Stage', connection = connection )
+    if not res['OK']:
+      self._cleanTask( taskID, connection = connection )
+      return res
+    for seLFN, replicaID in res['Value'].items():
+      replicas[seLFN] = ( replicaID, 'New' )
     # Insert all the replicas into the TaskReplicas table
-    res = self._insertTaskReplicaInformation( taskID, allReplicaIDs, connection = connection )
+    res = self._insertTaskReplicaInformation( taskID, replicas.values(), connection = connection )
     if not res['OK']:
       self._cleanTask( taskID, connection = connection )
       return res
     # Check whether the the task status is Done based on the existing file states
     # If all the files for a particular Task are 'Staged', update the Task
-    if taskStates == ['Staged']:
+    taskStates = set( [self.__getTaskStateFromReplicaState( status ) for _replicaID, status in replicas.values()] )
+    if taskStates == set( ['Staged'] ):
     # so if the tasks are for LFNs from the lfns dictionary, which are already staged,
     # they immediately change state New->Done. Fixed it to translate such tasks to 'Staged' state
       self.__updateTaskStatus( [taskID], 'Staged', True, connection = connection )
@@ -610,6 +613,64 @@ class StorageManagementDB( DB ):
       existingReplicas[lfn] = ( replicaID, status )
     return S_OK( existingReplicas )
 
+  def _getExistingReplicasBulk( self, seLFNs, minReplicaID = 0, connection = False ):
+    """ Obtains the ReplicaIDs and Status of the replicas already entered in the CacheReplicas table
+
+    :param dict seLFNs: { SE : [ LFNs ] }
+    :param int minReplicaID: only consider the replicas with a ReplicaID greater or equal
+    :return: S_OK( { ( SE, LFN ) : ( ReplicaID, Status ) } ), the smallest ReplicaID for duplicates
+    """
+    connection = self.__getConnection( connection )
+    existingReplicas = {}
+    conditions = []
+    for se, lfns in seLFNs.items():
+      for lfnChunk in breakListIntoChunks( lfns, REPLICA_CHUNK_SIZE ):
+        conditions.append( "( SE = '%s' AND LFN IN (%s) )" % ( se, stringListToString( lfnChunk ) ) )
+    for condChunk in breakListIntoChunks( conditions, max( 1, REPLICA_CHUNK_SIZE / 100 ) ):
+      req = "SELECT ReplicaID,SE,LFN,Status FROM CacheReplicas WHERE ReplicaID >= %d AND ( %s ) ORDER BY ReplicaID;" % ( minReplicaID,
+                                                                                                                      ' OR '.join( condChunk ) )
+      res = self._query( req, connection )
+      if not res['OK']:
+        gLogger.error( 'StorageManagementDB._getExistingReplicasBulk: Failed to get existing replicas.', res['Message'] )
+        return res
+      for replicaID, se, lfn, status in res['Value']:
+        existingReplicas.setdefault( ( se, lfn ), ( replicaID, status ) )
+    return S_OK( existingReplicas )
+
+  def _insertReplicasBulk( self, seLFNs, rType, connection = False ):
+    """ Enter the replicas into the CacheReplicas table with multi-row statements
+
+    :param dict seLFNs: { SE : [ LFNs ] }, replicas not in the table yet
+    :param str rType: replica type
+    :return: S_OK( { ( SE, LFN ) : ReplicaID } )
+    """
+    connection = self.__getConnection( connection )
+    values = []
+    for se, lfns in seLFNs.items():
+      for lfn in lfns:
+        values.append( "('%s','%s','%s','',0,'','',UTC_TIMESTAMP(),UTC_TIMESTAMP())" % ( rType, se, lfn ) )
+    if not values:
+      return S_OK( {} )
+    firstReplicaID = None
+    for valueChunk in breakListIntoChunks( values, REPLICA_CHUNK_SIZE ):
+      req = "INSERT INTO CacheReplicas (Type,SE,LFN,PFN,Size,FileChecksum,GUID,SubmitTime,LastUpdate) VALUES %s;" % ','.join( valueChunk )
+      res = self._update( req, connection )
+      if not res['OK']:
+        gLogger.error( "_insertReplicasBulk: Failed to insert to CacheReplicas table.", res['Message'] )
+        return res
+      # lastRowId is the ReplicaID of the first row inserted by a multi-row statement
+      if firstReplicaID is None:
+        firstReplicaID = res.get( 'lastRowId', 0 )
+    # Recover the ReplicaIDs of the new rows
+    res = self._getExistingReplicasBulk( seLFNs, minReplicaID = firstReplicaID, connection = connection )
+    if not res['OK']:
+      return res
+    replicaIDs = dict( [( seLFN, replicaID ) for seLFN, ( replicaID, _status ) in res['Value'].items()] )
+    if len( replicaIDs ) != len( values ):
+      return S_ERROR( "Failed to recover the ReplicaIDs of %d inserted replicas" % ( len( values ) - len( replicaIDs ) ) )
+    gLogger.verbose( "StorageManagementDB._insertReplicasBulk: Inserted %d replicas in CacheReplicas table" % len( replicaIDs ) )
+    return S_OK( replicaIDs )
+
   def _insertReplicaInformation( self, lfn, storageElement, rType, connection = False ):
     """ Enter the replica into the CacheReplicas table """
     connection = self.__getConnection( connection )
@@ -633,17 +694,17 @@ class StorageManagementDB( DB ):
   def _insertTaskReplicaInformation( self, taskID, replicaIDs, connection = False ):
     """ Enter the replicas into TaskReplicas table """
     connection = self.__getConnection( connection )
-    req = "INSERT INTO TaskReplicas (TaskID,ReplicaID) VALUES "
-    for replicaID, _status in replicaIDs:
-      replicaString = "(%s,%s)," % ( taskID, replicaID )
-      req = "%s %s" % ( req, replicaString )
-    req = req.rstrip( ',' )
-    res = self._update( req, connection )
-    if not res['OK']:
-      gLogger.error( 'StorageManagementDB._insertTaskReplicaInformation: Failed to insert to TaskReplicas table.', res['Message'] )
-      return res
+    values = ["(%s,%s)" % ( taskID, replicaID ) for replicaID, _status in replicaIDs]
+    inserted = 0
+    for valueChunk in breakListIntoChunks( values, REPLICA_CHUNK_SIZE ):
+      req = "INSERT INTO TaskReplicas (TaskID,ReplicaID) VALUES %s;" % ','.join( valueChunk )
+      res = self._update( req, connection )
+      if not res['OK']:
+        gLogger.error( 'StorageManagementDB._insertTaskReplicaInformation: Failed to insert to TaskReplicas table.', res['Message'] )
+        return res
+      inserted += res['Value']
     # gLogger.info( "%s_DB:%s" % ('_insertTaskReplicaInformation',req))
-    gLogger.verbose( "StorageManagementDB._insertTaskReplicaInformation: Successfully added %s CacheReplicas to Task %s." % ( res['Value'], taskID ) )
+    gLogger.verbose( "StorageManagementDB._insertTaskReplicaInformation: Successfully added %s CacheReplicas to Task %s." % ( inserted, taskID ) )
     return S_OK()
 
   #
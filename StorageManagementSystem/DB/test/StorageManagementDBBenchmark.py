@@ -0,0 +1,113 @@
+########################################################################
+# $HeadURL $
+# File: StorageManagementDBBenchmark.py
+########################################################################
+""" :mod: StorageManagementDBBenchmark
+    ==================================
+
+    .. module: StorageManagementDBBenchmark
+    :synopsis: per request latency of StorageManagementDB.setRequest vs number of files
+
+    StorageManagementDB runs on an in memory sqlite stand-in of the MySQL tables,
+    counting the statements. The set based setRequest is compared with the former
+    per file registration ( one INSERT and one SELECT per missing replica ), half of
+    the replicas of every request being already known.
+
+    usage: python StorageManagementDBBenchmark.py [fileCount ...]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import sys
+import time
+import types
+import sqlite3
+import datetime
+# # SUT
+from DIRAC.StorageManagementSystem.DB.StorageManagementDB import StorageManagementDB
+
+SCHEMA = """
+CREATE TABLE Tasks( TaskID INTEGER PRIMARY KEY AUTOINCREMENT, Status VARCHAR(32) DEFAULT 'New',
+  Source VARCHAR(32), SubmitTime DATETIME, LastUpdate DATETIME, CompleteTime DATETIME,
+  CallBackMethod VARCHAR(255), SourceTaskID VARCHAR(32) );
+CREATE TABLE TaskReplicas( TaskID INTEGER NOT NULL, ReplicaID INTEGER NOT NULL, PRIMARY KEY (TaskID,ReplicaID) );
+CREATE TRIGGER taskreplicasAfterInsert AFTER INSERT ON TaskReplicas FOR EACH ROW BEGIN
+  UPDATE CacheReplicas SET Links=Links+1 WHERE ReplicaID=NEW.ReplicaID; END;
+CREATE TABLE CacheReplicas( ReplicaID INTEGER PRIMARY KEY AUTOINCREMENT, Type VARCHAR(32) NOT NULL,
+  Status VARCHAR(32) DEFAULT 'New', SE VARCHAR(32) NOT NULL, LFN VARCHAR(255) NOT NULL, PFN VARCHAR(255),
+  Size BIGINT DEFAULT 0, FileChecksum VARCHAR(255) NOT NULL, GUID VARCHAR(255) NOT NULL,
+  SubmitTime DATETIME NOT NULL, LastUpdate DATETIME, Reason VARCHAR(255), Links INTEGER DEFAULT 0 );
+CREATE INDEX CacheReplicasLFN ON CacheReplicas(LFN,SE);
+"""
+
+class SQLiteStorageManagementDB( StorageManagementDB ):
+  """ StorageManagementDB on an in memory sqlite database """
+  def __init__( self ):
+    self.connection = sqlite3.connect( ":memory:" )
+    self.connection.create_function( "UTC_TIMESTAMP", 0, lambda: str( datetime.datetime.utcnow() ) )
+    self.connection.executescript( SCHEMA )
+    self.statements = 0
+
+  def _getConnection( self ):
+    return { "OK" : True, "Value" : self.connection }
+
+  def _query( self, cmd, conn = None ):
+    self.statements += 1
+    return { "OK" : True, "Value" : tuple( self.connection.execute( cmd ).fetchall() ) }
+
+  def _update( self, cmd, conn = None ):
+    self.statements += 1
+    cursor = self.connection.execute( cmd )
+    result = { "OK" : True, "Value" : cursor.rowcount }
+    # # MySQL returns the id of the first row of a multi-row INSERT, sqlite the last one
+    if cmd.startswith( "INSERT" ):
+      result["lastRowId"] = cursor.lastrowid - cursor.rowcount + 1
+    return result
+
+def perFileSetRequest( db, lfnDict, source, callbackMethod, sourceTaskID ):
+  """ the former setRequest: one INSERT and one SELECT per missing replica """
+  taskID = db._createTask( source, callbackMethod, sourceTaskID )["Value"]
+  allReplicaIDs = []
+  for se, lfns in lfnDict.items():
+    if type( lfns ) in types.StringTypes:
+      lfns = [ lfns ]
+    existingReplicas = db._getExistingReplicas( se, lfns )["Value"]
+    for lfn in lfns:
+      if lfn not in existingReplicas:
+        existingReplicas[lfn] = ( db._insertReplicaInformation( lfn, se, "Stage" )["Value"], "New" )
+    allReplicaIDs.extend( existingReplicas.values() )
+  db._insertTaskReplicaInformation( taskID, allReplicaIDs )
+  return { "OK" : True, "Value" : taskID }
+
+def makeRequest( nFiles, offset ):
+  """ nFiles LFNs on 3 SEs, starting at LFN number offset """
+  lfnDict = {}
+  for i in range( offset, offset + nFiles ):
+    lfnDict.setdefault( "SE-%d-RAW" % ( i % 3 ), [] ).append( "/vo/data/run%06d/file%08d.raw" % ( i / 100, i ) )
+  return lfnDict
+
+def run( db, setRequest, nFiles ):
+  """ register a request with half of the replicas already known, return ( seconds, statements ) """
+  setRequest( makeRequest( nFiles, 0 ), "Benchmark", "callback", "1" )
+  statements = db.statements
+  startTime = time.time()
+  result = setRequest( makeRequest( nFiles, nFiles / 2 ), "Benchmark", "callback", "2" )
+  elapsed = time.time() - startTime
+  assert result["OK"], result
+  links = db._query( "SELECT COUNT(*) FROM TaskReplicas WHERE TaskID = %s" % result["Value"] )["Value"][0][0]
+  assert links == nFiles, ( links, nFiles )
+  return elapsed, db.statements - statements
+
+def benchmark( fileCounts ):
+  """ print the latency and statement count of both implementations """
+  print "%8s | %12s %10s | %12s %10s | %7s" % ( "files", "per file (s)", "statements",
+                                                "set (s)", "statements", "speedup" )
+  for nFiles in fileCounts:
+    db = SQLiteStorageManagementDB()
+    oldTime, oldStatements = run( db, lambda *args: perFileSetRequest( db, *args ), nFiles )
+    db = SQLiteStorageManagementDB()
+    newTime, newStatements = run( db, db.setRequest, nFiles )
+    print "%8d | %12.3f %10d | %12.3f %10d | %6.1fx" % ( nFiles, oldTime, oldStatements,
+                                                          newTime, newStatements, oldTime / max( newTime, 1e-6 ) )
+
+if __name__ == "__main__":
+  benchmark( [ int( arg ) for arg in sys.argv[1:] ] or [ 100, 1000, 10000, 50000 ] )
@@ -0,0 +1,3 @@
+"""
+   DIRAC.StorageManagementSystem.DB test package
+"""
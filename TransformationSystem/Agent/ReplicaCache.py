@@ -0,0 +1,135 @@
+""" ReplicaCache is the persistent replica cache of the TransformationAgent
+
+    The replicas are kept in an embedded sqlite database, one row per
+    ( transformation, LFN ), so that:
+
+    - replicas of a transformation are read only when that transformation is processed
+    - new replicas are written per transformation, without rewriting the whole cache
+    - expired replicas are removed with a single indexed DELETE
+"""
+
+import os
+import time
+import pickle
+import sqlite3
+import datetime
+import threading
+
+__RCSID__ = "$Id$"
+
+class ReplicaCache( object ):
+  """ Replicas ( LFN -> list of SEs ) cached per transformation with their insertion time
+  """
+
+  def __init__( self, cacheFile ):
+    """ c'tor
+
+    :param str cacheFile: path of the sqlite file, created if needed
+    """
+    self.cacheFile = cacheFile
+    self.__lock = threading.Lock()
+    self.__connection = sqlite3.connect( cacheFile, check_same_thread = False )
+    self.__connection.text_factory = str
+    try:
+      self.__connection.execute( "PRAGMA journal_mode=WAL" )
+      self.__connection.execute( "PRAGMA synchronous=NORMAL" )
+    except sqlite3.Error:
+      pass
+    with self.__connection:
+      self.__connection.execute( "CREATE TABLE IF NOT EXISTS Replicas ( TransformationID INTEGER NOT NULL, "
+                                 "LFN TEXT NOT NULL, SEs TEXT NOT NULL, UpdateTime REAL NOT NULL, "
+                                 "PRIMARY KEY ( TransformationID, LFN ) )" )
+      self.__connection.execute( "CREATE INDEX IF NOT EXISTS UpdateTimeIndex ON Replicas ( UpdateTime )" )
+
+  @staticmethod
+  def __toEpoch( dateTime ):
+    """ datetime to seconds since epoch """
+    return time.mktime( dateTime.timetuple() ) + dateTime.microsecond / 1000000.
+
+  def close( self ):
+    """ close the sqlite connection, everything is already committed """
+    with self.__lock:
+      self.__connection.close()
+
+  def transformations( self ):
+    """ list of the transformations having cached replicas """
+    with self.__lock:
+      return [ row[0] for row in self.__connection.execute( "SELECT DISTINCT TransformationID FROM Replicas" ) ]
+
+  def get( self, transID ):
+    """ get all the cached replicas of a transformation
+
+    :return: dictionary { lfn : [ se1, se2, ... ] }
+    """
+    with self.__lock:
+      rows = self.__connection.execute( "SELECT LFN, SEs FROM Replicas WHERE TransformationID = ?",
+                                        ( int( transID ), ) ).fetchall()
+    return dict( [ ( lfn, ses.split( ',' ) ) for lfn, ses in rows ] )
+
+  def update( self, transID, replicas, updateTime = None ):
+    """ add or replace cached replicas of a transformation
+
+    :param dict replicas: { lfn : [ se1, se2, ... ] }
+    :param datetime updateTime: time of the insertion, now by default
+    """
+    if not replicas:
+      return 0
+    updateTime = self.__toEpoch( updateTime if updateTime else datetime.datetime.utcnow() )
+    rows = [ ( int( transID ), lfn, ','.join( ses ), updateTime ) for lfn, ses in replicas.items() if ses ]
+    with self.__lock:
+      with self.__connection:
+        self.__connection.executemany( "INSERT OR REPLACE INTO Replicas VALUES ( ?, ?, ?, ? )", rows )
+    return len( rows )
+
+  def remove( self, transID, lfns ):
+    """ remove some LFNs from the cache of a transformation """
+    if not lfns:
+      return 0
+    with self.__lock:
+      with self.__connection:
+        cursor = self.__connection.executemany( "DELETE FROM Replicas WHERE TransformationID = ? AND LFN = ?",
+                                                [ ( int( transID ), lfn ) for lfn in lfns ] )
+    return cursor.rowcount
+
+  def clear( self, transID ):
+    """ remove all the cached replicas of a transformation """
+    with self.__lock:
+      with self.__connection:
+        cursor = self.__connection.execute( "DELETE FROM Replicas WHERE TransformationID = ?", ( int( transID ), ) )
+    return cursor.rowcount
+
+  def expire( self, timeLimit ):
+    """ remove all the replicas cached before timeLimit
+
+    :param datetime timeLimit: UTC time limit
+    :return: dictionary { transID : number of removed replicas }
+    """
+    limit = self.__toEpoch( timeLimit )
+    with self.__lock:
+      with self.__connection:
+        rows = self.__connection.execute( "SELECT TransformationID, COUNT(*) FROM Replicas WHERE UpdateTime < ? "
+                                          "GROUP BY TransformationID", ( limit, ) ).fetchall()
+        if rows:
+          self.__connection.execute( "DELETE FROM Replicas WHERE UpdateTime < ?", ( limit, ) )
+    return dict( rows )
+
+  def importPickle( self, pickleFile ):
+    """ import a cache written by former versions of the agent, i.e. a pickled
+        { transID : { updateTime : { lfn : [ ses ] } } } dictionary, and remove the file
+
+    :return: number of imported replicas
+    """
+    if not os.path.exists( pickleFile ):
+      return 0
+    pklFile = open( pickleFile, 'r' )
+    try:
+      oldCache = pickle.load( pklFile )
+    finally:
+      pklFile.close()
+    imported = 0
+    for transID, replicaSets in oldCache.items():
+      # older sets first so that the most recent replicas win
+      for updateTime in sorted( replicaSets ):
+        imported += self.update( transID, replicaSets[updateTime], updateTime = updateTime )
+    os.remove( pickleFile )
+    return imported
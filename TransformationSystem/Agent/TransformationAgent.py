@@ -1,21 +1,20 @@
 """  TransformationAgent processes transformations found in the transformation database.
 """
 
-import time, re, random, Queue, os, datetime, pickle
+import time, re, random, Queue, os, datetime
 from DIRAC                                                          import S_OK, S_ERROR
 from DIRAC.Core.Base.AgentModule                                    import AgentModule
 from DIRAC.Core.Utilities.ThreadPool                                import ThreadPool
-from DIRAC.Core.Utilities.ThreadSafe                                import Synchronizer
 from DIRAC.Core.Utilities.List                                      import sortList, breakListIntoChunks
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations            import Operations
 from DIRAC.TransformationSystem.Client.TransformationClient         import TransformationClient
 from DIRAC.TransformationSystem.Agent.TransformationAgentsUtilities import TransformationAgentsUtilities
+from DIRAC.TransformationSystem.Agent.ReplicaCache                  import ReplicaCache
 from DIRAC.DataManagementSystem.Client.DataManager                  import DataManager
 
 __RCSID__ = "$Id$"
 
 AGENT_NAME = 'Transformation/TransformationAgent'
-gSynchro = Synchronizer()
 
 class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
   """ Usually subclass of AgentModule
@@ -48,16 +47,15 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     self.transQueue = Queue.Queue()
     self.transInQueue = []
 
-    # for caching using a pickle file
+    # for caching using a sqlite file, former pickle files are imported
     self.workDirectory = self.am_getWorkDirectory()
-    self.cacheFile = os.path.join( self.workDirectory, 'ReplicaCache.pkl' )
+    self.cacheFile = os.path.join( self.workDirectory, 'ReplicaCache.sqlite' )
+    self.pickleCacheFile = os.path.join( self.workDirectory, 'ReplicaCache.pkl' )
     self.controlDirectory = self.am_getControlDirectory()
-    self.dateWriteCache = datetime.datetime.utcnow()
 
     # Validity of the cache
     self.replicaCache = None
     self.replicaCacheValidity = self.am_getOption( 'ReplicaCacheValidity', 2 )
-    self.writingCache = False
 
     self.noUnusedDelay = self.am_getOption( 'NoUnusedDelay', 6 )
     self.unusedFiles = {}
@@ -70,8 +68,9 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     """ standard initialize
     """
 
-    self.__readCache()
-    self.dateWriteCache = datetime.datetime.utcnow()
+    res = self.__openCache()
+    if not res['OK']:
+      return res
 
     self.am_setOption( 'shifterProxy', 'ProductionManager' )
 
@@ -96,7 +95,8 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
       while self.transInThread:
         time.sleep( 2 )
       self.log.info( "Threads are empty, terminating the agent..." )
-    self.__writeCache( force = True )
+    if self.replicaCache:
+      self.replicaCache.close()
     return S_OK()
 
   def execute( self ):
@@ -367,11 +367,9 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     self._logVerbose( "Getting replicas for %d files" % nLfns, method = method, transID = transID )
     newLFNs = []
     try:
-      cachedReplicaSets = self.replicaCache.get( transID, {} )
-      cachedReplicas = {}
-      # Merge all sets of replicas
-      for crs in cachedReplicaSets:
-        cachedReplicas.update( cachedReplicaSets[crs] )
+      # Only the replicas of this transformation are loaded
+      cachedReplicas = self.replicaCache.get( transID )
+      obsoleteLFNs = []
       self._logVerbose( "Number of cached replicas: %d" % len( cachedReplicas ), method = method, transID = transID )
       # Sorted browsing
       for cacheLfn in sorted( cachedReplicas ):
@@ -386,10 +384,10 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
             continue
         if not lfns or lfns[0] > cacheLfn:
         # Remove files from the cache that are not in the required list
-          for crs in cachedReplicaSets:
-            cachedReplicaSets[crs].pop( cacheLfn, None )
+          obsoleteLFNs.append( cacheLfn )
       # Add what is left as new files
       newLFNs += lfns
+      self.replicaCache.remove( transID, obsoleteLFNs )
     except Exception:
       self._logException( "Exception when browsing cache", method = method, transID = transID )
     self._logVerbose( "ReplicaCache hit for %d out of %d LFNs" % ( len( dataReplicas ), nLfns ),
@@ -479,88 +477,50 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     return S_OK( dataReplicas )
 
 
-  @gSynchro
-  def __updateCache( self, transID, newReplicas ):
-    """ Add replicas to the cache
+  def __openCache( self ):
+    """ Opens the replica cache and imports the pickle file written by former versions
     """
-    self.replicaCache.setdefault( transID, {} )[datetime.datetime.utcnow()] = newReplicas
-
-  @gSynchro
-  def __clearCacheForTrans( self, transID ):
-    """ Remove all replicas for a transformation
-    """
-    self.replicaCache.pop( transID , None )
-
-  @gSynchro
-  def __cleanCache( self ):
-    """ Cleans the cache
-    """
-    cacheChanged = False
     try:
-      timeLimit = datetime.datetime.utcnow() - datetime.timedelta( days = self.replicaCacheValidity )
-      for transID in sorted( self.replicaCache ):
-        for updateTime in self.replicaCache[transID].keys():
-          if updateTime < timeLimit or not self.replicaCache[transID][updateTime]:
-            self._logVerbose( "Clear %d cached replicas for transformation %s" % ( len( self.replicaCache[transID][updateTime] ),
-                                                                                    str( transID ) ), method = '__cleanCache' )
-            self.replicaCache[transID].pop( updateTime )
-            cacheChanged = True
-        # Remove empty transformations
-        if not self.replicaCache[transID]:
-          self.replicaCache.pop( transID )
+      self.replicaCache = ReplicaCache( self.cacheFile )
+      self._logInfo( "Successfully opened replica cache %s" % self.cacheFile )
+    except Exception, e:
+      self._logException( "Failed to open replica cache %s" % self.cacheFile, method = '__openCache' )
+      return S_ERROR( "Failed to open replica cache: %s" % str( e ) )
+    try:
+      imported = self.replicaCache.importPickle( self.pickleCacheFile )
+      if imported:
+        self._logInfo( "Imported %d replicas from %s" % ( imported, self.pickleCacheFile ) )
     except Exception:
-      self._logException( "Exception when cleaning replica cache:" )
+      self._logException( "Failed to import replica cache from file %s" % self.pickleCacheFile, method = '__openCache' )
+    return S_OK()
 
-    # Write the cache file
+  def __updateCache( self, transID, newReplicas ):
+    """ Add replicas to the cache
+    """
     try:
-      if cacheChanged:
-        self.__writeCache()
+      self.replicaCache.update( transID, newReplicas )
     except Exception:
-      self._logException( "While writing replica cache" )
+      self._logException( "Exception when updating replica cache", method = '__updateCache', transID = transID )
 
-  def __readCache( self ):
-    """ Reads from the cache
+  def __clearCacheForTrans( self, transID ):
+    """ Remove all replicas for a transformation
     """
     try:
-      cacheFile = open( self.cacheFile, 'r' )
-      self.replicaCache = pickle.load( cacheFile )
-      cacheFile.close()
-      self._logInfo( "Successfully loaded replica cache from file %s" % self.cacheFile )
+      return self.replicaCache.clear( transID )
     except Exception:
-      self._logException( "Failed to load replica cache from file %s" % self.cacheFile, method = '__readCache' )
-      self.replicaCache = {}
+      self._logException( "Exception when clearing replica cache", method = '__clearCacheForTrans', transID = transID )
+    return 0
 
-  def __writeCache( self, force = False ):
-    """ Writes the cache
+  def __cleanCache( self ):
+    """ Cleans the cache from the replicas older than the validity
     """
-    method = '__writeCache'
-    now = datetime.datetime.utcnow()
-    if ( now - self.dateWriteCache ) < datetime.timedelta( minutes = 60 ) and not force:
-      return
-    while force and self.writingCache:
-      # If writing is forced, wait until the previous write is over
-      time.sleep( 10 )
     try:
-      startTime = time.time()
-      self.dateWriteCache = now
-      if self.writingCache:
-        return
-      self.writingCache = True
-      # Protect the copy of the cache
-      tmpCache = self.replicaCache.copy()
-      # write to a temporary file in order to avoid corrupted files
-      tmpFile = self.cacheFile + '.tmp'
-      f = open( tmpFile, 'w' )
-      pickle.dump( tmpCache, f )
-      f.close()
-      # Now rename the file as it shold
-      os.rename( tmpFile, self.cacheFile )
-      self._logVerbose( "Successfully wrote replica cache file %s in %.1f seconds" \
-                        % ( self.cacheFile, time.time() - startTime ), method = method )
+      timeLimit = datetime.datetime.utcnow() - datetime.timedelta( days = self.replicaCacheValidity )
+      for transID, nReplicas in sorted( self.replicaCache.expire( timeLimit ).items() ):
+        self._logVerbose( "Clear %d cached replicas for transformation %s" % ( nReplicas, str( transID ) ),
+                          method = '__cleanCache' )
     except Exception:
-      self._logException( "Could not write replica cache file %s" % self.cacheFile, method = method )
-    finally:
-      self.writingCache = False
+      self._logException( "Exception when cleaning replica cache:" )
 
   def __generatePluginObject( self, plugin, clients ):
     """ This simply instantiates the TransformationPlugin class with the relevant plugin name
@@ -582,20 +542,10 @@ class TransformationAgent( AgentModule, TransformationAgentsUtilities ):
     plugin_o.setDirectory( self.workDirectory )
     plugin_o.setCallback( self.pluginCallback )
 
-  @gSynchro
   def pluginCallback( self, transID, invalidateCache = False ):
     """ Standard plugin callback
     """
-    save = False
     if invalidateCache:
-      try:
-        if transID in self.replicaCache:
-          self._logInfo( "Removed cached replicas for transformation" , method = 'pluginCallBack', transID = transID )
-          self.replicaCache.pop( transID )
-          save = True
-      except:
-        pass
-
-      if save:
-        self.__writeCache()
+      if self.__clearCacheForTrans( transID ):
+        self._logInfo( "Removed cached replicas for transformation" , method = 'pluginCallBack', transID = transID )
 
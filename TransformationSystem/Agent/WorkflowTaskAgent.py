@@ -19,7 +19,8 @@ class WorkflowTaskAgent( TaskManagerAgentBase ):
     TaskManagerAgentBase.__init__( self, *args, **kwargs )
 
     self.submissionClient = WMSClient()
-    self.taskManager = WorkflowTasks( transClient = self.transClient, submissionClient = self.submissionClient )
+    self.taskManager = WorkflowTasks( transClient = self.transClient, submissionClient = self.submissionClient,
+                                      bulkSubmissionFlag = self.am_getOption( 'BulkSubmission', False ) )
     self.shifterProxy = 'ProductionManager'
     agentTSTypes = self.am_getOption( 'TransType', [] )
     if agentTSTypes:
@@ -0,0 +1,67 @@
+""" Test for the TransformationAgent persistent replica cache
+"""
+
+import os
+import shutil
+import pickle
+import datetime
+import tempfile
+import unittest
+
+from DIRAC.TransformationSystem.Agent.ReplicaCache import ReplicaCache
+
+class ReplicaCacheTestCase( unittest.TestCase ):
+  """ Base class for the ReplicaCache test cases
+  """
+  def setUp( self ):
+    self.workDir = tempfile.mkdtemp()
+    self.cacheFile = os.path.join( self.workDir, 'ReplicaCache.sqlite' )
+    self.cache = ReplicaCache( self.cacheFile )
+
+  def tearDown( self ):
+    self.cache.close()
+    shutil.rmtree( self.workDir )
+
+class ReplicaCacheSuccess( ReplicaCacheTestCase ):
+
+  def test_perTransformation( self ):
+    self.cache.update( 1, {'/a/1':['SE1', 'SE2'], '/a/2':['SE2'], '/a/3':[]} )
+    self.cache.update( 2, {'/b/1':['SE3']} )
+    self.assertEqual( self.cache.get( 1 ), {'/a/1':['SE1', 'SE2'], '/a/2':['SE2']} )
+    self.assertEqual( self.cache.get( 3 ), {} )
+    self.assertEqual( self.cache.remove( 1, ['/a/2', '/a/4'] ), 1 )
+    self.assertEqual( self.cache.get( 1 ), {'/a/1':['SE1', 'SE2']} )
+    self.assertEqual( self.cache.clear( 2 ), 1 )
+    self.assertEqual( self.cache.transformations(), [1] )
+
+  def test_persistence( self ):
+    self.cache.update( 1, {'/a/1':['SE1']} )
+    self.cache.close()
+    self.cache = ReplicaCache( self.cacheFile )
+    self.assertEqual( self.cache.get( 1 ), {'/a/1':['SE1']} )
+
+  def test_expire( self ):
+    now = datetime.datetime.utcnow()
+    self.cache.update( 1, {'/a/1':['SE1'], '/a/2':['SE1']}, updateTime = now - datetime.timedelta( days = 3 ) )
+    self.cache.update( 1, {'/a/2':['SE2']}, updateTime = now )
+    self.cache.update( 2, {'/b/1':['SE1']}, updateTime = now - datetime.timedelta( days = 3 ) )
+    self.assertEqual( self.cache.expire( now - datetime.timedelta( days = 2 ) ), {1:1, 2:1} )
+    self.assertEqual( self.cache.get( 1 ), {'/a/2':['SE2']} )
+    self.assertEqual( self.cache.get( 2 ), {} )
+
+  def test_importPickle( self ):
+    now = datetime.datetime.utcnow()
+    pickleFile = os.path.join( self.workDir, 'ReplicaCache.pkl' )
+    oldCache = {1:{now - datetime.timedelta( hours = 1 ):{'/a/1':['SE1']}, now:{'/a/1':['SE2'], '/a/2':['SE1']}}}
+    pklFile = open( pickleFile, 'w' )
+    pickle.dump( oldCache, pklFile )
+    pklFile.close()
+    self.assertEqual( self.cache.importPickle( pickleFile ), 3 )
+    self.assertFalse( os.path.exists( pickleFile ) )
+    self.assertEqual( self.cache.get( 1 ), {'/a/1':['SE2'], '/a/2':['SE1']} )
+    self.assertEqual( self.cache.importPickle( pickleFile ), 0 )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( ReplicaCacheTestCase )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( ReplicaCacheSuccess ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
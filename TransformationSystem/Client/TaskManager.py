@@ -4,6 +4,9 @@ __RCSID__ = "$Id$"
 
 COMPONENT_NAME = 'TaskManager'
 
+# Jobs submitted to the WMS with a single call, the default MaxBulkJobs of the JobManager
+MAX_BULK_JOBS = 500
+
 import time, types, os
 
 from DIRAC                                                      import S_OK, S_ERROR, gLogger
@@ -19,6 +22,7 @@ from DIRAC.RequestManagementSystem.private.RequestValidator     import gRequestV
 from DIRAC.WorkloadManagementSystem.Client.WMSClient            import WMSClient
 from DIRAC.WorkloadManagementSystem.Client.JobMonitoringClient  import JobMonitoringClient
 from DIRAC.TransformationSystem.Client.TransformationClient     import TransformationClient
+from DIRAC.TransformationSystem.Client.WorkflowTemplate         import WorkflowTemplate
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations        import Operations
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry          import getDNForUsername
 
@@ -53,17 +57,27 @@ class TaskBase( object ):
 
   def updateDBAfterTaskSubmission( self, taskDict ):
     """ Sets tasks status after the submission to "Submitted", in case of success
+        The tasks of a transformation are updated with a single call, or one by one if it fails
     """
     updated = 0
     startTime = time.time()
+    transTaskWmsIDs = {}
     for taskID in sorted( taskDict ):
-      transID = taskDict[taskID]['TransformationID']
       if taskDict[taskID]['Success']:
-        res = self.transClient.setTaskStatusAndWmsID( transID, taskID, 'Submitted',
-                                                      str( taskDict[taskID]['ExternalID'] ) )
+        transID = taskDict[taskID]['TransformationID']
+        transTaskWmsIDs.setdefault( transID, {} )[taskID] = str( taskDict[taskID]['ExternalID'] )
+    for transID, taskWmsIDs in transTaskWmsIDs.items():
+      res = self.transClient.setTaskStatusAndWmsIDBulk( transID, taskWmsIDs, 'Submitted' )
+      if res['OK']:
+        updated += len( taskWmsIDs )
+        continue
+      self.log.warn( "updateDBAfterSubmission: Failed to update tasks status after submission, updating them one by one",
+                     "%s %s" % ( transID, res['Message'] ) )
+      for taskID in sorted( taskWmsIDs ):
+        res = self.transClient.setTaskStatusAndWmsID( transID, taskID, 'Submitted', taskWmsIDs[taskID] )
         if not res['OK']:
           self.log.warn( "updateDBAfterSubmission: Failed to update task status after submission" ,
-                         "%s %s" % ( taskDict[taskID]['ExternalID'], res['Message'] ) )
+                         "%s %s" % ( taskWmsIDs[taskID], res['Message'] ) )
         updated += 1
     self.log.info( "updateDBAfterSubmission: Updated %d tasks in %.1f seconds" % ( updated, time.time() - startTime ) )
     return S_OK()
@@ -351,10 +365,11 @@ class WorkflowTasks( TaskBase ):
   """
 
   def __init__( self, transClient = None, logger = None, submissionClient = None, jobMonitoringClient = None,
-                outputDataModule = None, jobClass = None, opsH = None ):
+                outputDataModule = None, jobClass = None, opsH = None, bulkSubmissionFlag = False ):
     """ Generates some default objects.
         jobClass is by default "DIRAC.Interfaces.API.Job.Job". An extension of it also works:
         VOs can pass in their job class extension, if present
+        With bulkSubmissionFlag, the jobs of the tasks are submitted with a single call to the WMS
     """
 
     if not logger:
@@ -387,10 +402,12 @@ class WorkflowTasks( TaskBase ):
     else:
       self.outputDataModule = outputDataModule
 
+    self.bulkSubmissionFlag = bulkSubmissionFlag
 
   def prepareTransformationTasks( self, transBody, taskDict, owner = '', ownerGroup = '', ownerDN = '' ):
     """ Prepare tasks, given a taskDict, that is created (with some manipulation) by the DB
         jobClass is by default "DIRAC.Interfaces.API.Job.Job". An extension of it also works.
+        The transformation body is parsed once, task jobs being derived from it (see WorkflowTemplate)
     """
     if ( not owner ) or ( not ownerGroup ):
       res = getProxyInfo( False, False )
@@ -406,8 +423,9 @@ class WorkflowTasks( TaskBase ):
         return res
       ownerDN = res['Value'][0]
 
+    template = WorkflowTemplate( transBody, self.jobClass )
     for taskNumber in sorted( taskDict ):
-      oJob = self.jobClass( transBody )
+      oJob = template.newJob()
       paramsDict = taskDict[taskNumber]
       site = oJob.workflow.findParameter( 'Site' ).getValue()
       paramsDict['Site'] = site
@@ -450,7 +468,7 @@ class WorkflowTasks( TaskBase ):
 
       taskDict[taskNumber]['TaskObject'] = ''
       if self.outputDataModule:
-        res = self.getOutputData( {'Job':oJob._toXML(), 'TransformationID':transID,
+        res = self.getOutputData( {'Job':template.toXML( oJob ), 'TransformationID':transID,
                                    'TaskID':taskNumber, 'InputData':inputData},
                                   moduleLocation = self.outputDataModule )
         if not res ['OK']:
@@ -458,7 +476,7 @@ class WorkflowTasks( TaskBase ):
           continue
         for name, output in res['Value'].items():
           oJob._addJDLParameter( name, ';'.join( output ) )
-      taskDict[taskNumber]['TaskObject'] = self.jobClass( oJob._toXML() )
+      taskDict[taskNumber]['TaskObject'] = template.taskJob( oJob )
     return S_OK( taskDict )
 
   #############################################################################
@@ -548,8 +566,10 @@ class WorkflowTasks( TaskBase ):
     return module.execute()
 
   def submitTransformationTasks( self, taskDict ):
-    """ Submit jobs one by one
+    """ Submit jobs one by one, or all together if bulkSubmissionFlag is set
     """
+    if self.bulkSubmissionFlag:
+      return self.__submitTransformationTasksBulk( taskDict )
     submitted = 0
     failed = 0
     startTime = time.time()
@@ -573,8 +593,71 @@ class WorkflowTasks( TaskBase ):
       self.log.error( 'submitTransformationTasks: Failed to submit %d tasks to WMS.' % ( failed ) )
     return S_OK( taskDict )
 
-  def submitTaskToExternal( self, job ):
-    """ Submits a single job to the WMS.
+  def __submitTransformationTasksBulk( self, taskDict ):
+    """ Submit the jobs of the tasks to the WMS by bunches of MAX_BULK_JOBS, their input sandboxes
+        being uploaded one by one. The jobs of a bunch rejected by the JobManager, none of them being
+        inserted, are submitted one by one. If the outcome of the call is unknown, its tasks are failed
+        and left Reserved: their jobs, if any, are found by updateTransformationReservedTasks.
+    """
+    submitted = 0
+    failed = 0
+    startTime = time.time()
+    taskIDs = []
+    jdls = []
+    for taskID in sorted( taskDict ):
+      taskDict[taskID]['Success'] = False
+      if not taskDict[taskID]['TaskObject']:
+        failed += 1
+        continue
+      res = self.__prepareTaskForExternal( taskDict[taskID]['TaskObject'] )
+      if not res['OK']:
+        self.log.error( "Failed to prepare task for WMS", res['Message'] )
+        failed += 1
+        continue
+      taskIDs.append( taskID )
+      jdls.append( res['Value'] )
+
+    results = []
+    for i in range( 0, len( jdls ), MAX_BULK_JOBS ):
+      results += self.__submitJobsBulk( jdls[i:i + MAX_BULK_JOBS] )
+
+    for taskID, res in zip( taskIDs, results ):
+      if res['OK']:
+        taskDict[taskID]['ExternalID'] = res['Value']
+        taskDict[taskID]['Success'] = True
+        submitted += 1
+      else:
+        self.log.error( "Failed to submit task to WMS", res['Message'] )
+        failed += 1
+    self.log.info( 'submitTransformationTasks: Submitted %d tasks to WMS in %.1f seconds' % ( submitted,
+                                                                                            time.time() - startTime ) )
+    if failed:
+      self.log.error( 'submitTransformationTasks: Failed to submit %d tasks to WMS.' % ( failed ) )
+    return S_OK( taskDict )
+
+  def __submitJobsBulk( self, jdls ):
+    """ Submit jdls with a single call to the WMS, returns the S_OK( jobID ) or S_ERROR of each of them
+    """
+    res = self.submissionClient.submitJobs( jdls )
+    if res['OK'] and len( res['Value'] ) == len( jdls ):
+      return [S_OK( jobID ) for jobID in res['Value']]
+    if not res['OK'] and res.get( 'Rejected' ):
+      self.log.warn( "Tasks rejected by the WMS in bulk, submitting them one by one", res['Message'] )
+      results = []
+      for jdl in jdls:
+        res = self.submissionClient.submitJobs( [jdl] )
+        if res['OK']:
+          res = S_OK( res['Value'][0] )
+        results.append( res )
+      return results
+    # The jobs may have been created: the tasks are not submitted again
+    if res['OK']:
+      res = S_ERROR( "%d job IDs for %d tasks" % ( len( res['Value'] ), len( jdls ) ) )
+    self.log.error( "Failed to submit tasks to WMS in bulk, leaving them Reserved", res['Message'] )
+    return [res] * len( jdls )
+
+  def __callWithJobDescription( self, job, call ):
+    """ Calls call( jdl ) for a job or its XML description, the XML being written in jobDescription.xml
     """
     if type( job ) in types.StringTypes:
       try:
@@ -591,10 +674,20 @@ class WorkflowTasks( TaskBase ):
     workflowFile.write( oJob._toXML() )
     workflowFile.close()
     jdl = oJob._toJDL()
-    res = self.submissionClient.submitJob( jdl )
+    res = call( jdl )
     os.remove( "jobDescription.xml" )
     return res
 
+  def __prepareTaskForExternal( self, job ):
+    """ Uploads the input sandbox of a job, returns the JDL to submit to the WMS
+    """
+    return self.__callWithJobDescription( job, self.submissionClient.prepareJob )
+
+  def submitTaskToExternal( self, job ):
+    """ Submits a single job to the WMS.
+    """
+    return self.__callWithJobDescription( job, self.submissionClient.submitJob )
+
   def updateTransformationReservedTasks( self, taskDicts ):
     requestNames = []
     for taskDict in taskDicts:
@@ -38,6 +38,7 @@ class TransformationClient( Client, FileCatalogueBase ):
 
           setTaskStatus(transName, taskID, status)
           setTaskStatusAndWmsID(transName, taskID, status, taskWmsID)
+          setTaskStatusAndWmsIDBulk(transName, taskWmsIDs, status)
           getTransformationTaskStats(transName)
           deleteTasks(transName, taskMin, taskMax)
           extendTransformation( transName, nTasks)
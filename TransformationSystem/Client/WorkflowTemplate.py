@@ -0,0 +1,164 @@
+""" WorkflowTemplate parses a transformation body once and derives the jobs of its tasks from it
+
+    For each task, WorkflowTasks used to parse the transformation body, modify the job, write it
+    to XML and parse the XML again to get the task job. Tasks only change the workflow name and the
+    workflow parameters: the template keeps the parsed body and the XML of its module and step
+    definitions and step instances, task jobs being copies of it with their own parameters, which
+    share these definitions and instances, and their XML being the template XML patched with them.
+
+    Task jobs and XML are the same as those of the former path. A task changing more than the
+    template can patch (other workflow attributes, values not read back as written) takes the
+    former path.
+"""
+
+import re
+
+from DIRAC                                                      import S_OK
+from DIRAC.Core.Workflow.Parameter                              import AttributeCollection, Parameter, \
+                                                                       ParameterCollection
+from DIRAC.Core.Workflow.Workflow                               import Workflow
+
+__RCSID__ = "$Id$"
+
+class WorkflowTemplate( object ):
+  """ Jobs of the tasks of a transformation, from its body parsed once
+  """
+
+  # text not read back as written: in CDATA sections, in elements and in attributes
+  __unsafeCDATA = re.compile( r'\]\]>|[\r\x80-\xff]' )
+  __unsafeText = re.compile( r'\]\]>|[<&\r\x80-\xff]' )
+  __unsafeAttribute = re.compile( r'[<&"\t\n\r\x80-\xff]' )
+
+  def __init__( self, transBody, jobClass ):
+    """ Parses transBody with jobClass, then the XML of the result as task jobs are read from their XML
+    """
+    self.transBody = transBody
+    self.jobClass = jobClass
+    self.template = jobClass( transBody )
+    # jobClass may not come with a workflow to patch
+    self.compiled = isinstance( getattr( self.template, 'workflow', None ), Workflow )
+    if not self.compiled:
+      return
+    workflow = self.template.workflow
+    # workflow attributes in the order they are written
+    self.attributeNames = [ name for name in workflow.keys() if name != 'parent' ]
+    self.xmlTail = workflow.module_definitions.toXML() + workflow.step_definitions.toXML() + \
+                   workflow.step_instances.toXML() + '</Workflow>\n'
+    self.taskTemplate = jobClass( workflow.toXML() )
+
+  def newJob( self ):
+    """ Job to be modified for a task, as jobClass( transBody )
+    """
+    if not self.compiled:
+      return self.jobClass( self.transBody )
+    workflow = self.template.workflow
+    attributes = [ ( name, workflow[name] ) for name in workflow.keys() ]
+    return self.__copyJob( self.template, self.__copyWorkflow( workflow, attributes,
+                                                               ParameterCollection( workflow.parameters ) ) )
+
+  def toXML( self, job ):
+    """ XML of a job got from newJob, as job._toXML()
+    """
+    if not self.compiled or not self.__isPatchable( job.workflow ):
+      return job._toXML()
+    return self.__toXML( job.workflow )
+
+  def taskJob( self, job ):
+    """ Task job for a job got from newJob, as jobClass( job._toXML() )
+    """
+    if not self.compiled or not self.__isPatchable( job.workflow ):
+      return self.jobClass( job._toXML() )
+    readBack = self.__readBack( job.workflow )
+    if not readBack:
+      return self.jobClass( self.__toXML( job.workflow ) )
+    attributes, parameters = readBack
+    taskJob = self.__copyJob( self.taskTemplate, self.__copyWorkflow( self.taskTemplate.workflow,
+                                                                      attributes, parameters ) )
+    # as set by jobClass( xml )
+    taskJob.script = self.__toXML( job.workflow )
+    return taskJob
+
+  def __isPatchable( self, workflow ):
+    """ Workflow attributes are those of the template
+    """
+    return len( workflow ) == len( self.attributeNames ) and \
+           not [ name for name in self.attributeNames if name not in workflow ]
+
+  def __toXML( self, workflow ):
+    """ Workflow.toXML with the template definitions and instances
+    """
+    return '<Workflow>\n' + self.__attributesXML( workflow ) + workflow.parameters.toXML() + self.xmlTail
+
+  def __attributesXML( self, workflow ):
+    """ AttributeCollection.toXML in the order of the template
+    """
+    xml = []
+    for name in self.attributeNames:
+      if name in ( 'body', 'description' ):
+        xml.append( '<' + name + '><![CDATA[' + str( workflow[name] ) + ']]></' + name + '>\n' )
+      else:
+        xml.append( '<' + name + '>' + str( workflow[name] ) + '</' + name + '>\n' )
+    return ''.join( xml )
+
+  def __readBack( self, workflow ):
+    """ Workflow attributes (in insertion order) and parameters, as read from the workflow XML,
+        None if some of them would not be read back as written
+    """
+    attributes = []
+    for name in self.attributeNames:
+      value = str( workflow[name] )
+      unsafe = self.__unsafeCDATA if name in ( 'body', 'description' ) else self.__unsafeText
+      if unsafe.search( value ):
+        return None
+      attributes.append( ( name, value ) )
+
+    parameters = ParameterCollection()
+    for parameter in workflow.parameters:
+      fields = [ str( field ) for field in ( parameter.name, parameter.type, parameter.linked_module,
+                                             parameter.linked_parameter, parameter.typein, parameter.typeout,
+                                             parameter.description ) ]
+      value = str( parameter.getValue() )
+      if [ field for field in fields if self.__unsafeAttribute.search( field ) ] or self.__unsafeCDATA.search( value ):
+        return None
+      name, ptype, linkedModule, linkedParameter, typein, typeout, description = fields
+      readBack = Parameter( name, None, ptype, linkedModule, linkedParameter, typein, typeout, description )
+      try:
+        if readBack.isTypeString():
+          readBack.setValue( value )
+        else:
+          readBack.setValue( eval( value ) )
+      except Exception:
+        return None
+      # names are unique already
+      list.append( parameters, readBack )
+    return attributes, parameters
+
+  @staticmethod
+  def __copyWorkflow( workflow, attributes, parameters ):
+    """ Workflow with attributes and parameters, sharing the definitions and instances of workflow
+    """
+    newWorkflow = Workflow.__new__( Workflow )
+    AttributeCollection.__init__( newWorkflow )
+    for name, value in attributes:
+      newWorkflow[name] = value
+    newWorkflow.parameters = parameters
+    newWorkflow.module_definitions = workflow.module_definitions
+    newWorkflow.step_definitions = workflow.step_definitions
+    newWorkflow.step_instances = workflow.step_instances
+    newWorkflow.workflow_commons = {}
+    newWorkflow.workflowStatus = S_OK()
+    return newWorkflow
+
+  @staticmethod
+  def __copyJob( job, workflow ):
+    """ Copy of job with workflow, its lists and dictionaries being copied
+    """
+    newJob = job.__class__.__new__( job.__class__ )
+    for name, value in job.__dict__.items():
+      if type( value ) == list:
+        value = list( value )
+      elif type( value ) == dict:
+        value = dict( value )
+      newJob.__dict__[name] = value
+    newJob.workflow = workflow
+    return newJob
@@ -0,0 +1,204 @@
+""" Submission of the tasks of a transformation to the WMS and update of the TransformationDB,
+    one by one or in bulk, against local stand-ins of the JobManager and TransformationManager
+    services: each call costs a fixed latency, their DBs are sqlite tables written with
+    the statements of JobDB.insertNewJobIntoDB / insertNewJobsIntoDB and of
+    TransformationDB.setTaskStatusAndWmsID / setTaskStatusAndWmsIDBulk. Input sandboxes,
+    uploaded one by one in both modes, are left out.
+
+    usage: python TaskSubmissionBenchmark.py [nTasks,nTasks...] [latency]
+"""
+
+import copy
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from DIRAC import S_OK, S_ERROR
+
+from test_TaskSubmission import SubmissionTasks
+from test_WorkflowTemplate import transformationBody, taskDictionary
+
+class StandInDB( object ):
+  """ sqlite DB counting its statements """
+
+  def __init__( self, schema ):
+    self.connection = sqlite3.connect( ':memory:' )
+    self.connection.executescript( schema )
+    self.statements = 0
+
+  def execute( self, cmd, values = () ):
+    self.statements += 1
+    cursor = self.connection.execute( cmd, values )
+    self.connection.commit()
+    return cursor
+
+class StandInWMSClient( object ):
+  """ WMSClient calling a JobManager stand-in """
+
+  jobName = re.compile( r'JobName\s*=\s*"([^"]*)"' )
+  inputData = re.compile( r'InputData\s*=\s*{([^}]*)}' )
+
+  def __init__( self, latency ):
+    self.latency = latency
+    self.calls = 0
+    self.db = StandInDB( """
+      CREATE TABLE JobJDLs ( JobID INTEGER PRIMARY KEY AUTOINCREMENT, OriginalJDL TEXT, JDL TEXT );
+      CREATE TABLE Jobs ( JobID INTEGER PRIMARY KEY, JobName TEXT, Status TEXT, MinorStatus TEXT );
+      CREATE TABLE InputData ( JobID INTEGER, LFN TEXT );
+      CREATE TABLE JobParameters ( JobID INTEGER, Name TEXT, Value TEXT );
+      CREATE TABLE JobsSummary ( Status TEXT PRIMARY KEY, Jobs INTEGER );
+      INSERT INTO JobsSummary VALUES ( 'Received', 0 );
+      CREATE TABLE LoggingInfo ( JobID INTEGER, Status TEXT, MinorStatus TEXT, StatusSource TEXT );
+      """ )
+
+  def __call( self ):
+    self.calls += 1
+    time.sleep( self.latency )
+
+  def __rows( self, jdl ):
+    """ Jobs, InputData and JobParameters rows without JobID """
+    name = self.jobName.search( jdl )
+    lfns = self.inputData.search( jdl )
+    lfns = [ lfn.strip( ' "' ) for lfn in lfns.group( 1 ).split( ',' ) ] if lfns else []
+    return ( name.group( 1 ) if name else '', 'Received', 'Job accepted' ), [ lfn for lfn in lfns if lfn ], \
+           [ ( 'JobType', 'MCSimulation' ) ]
+
+  def prepareJob( self, jdl ):
+    return S_OK( jdl )
+
+  def submitJob( self, jdl ):
+    """ insertNewJobIntoDB: one JobID at a time """
+    self.__call()
+    jobID = self.db.execute( 'INSERT INTO JobJDLs (OriginalJDL) VALUES (?)', ( jdl, ) ).lastrowid
+    self.db.execute( 'UPDATE JobJDLs SET JDL=? WHERE JobID=?', ( jdl, jobID ) )
+    jobRow, lfns, parameters = self.__rows( jdl )
+    if lfns:
+      self.db.execute( 'INSERT INTO InputData (JobID,LFN) VALUES %s' % ', '.join( [ '(?, ?)' ] * len( lfns ) ),
+                       sum( [ ( jobID, lfn ) for lfn in lfns ], () ) )
+    self.db.execute( 'INSERT OR REPLACE INTO JobParameters (JobID,Name,Value) VALUES %s' % \
+                     ', '.join( [ '(?, ?, ?)' ] * len( parameters ) ),
+                     sum( [ ( jobID, ) + parameter for parameter in parameters ], () ) )
+    self.db.execute( 'INSERT INTO Jobs (JobID,JobName,Status,MinorStatus) VALUES (?, ?, ?, ?)', ( jobID, ) + jobRow )
+    self.db.execute( 'UPDATE JobsSummary SET Jobs=Jobs+1 WHERE Status=?', ( 'Received', ) )
+    self.db.execute( 'INSERT INTO LoggingInfo VALUES (?, ?, ?, ?)', ( jobID, ) + jobRow[1:] + ( 'JobManager', ) )
+    return S_OK( jobID )
+
+  def submitJobs( self, jdlList ):
+    """ insertNewJobsIntoDB: multi-row statements in one transaction """
+    self.__call()
+    if not jdlList:
+      return S_OK( [] )
+    # START TRANSACTION and COMMIT
+    self.db.statements += 2
+    markers = [ 'insertNewJobsIntoDB:%d' % i for i in range( len( jdlList ) ) ]
+    self.db.execute( 'INSERT INTO JobJDLs (JDL,OriginalJDL) VALUES %s' % ', '.join( [ '(?, ?)' ] * len( jdlList ) ),
+                     sum( zip( markers, jdlList ), () ) )
+    markerIDs = dict( [ ( marker, jobID ) for jobID, marker in
+                        self.db.execute( 'SELECT JobID, JDL FROM JobJDLs WHERE JDL IN (%s)' % \
+                                         ', '.join( [ '?' ] * len( markers ) ), tuple( markers ) ) ] )
+    jobIDs = [ markerIDs[marker] for marker in markers ]
+    jobRows, inputData, parameters, jdls = [], [], [], []
+    for jobID, jdl in zip( jobIDs, jdlList ):
+      jobRow, lfns, jobParameters = self.__rows( jdl )
+      jobRows.append( ( jobID, ) + jobRow )
+      inputData += [ ( jobID, lfn ) for lfn in lfns ]
+      parameters += [ ( jobID, ) + parameter for parameter in jobParameters ]
+      jdls.append( ( jobID, jdl ) )
+    self.db.execute( 'UPDATE JobJDLs SET JDL=CASE JobID %s END WHERE JobID IN (%s)' % \
+                     ( ' '.join( [ 'WHEN ? THEN ?' ] * len( jdls ) ), ', '.join( [ '?' ] * len( jobIDs ) ) ),
+                     sum( jdls, () ) + tuple( jobIDs ) )
+    for cmd, rows in ( ( 'INSERT INTO InputData (JobID,LFN) VALUES %s', inputData ),
+                       ( 'INSERT INTO JobParameters (JobID,Name,Value) VALUES %s', parameters ),
+                       ( 'INSERT INTO Jobs (JobID,JobName,Status,MinorStatus) VALUES %s', jobRows ) ):
+      if rows:
+        placeHolders = '(%s)' % ', '.join( [ '?' ] * len( rows[0] ) )
+        self.db.execute( cmd % ', '.join( [ placeHolders ] * len( rows ) ), sum( rows, () ) )
+    self.db.execute( 'UPDATE JobsSummary SET Jobs=Jobs+? WHERE Status=?', ( len( jobIDs ), 'Received' ) )
+    self.db.execute( 'INSERT INTO LoggingInfo VALUES %s' % ', '.join( [ '(?, ?, ?, ?)' ] * len( jobIDs ) ),
+                     sum( [ row[:1] + row[2:] + ( 'JobManager', ) for row in jobRows ], () ) )
+    return S_OK( jobIDs )
+
+class StandInTransClient( object ):
+  """ TransformationClient calling a TransformationManager stand-in, with or without bulk update """
+
+  def __init__( self, latency, taskDict, bulk = True ):
+    self.latency = latency
+    self.bulk = bulk
+    self.calls = 0
+    self.db = StandInDB( """
+      CREATE TABLE TransformationTasks ( TransformationID INTEGER, TaskID INTEGER, ExternalStatus TEXT,
+                                         ExternalID TEXT, LastUpdateTime TEXT,
+                                         PRIMARY KEY ( TransformationID, TaskID ) );
+      """ )
+    for taskID, task in taskDict.items():
+      self.db.execute( "INSERT INTO TransformationTasks VALUES (?, ?, 'Reserved', '0', datetime('now'))",
+                       ( task['TransformationID'], taskID ) )
+    self.db.statements = 0
+
+  def __call( self ):
+    self.calls += 1
+    time.sleep( self.latency )
+
+  def setTaskStatusAndWmsID( self, transName, taskID, status, taskWmsID ):
+    self.__call()
+    for name, value in ( ( 'ExternalStatus', status ), ( 'ExternalID', taskWmsID ) ):
+      self.db.execute( "UPDATE TransformationTasks SET %s=?, LastUpdateTime=datetime('now') "
+                       "WHERE TransformationID=? AND TaskID=?" % name, ( value, transName, taskID ) )
+    return S_OK()
+
+  def setTaskStatusAndWmsIDBulk( self, transName, taskWmsIDs, status ):
+    if not self.bulk:
+      return S_ERROR( 'Unknown method setTaskStatusAndWmsIDBulk' )
+    self.__call()
+    taskIDs = sorted( taskWmsIDs )
+    self.db.execute( "UPDATE TransformationTasks SET ExternalStatus=?, ExternalID=CASE TaskID %s END, "
+                     "LastUpdateTime=datetime('now') WHERE TransformationID=? AND TaskID IN (%s)" % \
+                     ( ' '.join( [ 'WHEN ? THEN ?' ] * len( taskIDs ) ), ', '.join( [ '?' ] * len( taskIDs ) ) ),
+                     ( status, ) + sum( [ ( taskID, taskWmsIDs[taskID] ) for taskID in taskIDs ], () ) +
+                     ( transName, ) + tuple( taskIDs ) )
+    return S_OK()
+
+def submissionCycle( bulk, preparedTasks, latency ):
+  """ submission and DB update of prepared tasks: elapsed time, clients """
+  taskDict = copy.deepcopy( preparedTasks )
+  wmsClient = StandInWMSClient( latency )
+  transClient = StandInTransClient( latency, taskDict, bulk )
+  tasks = SubmissionTasks( bulkSubmissionFlag = bulk, submissionClient = wmsClient, transClient = transClient )
+  start = time.time()
+  taskDict = tasks.submitTransformationTasks( taskDict )['Value']
+  tasks.updateDBAfterTaskSubmission( taskDict )
+  elapsed = time.time() - start
+  submitted = transClient.db.execute( "SELECT COUNT(*) FROM TransformationTasks WHERE ExternalStatus='Submitted'" )
+  assert submitted.fetchone()[0] == len( [ task for task in taskDict.values() if task['Success'] ] )
+  return elapsed, wmsClient, transClient
+
+def benchmark( nTasksList = ( 50, 200, 500 ), latency = 0.005 ):
+  """ print round trips, statements and time of a submission cycle, one by one or in bulk """
+  print "%.3fs per call" % latency
+  print "%-8s %-8s %8s %12s %10s" % ( "tasks", "mode", "calls", "statements", "time" )
+  cwd = os.getcwd()
+  tmpDir = tempfile.mkdtemp()
+  os.chdir( tmpDir )
+  try:
+    for nTasks in nTasksList:
+      tasks = SubmissionTasks()
+      preparedTasks = tasks.prepareTransformationTasks( transformationBody(), taskDictionary( nTasks ),
+                                                        'owner', 'ownerGroup', '/DC=org/CN=owner' )['Value']
+      times = {}
+      for mode, bulk in ( ( "single", False ), ( "bulk", True ) ):
+        times[mode], wmsClient, transClient = submissionCycle( bulk, preparedTasks, latency )
+        print "%-8d %-8s %8d %12d %9.2fs" % ( nTasks, mode, wmsClient.calls + transClient.calls,
+                                              wmsClient.db.statements + transClient.db.statements, times[mode] )
+      print "%-8d %-8s %30.1fx" % ( nTasks, "speedup", times["single"] / times["bulk"] )
+  finally:
+    os.chdir( cwd )
+    shutil.rmtree( tmpDir )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( [ int( nTasks ) for nTasks in args[0].split( "," ) ] if len( args ) > 0 else ( 50, 200, 500 ),
+             float( args[1] ) if len( args ) > 1 else 0.005 )
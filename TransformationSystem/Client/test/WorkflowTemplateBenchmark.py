@@ -0,0 +1,35 @@
+""" Tasks per second prepared by WorkflowTasks, parsing the transformation body for each task
+    (former path) or once (WorkflowTemplate)
+
+    usage: python WorkflowTemplateBenchmark.py [nTasks] [nSteps,nSteps...]
+"""
+
+import copy
+import sys
+import time
+
+from test_WorkflowTemplate import LegacyTasks, OutputDataTasks, transformationBody, taskDictionary
+
+def prepare( tasks, transBody, taskDict ):
+  """ elapsed time and prepared tasks """
+  start = time.time()
+  res = tasks.prepareTransformationTasks( transBody, taskDict, 'owner', 'ownerGroup', '/DC=org/CN=owner' )
+  return time.time() - start, res['Value']
+
+def benchmark( nTasks = 2000, stepsList = ( 1, 5, 20 ) ):
+  """ print tasks per second of both paths, check their task jobs are the same """
+  print "%-6s %-10s %-8s %12s %12s %8s" % ( "steps", "XML bytes", "tasks", "former/s", "template/s", "speedup" )
+  for nSteps in stepsList:
+    transBody = transformationBody( nSteps )
+    taskDict = taskDictionary( nTasks )
+    legacyTime, legacyTasks = prepare( LegacyTasks(), transBody, copy.deepcopy( taskDict ) )
+    newTime, tasks = prepare( OutputDataTasks(), transBody, copy.deepcopy( taskDict ) )
+    for taskID in tasks:
+      assert tasks[taskID]['TaskObject']._toXML() == legacyTasks[taskID]['TaskObject']._toXML()
+    print "%-6d %-10d %-8d %12.1f %12.1f %7.1fx" % ( nSteps, len( transBody ), nTasks, nTasks / legacyTime,
+                                                    nTasks / newTime, legacyTime / newTime )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 2000,
+             [ int( steps ) for steps in args[1].split( "," ) ] if len( args ) > 1 else ( 1, 5, 20 ) )
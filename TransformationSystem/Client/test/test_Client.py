@@ -21,6 +21,7 @@ class ClientsTestCase( unittest.TestCase ):
 
     self.mockTransClient = Mock()
     self.mockTransClient.setTaskStatusAndWmsID.return_value = {'OK':True}
+    self.mockTransClient.setTaskStatusAndWmsIDBulk.return_value = {'OK':True}
 
     self.WMSClientMock = Mock()
     self.jobMonitoringClient = Mock()
@@ -0,0 +1,202 @@
+""" Submission of the tasks of a transformation to the WMS, one by one and in bulk,
+    and update of the TransformationDB after the submission
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from DIRAC                                                    import S_OK, S_ERROR
+from DIRAC.TransformationSystem.Client                        import TaskManager
+from DIRAC.TransformationSystem.Client.TaskManager            import TaskBase
+
+from test_WorkflowTemplate import OutputDataTasks, transformationBody, taskDictionary
+
+#############################################################################
+
+class FakeWMSClient( object ):
+  """ WMSClient handing out consecutive job IDs, counting its calls.
+      Jobs with badJobMark in their JDL are rejected, with their whole bunch.
+      With lostReply, the reply to the nth submitJobs call is lost, its jobs being inserted
+  """
+  def __init__( self, badJobMark = None, lostReply = None ):
+    self.badJobMark = badJobMark
+    self.lostReply = lostReply
+    self.bulkSizes = []
+    self.nextJobID = 1000
+    self.calls = {'prepareJob':0, 'submitJob':0, 'submitJobs':0}
+    self.jdls = []
+
+  def __isBad( self, jdl ):
+    return self.badJobMark and self.badJobMark in jdl
+
+  def prepareJob( self, jdl ):
+    self.calls['prepareJob'] += 1
+    if not os.path.exists( 'jobDescription.xml' ):
+      return S_ERROR( 'Input Sandbox is not valid' )
+    return S_OK( jdl )
+
+  def submitJob( self, jdl ):
+    self.calls['submitJob'] += 1
+    if self.__isBad( jdl ):
+      return S_ERROR( 'Invalid job JDL' )
+    self.jdls.append( jdl )
+    self.nextJobID += 1
+    return S_OK( self.nextJobID )
+
+  def submitJobs( self, jdlList ):
+    self.calls['submitJobs'] += 1
+    self.bulkSizes.append( len( jdlList ) )
+    if len( jdlList ) > TaskManager.MAX_BULK_JOBS or [ jdl for jdl in jdlList if self.__isBad( jdl ) ]:
+      res = S_ERROR( 'Invalid job JDL' )
+      res['Rejected'] = True
+      return res
+    self.jdls += jdlList
+    jobIDs = range( self.nextJobID + 1, self.nextJobID + 1 + len( jdlList ) )
+    self.nextJobID += len( jdlList )
+    if self.calls['submitJobs'] == self.lostReply:
+      return S_ERROR( 'Connection timeout' )
+    return S_OK( jobIDs )
+
+class FakeTransClient( object ):
+  """ TransformationClient recording the tasks status updates
+  """
+  def __init__( self, bulkAvailable = True ):
+    self.bulkAvailable = bulkAvailable
+    self.calls = {'setTaskStatusAndWmsID':0, 'setTaskStatusAndWmsIDBulk':0}
+    self.tasks = {}
+
+  def setTaskStatusAndWmsID( self, transName, taskID, status, taskWmsID ):
+    self.calls['setTaskStatusAndWmsID'] += 1
+    self.tasks[( transName, taskID )] = ( status, taskWmsID )
+    return S_OK()
+
+  def setTaskStatusAndWmsIDBulk( self, transName, taskWmsIDs, status ):
+    self.calls['setTaskStatusAndWmsIDBulk'] += 1
+    if not self.bulkAvailable:
+      return S_ERROR( 'Unknown method setTaskStatusAndWmsIDBulk' )
+    for taskID, taskWmsID in taskWmsIDs.items():
+      self.tasks[( transName, taskID )] = ( status, taskWmsID )
+    return S_OK()
+
+class SubmissionTasks( OutputDataTasks ):
+  """ WorkflowTasks with fake WMS and transformation clients
+  """
+  def __init__( self, bulkSubmissionFlag = False, submissionClient = None, transClient = None ):
+    super( SubmissionTasks, self ).__init__()
+    self.submissionClient = submissionClient if submissionClient else FakeWMSClient()
+    self.transClient = transClient if transClient else FakeTransClient()
+    self.bulkSubmissionFlag = bulkSubmissionFlag
+
+def submittedTasks( tasks, taskDict, transBody = None ):
+  """ Tasks prepared and submitted by tasks
+  """
+  res = tasks.prepareTransformationTasks( transBody if transBody else transformationBody(), taskDict,
+                                          'owner', 'ownerGroup', '/DC=org/CN=owner' )
+  if not res['OK']:
+    return res
+  return tasks.submitTransformationTasks( res['Value'] )
+
+#############################################################################
+
+class TaskSubmissionTestCase( unittest.TestCase ):
+  """ Tasks submitted in bulk as they are one by one
+  """
+  def setUp( self ):
+    self.cwd = os.getcwd()
+    self.tmpDir = tempfile.mkdtemp()
+    os.chdir( self.tmpDir )
+
+  def tearDown( self ):
+    os.chdir( self.cwd )
+    shutil.rmtree( self.tmpDir )
+
+  def submit( self, tasks, nTasks = 20 ):
+    res = submittedTasks( tasks, taskDictionary( nTasks ) )
+    self.assert_( res['OK'] )
+    return res['Value']
+
+  def assertSubmitted( self, taskDict, oneByOne ):
+    self.assertEqual( sorted( taskDict ), sorted( oneByOne ) )
+    for taskID in taskDict:
+      self.assertEqual( taskDict[taskID]['Success'], oneByOne[taskID]['Success'] )
+      self.assertEqual( taskDict[taskID].get( 'ExternalID' ), oneByOne[taskID].get( 'ExternalID' ) )
+
+  def test_bulk( self ):
+    oneByOneTasks = SubmissionTasks()
+    oneByOne = self.submit( oneByOneTasks )
+    tasks = SubmissionTasks( bulkSubmissionFlag = True )
+    taskDict = self.submit( tasks )
+
+    self.assertSubmitted( taskDict, oneByOne )
+    self.assertEqual( len( [ task for task in taskDict.values() if task['Success'] ] ), 20 )
+    self.assertEqual( tasks.submissionClient.calls, {'prepareJob':20, 'submitJob':0, 'submitJobs':1} )
+    self.assertEqual( oneByOneTasks.submissionClient.calls, {'prepareJob':0, 'submitJob':20, 'submitJobs':0} )
+    self.assertEqual( tasks.submissionClient.jdls, oneByOneTasks.submissionClient.jdls )
+    self.failIf( os.path.exists( 'jobDescription.xml' ) )
+
+  def test_bulkFailure( self ):
+    # task 7 rejected by the WMS: the others are submitted one by one
+    badJobMark = '00001234_00000007'
+    oneByOne = self.submit( SubmissionTasks( submissionClient = FakeWMSClient( badJobMark ) ) )
+    tasks = SubmissionTasks( bulkSubmissionFlag = True, submissionClient = FakeWMSClient( badJobMark ) )
+    taskDict = self.submit( tasks )
+
+    self.assertSubmitted( taskDict, oneByOne )
+    self.assertEqual( taskDict[7]['Success'], False )
+    self.assertEqual( len( [ task for task in taskDict.values() if task['Success'] ] ), 19 )
+    self.assertEqual( tasks.submissionClient.calls['submitJobs'], 21 )
+
+    # tasks not prepared are not submitted
+    taskDict = taskDictionary( 5 )
+    for task in taskDict.values():
+      task['TaskObject'] = ''
+    taskDict[3]['TaskObject'] = 3
+    tasks = SubmissionTasks( bulkSubmissionFlag = True )
+    res = tasks.submitTransformationTasks( taskDict )
+    self.assert_( res['OK'] )
+    self.failIf( [ task for task in res['Value'].values() if task['Success'] ] )
+
+  def test_bunches( self ):
+    maxBulkJobs = TaskManager.MAX_BULK_JOBS
+    TaskManager.MAX_BULK_JOBS = 8
+    try:
+      oneByOne = self.submit( SubmissionTasks() )
+      tasks = SubmissionTasks( bulkSubmissionFlag = True )
+      self.assertSubmitted( self.submit( tasks ), oneByOne )
+      self.assertEqual( tasks.submissionClient.bulkSizes, [ 8, 8, 4 ] )
+
+      # the outcome of the second bunch is unknown: its tasks are failed, not submitted again
+      tasks = SubmissionTasks( bulkSubmissionFlag = True, submissionClient = FakeWMSClient( lostReply = 2 ) )
+      taskDict = self.submit( tasks )
+      self.assertEqual( tasks.submissionClient.bulkSizes, [ 8, 8, 4 ] )
+      self.assertEqual( sorted( [ taskID for taskID, task in taskDict.items() if not task['Success'] ] ),
+                        sorted( taskDict )[8:16] )
+      self.assertEqual( len( tasks.submissionClient.jdls ), 20 )
+    finally:
+      TaskManager.MAX_BULK_JOBS = maxBulkJobs
+
+  def test_updateDB( self ):
+    taskDict = taskDictionary( 20 )
+    for taskID, task in taskDict.items():
+      task['TransformationID'] = 1234 if taskID <= 10 else 1235
+      task['Success'] = taskID % 10 != 5
+      task['ExternalID'] = 1000 + taskID
+
+    transClient = FakeTransClient()
+    self.assert_( TaskBase( transClient = transClient ).updateDBAfterTaskSubmission( taskDict )['OK'] )
+    self.assertEqual( transClient.calls, {'setTaskStatusAndWmsID':0, 'setTaskStatusAndWmsIDBulk':2} )
+    expected = dict( [ ( ( task['TransformationID'], taskID ), ( 'Submitted', str( task['ExternalID'] ) ) )
+                       for taskID, task in taskDict.items() if task['Success'] ] )
+    self.assertEqual( transClient.tasks, expected )
+
+    # TransformationManager without bulk update
+    transClient = FakeTransClient( bulkAvailable = False )
+    self.assert_( TaskBase( transClient = transClient ).updateDBAfterTaskSubmission( taskDict )['OK'] )
+    self.assertEqual( transClient.calls, {'setTaskStatusAndWmsID':18, 'setTaskStatusAndWmsIDBulk':2} )
+    self.assertEqual( transClient.tasks, expected )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( TaskSubmissionTestCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
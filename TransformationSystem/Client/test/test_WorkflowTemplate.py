@@ -0,0 +1,190 @@
+""" Task jobs prepared from a WorkflowTemplate compared with those of the former path,
+    which parsed the transformation body for each task
+"""
+
+import copy
+import unittest
+
+from DIRAC                                                    import S_OK
+from DIRAC.Interfaces.API.Job                                 import Job
+from DIRAC.TransformationSystem.Client.TaskManager            import WorkflowTasks
+from DIRAC.TransformationSystem.Client.WorkflowTemplate       import WorkflowTemplate
+
+#############################################################################
+
+class OpsHelper( object ):
+  """ Operations helper without hospital transformations
+  """
+  def __init__( self, hospitalTransformations = None ):
+    self.hospitalTransformations = hospitalTransformations if hospitalTransformations else []
+
+  def getValue( self, option, default = None ):
+    if option == "Hospital/Transformations":
+      return self.hospitalTransformations
+    return default
+
+class CountingJob( Job ):
+  """ Job counting its instances
+  """
+  instances = 0
+
+  def __init__( self, script = None, stdout = 'std.out', stderr = 'std.err' ):
+    CountingJob.instances += 1
+    super( CountingJob, self ).__init__( script, stdout, stderr )
+
+class OutputDataTasks( WorkflowTasks ):
+  """ WorkflowTasks recording the job XML given to the output data module
+  """
+  def __init__( self, jobClass = Job, opsH = None ):
+    super( OutputDataTasks, self ).__init__( transClient = object(), submissionClient = object(),
+                                             jobMonitoringClient = object(), outputDataModule = 'OutputData',
+                                             jobClass = jobClass, opsH = opsH if opsH else OpsHelper() )
+    self.jobXMLs = []
+
+  def getOutputData( self, paramDict, moduleLocation ):
+    self.jobXMLs.append( paramDict['Job'] )
+    return S_OK( {'ProductionOutputData':['/lhcb/data/%08d/%08d.dst' % ( int( paramDict['TransformationID'] ),
+                                                                        paramDict['TaskID'] )]} )
+
+class LegacyTasks( OutputDataTasks ):
+  """ Former prepareTransformationTasks, parsing the transformation body for each task
+  """
+  def prepareTransformationTasks( self, transBody, taskDict, owner = '', ownerGroup = '', ownerDN = '' ):
+    for taskNumber in sorted( taskDict ):
+      oJob = self.jobClass( transBody )
+      paramsDict = taskDict[taskNumber]
+      site = oJob.workflow.findParameter( 'Site' ).getValue()
+      paramsDict['Site'] = site
+      transID = paramsDict['TransformationID']
+      oJob.setOwner( owner )
+      oJob.setOwnerGroup( ownerGroup )
+      oJob.setOwnerDN( ownerDN )
+      oJob.setJobGroup( str( transID ).zfill( 8 ) )
+      oJob.setName( str( transID ).zfill( 8 ) + '_' + str( taskNumber ).zfill( 8 ) )
+      oJob._setParamValue( 'PRODUCTION_ID', str( transID ).zfill( 8 ) )
+      oJob._setParamValue( 'JOB_ID', str( taskNumber ).zfill( 8 ) )
+      sites = self._handleDestination( paramsDict )
+      if not sites:
+        taskDict[taskNumber]['TaskObject'] = ''
+        continue
+      res = oJob.setDestination( sites )
+      if not res['OK']:
+        continue
+      self._handleInputs( oJob, paramsDict )
+      self._handleRest( oJob, paramsDict )
+      hospitalTrans = [int( x ) for x in self.opsH.getValue( "Hospital/Transformations", [] )]
+      if int( transID ) in hospitalTrans:
+        self._handleHospital( oJob )
+      taskDict[taskNumber]['TaskObject'] = ''
+      if self.outputDataModule:
+        res = self.getOutputData( {'Job':oJob._toXML(), 'TransformationID':transID,
+                                   'TaskID':taskNumber, 'InputData':None},
+                                  moduleLocation = self.outputDataModule )
+        if not res ['OK']:
+          continue
+        for name, output in res['Value'].items():
+          oJob._addJDLParameter( name, ';'.join( output ) )
+      taskDict[taskNumber]['TaskObject'] = self.jobClass( oJob._toXML() )
+    return S_OK( taskDict )
+
+def transformationBody( nSteps = 3 ):
+  """ Production like workflow: steps, workflow parameters and JDL parameters
+  """
+  job = Job()
+  for step in range( nSteps ):
+    job.setExecutable( '/bin/echo', arguments = 'step %d' % step, logFile = 'step%d.log' % step )
+  job.setCPUTime( 100000 )
+  job.setLogLevel( 'verbose' )
+  job.setType( 'MCSimulation' )
+  job.setOutputSandbox( ['*.log', 'summary.xml'] )
+  job.setDestination( 'ANY' )
+  for name, value in ( ( 'PRODUCTION_ID', '00000000' ), ( 'JOB_ID', '00000000' ),
+                       ( 'outputDataFileMask', 'dst;sim' ), ( 'configName', 'MC' ) ):
+    job._addParameter( job.workflow, name, 'string', value, 'production parameter' )
+  job._addParameter( job.workflow, 'maxNumberOfEvents', 'int', 500, 'events' )
+  job._addParameter( job.workflow, 'CPUeFactor', 'float', 1.4, 'CPU efficiency factor' )
+  return job._toXML()
+
+def taskDictionary( nTasks, transID = 1234 ):
+  """ Tasks as given by TransformationDB, some with unusual values
+  """
+  taskDict = {}
+  for taskID in range( 1, nTasks + 1 ):
+    taskDict[taskID] = {'TransformationID':transID, 'TaskID':taskID, 'Status':'Created', 'TargetSE':'',
+                        'InputData':['/lhcb/data/%08d/%05d.raw' % ( transID, taskID + i ) for i in range( 3 )],
+                        'RunNumber':100000 + taskID / 10, 'JobType':'MCSimulation'}
+  # read back differently from their XML: former path
+  taskDict[2]['Comment'] = 'first line\r\nsecond line'
+  taskDict[3]['Site'] = 'DIRAC.Test.ch;DIRAC.Other.ch'
+  taskDict[4]['InputData'] = ''
+  return taskDict
+
+#############################################################################
+
+class WorkflowTemplateTestCase( unittest.TestCase ):
+  """ Task jobs and XML of both paths
+  """
+  def prepare( self, tasks, transBody, taskDict ):
+    taskDict = copy.deepcopy( taskDict )
+    res = tasks.prepareTransformationTasks( transBody, taskDict, 'owner', 'ownerGroup', '/DC=org/CN=owner' )
+    self.assert_( res['OK'] )
+    return res['Value']
+
+  def assertSameTasks( self, transBody, taskDict, opsH = None ):
+    legacy = LegacyTasks( opsH = opsH )
+    legacyTasks = self.prepare( legacy, transBody, taskDict )
+    current = OutputDataTasks( opsH = opsH )
+    tasks = self.prepare( current, transBody, taskDict )
+
+    self.assertEqual( current.jobXMLs, legacy.jobXMLs )
+    self.assertEqual( sorted( tasks ), sorted( legacyTasks ) )
+    for taskID in sorted( tasks ):
+      task = tasks[taskID]
+      legacyTask = legacyTasks[taskID]
+      self.assertEqual( type( task['TaskObject'] ), type( legacyTask['TaskObject'] ) )
+      self.assertEqual( task['TaskObject']._toXML(), legacyTask['TaskObject']._toXML() )
+      self.assertEqual( task['TaskObject']._toJDL(), legacyTask['TaskObject']._toJDL() )
+      self.assertEqual( task['TaskObject'].script, legacyTask['TaskObject'].script )
+      del task['TaskObject']
+      del legacyTask['TaskObject']
+      self.assertEqual( task, legacyTask )
+
+  def test_sameTasks( self ):
+    transBody = transformationBody()
+    self.assertSameTasks( transBody, taskDictionary( 20 ) )
+
+  def test_parsing( self ):
+    CountingJob.instances = 0
+    tasks = self.prepare( OutputDataTasks( jobClass = CountingJob ), transformationBody(), taskDictionary( 50 ) )
+    # template, its read back and the task with a carriage return
+    self.assertEqual( CountingJob.instances, 3 )
+    for task in tasks.values():
+      self.assert_( isinstance( task['TaskObject'], CountingJob ) )
+
+  def test_hospital( self ):
+    self.assertSameTasks( transformationBody( 1 ), taskDictionary( 5 ), OpsHelper( [1234] ) )
+
+  def test_template( self ):
+    transBody = transformationBody()
+    template = WorkflowTemplate( transBody, Job )
+    self.assert_( template.compiled )
+    self.assertEqual( template.toXML( template.newJob() ), transBody )
+    # task jobs do not share parameters
+    job1 = template.newJob()
+    job2 = template.newJob()
+    job1.setName( 'job1' )
+    job1._setParamValue( 'JOB_ID', '00000001' )
+    self.assertEqual( job2.workflow.getName(), Job( transBody ).workflow.getName() )
+    self.assertEqual( job2.workflow.findParameter( 'JOB_ID' ).getValue(), '00000000' )
+    self.assertEqual( template.template.workflow.findParameter( 'JOB_ID' ).getValue(), '00000000' )
+    taskJob = template.taskJob( job1 )
+    self.assertEqual( taskJob._toXML(), Job( job1._toXML() )._toXML() )
+    self.assertEqual( taskJob.workflow.findParameter( 'maxNumberOfEvents' ).getValue(), 500 )
+    # other workflow attributes: former path
+    job2.workflow.setBody( 'import os' )
+    self.assertEqual( template.toXML( job2 ), job2._toXML() )
+    self.assertEqual( template.taskJob( job2 )._toXML(), Job( job2._toXML() )._toXML() )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( WorkflowTemplateTestCase )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -17,6 +17,7 @@ from DIRAC.Core.Utilities.List                            import stringListToStr
 from DIRAC.Core.Utilities.Shifter                         import setupShifterProxyInEnv
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations  import Operations
 from DIRAC.Core.Utilities.Subprocess                      import pythonCall
+from DIRAC.Core.Utilities.MaskMatcher                     import MaskMatcher
 
 __RCSID__ = "$Id$"
 
@@ -42,7 +43,7 @@ class TransformationDB( DB ):
       DB.__init__( self, dbname, dbconfig, maxQueueSize )
 
     self.lock = threading.Lock()
-    self.filters = ()
+    self.filters = MaskMatcher()
     res = self.__updateFilters()
     if not res['OK']:
       gLogger.fatal( "Failed to create filters" )
@@ -172,7 +173,7 @@ class TransformationDB( DB ):
     self.lock.release()
     # If the transformation has an input data specification
     if fileMask:
-      self.filters.append( ( transID, re.compile( fileMask ) ) )
+      self.filters.addMask( transID, fileMask )
 
     if inheritedFrom:
       res = self._getTransformationID( inheritedFrom, connection = connection )
@@ -344,13 +345,12 @@ class TransformationDB( DB ):
     """ Get filters for all defined input streams in all the transformations.
         If transID argument is given, get filters only for this transformation.
     """
-    resultList = []
+    filters = MaskMatcher()
     # Define the general filter first
     self.database_name = self.__class__.__name__
     value = Operations().getValue( 'InputDataFilter/%sFilter' % self.database_name, '' )
     if value:
-      refilter = re.compile( value )
-      resultList.append( ( 0, refilter ) )
+      filters.addMask( 0, value )
     # Per transformation filters
     req = "SELECT TransformationID,FileMask FROM Transformations;"
     res = self._query( req, connection )
@@ -358,23 +358,15 @@ class TransformationDB( DB ):
       return res
     for transID, mask in res['Value']:
       if mask:
-        refilter = re.compile( mask )
-        resultList.append( ( transID, refilter ) )
-    self.filters = resultList
-    return S_OK( resultList )
+        filters.addMask( transID, mask )
+    self.filters = filters
+    return S_OK( filters.items() )
 
   def __filterFile( self, lfn, filters = None ):
     """Pass the input file through a supplied filter or those currently active """
-    result = []
     if filters:
-      for transID, refilter in filters:
-        if refilter.search( lfn ):
-          result.append( transID )
-    else:
-      for transID, refilter in self.filters:
-        if refilter.search( lfn ):
-          result.append( transID )
-    return result
+      return [ transID for transID, refilter in filters if refilter.search( lfn ) ]
+    return self.filters.match( lfn )
 
   ###########################################################################
   #
@@ -392,6 +384,11 @@ class TransformationDB( DB ):
       res = self.__updateTransformationParameter( transID, paramName, paramValue, connection = connection )
       if res['OK'] and ( paramName != 'Body' ):
         message = '%s updated to %s' % ( paramName, paramValue )
+      if res['OK'] and ( paramName == 'FileMask' ):
+        if paramValue:
+          self.filters.setMask( transID, paramValue )
+        else:
+          self.filters.removeMask( transID )
     else:
       res = self.__addAdditionalTransformationParameter( transID, paramName, paramValue, connection = connection )
       if res['OK']:
@@ -675,10 +672,7 @@ class TransformationDB( DB ):
   def __addExistingFiles( self, transID, connection = False ):
     """ Add files that already exist in the DataFiles table to the transformation specified by the transID
     """
-    for tID, _filter in self.filters:
-      if tID == transID:
-        filters = [( tID, filter )]
-        break
+    filters = [ ( transID, refilter ) for refilter in self.filters.getMasks( transID ) ]
     if not filters:
       return S_ERROR( 'No filters defined for transformation %d' % transID )
     res = self.__getAllFileIDs( connection = connection )
@@ -921,6 +915,33 @@ class TransformationDB( DB ):
       return res
     return self.__setTaskParameterValue( transID, taskID, 'ExternalID', taskWmsID, connection = connection )
 
+  def setTaskStatusAndWmsIDBulk( self, transName, taskWmsIDs, status, connection = False ):
+    """ Set status and ExternalIDs for the tasks of a transformation with a single statement,
+        taskWmsIDs being a { taskID : taskWmsID } dictionary
+    """
+    res = self._getConnectionTransID( connection, transName )
+    if not res['OK']:
+      return res
+    connection = res['Value']['Connection']
+    transID = res['Value']['TransformationID']
+    if not taskWmsIDs:
+      return S_OK()
+    res = self._escapeString( status )
+    if not res['OK']:
+      return res
+    status = res['Value']
+    cases = []
+    for taskID in sorted( taskWmsIDs ):
+      res = self._escapeString( str( taskWmsIDs[taskID] ) )
+      if not res['OK']:
+        return res
+      cases.append( "WHEN %d THEN %s" % ( int( taskID ), res['Value'] ) )
+    req = "UPDATE TransformationTasks SET ExternalStatus=%s, ExternalID=CASE TaskID %s END," % ( status,
+                                                                                                 ' '.join( cases ) )
+    req = req + " LastUpdateTime=UTC_TIMESTAMP() WHERE TransformationID=%d AND TaskID IN (%s);" % \
+          ( transID, intListToString( [int( taskID ) for taskID in taskWmsIDs] ) )
+    return self._update( req, connection )
+
   def setTaskStatus( self, transName, taskID, status, connection = False ):
     """ Set status for job with taskID in production with transformationID """
     res = self._getConnectionTransID( connection, transName )
@@ -1367,9 +1388,7 @@ class TransformationDB( DB ):
     res = self.__deleteTransformation( transID, connection = connection )
     if not res['OK']:
       return res
-    res = self.__updateFilters()
-    if not res['OK']:
-      return res
+    self.filters.removeMask( transID )
     return S_OK()
 
   def __removeTransformationTask( self, transID, taskID, connection = False ):
@@ -209,6 +209,11 @@ class TransformationManagerHandlerBase( RequestHandler ):
     res = database.setTaskStatusAndWmsID( transName, taskID, status, taskWmsID )
     return self._parseRes( res )
 
+  types_setTaskStatusAndWmsIDBulk = [ transTypes, DictType, StringType]
+  def export_setTaskStatusAndWmsIDBulk( self, transName, taskWmsIDs, status ):
+    res = database.setTaskStatusAndWmsIDBulk( transName, taskWmsIDs, status )
+    return self._parseRes( res )
+
   types_getTransformationTaskStats = [transTypes]
   def export_getTransformationTaskStats( self, transName ):
     res = database.getTransformationTaskStats( transName )
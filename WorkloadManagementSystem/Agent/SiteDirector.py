@@ -28,6 +28,7 @@ from DIRAC.Core.Security                                   import CS
 from DIRAC.Core.Utilities.SiteCEMapping                    import getSiteForCE
 from DIRAC.Core.Utilities.Time                             import dateTime, second
 from DIRAC.Core.Utilities.List                             import fromChar
+from DIRAC.Core.Utilities.BoundedTaskPool                  import BoundedTaskPool
 import os, base64, bz2, tempfile, random, socket, types
 import DIRAC
 
@@ -40,6 +41,8 @@ WAITING_PILOT_STATUS = ['Submitted', 'Waiting', 'Scheduled', 'Ready']
 FINAL_PILOT_STATUS = ['Aborted', 'Failed', 'Done']
 MAX_PILOTS_TO_SUBMIT = 100
 MAX_JOBS_IN_FILLMODE = 5
+MAX_SUBMISSION_THREADS = 10
+CE_SUBMISSION_TIMEOUT = 600
 
 class SiteDirector( AgentModule ):
   """
@@ -64,6 +67,9 @@ class SiteDirector( AgentModule ):
     self.firstPass = True
     self.maxJobsInFillMode = MAX_JOBS_IN_FILLMODE
     self.maxPilotsToSubmit = MAX_PILOTS_TO_SUBMIT
+    # CEs are served in parallel, the pool keeps track of the CEs still busy from previous cycles
+    self.submissionPool = BoundedTaskPool( MAX_SUBMISSION_THREADS )
+    self.ceSubmissionTimeout = CE_SUBMISSION_TIMEOUT
     return S_OK()
 
   def beginExecution( self ):
@@ -119,6 +125,8 @@ class SiteDirector( AgentModule ):
     self.pilotWaitingTime = self.am_getOption( 'MaxPilotWaitingTime', 3600 )
     self.failedQueueCycleFactor = self.am_getOption( 'FailedQueueCycleFactor', 10 )
     self.pilotStatusUpdateCycleFactor = self.am_getOption( 'PilotStatusUpdateCycleFactor', 10 ) 
+    self.submissionPool.maxThreads = max( 1, self.am_getOption( 'MaxSubmissionThreads', MAX_SUBMISSION_THREADS ) )
+    self.ceSubmissionTimeout = self.am_getOption( 'CESubmissionTimeout', CE_SUBMISSION_TIMEOUT )
 
     # Flags
     self.updateStatus = self.am_getOption( 'UpdatePilotStatus', True )
@@ -173,6 +181,7 @@ class SiteDirector( AgentModule ):
     self.log.always( 'PilotGroup:', self.pilotGroup )
     self.log.always( 'MaxPilotsToSubmit:', self.maxPilotsToSubmit )
     self.log.always( 'MaxJobsInFillMode:', self.maxJobsInFillMode )
+    self.log.always( 'MaxSubmissionThreads:', self.submissionPool.maxThreads )
 
     self.localhost = socket.getfqdn()
     self.proxy = ''
@@ -379,7 +388,9 @@ class SiteDirector( AgentModule ):
 
     queues = self.queueDict.keys()
     random.shuffle( queues )
-    totalSubmittedPilots = 0
+    busyCEs = self.submissionPool.busyKeys()
+    ceDicts = {}
+    queueCPUTimes = {}
     for queue in queues:
 
       # Check if the queue failed previously
@@ -391,12 +402,14 @@ class SiteDirector( AgentModule ):
 
       ce = self.queueDict[queue]['CE']
       ceName = self.queueDict[queue]['CEName']
-      ceType = self.queueDict[queue]['CEType']
       queueName = self.queueDict[queue]['QueueName']
       siteName = self.queueDict[queue]['Site']
       platform = self.queueDict[queue]['Platform']
       siteMask = siteName in siteMaskList
 
+      if ceName in busyCEs:
+        self.log.warn( "Skipping queue %s: submission to %s from a previous cycle still running" % ( queue, ceName ) )
+        continue
       if not anySite and siteName not in jobSites:
         self.log.verbose( "Skipping queue %s at %s: no workload expected" % (queueName, siteName) )
         continue
@@ -428,7 +441,7 @@ class SiteDirector( AgentModule ):
 
       # This is a hack to get rid of !
       ceDict['SubmitPool'] = self.defaultSubmitPools
-      
+
       if "Tag" in ceDict and type( ceDict['Tag'] ) in types.StringTypes:
         ceDict['Tag'] = fromChar( ceDict['Tag'] )
 
@@ -436,136 +449,219 @@ class SiteDirector( AgentModule ):
       if not result['OK']:
         continue
       ceDict['Platform'] = result['Value']
+      ceDicts[queue] = ceDict
+      queueCPUTimes[queue] = queueCPUTime
 
-      # Get the number of eligible jobs for the target site/queue
-      result = rpcMatcher.getMatchingTaskQueues( ceDict )
+    if not ceDicts:
+      self.log.info( "No queue to submit pilots to in this cycle" )
+      return S_OK()
+
+    # Get the number of eligible jobs for all the target sites/queues at once
+    result = self.__getMatchingTaskQueues( rpcMatcher, ceDicts )
+    if not result['OK']:
+      self.log.error( 'Could not retrieve TaskQueues from TaskQueueDB', result['Message'] )
+      return result
+    matchingTaskQueues = result['Value']
+
+    # The queues of a CE are served one after the other, the CEs in parallel
+    ceQueues = {}
+    for queue in queues:
+      if queue not in ceDicts:
+        continue
+      result = matchingTaskQueues.get( queue, S_OK() )
       if not result['OK']:
-        self.log.error( 'Could not retrieve TaskQueues from TaskQueueDB', result['Message'] )
-        return result
-      taskQueueDict = result['Value']
-      if not taskQueueDict:
+        self.log.error( 'Could not retrieve TaskQueues for %s' % queue, result['Message'] )
+        continue
+      if not result['Value']:
         self.log.verbose( 'No matching TQs found for %s' % queue )
         continue
+      ceQueues.setdefault( self.queueDict[queue]['CEName'], [] ).append( ( queue, result['Value'],
+                                                                           queueCPUTimes[queue] ) )
 
-      totalTQJobs = 0
-      tqIDList = taskQueueDict.keys()
-      for tq in taskQueueDict:
-        totalTQJobs += taskQueueDict[tq]['Jobs']
-
-      self.log.verbose( '%d job(s) from %d task queue(s) are eligible for %s queue' % (totalTQJobs, len( tqIDList ), queue) )
-
-      # Get the number of already waiting pilots for these task queues
-      totalWaitingPilots = 0
-      if self.pilotWaitingFlag:
-        lastUpdateTime = dateTime() - self.pilotWaitingTime * second
-        result = pilotAgentsDB.countPilots( { 'TaskQueueID': tqIDList,
-                                              'Status': WAITING_PILOT_STATUS },
-                                              None, lastUpdateTime )
-        if not result['OK']:
-          self.log.error( 'Failed to get Number of Waiting pilots', result['Message'] )
-          totalWaitingPilots = 0
-        else:
-          totalWaitingPilots = result['Value']
-          self.log.verbose( 'Waiting Pilots for TaskQueue %s:' % tqIDList, totalWaitingPilots )
-      if totalWaitingPilots >= totalTQJobs:
-        self.log.verbose( "%d waiting pilots already for all the available jobs" % totalWaitingPilots )
+    tasks = {}
+    for ceName, queueList in ceQueues.items():
+      tasks[ceName] = ( self.__submitToQueues, ( queueList, ) )
+    results = self.submissionPool.execute( tasks, timeout = self.ceSubmissionTimeout )
+    totalSubmittedPilots = 0
+    for ceName, result in results.items():
+      if not result['OK']:
+        self.log.error( 'Failed submission to CE %s:' % ceName, result['Message'] )
+        for queue, _taskQueueDict, _queueCPUTime in ceQueues[ceName]:
+          self.failedQueues[queue] += 1
         continue
+      totalSubmittedPilots += result['Value']
+
+    self.log.info( "%d pilots submitted in total in this cycle" % totalSubmittedPilots )
+    return S_OK()
 
-      self.log.verbose( "%d waiting pilots for the total of %d eligible jobs for %s" % (totalWaitingPilots, totalTQJobs, queue) )
+  def __getMatchingTaskQueues( self, rpcMatcher, ceDicts ):
+    """ Get the matching task queues for all the queues in a single Matcher call
 
-      # Get the working proxy
-      cpuTime = queueCPUTime + 86400
-      self.log.verbose( "Getting pilot proxy for %s/%s %d long" % ( self.pilotDN, self.pilotGroup, cpuTime ) )
-      result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, cpuTime )
+    :param rpcMatcher: Matcher RPCClient
+    :param dict ceDicts: { queue : ceDict }
+    :return: S_OK( { queue : S_OK( taskQueueDict ) or S_ERROR } )
+    """
+    result = rpcMatcher.getBulkMatchingTaskQueues( ceDicts )
+    if result['OK']:
+      return result
+    # The Matcher may not support bulk matching yet
+    self.log.warn( 'Bulk TaskQueue matching failed, matching queues one by one', result['Message'] )
+    matchingTaskQueues = {}
+    for queue, ceDict in ceDicts.items():
+      result = rpcMatcher.getMatchingTaskQueues( ceDict )
       if not result['OK']:
         return result
-      self.proxy = result['Value']
-      ce.setProxy( self.proxy, cpuTime - 60 )
+      matchingTaskQueues[queue] = result
+    return S_OK( matchingTaskQueues )
+
+  def __submitToQueues( self, queueList ):
+    """ Submit pilots to the queues of one CE, executed in the submission pool
 
-      # Get the number of available slots on the target site/queue
-      totalSlots = self.__getQueueSlots( queue )
-      if totalSlots == 0:
+    :param list queueList: list of ( queue, taskQueueDict, queueCPUTime ) tuples
+    :return: S_OK( number of submitted pilots )
+    """
+    submittedPilots = 0
+    for queue, taskQueueDict, queueCPUTime in queueList:
+      result = self.__submitToQueue( queue, taskQueueDict, queueCPUTime )
+      if not result['OK']:
+        self.log.error( 'Failed submission to queue %s:' % queue, result['Message'] )
         continue
+      submittedPilots += result['Value']
+    return S_OK( submittedPilots )
 
-      pilotsToSubmit = max( 0, min( totalSlots, totalTQJobs - totalWaitingPilots ) )
-      self.log.info( '%s: Slots=%d, TQ jobs=%d, Pilots: waiting %d, to submit=%d' % \
-                              ( queue, totalSlots, totalTQJobs, totalWaitingPilots, pilotsToSubmit ) )
+  def __submitToQueue( self, queue, taskQueueDict, queueCPUTime ):
+    """ Submit pilots to a queue for its eligible jobs
 
-      # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
-      pilotsToSubmit = min( self.maxPilotsToSubmit, pilotsToSubmit )
+    :param str queue: queue name
+    :param dict taskQueueDict: task queues matching the queue
+    :param int queueCPUTime: CPU time of the queue
+    :return: S_OK( number of submitted pilots )
+    """
+    ce = self.queueDict[queue]['CE']
+    ceName = self.queueDict[queue]['CEName']
+    ceType = self.queueDict[queue]['CEType']
+    queueName = self.queueDict[queue]['QueueName']
+    siteName = self.queueDict[queue]['Site']
+    submittedPilots = 0
 
-      while pilotsToSubmit > 0:
-        self.log.info( 'Going to submit %d pilots to %s queue' % ( pilotsToSubmit, queue ) )
+    totalTQJobs = 0
+    tqIDList = taskQueueDict.keys()
+    for tq in taskQueueDict:
+      totalTQJobs += taskQueueDict[tq]['Jobs']
 
-        bundleProxy = self.queueDict[queue].get( 'BundleProxy', False )
-        jobExecDir = ''
-        if ceType == 'CREAM':
-          jobExecDir = '.'
-        jobExecDir = self.queueDict[queue].get( 'JobExecDir', jobExecDir )
-        httpProxy = self.queueDict[queue].get( 'HttpProxy', '' )
+    self.log.verbose( '%d job(s) from %d task queue(s) are eligible for %s queue' % (totalTQJobs, len( tqIDList ), queue) )
 
-        result = self.__getExecutable( queue, pilotsToSubmit, bundleProxy, httpProxy, jobExecDir )
-        if not result['OK']:
-          return result
+    # Get the number of already waiting pilots for these task queues
+    totalWaitingPilots = 0
+    if self.pilotWaitingFlag:
+      lastUpdateTime = dateTime() - self.pilotWaitingTime * second
+      result = pilotAgentsDB.countPilots( { 'TaskQueueID': tqIDList,
+                                            'Status': WAITING_PILOT_STATUS },
+                                            None, lastUpdateTime )
+      if not result['OK']:
+        self.log.error( 'Failed to get Number of Waiting pilots', result['Message'] )
+        totalWaitingPilots = 0
+      else:
+        totalWaitingPilots = result['Value']
+        self.log.verbose( 'Waiting Pilots for TaskQueue %s:' % tqIDList, totalWaitingPilots )
+    if totalWaitingPilots >= totalTQJobs:
+      self.log.verbose( "%d waiting pilots already for all the available jobs" % totalWaitingPilots )
+      return S_OK( 0 )
+
+    self.log.verbose( "%d waiting pilots for the total of %d eligible jobs for %s" % (totalWaitingPilots, totalTQJobs, queue) )
+
+    # Get the working proxy
+    cpuTime = queueCPUTime + 86400
+    self.log.verbose( "Getting pilot proxy for %s/%s %d long" % ( self.pilotDN, self.pilotGroup, cpuTime ) )
+    result = gProxyManager.getPilotProxyFromDIRACGroup( self.pilotDN, self.pilotGroup, cpuTime )
+    if not result['OK']:
+      return result
+    proxy = result['Value']
+    ce.setProxy( proxy, cpuTime - 60 )
 
-        executable, pilotSubmissionChunk = result['Value']
-        result = ce.submitJob( executable, '', pilotSubmissionChunk )
-        os.unlink( executable )
-        if not result['OK']:
-          self.log.error( 'Failed submission to queue %s:\n' % queue, result['Message'] )
-          pilotsToSubmit = 0
-          self.failedQueues[queue] += 1
-          continue
+    # Get the number of available slots on the target site/queue
+    totalSlots = self.__getQueueSlots( queue )
+    if totalSlots == 0:
+      return S_OK( 0 )
+
+    pilotsToSubmit = max( 0, min( totalSlots, totalTQJobs - totalWaitingPilots ) )
+    self.log.info( '%s: Slots=%d, TQ jobs=%d, Pilots: waiting %d, to submit=%d' % \
+                            ( queue, totalSlots, totalTQJobs, totalWaitingPilots, pilotsToSubmit ) )
 
-        pilotsToSubmit = pilotsToSubmit - pilotSubmissionChunk
-        # Add pilots to the PilotAgentsDB assign pilots to TaskQueue proportionally to the
-        # task queue priorities
-        pilotList = result['Value']
-        self.queueSlots[queue]['AvailableSlots'] -= len( pilotList )
-        totalSubmittedPilots += len( pilotList )
-        self.log.info( 'Submitted %d pilots to %s@%s' % ( len( pilotList ), queueName, ceName ) )
-        stampDict = {}
-        if result.has_key( 'PilotStampDict' ):
-          stampDict = result['PilotStampDict']
-        tqPriorityList = []
-        sumPriority = 0.
-        for tq in taskQueueDict:
-          sumPriority += taskQueueDict[tq]['Priority']
-          tqPriorityList.append( ( tq, sumPriority ) )
+    # Limit the number of pilots to submit to MAX_PILOTS_TO_SUBMIT
+    pilotsToSubmit = min( self.maxPilotsToSubmit, pilotsToSubmit )
+
+    while pilotsToSubmit > 0:
+      self.log.info( 'Going to submit %d pilots to %s queue' % ( pilotsToSubmit, queue ) )
+
+      bundleProxy = self.queueDict[queue].get( 'BundleProxy', False )
+      jobExecDir = ''
+      if ceType == 'CREAM':
+        jobExecDir = '.'
+      jobExecDir = self.queueDict[queue].get( 'JobExecDir', jobExecDir )
+      httpProxy = self.queueDict[queue].get( 'HttpProxy', '' )
+
+      result = self.__getExecutable( queue, pilotsToSubmit, bundleProxy, httpProxy, jobExecDir, proxy )
+      if not result['OK']:
+        return result
+
+      executable, pilotSubmissionChunk = result['Value']
+      result = ce.submitJob( executable, '', pilotSubmissionChunk )
+      os.unlink( executable )
+      if not result['OK']:
+        self.log.error( 'Failed submission to queue %s:\n' % queue, result['Message'] )
+        pilotsToSubmit = 0
+        self.failedQueues[queue] += 1
+        continue
+
+      pilotsToSubmit = pilotsToSubmit - pilotSubmissionChunk
+      # Add pilots to the PilotAgentsDB assign pilots to TaskQueue proportionally to the
+      # task queue priorities
+      pilotList = result['Value']
+      self.queueSlots[queue]['AvailableSlots'] -= len( pilotList )
+      submittedPilots += len( pilotList )
+      self.log.info( 'Submitted %d pilots to %s@%s' % ( len( pilotList ), queueName, ceName ) )
+      stampDict = {}
+      if result.has_key( 'PilotStampDict' ):
+        stampDict = result['PilotStampDict']
+      tqPriorityList = []
+      sumPriority = 0.
+      for tq in taskQueueDict:
+        sumPriority += taskQueueDict[tq]['Priority']
+        tqPriorityList.append( ( tq, sumPriority ) )
+      rndm = random.random()*sumPriority
+      tqDict = {}
+      for pilotID in pilotList:
         rndm = random.random()*sumPriority
-        tqDict = {}
-        for pilotID in pilotList:
-          rndm = random.random()*sumPriority
-          for tq, prio in tqPriorityList:
-            if rndm < prio:
-              tqID = tq
-              break
-          if not tqDict.has_key( tqID ):
-            tqDict[tqID] = []
-          tqDict[tqID].append( pilotID )
-
-        for tqID, pilotList in tqDict.items():
-          result = pilotAgentsDB.addPilotTQReference( pilotList,
-                                                     tqID,
-                                                     self.pilotDN,
-                                                     self.pilotGroup,
-                                                     self.localhost,
-                                                     ceType,
-                                                     '',
-                                                     stampDict )
+        for tq, prio in tqPriorityList:
+          if rndm < prio:
+            tqID = tq
+            break
+        if not tqDict.has_key( tqID ):
+          tqDict[tqID] = []
+        tqDict[tqID].append( pilotID )
+
+      for tqID, pilotList in tqDict.items():
+        result = pilotAgentsDB.addPilotTQReference( pilotList,
+                                                   tqID,
+                                                   self.pilotDN,
+                                                   self.pilotGroup,
+                                                   self.localhost,
+                                                   ceType,
+                                                   '',
+                                                   stampDict )
+        if not result['OK']:
+          self.log.error( 'Failed add pilots to the PilotAgentsDB: ', result['Message'] )
+          continue
+        for pilot in pilotList:
+          result = pilotAgentsDB.setPilotStatus( pilot, 'Submitted', ceName,
+                                                'Successfully submitted by the SiteDirector',
+                                                siteName, queueName )
           if not result['OK']:
-            self.log.error( 'Failed add pilots to the PilotAgentsDB: ', result['Message'] )
+            self.log.error( 'Failed to set pilot status: ', result['Message'] )
             continue
-          for pilot in pilotList:
-            result = pilotAgentsDB.setPilotStatus( pilot, 'Submitted', ceName,
-                                                  'Successfully submitted by the SiteDirector',
-                                                  siteName, queueName )
-            if not result['OK']:
-              self.log.error( 'Failed to set pilot status: ', result['Message'] )
-              continue
 
-    self.log.info( "%d pilots submitted in total in this cycle" % totalSubmittedPilots )
-    return S_OK()
+    return S_OK( submittedPilots )
 
   def __getQueueSlots( self, queue ):
     """ Get the number of available slots in the queue
@@ -595,12 +691,13 @@ class SiteDirector( AgentModule ):
     return totalSlots
 
 #####################################################################################
-  def __getExecutable( self, queue, pilotsToSubmit, bundleProxy = True, httpProxy = '', jobExecDir = '' ):
+  def __getExecutable( self, queue, pilotsToSubmit, bundleProxy = True, httpProxy = '', jobExecDir = '', proxy = None ):
     """ Prepare the full executable for queue
     """
 
-    proxy = None
-    if bundleProxy:
+    if not bundleProxy:
+      proxy = None
+    elif proxy is None:
       proxy = self.proxy
     pilotOptions, pilotsToSubmit = self.__getPilotOptions( queue, pilotsToSubmit )
     if pilotOptions is None:
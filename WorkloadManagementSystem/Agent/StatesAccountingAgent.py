@@ -6,6 +6,8 @@
 
 """  StatesAccountingAgent sends periodically numbers of jobs in various states for various
      sites to the Monitoring system to create historical plots.
+     It is also the single place correcting the drift of the JobsSummary counters of the JobDB,
+     every SummaryReconciliationPeriod seconds.
 """
 __RCSID__ = "$Id$"
 
@@ -16,6 +18,7 @@ from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.AccountingSystem.Client.Types.WMSHistory import WMSHistory
 from DIRAC.AccountingSystem.Client.DataStoreClient import DataStoreClient
 from DIRAC.Core.Utilities import Time
+import time
 
 class StatesAccountingAgent( AgentModule ):
   """
@@ -50,6 +53,8 @@ class StatesAccountingAgent( AgentModule ):
 
     self.reportPeriod = 850
     self.am_setOption( "PollingTime", self.reportPeriod )
+    self.reconciliationPeriod = self.am_getOption( "SummaryReconciliationPeriod", 3600 )
+    self.lastReconciliation = 0
     self.__jobDBFields = []
     for field in self.__summaryKeyFieldsMapping:
       if field == 'User':
@@ -67,6 +72,10 @@ class StatesAccountingAgent( AgentModule ):
       return result
     validSetups = result[ 'Value' ]
     gLogger.info( "Valid setups for this cycle are %s" % ", ".join( validSetups ) )
+    if time.time() - self.lastReconciliation >= self.reconciliationPeriod:
+      result = self.jobDB.reconcileJobsSummary()
+      if result[ 'OK' ]:
+        self.lastReconciliation = time.time()
     #Get the WMS Snapshot!
     result = self.jobDB.getSummarySnapshot( self.__jobDBFields )
     now = Time.dateTime()
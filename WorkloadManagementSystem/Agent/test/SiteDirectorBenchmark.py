@@ -0,0 +1,85 @@
+########################################################################
+# $HeadURL $
+# File: SiteDirectorBenchmark.py
+########################################################################
+""" :mod: SiteDirectorBenchmark
+    ===========================
+
+    .. module: SiteDirectorBenchmark
+    :synopsis: time the pilot submission cycle of the SiteDirector with stub CEs
+
+    SiteDirector.submitJobs is run against the stub CEs, Matcher client and pilot
+    services of Test_SiteDirectorSubmission. Every CE serves a few queues and answers
+    available() and submitJob() after a random latency, a few of them being much
+    slower than the others and one hanging. The cycle is timed with a single
+    submission thread, the hanging CE excluded, and with a pool of threads and a
+    per CE timeout.
+
+    usage: python SiteDirectorBenchmark.py [nCEs] [queuesPerCE] [latency] [maxThreads] [timeout]
+"""
+__RCSID__ = "$Id$"
+# # imports
+import sys
+import time
+import random
+import shutil
+import tempfile
+import threading
+# # stubs
+from Test_SiteDirectorSubmission import StubMatcher, StubbedSiteDirector, makeQueues, stubServices, restoreServices
+
+def runCycle( queueDict, maxThreads, timeout ):
+  """ time a submitJobs cycle, return the cycle time, the submitted pilots and the director """
+  matcher = StubMatcher( dict( [ ( queue['Site'], { i : 1000 } ) for i, queue in enumerate( queueDict.values() ) ] ) )
+  replaced = stubServices( matcher, [ queue['Site'] for queue in queueDict.values() ] )
+  workingDirectory = tempfile.mkdtemp()
+  try:
+    director = StubbedSiteDirector( queueDict, workingDirectory, maxThreads, timeout )
+    startTime = time.time()
+    director.submitJobs()
+    cycleTime = time.time() - startTime
+  finally:
+    restoreServices( replaced )
+    shutil.rmtree( workingDirectory, ignore_errors = True )
+  submitted = sum( [ len( queue['CE'].submitted ) for queue in queueDict.values() ] )
+  return cycleTime, submitted, director
+
+def benchmark( nCEs = 100, queuesPerCE = 3, latency = 0.05, maxThreads = 20, timeout = 5. ):
+  """ run both cycles and print their times """
+  rand = random.Random( 12345 )
+  release = threading.Event()
+  queueDict = makeQueues( nCEs, queuesPerCE, release = release )
+  # # random latencies around :latency:, 5% of the CEs being 10 times slower
+  ceLatencies = {}
+  for queue in sorted( queueDict.values(), key = lambda queue: queue['CEName'] ):
+    if queue['CEName'] not in ceLatencies:
+      ceLatency = latency * rand.uniform( 0.5, 1.5 )
+      if rand.random() < 0.05:
+        ceLatency *= 10
+      ceLatencies[queue['CEName']] = ceLatency
+    queue['CE'].latency = ceLatencies[queue['CEName']]
+  hangingCE = sorted( ceLatencies )[0]
+
+  # # a single thread, without the hanging CE that would block it forever
+  seqTime, seqSubmitted, _director = runCycle( dict( [ ( name, queue ) for name, queue in queueDict.items()
+                                                       if queue['CEName'] != hangingCE ] ), 1, None )
+  for queue in queueDict.values():
+    queue['CE'].submitted = []
+  poolTime, poolSubmitted, director = runCycle( queueDict, maxThreads, timeout )
+  timedOut = sorted( director.submissionPool.busyKeys() )
+  release.set()
+
+  slowest = max( [ ceLatency for ceName, ceLatency in ceLatencies.items() if ceName != hangingCE ] ) * 2 * queuesPerCE
+  print "%d CEs x %d queues, mean CE latency %.3f s, slowest CE cycle %.2f s" % ( nCEs, queuesPerCE,
+                                                                                 latency, slowest )
+  print "single thread (hanging CE excluded): %6.2f s, %d pilots" % ( seqTime, seqSubmitted )
+  print "pool of %3d threads, %.0f s timeout: %6.2f s, %d pilots, timed out: %s" % ( maxThreads, timeout, poolTime,
+                                                                                  poolSubmitted, timedOut )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 100,
+             int( args[1] ) if len( args ) > 1 else 3,
+             float( args[2] ) if len( args ) > 2 else 0.05,
+             int( args[3] ) if len( args ) > 3 else 20,
+             float( args[4] ) if len( args ) > 4 else 5. )
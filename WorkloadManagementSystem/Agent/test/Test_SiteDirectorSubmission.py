@@ -0,0 +1,309 @@
+""" Test cases for the pilot submission of the SiteDirector: submitJobs run against stub CEs, a stub
+    Matcher client and stub pilot services, the CEs being served in parallel, and the bulk task
+    queue matching of the Matcher
+"""
+
+__RCSID__ = "$Id$"
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import types
+import unittest
+
+from DIRAC                                                  import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.BoundedTaskPool                   import BoundedTaskPool
+from DIRAC.WorkloadManagementSystem.Agent                   import SiteDirector as sdModule
+from DIRAC.WorkloadManagementSystem.Agent.SiteDirector      import SiteDirector
+from DIRAC.WorkloadManagementSystem.Service                 import MatcherHandler as matcherModule
+from DIRAC.WorkloadManagementSystem.Service.MatcherHandler  import MatcherHandler
+
+class StubCE( object ):
+  """ CE of a queue answering after :latency: seconds, its submissions waiting for :release: if given """
+  def __init__( self, ceName, queueName, site, slots = 4, latency = 0., release = None ):
+    self.ceName = ceName
+    self.queueName = queueName
+    self.site = site
+    self.slots = slots
+    self.latency = latency
+    self.release = release
+    self.submitted = []
+
+  def getParameterDict( self ):
+    return { 'Site' : self.site, 'Queue' : self.queueName, 'CPUTime' : 1000 }
+
+  def setProxy( self, proxy, valid = 0 ):
+    self.proxy = proxy
+
+  def available( self ):
+    time.sleep( self.latency )
+    result = S_OK( self.slots )
+    result['CEInfoDict'] = { 'WaitingJobs' : 0, 'RunningJobs' : 0, 'SubmittedJobs' : 0, 'MaxTotalJobs' : self.slots }
+    return result
+
+  def submitJob( self, executable, proxy, numberOfJobs ):
+    time.sleep( self.latency )
+    if self.release:
+      self.release.wait()
+    pilots = [ 'https://%s/%s/%d' % ( self.ceName, self.queueName, len( self.submitted ) + i )
+               for i in range( numberOfJobs ) ]
+    self.submitted.extend( pilots )
+    return S_OK( pilots )
+
+class StubMatcher( object ):
+  """ Matcher client on the task queues of each site: { site : { tqID : jobs } }, recording its calls """
+  def __init__( self, siteJobs, bulk = True ):
+    self.siteJobs = siteJobs
+    self.bulk = bulk
+    self.calls = []
+    self.bulkDicts = {}
+
+  def __match( self, resourceDict ):
+    # the overall check of the director is made with the list of its sites, empty for any
+    sites = resourceDict.get( 'Site' ) or self.siteJobs.keys()
+    if type( sites ) in types.StringTypes:
+      sites = [ sites ]
+    taskQueues = {}
+    for site in sites:
+      for tqID, jobs in self.siteJobs.get( site, {} ).items():
+        taskQueues[tqID] = { 'Jobs' : jobs, 'Priority' : 1., 'Sites' : [ site ] }
+    return S_OK( taskQueues )
+
+  def getMatchingTaskQueues( self, resourceDict ):
+    self.calls.append( 'getMatchingTaskQueues' )
+    return self.__match( resourceDict )
+
+  def getBulkMatchingTaskQueues( self, resourceDicts ):
+    self.calls.append( 'getBulkMatchingTaskQueues' )
+    if not self.bulk:
+      return S_ERROR( 'Unknown method getBulkMatchingTaskQueues' )
+    self.bulkDicts = resourceDicts
+    return S_OK( dict( [ ( key, self.__match( resourceDict ) ) for key, resourceDict in resourceDicts.items() ] ) )
+
+class StubPilotAgentsDB( object ):
+  """ PilotAgentsDB recording the pilots added to each task queue """
+  def __init__( self ):
+    self.pilots = {}
+    self.lock = threading.Lock()
+
+  def countPilots( self, condDict, older = None, newer = None ):
+    return S_OK( 0 )
+
+  def addPilotTQReference( self, pilotRefs, taskQueueID, ownerDN, ownerGroup, broker, gridType, requirements, stampDict ):
+    with self.lock:
+      self.pilots.setdefault( taskQueueID, [] ).extend( pilotRefs )
+    return S_OK()
+
+  def setPilotStatus( self, pilotRef, status, destination = None, statusReason = None, gridSite = None, queue = None ):
+    return S_OK()
+
+class StubJobDB( object ):
+  def __init__( self, siteMask ):
+    self.siteMask = siteMask
+
+  def getSiteMask( self ):
+    return S_OK( self.siteMask )
+
+class StubProxyManager( object ):
+  def getPilotProxyFromDIRACGroup( self, userDN, userGroup, requiredTimeLeft ):
+    return S_OK( 'pilot proxy' )
+
+class StubResources( object ):
+  @staticmethod
+  def getCompatiblePlatforms( platforms ):
+    return S_OK( platforms )
+
+def stubServices( matcher, sites ):
+  """ set the stub Matcher client and pilot services in the SiteDirector module, return the replaced ones """
+  replaced = dict( [ ( name, getattr( sdModule, name ) )
+                     for name in ( 'RPCClient', 'pilotAgentsDB', 'jobDB', 'gProxyManager', 'Resources' ) ] )
+  sdModule.RPCClient = lambda url, **kwargs: matcher
+  sdModule.pilotAgentsDB = StubPilotAgentsDB()
+  sdModule.jobDB = StubJobDB( sites )
+  sdModule.gProxyManager = StubProxyManager()
+  sdModule.Resources = StubResources
+  return replaced
+
+def restoreServices( replaced ):
+  for name, value in replaced.items():
+    setattr( sdModule, name, value )
+
+def makeQueues( nCEs, queuesPerCE, slots = 4, latency = 0., release = None ):
+  """ queueDict of nCEs CEs with queuesPerCE queues each, CE i being at site i, the first one waiting
+      for :release: if given
+  """
+  queueDict = {}
+  for i in range( nCEs ):
+    ceName = 'ce%03d.example.org' % i
+    for j in range( queuesPerCE ):
+      queueName = 'queue%d' % j
+      ce = StubCE( ceName, queueName, 'LCG.Site%03d.org' % i, slots, latency, release if i == 0 else None )
+      queueDict['%s_%s' % ( ceName, queueName )] = { 'CE' : ce, 'CEName' : ceName, 'CEType' : 'CREAM',
+                                                     'QueueName' : queueName, 'Site' : ce.site,
+                                                     'Platform' : 'x86_64-slc6', 'ParametersDict' : { 'CPUTime' : 1000 } }
+  return queueDict
+
+class StubbedSiteDirector( SiteDirector ):
+  """ SiteDirector as set up by its initialize and beginExecution for the queues of queueDict
+  """
+  def __init__( self, queueDict, workingDirectory, maxThreads = 10, timeout = 600 ):
+    self.log = gLogger.getSubLogger( 'SiteDirector' )
+    self.queueDict = queueDict
+    self.queueSlots = {}
+    self.failedQueues = {}
+    self.failedQueueCycleFactor = 10
+    self.submissionPool = BoundedTaskPool( maxThreads )
+    self.ceSubmissionTimeout = timeout
+    self.defaultSubmitPools = ''
+    self.vo = ''
+    self.voGroups = []
+    self.platforms = [ 'x86_64-slc6' ]
+    self.sites = []
+    self.maxQueueLength = 86400
+    self.pilotWaitingFlag = False
+    self.pilotDN = '/DC=org/CN=pilot'
+    self.pilotGroup = 'pilot'
+    self.maxPilotsToSubmit = 100
+    self.localhost = 'localhost'
+    self.workingDirectory = workingDirectory
+
+  def _SiteDirector__getExecutable( self, queue, pilotsToSubmit, bundleProxy = True, httpProxy = '', jobExecDir = '',
+                                    proxy = None ):
+    """ an empty pilot script """
+    fd, executable = tempfile.mkstemp( suffix = '_pilotwrapper.py', dir = self.workingDirectory )
+    os.close( fd )
+    return S_OK( [ executable, pilotsToSubmit ] )
+
+class SiteDirectorTestCase( unittest.TestCase ):
+  """ Base class of the SiteDirector test cases """
+
+  def setUp( self ):
+    self.workingDirectory = tempfile.mkdtemp()
+    self.release = threading.Event()
+    self.replaced = None
+
+  def tearDown( self ):
+    self.release.set()
+    if self.replaced:
+      restoreServices( self.replaced )
+    shutil.rmtree( self.workingDirectory )
+
+  def makeDirector( self, queueDict, matcher, maxThreads = 10, timeout = 600 ):
+    sites = sorted( set( [ queue['Site'] for queue in queueDict.values() ] ) )
+    self.replaced = stubServices( matcher, sites )
+    return StubbedSiteDirector( queueDict, self.workingDirectory, maxThreads, timeout )
+
+  @staticmethod
+  def submitted( queueDict ):
+    """ number of pilots submitted to each CE """
+    ceSubmitted = {}
+    for queue in queueDict.values():
+      ceSubmitted[queue['CEName']] = ceSubmitted.get( queue['CEName'], 0 ) + len( queue['CE'].submitted )
+    return ceSubmitted
+
+class SubmitJobs( SiteDirectorTestCase ):
+
+  def test_bulkMatching( self ):
+    """ the queues are matched in a single call, the pilots submitted for min( slots, jobs ) """
+    queueDict = makeQueues( 3, 2, slots = 4 )
+    matcher = StubMatcher( { 'LCG.Site000.org' : { 1 : 10 }, 'LCG.Site001.org' : { 2 : 3 },
+                             'LCG.Site002.org' : { 3 : 5, 4 : 5 } } )
+    director = self.makeDirector( queueDict, matcher )
+    result = director.submitJobs()
+    self.assert_( result['OK'], result )
+    self.assertEqual( matcher.calls, [ 'getMatchingTaskQueues', 'getBulkMatchingTaskQueues' ] )
+    self.assertEqual( sorted( matcher.bulkDicts ), sorted( queueDict ) )
+    self.assertEqual( matcher.bulkDicts['ce001.example.org_queue1']['GridCE'], 'ce001.example.org' )
+    self.assertEqual( self.submitted( queueDict ), { 'ce000.example.org' : 8, 'ce001.example.org' : 6,
+                                                     'ce002.example.org' : 8 } )
+    pilots = sdModule.pilotAgentsDB.pilots
+    self.assertEqual( len( pilots[1] ), 8 )
+    self.assertEqual( len( pilots[2] ), 6 )
+    self.assertEqual( len( pilots.get( 3, [] ) ) + len( pilots.get( 4, [] ) ), 8 )
+    self.assertEqual( os.listdir( self.workingDirectory ), [] )
+
+  def test_matcherFallback( self ):
+    """ a Matcher without bulk matching is called for each queue """
+    queueDict = makeQueues( 3, 2, slots = 4 )
+    matcher = StubMatcher( dict( [ ( 'LCG.Site%03d.org' % i, { i : 10 } ) for i in range( 3 ) ] ), bulk = False )
+    director = self.makeDirector( queueDict, matcher )
+    self.assert_( director.submitJobs()['OK'] )
+    self.assertEqual( matcher.calls, [ 'getMatchingTaskQueues', 'getBulkMatchingTaskQueues' ] + \
+                                     [ 'getMatchingTaskQueues' ] * 6 )
+    self.assertEqual( sum( self.submitted( queueDict ).values() ), 24 )
+
+  def test_parallelCEs( self ):
+    """ the cycle lasts as long as the slowest CE, not as all of them """
+    queueDict = makeQueues( 5, 2, latency = 0.2 )
+    matcher = StubMatcher( dict( [ ( 'LCG.Site%03d.org' % i, { i : 10 } ) for i in range( 5 ) ] ) )
+    director = self.makeDirector( queueDict, matcher, maxThreads = 5 )
+    startTime = time.time()
+    self.assert_( director.submitJobs()['OK'] )
+    # 0.8 s for each CE, 4 s for the five of them in sequence
+    self.assert_( time.time() - startTime < 2.5 )
+    self.assertEqual( sum( self.submitted( queueDict ).values() ), 40 )
+
+  def test_hangingCE( self ):
+    """ the queues of a CE which timed out are failed, the CE is skipped while it is still busy """
+    queueDict = makeQueues( 3, 2, release = self.release )
+    matcher = StubMatcher( dict( [ ( 'LCG.Site%03d.org' % i, { i : 10 } ) for i in range( 3 ) ] ) )
+    director = self.makeDirector( queueDict, matcher, timeout = 0.5 )
+    self.assert_( director.submitJobs()['OK'] )
+    self.assertEqual( self.submitted( queueDict ), { 'ce000.example.org' : 0, 'ce001.example.org' : 8,
+                                                     'ce002.example.org' : 8 } )
+    hangingQueues = [ queue for queue in queueDict if queue.startswith( 'ce000' ) ]
+    for queue in queueDict:
+      self.assertEqual( director.failedQueues[queue], 1 if queue in hangingQueues else 0 )
+    self.assertEqual( director.submissionPool.busyKeys(), set( [ 'ce000.example.org' ] ) )
+
+    # the next cycle leaves the busy CE alone, even once its queues are no longer failed
+    for queue in hangingQueues:
+      director.failedQueues[queue] = 0
+    self.assert_( director.submitJobs()['OK'] )
+    self.assertEqual( sorted( matcher.bulkDicts ), sorted( [ queue for queue in queueDict
+                                                             if queue not in hangingQueues ] ) )
+
+    # the submission goes on once the CE answers
+    self.release.set()
+    for _i in range( 50 ):
+      if not director.submissionPool.busyKeys():
+        break
+      time.sleep( 0.1 )
+    self.assertEqual( self.submitted( queueDict )['ce000.example.org'], 8 )
+
+class BulkMatchingTaskQueues( unittest.TestCase ):
+  """ MatcherHandler.export_getBulkMatchingTaskQueues """
+
+  class StubTaskQueueDB( object ):
+    def retrieveTaskQueuesThatMatch( self, resourceDict, negativeCond = {} ):
+      return S_OK( { resourceDict['Site'] : { 'Jobs' : 1, 'Priority' : 1., 'NegativeCond' : negativeCond } } )
+
+  class StubLimiter( object ):
+    def getNegativeCondForSite( self, site ):
+      return { 'Site' : site }
+
+  def setUp( self ):
+    self.taskQueueDB = matcherModule.gTaskQueueDB
+    matcherModule.gTaskQueueDB = self.StubTaskQueueDB()
+    self.handler = MatcherHandler.__new__( MatcherHandler )
+    self.handler._MatcherHandler__limiter = self.StubLimiter()
+
+  def tearDown( self ):
+    matcherModule.gTaskQueueDB = self.taskQueueDB
+
+  def test_bulk( self ):
+    result = self.handler.export_getBulkMatchingTaskQueues( { 'ce1_queue0' : { 'Site' : 'LCG.Site1.org' },
+                                                              'ce2_queue0' : { 'Site' : 'LCG.Site2.org' },
+                                                              'bad' : 'LCG.Site3.org' } )
+    self.assert_( result['OK'], result )
+    self.assertEqual( sorted( result['Value'] ), [ 'bad', 'ce1_queue0', 'ce2_queue0' ] )
+    self.assertEqual( result['Value']['ce2_queue0'],
+                      S_OK( { 'LCG.Site2.org' : { 'Jobs' : 1, 'Priority' : 1., 'NegativeCond' : { 'Site' : 'LCG.Site2.org' } } } ) )
+    self.failIf( result['Value']['bad']['OK'] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( SubmitJobs )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( BulkMatchingTaskQueues ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -55,12 +55,58 @@ class CachedJobState( object ):
     return set( self.__dirtyKeys )
 
   def commitChanges( self ):
-    if self.__initState == None:
-      return S_ERROR( "CachedJobState( %d ) is not valid" % self.__jid )
+    result = self.commitStates( [ self ] )
+    if not result[ 'OK' ]:
+      return result
+    return result[ 'Value' ][ self.__jid ]
+
+  @classmethod
+  def commitStates( cls, cachedJobStates ):
+    """ Commit the changes of several cached job states. With local DB access the changes of all
+        of them are applied in a single transaction, otherwise with one call per job. Jobs are then
+        inserted in the task queues if requested.
+
+        Returns S_OK( { jid : S_OK() or S_ERROR() } )
+    """
+    results = {}
+    toCommit = []
+    for cjs in cachedJobStates:
+      if cjs.__initState == None:
+        results[ cjs.__jid ] = S_ERROR( "CachedJobState( %d ) is not valid" % cjs.__jid )
+      else:
+        toCommit.append( cjs )
+    if not toCommit:
+      return S_OK( results )
+
+    if toCommit[0].__jobState.localAccess:
+      result = JobState.commitCaches( [ cjs.__getChanges() for cjs in toCommit ] )
+      for cjs in toCommit:
+        if result[ 'OK' ]:
+          results[ cjs.__jid ] = S_OK( result[ 'Value' ][ cjs.__jid ] )
+        else:
+          results[ cjs.__jid ] = result
+    else:
+      for cjs in toCommit:
+        results[ cjs.__jid ] = cjs.__jobState.commitCache( *cjs.__getChanges()[1:] )
+
+    for cjs in toCommit:
+      results[ cjs.__jid ] = cjs.__changesCommitted( results[ cjs.__jid ] )
+    return S_OK( results )
+
+  def __getChanges( self ):
+    """ ( jid, initialState, changes, jobLog, manifestJDL ) to commit
+    """
     changes = {}
     for k in self.__dirtyKeys:
       changes[ k ] = self.__cache[ k ]
-    result = self.__jobState.commitCache( self.__initState, changes, self.__jobLog )
+    manifest = None
+    if self.__manifest and self.__manifest.isDirty():
+      manifest = self.__manifest.dumpAsJDL()
+    return ( self.__jid, self.__initState, changes, self.__jobLog, manifest )
+
+  def __changesCommitted( self, result ):
+    """ Update the state after the commit of the changes and insert the job into the TQ if requested
+    """
     try:
       result.pop( 'rpcStub' )
     except KeyError:
@@ -74,19 +120,15 @@ class CachedJobState( object ):
     newState = result[ 'Value' ]
     self.__jobLog = []
     self.__dirtyKeys.clear()
-    #Save manifest
-    if self.__manifest and self.__manifest.isDirty():
-      result = self.__jobState.setManifest( self.__manifest )
-      if not result[ 'OK' ]:
-        self.cleanState()
-        for i in range( 5 ):
-          if self.__jobState.rescheduleJob()[ 'OK' ]:
-            break
-        return result
+    if self.__manifest:
       self.__manifest.clearDirty()
     #Insert into TQ
     if self.__insertIntoTQ:
-      result = self.__jobState.insertIntoTQ()
+      #The manifest can only be given with local access
+      manifest = None
+      if self.__manifest and self.__jobState.localAccess:
+        manifest = self.__manifest
+      result = self.__jobState.insertIntoTQ( manifest )
       if not result[ 'OK' ]:
         self.cleanState()
         for i in range( 5 ):
@@ -132,7 +132,8 @@ class JobState( object ):
 
 #Execute traces
 
-  def __retryFunction( self, retries, functor, args = False, kwargs = False ):
+  @staticmethod
+  def __retryFunction( retries, functor, args = False, kwargs = False ):
     retries = max( 1, retries )
     if not args:
       args = tuple()
@@ -149,63 +150,66 @@ class JobState( object ):
 
   right_commitCache = RIGHT_GET_INFO
   @RemoteMethod
-  def commitCache( self, initialState, cache, jobLog ):
+  def commitCache( self, initialState, cache, jobLog, manifest = None ):
+    """ Apply the cached changes of the job if it is in initialState, see commitCaches()
+    """
     try:
       self.__checkType( initialState , types.DictType )
       self.__checkType( cache , types.DictType )
       self.__checkType( jobLog , ( types.ListType, types.TupleType ) )
+      self.__checkType( manifest, ( types.StringType, types.NoneType ) )
     except TypeError, excp:
       return S_ERROR( str( excp ) )
-    result = self.getAttributes( initialState.keys() )
+    result = self.commitCaches( [ ( self.__jid, initialState, cache, jobLog, manifest ) ] )
     if not result[ 'OK' ]:
       return result
-    if not result[ 'Value' ] == initialState:
-      return S_OK( False )
-    gLogger.verbose( "Job %s: About to execute trace. Current state %s" % ( self.__jid, initialState ) )
-
-    data = { 'att': [], 'jobp': [], 'optp': [] }
-    for key in cache:
-      for dk in data:
-        if key.find( "%s." % dk ) == 0:
-          data[ dk ].append( ( key[ len( dk ) + 1:], cache[ key ] ) )
-
-    jobDB = JobState.__db.job
-    if data[ 'att' ]:
-      attN = [ t[0] for t in data[ 'att' ] ]
-      attV = [ t[1] for t in data[ 'att' ] ]
-      result = self.__retryFunction( 5, jobDB.setJobAttributes,
-                                     ( self.__jid, attN, attV ), { 'update' : True } )
-      if not result[ 'OK' ]:
-        return result
-
-    if data[ 'jobp' ]:
-      result = self.__retryFunction( 5, jobDB.setJobParameters, ( self.__jid, data[ 'jobp' ] ) )
-      if not result[ 'OK' ]:
-        return result
+    return S_OK( result[ 'Value' ][ self.__jid ] )
 
-    for k,v in  data[ 'optp' ]:
-      result = self.__retryFunction( 5, jobDB.setJobOptParameter, ( self.__jid, k, v ) )
-      if not result[ 'OK' ]:
-        return result
-
-    if 'inputData' in cache:
-      result = self.__retryFunction( 5, jobDB.setInputData, ( self.__jid, cache[ 'inputData' ] ) )
-      if not result[ 'OK' ]:
-        return result
+  @classmethod
+  def commitCaches( cls, cacheList ):
+    """ Apply the cached changes of several jobs: attributes, job and optimizer parameters,
+        input data and manifests in a single JobDB transaction, then the logging records with
+        a single insert. cacheList is a list of ( jid, initialState, cache, jobLog, manifestJDL )
+        tuples, manifestJDL being None for an unchanged manifest. Needs local DB access.
+
+        Returns S_OK( { jid : newState } ), newState being the attributes of the initial state
+        after the changes, or False if the job was not in its initial state
+    """
+    changesDict = {}
+    for jid, initialState, cache, jobLog, manifest in cacheList:
+      changes = { 'InitialState' : initialState, 'Attributes' : {}, 'Parameters' : {}, 'OptParameters' : {} }
+      for key in cache:
+        for prefix, name in ( ( 'att', 'Attributes' ), ( 'jobp', 'Parameters' ), ( 'optp', 'OptParameters' ) ):
+          if key.find( "%s." % prefix ) == 0:
+            changes[ name ][ key[ len( prefix ) + 1: ] ] = cache[ key ]
+      if 'inputData' in cache:
+        changes[ 'InputData' ] = cache[ 'inputData' ]
+      if manifest:
+        changes[ 'JDL' ] = manifest
+      changesDict[ jid ] = changes
+
+    gLogger.verbose( "About to commit the changes of jobs %s" % ", ".join( [ str( jid ) for jid in changesDict ] ) )
+    result = cls.__retryFunction( 5, JobState.__db.job.commitJobChanges, ( changesDict, ) )
+    if not result[ 'OK' ]:
+      return result
+    newStates = dict( [ ( jid, result[ 'Value' ][ int( jid ) ] ) for jid in changesDict ] )
 
-    logDB = JobState.__db.log
-    gLogger.verbose( "Adding logging records for %s" % self.__jid )
-    for record, updateTime, source in jobLog:
-      gLogger.verbose( "Logging records for %s: %s %s %s" % ( self.__jid, record, updateTime, source ) )
-      record[ 'date' ] = updateTime
-      record[ 'source' ] = source
-      result = self.__retryFunction( 5, logDB.addLoggingRecord, ( self.__jid, ), record )
-      if not result[ 'OK' ]:
-        return result
+    records = []
+    for jid, initialState, cache, jobLog, manifest in cacheList:
+      if not newStates[ jid ]:
+        continue
+      for record, updateTime, source in jobLog:
+        gLogger.verbose( "Logging records for %s: %s %s %s" % ( jid, record, updateTime, source ) )
+        record = dict( record )
+        record[ 'date' ] = updateTime
+        record[ 'source' ] = source
+        records.append( ( jid, record ) )
+    result = cls.__retryFunction( 5, JobState.__db.log.addLoggingRecordList, ( records, ) )
+    if not result[ 'OK' ]:
+      return result
 
-    gLogger.info( "Job %s: Ended trace execution" % self.__jid )
-    #We return a new initial state
-    return self.getAttributes( initialState.keys() )
+    gLogger.info( "Ended commit of the changes of %s jobs" % len( [ jid for jid in newStates if newStates[ jid ] ] ) )
+    return S_OK( newStates )
 #
 # Status
 #
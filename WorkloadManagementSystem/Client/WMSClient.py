@@ -99,6 +99,22 @@ class WMSClient( object ):
     """ Submit one job specified by its JDL to WMS
     """
 
+    result = self.prepareJob( jdl )
+    if not result['OK']:
+      return result
+
+    # Submit the job now and get the new job ID
+    self.__getJobManager()
+    result = self.jobManager.submitJob( result['Value'] )
+    if 'requireProxyUpload' in result and result['requireProxyUpload']:
+      gLogger.warn( "Need to upload the proxy" )
+    return result
+
+  def prepareJob( self, jdl ):
+    """ Check the JDL of one job and upload its input sandbox,
+        returns the JDL to be submitted with submitJobs
+    """
+
     if os.path.exists( jdl ):
       fic = open ( jdl, "r" )
       jdlString = fic.read()
@@ -120,15 +136,29 @@ class WMSClient( object ):
     if not result['OK']:
       return result
 
-    # Submit the job now and get the new job ID
+    return S_OK( classAdJob.asJDL() )
+
+  def submitJobs( self, jdlList ):
+    """ Submit jobs prepared by prepareJob to WMS with a single call,
+        returns the list of their job IDs, in the order of jdlList.
+        An error with Rejected set comes from the JobManager, no job having been inserted
+    """
+    if not jdlList:
+      return S_OK( [] )
+    self.__getJobManager()
+    result = self.jobManager.submitJobs( list( jdlList ) )
+    if 'requireProxyUpload' in result and result['requireProxyUpload']:
+      gLogger.warn( "Need to upload the proxy" )
+    return result
+
+  def __getJobManager( self ):
+    """ JobManager client, created on first use
+    """
     if not self.jobManager:
       self.jobManager = RPCClient( 'WorkloadManagement/JobManager',
                                     useCertificates = self.useCertificates,
                                     timeout = self.timeout )
-    result = self.jobManager.submitJob( classAdJob.asJDL() )
-    if 'requireProxyUpload' in result and result['requireProxyUpload']:
-      gLogger.warn( "Need to upload the proxy" )
-    return result
+    return self.jobManager
 
   def killJob( self, jobID ):
     """ Kill running job.
@@ -27,8 +27,10 @@
     setJobJDL()
     setJobStatus()
     setInputData()
+    commitJobChanges()
 
     insertNewJobIntoDB()
+    insertNewJobsIntoDB()
     removeJobFromDB()
 
     rescheduleJob()
@@ -40,11 +42,14 @@
     banSiteInMask()
 
     getCounters()
+    getSummaryCounters()
+    reconcileJobsSummary()
 """
 
 __RCSID__ = "$Id$"
 
 import sys
+import uuid
 import operator
 
 from DIRAC.Core.Utilities.ClassAd.ClassAdLight               import ClassAd
@@ -52,6 +57,7 @@ from DIRAC                                                   import S_OK, S_ERRO
 from DIRAC.ConfigurationSystem.Client.Config                 import gConfig
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry       import getVOForGroup, getVOOption, getGroupOption
 from DIRAC.Core.Base.DB                                      import DB
+from DIRAC.Core.Utilities                                    import List
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry       import getUsernameForDN, getDNForUsername
 from DIRAC.ConfigurationSystem.Client.Helpers.Resources      import getDIRACPlatform
 from DIRAC.WorkloadManagementSystem.Client.JobState.JobManifest   import JobManifest
@@ -61,6 +67,15 @@ JOB_STATES = ['Received', 'Checking', 'Staging', 'Waiting', 'Matched',
               'Running', 'Stalled', 'Done', 'Completed', 'Failed']
 JOB_FINAL_STATES = ['Done', 'Completed', 'Failed']
 
+# Manifest options looked at by JobManifest.check() and the ones it may normalise
+JOB_MANIFEST_CHECKED_OPTIONS = [ 'MaxCPUTime', 'CPUTime', 'Priority', 'SubmitPools', 'PilotTypes',
+                                 'JobType', 'InputData' ]
+JOB_MANIFEST_NORMALISED_OPTIONS = [ 'MaxCPUTime', 'CPUTime', 'Priority' ]
+
+# Key of the incrementally maintained JobsSummary counters
+JOB_SUMMARY_FIELDS = [ 'DIRACSetup', 'Status', 'MinorStatus', 'Site', 'Owner', 'OwnerDN', 'OwnerGroup',
+                       'JobGroup', 'JobSplitType' ]
+
 JOB_DEPRECATED_ATTRIBUTES = [ 'UserPriority', 'SystemPriority' ]
 
 JOB_STATIC_ATTRIBUTES = [ 'JobID', 'JobType', 'DIRACSetup', 'JobGroup', 'JobSplitType', 'MasterJobID',
@@ -96,6 +111,13 @@ class JobDB( DB ):
       sys.exit( error )
       return
 
+    result = self.__initializeDB()
+    if not result['OK']:
+      error = 'Can not create the JobsSummary table'
+      self.log.fatal( 'JobDB: %s' % error, result['Message'] )
+      sys.exit( error )
+      return
+
     self.log.info( "MaxReschedule:  %s" % self.maxRescheduling )
     self.log.info( "==================================================" )
 
@@ -136,6 +158,43 @@ class JobDB( DB ):
 
     return S_OK()
 
+  def __initializeDB( self ):
+    """ Create the JobsSummary table if it is not there yet, as in a database created
+        before it. It is filled in by the first reconcileJobsSummary of the StatesAccountingAgent
+    """
+    result = self._query( "SHOW TABLES" )
+    if not result['OK']:
+      return result
+    tablesInDB = [ t[0] for t in result['Value'] ]
+    if 'JobsSummary' in tablesInDB:
+      return S_OK()
+
+    tablesDesc = {}
+    tablesDesc['JobsSummary'] = { 'Fields' : { 'SummaryKey' : 'CHAR(32) NOT NULL',
+                                               'DIRACSetup' : 'VARCHAR(32) NOT NULL',
+                                               'Status' : "VARCHAR(32) NOT NULL DEFAULT 'Received'",
+                                               'MinorStatus' : "VARCHAR(128) NOT NULL DEFAULT 'Initial insertion'",
+                                               'Site' : "VARCHAR(100) NOT NULL DEFAULT 'ANY'",
+                                               'Owner' : "VARCHAR(32) NOT NULL DEFAULT 'Unknown'",
+                                               'OwnerDN' : "VARCHAR(255) NOT NULL DEFAULT 'Unknown'",
+                                               'OwnerGroup' : "VARCHAR(128) NOT NULL DEFAULT 'lhcb_user'",
+                                               'JobGroup' : "VARCHAR(32) NOT NULL DEFAULT 'NoGroup'",
+                                               'JobSplitType' : "ENUM ('Single','Master','Subjob','DAGNode') "
+                                                                "NOT NULL DEFAULT 'Single'",
+                                               'JobCount' : 'INTEGER NOT NULL DEFAULT 0',
+                                               'RescheduleSum' : 'INTEGER NOT NULL DEFAULT 0' },
+                                  'PrimaryKey' : 'SummaryKey',
+                                  'Indexes' : { 'Status' : [ 'Status' ], 'Site' : [ 'Site' ] } }
+    result = self._createTables( tablesDesc )
+    if not result['OK']:
+      # Another JobDB may have created it in the meantime
+      tables = self._query( "SHOW TABLES" )
+      if tables['OK'] and 'JobsSummary' in [ t[0] for t in tables['Value'] ]:
+        return S_OK()
+      return result
+    self.log.info( 'JobDB: JobsSummary table created' )
+    return S_OK()
+
 #############################################################################
   def getJobID( self ):
     """Get the next unique JobID and prepare the new job insertion
@@ -749,7 +808,7 @@ class JobDB( DB ):
     ret = self._escapeString( jobID )
     if not ret['OK']:
       return ret
-    jobID = ret['Value']
+    e_jobID = ret['Value']
 
     ret = self._escapeString( attrValue )
     if not ret['OK']:
@@ -759,14 +818,14 @@ class JobDB( DB ):
     # FIXME: need to check the validity of attrName
 
     if update:
-      cmd = "UPDATE Jobs SET %s=%s,LastUpdateTime=UTC_TIMESTAMP() WHERE JobID=%s" % ( attrName, value, jobID )
+      cmd = "UPDATE Jobs SET %s=%s,LastUpdateTime=UTC_TIMESTAMP() WHERE JobID=%s" % ( attrName, value, e_jobID )
     else:
-      cmd = "UPDATE Jobs SET %s=%s WHERE JobID=%s" % ( attrName, value, jobID )
+      cmd = "UPDATE Jobs SET %s=%s WHERE JobID=%s" % ( attrName, value, e_jobID )
 
     if myDate:
       cmd += ' AND LastUpdateTime < %s' % myDate
 
-    res = self._update( cmd )
+    res = self.__updateJobs( jobID, cmd, { attrName : attrValue } )
     if res['OK']:
       return res
     else:
@@ -781,7 +840,7 @@ class JobDB( DB ):
     ret = self._escapeString( jobID )
     if not ret['OK']:
       return ret
-    jobID = ret['Value']
+    e_jobID = ret['Value']
 
     if len( attrNames ) != len( attrValues ):
       return S_ERROR( 'JobDB.setAttributes: incompatible Argument length' )
@@ -799,12 +858,12 @@ class JobDB( DB ):
     if len( attr ) == 0:
       return S_ERROR( 'JobDB.setAttributes: Nothing to do' )
 
-    cmd = 'UPDATE Jobs SET %s WHERE JobID=%s' % ( ', '.join( attr ), jobID )
+    cmd = 'UPDATE Jobs SET %s WHERE JobID=%s' % ( ', '.join( attr ), e_jobID )
 
     if myDate:
       cmd += ' AND LastUpdateTime < %s' % myDate
 
-    res = self._update( cmd )
+    res = self.__updateJobs( jobID, cmd, dict( zip( attrNames, attrValues ) ) )
     if res['OK']:
       return res
     else:
@@ -1068,6 +1127,193 @@ class JobDB( DB ):
 
     return result
 
+#############################################################################
+  def commitJobChanges( self, changesDict ):
+    """ Apply the changes of several jobs in a single transaction, each table being
+        updated with one statement for all the jobs. changesDict is a { jobID : changes }
+        dictionary, changes having the keys:
+
+          'InitialState' : { attribute : value } the job has to be in for its changes to be applied
+          'Attributes', 'Parameters', 'OptParameters' : { name : value } dictionaries to set
+          'InputData' : optional list of LFNs replacing the job input data
+          'JDL' : optional new JDL of the job
+
+        The LastUpdateTime of the jobs with attributes to set is refreshed.
+        Returns S_OK( { jobID : newState } ), newState having the attributes of the initial
+        state after the changes, or being False if the job was not in its initial state
+    """
+    if not changesDict:
+      return S_OK( {} )
+    changesDict = dict( [ ( int( jobID ), changes ) for jobID, changes in changesDict.items() ] )
+    names = set()
+    for changes in changesDict.values():
+      names.update( changes['InitialState'] )
+      names.update( changes.get( 'Attributes', {} ) )
+    badNames = [ name for name in names if name not in self.jobAttributeNames ]
+    if badNames:
+      return S_ERROR( 'JobDB.commitJobChanges: unknown job attributes %s' % ', '.join( sorted( badNames ) ) )
+
+    return self.__inTransaction( self.__commitJobChanges, changesDict )
+
+  def __inTransaction( self, function, *args ):
+    """ Call function( *args ) in a transaction, committed if it returns S_OK and rolled back otherwise
+    """
+    result = self.transactionStart()
+    if not result['OK']:
+      return result
+    result = function( *args )
+    if not result['OK']:
+      self.transactionRollback()
+      return result
+    commit = self.transactionCommit()
+    if not commit['OK']:
+      self.transactionRollback()
+      return commit
+    return result
+
+  def __commitJobChanges( self, changesDict ):
+    """ Statements of commitJobChanges(), the transaction being started
+    """
+    jobIDs = sorted( changesDict )
+    jobList = ','.join( [ str( jobID ) for jobID in jobIDs ] )
+    stateNames = set( JOB_SUMMARY_FIELDS + [ 'RescheduleCounter' ] )
+    for changes in changesDict.values():
+      stateNames.update( changes['InitialState'] )
+    stateNames = sorted( stateNames )
+
+    # Lock the rows of the jobs before checking their state
+    cmd = 'SELECT JobID, %s FROM Jobs WHERE JobID IN (%s) FOR UPDATE' % \
+          ( ', '.join( [ '`%s`' % name for name in stateNames ] ), jobList )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    rows = {}
+    for row in result['Value']:
+      rows[int( row[0] )] = dict( zip( stateNames, [ str( value ) for value in row[1:] ] ) )
+
+    newStates = {}
+    for jobID in jobIDs:
+      initialState = changesDict[jobID]['InitialState']
+      row = rows.get( jobID )
+      if not row or dict( [ ( name, row[name] ) for name in initialState ] ) != initialState:
+        self.log.verbose( 'JobDB.commitJobChanges: job %s is not in its initial state' % jobID )
+        newStates[jobID] = False
+    jobIDs = [ jobID for jobID in jobIDs if jobID not in newStates ]
+    if not jobIDs:
+      return S_OK( newStates )
+    jobList = ','.join( [ str( jobID ) for jobID in jobIDs ] )
+
+    attrJobs = [ jobID for jobID in jobIDs if changesDict[jobID].get( 'Attributes' ) ]
+    if attrJobs:
+      result = self.__setJobsAttributes( attrJobs, dict( [ ( jobID, changesDict[jobID]['Attributes'] )
+                                                           for jobID in attrJobs ] ), rows )
+      if not result['OK']:
+        return result
+
+    for key, table in ( ( 'Parameters', 'JobParameters' ), ( 'OptParameters', 'OptimizerParameters' ) ):
+      paramRows = []
+      for jobID in jobIDs:
+        paramRows.extend( [ ( jobID, name, value ) for name, value in changesDict[jobID].get( key, {} ).items() ] )
+      if paramRows:
+        result = self.__escapeJobRows( paramRows )
+        if not result['OK']:
+          return result
+        result = self._update( 'REPLACE INTO %s (JobID,Name,Value) VALUES %s' % ( table, result['Value'] ) )
+        if not result['OK']:
+          return S_ERROR( 'JobDB.commitJobChanges: failed to set %s: %s' % ( table, result['Message'] ) )
+
+    inputJobs = [ jobID for jobID in jobIDs if 'InputData' in changesDict[jobID] ]
+    if inputJobs:
+      result = self._update( 'DELETE FROM InputData WHERE JobID IN (%s)' % \
+                             ','.join( [ str( jobID ) for jobID in inputJobs ] ) )
+      if not result['OK']:
+        return result
+      lfnRows = []
+      for jobID in inputJobs:
+        lfns = []
+        # some jobs are setting empty string as InputData
+        for lfn in changesDict[jobID]['InputData']:
+          if lfn and lfn.strip() not in lfns:
+            lfns.append( lfn.strip() )
+        lfnRows.extend( [ ( jobID, lfn ) for lfn in lfns ] )
+      if lfnRows:
+        result = self.__escapeJobRows( lfnRows )
+        if not result['OK']:
+          return result
+        result = self._update( 'INSERT INTO InputData (JobID,LFN) VALUES %s' % result['Value'] )
+        if not result['OK']:
+          return result
+
+    jdlRows = [ ( jobID, changesDict[jobID]['JDL'] ) for jobID in jobIDs if changesDict[jobID].get( 'JDL' ) ]
+    if jdlRows:
+      result = self.__escapeJobRows( jdlRows )
+      if not result['OK']:
+        return result
+      result = self._update( 'INSERT INTO JobJDLs (JobID,JDL) VALUES %s ON DUPLICATE KEY UPDATE JDL=VALUES(JDL)' % \
+                             result['Value'] )
+      if not result['OK']:
+        return result
+
+    cmd = 'SELECT JobID, %s FROM Jobs WHERE JobID IN (%s)' % \
+          ( ', '.join( [ '`%s`' % name for name in stateNames ] ), jobList )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    for row in result['Value']:
+      jobID = int( row[0] )
+      values = dict( zip( stateNames, [ str( value ) for value in row[1:] ] ) )
+      newStates[jobID] = dict( [ ( name, values[name] ) for name in changesDict[jobID]['InitialState'] ] )
+    return S_OK( newStates )
+
+  def __setJobsAttributes( self, jobIDs, attrDict, rows ):
+    """ Set the { jobID : { name : value } } attributes of attrDict with a single statement and
+        move the JobsSummary counters of the jobs, rows being their former state
+    """
+    names = set()
+    for attributes in attrDict.values():
+      names.update( attributes )
+    setList = []
+    for name in sorted( names ):
+      cases = []
+      for jobID in jobIDs:
+        if name in attrDict[jobID]:
+          ret = self._escapeString( attrDict[jobID][name] )
+          if not ret['OK']:
+            return ret
+          cases.append( 'WHEN %d THEN %s' % ( jobID, ret['Value'] ) )
+      setList.append( '`%s`=CASE JobID %s ELSE `%s` END' % ( name, ' '.join( cases ), name ) )
+    setList.append( 'LastUpdateTime=UTC_TIMESTAMP()' )
+    cmd = 'UPDATE Jobs SET %s WHERE JobID IN (%s)' % ( ', '.join( setList ),
+                                                     ','.join( [ str( jobID ) for jobID in jobIDs ] ) )
+    result = self._update( cmd )
+    if not result['OK']:
+      return S_ERROR( 'JobDB.commitJobChanges: failed to set attributes: %s' % result['Message'] )
+
+    deltaDict = {}
+    for jobID in jobIDs:
+      row = rows[jobID]
+      oldKey = tuple( [ row[field] for field in JOB_SUMMARY_FIELDS ] )
+      newKey = tuple( [ str( attrDict[jobID].get( field, row[field] ) ) for field in JOB_SUMMARY_FIELDS ] )
+      oldCounter = int( row['RescheduleCounter'] )
+      newCounter = int( attrDict[jobID].get( 'RescheduleCounter', oldCounter ) )
+      if newKey != oldKey or newCounter != oldCounter:
+        for key, jobs, reschedules in ( ( oldKey, -1, -oldCounter ), ( newKey, 1, newCounter ) ):
+          delta = deltaDict.setdefault( key, [ 0, 0 ] )
+          delta[0] += jobs
+          delta[1] += reschedules
+    return self.__updateJobsSummary( deltaDict )
+
+  def __escapeJobRows( self, rows ):
+    """ SQL values of the ( jobID, value, ... ) rows
+    """
+    sqlRows = []
+    for row in rows:
+      ret = self._escapeValues( list( row[1:] ) )
+      if not ret['OK']:
+        return ret
+      sqlRows.append( '(%d, %s)' % ( row[0], ', '.join( ret['Value'] ) ) )
+    return S_OK( ', '.join( sqlRows ) )
+
 #############################################################################
   def __insertNewJDL( self, jdl ):
     """Insert a new JDL in the system, this produces a new JobID
@@ -1189,7 +1435,7 @@ class JobDB( DB ):
       jobAttrNames.append( 'MinorStatus' )
       jobAttrValues.append( 'Error in JDL syntax' )
 
-      result = self.insertFields( 'Jobs', jobAttrNames, jobAttrValues )
+      result = self.__inTransaction( self.__insertJob, jobID, jobAttrNames, jobAttrValues )
       if not result['OK']:
         return result
 
@@ -1277,7 +1523,7 @@ class JobDB( DB ):
     if not result['OK']:
       return result
 
-    result = self.insertFields( 'Jobs', jobAttrNames, jobAttrValues )
+    result = self.__inTransaction( self.__insertJob, jobID, jobAttrNames, jobAttrValues )
     if not result['OK']:
       return result
 
@@ -1286,12 +1532,293 @@ class JobDB( DB ):
 
     return retVal
 
+#############################################################################
+  def __checkManifests( self, jdlList, owner, ownerDN, ownerGroup, diracSetup ):
+    """ Load the manifests of a bunch of jobs. The first manifest is the template
+        of the bunch and it is fully checked. The others are only checked if they
+        differ from the template in any of the checked options, otherwise the
+        values normalised by the template check are copied over.
+    """
+    ownerDict = { 'OwnerName' : owner,
+                  'OwnerDN' : ownerDN,
+                  'OwnerGroup' : ownerGroup,
+                  'DIRACSetup' : diracSetup }
+    manifestList = []
+    template = None
+    templateOptions = {}
+    for jdl in jdlList:
+      jobManifest = JobManifest()
+      result = jobManifest.load( jdl )
+      if not result['OK']:
+        return result
+      jobManifest.setOptionsFromDict( ownerDict )
+      manifestList.append( jobManifest )
+
+      jobOptions = dict( [ ( opt, jobManifest.getOption( opt ) ) for opt in JOB_MANIFEST_CHECKED_OPTIONS ] )
+      if template is None:
+        template = jobManifest
+        templateOptions = jobOptions
+        result = jobManifest.check()
+        if not result['OK']:
+          return result
+        continue
+
+      sameAsTemplate = True
+      for opt in JOB_MANIFEST_CHECKED_OPTIONS:
+        if jobOptions[opt] == templateOptions[opt]:
+          continue
+        if opt == 'InputData' and \
+           len( List.fromChar( jobOptions[opt] or '' ) ) <= len( List.fromChar( templateOptions[opt] or '' ) ):
+          # The template passed the check with at least as many input files
+          continue
+        sameAsTemplate = False
+        break
+
+      if sameAsTemplate:
+        for opt in JOB_MANIFEST_NORMALISED_OPTIONS:
+          jobManifest.setOption( opt, template.getOption( opt ) )
+      else:
+        result = jobManifest.check()
+        if not result['OK']:
+          return result
+
+    return S_OK( manifestList )
+
+#############################################################################
+  def insertNewJobsIntoDB( self, jdlList, owner, ownerDN, ownerGroup, diracSetup ):
+    """ Bulk version of insertNewJobIntoDB() for a bunch of jobs with the same owner,
+        e.g. the jobs of a parametric submission.
+
+        All the JDLs are checked before anything is written. The JobIDs are allocated
+        by a single multi-row insert into JobJDLs and read back by the marker of the
+        batch, and the Jobs, JobJDLs, InputData and JobParameters rows are written with
+        multi-row statements, everything in a single transaction.
+
+        :return: S_OK( jobIDList ) with the 'JobStatus' key holding a
+                 { jobID : { 'Status' : status, 'MinorStatus' : minorStatus } } dictionary
+    """
+    if not jdlList:
+      return S_OK( [] )
+
+    result = self.__checkManifests( jdlList, owner, ownerDN, ownerGroup, diracSetup )
+    if not result['OK']:
+      return result
+    manifestList = result['Value']
+
+    # Check JDLs and prepare DIRAC JDLs, nothing is written yet
+    now = Time.toString()
+    jobList = []
+    for jobManifest in manifestList:
+      jobAttrs = [ ( 'LastUpdateTime', now ),
+                   ( 'SubmissionTime', now ),
+                   ( 'Owner', owner ),
+                   ( 'OwnerDN', ownerDN ),
+                   ( 'OwnerGroup', ownerGroup ),
+                   ( 'DIRACSetup', diracSetup ) ]
+      classAdJob = ClassAd( jobManifest.dumpAsJDL() )
+      classAdReq = ClassAd( '[]' )
+      if not classAdJob.isOK():
+        jobAttrs += [ ( 'Status', 'Failed' ), ( 'MinorStatus', 'Error in JDL syntax' ) ]
+        jobList.append( ( None, jobAttrs ) )
+        continue
+
+      result = self.__prepareJobClassAd( classAdJob, classAdReq, owner, ownerDN, ownerGroup, diracSetup )
+      if not result['OK']:
+        return result
+
+      jobAttrs.append( ( 'UserPriority', classAdJob.getAttributeInt( 'Priority' ) ) )
+      for jdlName in 'JobName', 'JobType', 'JobGroup':
+        # Defaults are set by the DB.
+        jdlValue = classAdJob.getAttributeString( jdlName )
+        if jdlValue:
+          jobAttrs.append( ( jdlName, jdlValue ) )
+      jdlValue = classAdJob.getAttributeString( 'Site' )
+      if jdlValue:
+        if jdlValue.find( ',' ) != -1:
+          jdlValue = 'Multiple'
+        jobAttrs.append( ( 'Site', jdlValue ) )
+      jobAttrs += [ ( 'VerifiedFlag', 'True' ), ( 'Status', 'Received' ), ( 'MinorStatus', 'Job accepted' ) ]
+
+      classAdJob.insertAttributeInt( 'JobRequirements', classAdReq.asJDL() )
+      jobList.append( ( classAdJob, jobAttrs ) )
+
+    return self.__inTransaction( self.__insertNewJobs, jdlList, jobList )
+
+  def __insertNewJobs( self, jdlList, jobList ):
+    """ Statements of insertNewJobsIntoDB(), the transaction being started
+    """
+    # 1.- Insert the original JDLs and get the new JobIDs
+    result = self.__allocateJobIDs( jdlList )
+    if not result['OK']:
+      return result
+    jobIDList, e_markers = result['Value']
+    self.log.info( 'JobDB: %d new JobIDs served from %s' % ( len( jobIDList ), jobIDList[0] ) )
+
+    # 2.- Build the rows of all the tables
+    jdlCases = []
+    inputDataValues = []
+    parameterValues = []
+    jobRows = {}
+    jobStatus = {}
+    for jobID, ( classAdJob, jobAttrs ) in zip( jobIDList, jobList ):
+      jobAttrs.insert( 0, ( 'JobID', jobID ) )
+      attrDict = dict( jobAttrs )
+      jobStatus[jobID] = { 'Status' : attrDict['Status'], 'MinorStatus' : attrDict['MinorStatus'] }
+      attrNames = tuple( [ name for name, _value in jobAttrs ] )
+      jobRows.setdefault( attrNames, [] ).append( [ value for _name, value in jobAttrs ] )
+      if classAdJob is None:
+        continue
+
+      classAdJob.insertAttributeInt( 'JobID', jobID )
+      jobJDL = classAdJob.asJDL()
+      # Replace the JobID placeholder if any
+      if jobJDL.find( '%j' ) != -1:
+        jobJDL = jobJDL.replace( '%j', str( jobID ) )
+      ret = self._escapeString( jobJDL )
+      if not ret['OK']:
+        return ret
+      jdlCases.append( 'WHEN %d THEN %s' % ( jobID, ret['Value'] ) )
+
+      inputData = []
+      if classAdJob.lookupAttribute( 'InputData' ):
+        inputData = classAdJob.getListFromExpression( 'InputData' )
+      for lfn in inputData:
+        # some jobs are setting empty string as InputData
+        if not lfn:
+          continue
+        ret = self._escapeString( lfn.strip() )
+        if not ret['OK']:
+          return ret
+        inputDataValues.append( '(%d, %s)' % ( jobID, ret['Value'] ) )
+
+      parameters = {}
+      if classAdJob.lookupAttribute( "Parameters" ):
+        parameters = classAdJob.getDictionaryFromSubJDL( "Parameters" )
+      for name, value in parameters.items():
+        ret = self._escapeValues( [ name, value ] )
+        if not ret['OK']:
+          return ret
+        parameterValues.append( '(%d, %s, %s)' % ( jobID, ret['Value'][0], ret['Value'][1] ) )
+
+    # 3.- Write everything with multi-row statements
+    # The JDLs replace the markers, the JDL of the jobs with a syntax error is left empty
+    jobString = ','.join( [ str( jobID ) for jobID in jobIDList ] )
+    jdlValue = "''"
+    if jdlCases:
+      jdlValue = "CASE JobID %s ELSE '' END" % ' '.join( jdlCases )
+    cmd = 'UPDATE JobJDLs SET JDL=%s WHERE JobID IN (%s) AND JDL IN (%s)' % ( jdlValue, jobString,
+                                                                           ','.join( e_markers ) )
+    result = self._update( cmd )
+    if not result['OK']:
+      return result
+    if result['Value'] != len( jobIDList ):
+      return S_ERROR( 'JobDB.insertNewJobsIntoDB: JDLs of jobs %s changed during their insertion' % jobString )
+
+    if inputDataValues:
+      cmd = 'INSERT INTO InputData (JobID,LFN) VALUES %s' % ', '.join( inputDataValues )
+      result = self._update( cmd )
+      if not result['OK']:
+        return result
+
+    if parameterValues:
+      cmd = 'INSERT INTO JobParameters (JobID,Name,Value) VALUES %s' % ', '.join( parameterValues )
+      result = self._update( cmd )
+      if not result['OK']:
+        return S_ERROR( 'JobDB.insertNewJobsIntoDB: failed to set job parameters' )
+
+    for attrNames, rows in jobRows.items():
+      values = []
+      for row in rows:
+        ret = self._escapeValues( row )
+        if not ret['OK']:
+          return ret
+        values.append( '(%s)' % ', '.join( ret['Value'] ) )
+      cmd = 'INSERT INTO Jobs (%s) VALUES %s' % ( ', '.join( attrNames ), ', '.join( values ) )
+      result = self._update( cmd )
+      if not result['OK']:
+        return result
+    result = self.__addJobsToSummary( jobIDList )
+    if not result['OK']:
+      return result
+
+    retVal = S_OK( jobIDList )
+    retVal['JobStatus'] = jobStatus
+    return retVal
+
+  def __allocateJobIDs( self, jdlList ):
+    """ Insert the original JDLs with one multi-row statement and return the new JobIDs in
+        the order of jdlList, with the escaped markers set as the JDL of their rows.
+
+        The AUTO_INCREMENT values of a multi-row insert are not consecutive with
+        innodb_autoinc_lock_mode = 2 or auto_increment_increment > 1: the rows are read
+        back from the ID of the first one by a marker unique to the batch
+    """
+    batch = uuid.uuid4().hex
+    markers = [ 'insertNewJobsIntoDB:%s:%d' % ( batch, i ) for i in range( len( jdlList ) ) ]
+    ret = self._escapeValues( markers )
+    if not ret['OK']:
+      return ret
+    e_markers = ret['Value']
+
+    values = []
+    for e_marker, jdl in zip( e_markers, jdlList ):
+      # Fix the possible lack of the brackets in the JDL
+      if jdl.strip()[0].find( '[' ) != 0 :
+        jdl = '[' + jdl + ']'
+      ret = self._escapeString( jdl )
+      if not ret['OK']:
+        return ret
+      values.append( '(%s, %s)' % ( e_marker, ret['Value'] ) )
+    cmd = 'INSERT INTO JobJDLs (JDL,OriginalJDL) VALUES %s' % ', '.join( values )
+    result = self._update( cmd )
+    if not result['OK']:
+      self.log.error( 'Can not insert New JDLs', result['Message'] )
+      return S_ERROR( 'Can not insert JDL in to DB' )
+    if not 'lastRowId' in result:
+      return S_ERROR( 'JobDB.insertNewJobsIntoDB: Failed to retrieve new Ids.' )
+
+    cmd = 'SELECT JobID, JDL FROM JobJDLs WHERE JobID>=%d AND JDL IN (%s)' % ( int( result['lastRowId'] ),
+                                                                            ','.join( e_markers ) )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    markerIDs = dict( [ ( str( marker ), int( jobID ) ) for jobID, marker in result['Value'] ] )
+    if len( markerIDs ) != len( markers ):
+      return S_ERROR( 'JobDB.insertNewJobsIntoDB: Failed to retrieve new Ids.' )
+    return S_OK( ( [ markerIDs[marker] for marker in markers ], e_markers ) )
+
   def __checkAndPrepareJob( self, jobID, classAdJob, classAdReq, owner, ownerDN,
                             ownerGroup, diracSetup, jobAttrNames, jobAttrValues ):
     """
       Check Consistency of Submitted JDL and set some defaults
       Prepare subJDL with Job Requirements
     """
+    result = self.__prepareJobClassAd( classAdJob, classAdReq, owner, ownerDN, ownerGroup, diracSetup )
+    if result['OK']:
+      return result
+    error = result['Message']
+
+    retVal = S_ERROR( error )
+    retVal['JobId'] = jobID
+    retVal['Status'] = 'Failed'
+    retVal['MinorStatus'] = error
+
+    jobAttrNames.append( 'Status' )
+    jobAttrValues.append( 'Failed' )
+
+    jobAttrNames.append( 'MinorStatus' )
+    jobAttrValues.append( error )
+    resultInsert = self.setJobAttributes( jobID, jobAttrNames, jobAttrValues )
+    if not resultInsert['OK']:
+      retVal['MinorStatus'] += '; %s' % resultInsert['Message']
+
+    return retVal
+
+  def __prepareJobClassAd( self, classAdJob, classAdReq, owner, ownerDN, ownerGroup, diracSetup ):
+    """
+      Check Consistency of Submitted JDL and set some defaults in the job ClassAd
+      Fill the Job Requirements ClassAd. Nothing is written to the DB here.
+    """
     error = ''
     vo = getVOForGroup( ownerGroup )
 
@@ -1365,22 +1892,7 @@ class JobDB( DB ):
         error = "OS compatibility info not found"
 
     if error:
-
-      retVal = S_ERROR( error )
-      retVal['JobId'] = jobID
-      retVal['Status'] = 'Failed'
-      retVal['MinorStatus'] = error
-
-      jobAttrNames.append( 'Status' )
-      jobAttrValues.append( 'Failed' )
-
-      jobAttrNames.append( 'MinorStatus' )
-      jobAttrValues.append( error )
-      resultInsert = self.setJobAttributes( jobID, jobAttrNames, jobAttrValues )
-      if not resultInsert['OK']:
-        retVal['MinorStatus'] += '; %s' % resultInsert['Message']
-
-      return retVal
+      return S_ERROR( error )
 
     return S_OK()
 
@@ -1430,7 +1942,10 @@ class JobDB( DB ):
                    ):
 
       cmd = 'DELETE FROM %s WHERE JobID in (%s)' % ( table, jobIDString )
-      result = self._update( cmd )
+      if table == 'Jobs':
+        result = self.__inTransaction( self.__deleteJobs, jobIDList, cmd )
+      else:
+        result = self._update( cmd )
       if not result['OK']:
         failedTablesList.append( table )
 
@@ -1626,6 +2141,196 @@ class JobDB( DB ):
 
     return retVal
 
+#############################################################################
+  def __getJobsSummaryRows( self, jobIDList, lock = False ):
+    """ Get the JobsSummary key and the RescheduleCounter of the given jobs
+        as a { jobID : ( keyTuple, rescheduleCounter ) } dictionary. With lock, the rows
+        are locked until the end of the transaction
+    """
+    if not jobIDList:
+      return S_OK( {} )
+    cmd = 'SELECT JobID, %s, RescheduleCounter FROM Jobs WHERE JobID IN (%s)' % \
+          ( ', '.join( JOB_SUMMARY_FIELDS ), ','.join( [ str( int( jobID ) ) for jobID in jobIDList ] ) )
+    if lock:
+      cmd += ' FOR UPDATE'
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+    rowDict = {}
+    for row in result['Value']:
+      rowDict[int( row[0] )] = ( tuple( [ str( v ) for v in row[1:-1] ] ), int( row[-1] ) )
+    return S_OK( rowDict )
+
+  def __updateJobsSummary( self, deltaDict ):
+    """ Apply the { keyTuple : [ jobsDelta, reschedulesDelta ] } deltas to the JobsSummary
+        counters with a single statement. The rows are keyed by a hash of the key fields.
+    """
+    values = []
+    for key, ( jobs, reschedules ) in deltaDict.items():
+      if not jobs and not reschedules:
+        continue
+      ret = self._escapeValues( list( key ) )
+      if not ret['OK']:
+        return ret
+      keyString = ', '.join( ret['Value'] )
+      values.append( "(MD5(CONCAT_WS('|', %s)), %s, %d, %d)" % ( keyString, keyString, jobs, reschedules ) )
+    if not values:
+      return S_OK()
+
+    cmd = 'INSERT INTO JobsSummary (SummaryKey, %s, JobCount, RescheduleSum) VALUES %s ' % \
+          ( ', '.join( JOB_SUMMARY_FIELDS ), ', '.join( values ) )
+    cmd += 'ON DUPLICATE KEY UPDATE JobCount=JobCount+VALUES(JobCount), '
+    cmd += 'RescheduleSum=RescheduleSum+VALUES(RescheduleSum)'
+    result = self._update( cmd )
+    if not result['OK']:
+      self.log.warn( 'Failed to update the JobsSummary', result['Message'] )
+    return result
+
+  def __addJobsToSummary( self, jobIDList, sign = 1 ):
+    """ Count the given jobs in the JobsSummary table, or discount them if sign is -1
+    """
+    result = self.__getJobsSummaryRows( jobIDList )
+    if not result['OK']:
+      return result
+    return self.__applySummaryRows( result['Value'], sign )
+
+  def __applySummaryRows( self, rowDict, sign = 1 ):
+    """ Add ( sign = 1 ) or subtract ( sign = -1 ) the rows returned by __getJobsSummaryRows()
+    """
+    deltaDict = {}
+    for key, rescheduleCounter in rowDict.values():
+      delta = deltaDict.setdefault( key, [0, 0] )
+      delta[0] += sign
+      delta[1] += sign * rescheduleCounter
+    return self.__updateJobsSummary( deltaDict )
+
+  def __insertJob( self, jobID, jobAttrNames, jobAttrValues ):
+    """ Insert the Jobs row of a new job and count it in the JobsSummary, the transaction being started
+    """
+    result = self.insertFields( 'Jobs', jobAttrNames, jobAttrValues )
+    if not result['OK']:
+      return result
+    return self.__addJobsToSummary( [ jobID ] )
+
+  def __deleteJobs( self, jobIDList, cmd ):
+    """ Execute the cmd deleting the Jobs rows of jobIDList and discount them from the JobsSummary,
+        the transaction being started
+    """
+    result = self.__getJobsSummaryRows( jobIDList, lock = True )
+    if not result['OK']:
+      return result
+    rowDict = result['Value']
+    res = self._update( cmd )
+    if not res['OK']:
+      return res
+    result = self.__applySummaryRows( rowDict, sign = -1 )
+    if not result['OK']:
+      return result
+    return res
+
+  def __updateJobs( self, jobID, cmd, attrDict ):
+    """ Execute the cmd updating the Jobs row of jobID to the values of attrDict.
+        If any of the JobsSummary fields is modified, the counters are moved from
+        the old to the new key in the same transaction, the row of the job being locked.
+    """
+    if not [ attr for attr in attrDict if attr in JOB_SUMMARY_FIELDS or attr == 'RescheduleCounter' ]:
+      return self._update( cmd )
+    return self.__inTransaction( self.__updateJobAndSummary, int( jobID ), cmd, attrDict )
+
+  def __updateJobAndSummary( self, jobID, cmd, attrDict ):
+    """ Statements of __updateJobs(), the transaction being started
+    """
+    result = self.__getJobsSummaryRows( [ jobID ], lock = True )
+    if not result['OK']:
+      return result
+    rowDict = result['Value']
+
+    res = self._update( cmd )
+    # The number of changed rows is 0 if the job does not exist, if it did not match the cmd
+    # condition or if nothing changed
+    if not res['OK'] or not res['Value'] or jobID not in rowDict:
+      return res
+
+    oldKey, oldCounter = rowDict[jobID]
+    newKey = tuple( [ str( attrDict.get( field, value ) ) for field, value in zip( JOB_SUMMARY_FIELDS, oldKey ) ] )
+    newCounter = int( attrDict.get( 'RescheduleCounter', oldCounter ) )
+    if newKey != oldKey or newCounter != oldCounter:
+      deltaDict = { oldKey : [ -1, -oldCounter ] }
+      delta = deltaDict.setdefault( newKey, [ 0, 0 ] )
+      delta[0] += 1
+      delta[1] += newCounter
+      result = self.__updateJobsSummary( deltaDict )
+      if not result['OK']:
+        return result
+    return res
+
+  def reconcileJobsSummary( self ):
+    """ Correct any drift of the JobsSummary counters from the Jobs table. To be called
+        periodically, by a single agent.
+
+        Both tables are read in one consistent, non-locking snapshot. Each change of the Jobs
+        table being committed with its delta, the difference of the two is the drift at the
+        time of the snapshot: it is applied as a delta, together with the ones of the changes
+        made since then.
+    """
+    fields = ', '.join( JOB_SUMMARY_FIELDS )
+    result = self.transactionStart()
+    if not result['OK']:
+      return result
+    jobs = self._query( 'SELECT %s, COUNT(JobID), SUM(RescheduleCounter) FROM Jobs GROUP BY %s' % ( fields, fields ) )
+    summary = self._query( 'SELECT %s, JobCount, RescheduleSum FROM JobsSummary' % fields )
+    self.transactionCommit()
+    for result in ( jobs, summary ):
+      if not result['OK']:
+        self.log.error( 'Failed to reconcile the JobsSummary table', result['Message'] )
+        return result
+
+    deltaDict = {}
+    for rows, sign in ( ( jobs['Value'], 1 ), ( summary['Value'], -1 ) ):
+      for row in rows:
+        delta = deltaDict.setdefault( tuple( [ str( v ) for v in row[:-2] ] ), [ 0, 0 ] )
+        delta[0] += sign * int( row[-2] )
+        delta[1] += sign * int( row[-1] or 0 )
+    drift = [ key for key, delta in deltaDict.items() if delta != [ 0, 0 ] ]
+    result = self.__updateJobsSummary( deltaDict )
+    if not result['OK']:
+      self.log.error( 'Failed to reconcile the JobsSummary table', result['Message'] )
+      return result
+    result = self._update( 'DELETE FROM JobsSummary WHERE JobCount=0 AND RescheduleSum=0' )
+    if not result['OK']:
+      return result
+    self.log.info( 'JobsSummary reconciled: %d counters corrected' % len( drift ) )
+    return S_OK( len( drift ) )
+
+  def getSummaryCounters( self, attrList, condDict = None ):
+    """ Same as getCounters( 'Jobs', attrList, condDict ) but answered from the JobsSummary
+        table. Falls back to the Jobs table if attrList or condDict use other attributes.
+    """
+    if not condDict:
+      condDict = {}
+    for attr in list( attrList ) + condDict.keys():
+      if attr not in JOB_SUMMARY_FIELDS:
+        return self.getCounters( 'Jobs', attrList, condDict )
+
+    attrNames = ', '.join( attrList )
+    try:
+      cond = self.buildCondition( condDict = condDict )
+    except Exception, x:
+      return S_ERROR( x )
+    cmd = 'SELECT %s, SUM(JobCount) FROM JobsSummary %s GROUP BY %s HAVING SUM(JobCount) > 0 ORDER BY %s' % \
+          ( attrNames, cond, attrNames, attrNames )
+    result = self._query( cmd )
+    if not result['OK']:
+      return result
+
+    resultList = []
+    for row in result['Value']:
+      attrDict = {}
+      for i in range( len( attrList ) ):
+        attrDict[attrList[i]] = row[i]
+      resultList.append( ( attrDict, int( row[-1] ) ) )
+    return S_OK( resultList )
+
 #############################################################################
   def getSiteMask( self, siteState = 'Active' ):
     """ Get the currently active site list
@@ -1896,12 +2601,15 @@ class JobDB( DB ):
       last_update = selectDict['LastUpdateTime']
       del selectDict['LastUpdateTime']
 
-    result = self.getCounters( 'Jobs', ['Site', 'Status'],
-                              {}, newer = last_update,
-                              timeStamp = 'LastUpdateTime' )
+    if last_update:
+      result = self.getCounters( 'Jobs', ['Site', 'Status'],
+                                {}, newer = last_update,
+                                timeStamp = 'LastUpdateTime' )
+    else:
+      result = self.getSummaryCounters( ['Site', 'Status'] )
     last_day = Time.dateTime() - Time.day
     resultDay = self.getCounters( 'Jobs', ['Site', 'Status'],
-                                 {}, newer = last_day,
+                                 { 'Status' : JOB_FINAL_STATES }, newer = last_day,
                                  timeStamp = 'EndExecTime' )
 
     # Get the site mask status
@@ -2056,12 +2764,18 @@ class JobDB( DB ):
       else:
         return S_ERROR( 'Unknown user %s' % username )
 
-    result = self.getCounters( 'Jobs', ['OwnerDN', 'OwnerGroup', 'Status'],
-                              selectDict, newer = last_update,
-                              timeStamp = 'LastUpdateTime' )
+    if last_update:
+      result = self.getCounters( 'Jobs', ['OwnerDN', 'OwnerGroup', 'Status'],
+                                selectDict, newer = last_update,
+                                timeStamp = 'LastUpdateTime' )
+    else:
+      result = self.getSummaryCounters( ['OwnerDN', 'OwnerGroup', 'Status'], selectDict )
     last_day = Time.dateTime() - Time.day
+    daySelectDict = dict( selectDict )
+    if not 'Status' in daySelectDict:
+      daySelectDict['Status'] = JOB_FINAL_STATES
     resultDay = self.getCounters( 'Jobs', ['OwnerDN', 'OwnerGroup', 'Status'],
-                                 selectDict, newer = last_day,
+                                 daySelectDict, newer = last_day,
                                  timeStamp = 'EndExecTime' )
 
     # Sort out different counters
@@ -2141,7 +2855,7 @@ class JobDB( DB ):
     e_jobID = ret['Value']
 
     req = "UPDATE Jobs SET HeartBeatTime=UTC_TIMESTAMP(), Status='Running' WHERE JobID=%s" % e_jobID
-    result = self._update( req )
+    result = self.__updateJobs( jobID, req, { 'Status' : 'Running' } )
     if not result['OK']:
       return S_ERROR( 'Failed to set the heart beat time: ' + result['Message'] )
 
@@ -2298,7 +3012,11 @@ class JobDB( DB ):
     valueFields = [ 'COUNT(JobID)', 'SUM(RescheduleCounter)' ]
     defString = ", ".join( defFields )
     valueString = ", ".join( valueFields )
-    sqlCmd = "SELECT %s, %s From Jobs GROUP BY %s" % ( defString, valueString, defString )
+    if [ field for field in defFields if field not in JOB_SUMMARY_FIELDS ]:
+      sqlCmd = "SELECT %s, %s From Jobs GROUP BY %s" % ( defString, valueString, defString )
+    else:
+      sqlCmd = "SELECT %s, SUM(JobCount), SUM(RescheduleSum) From JobsSummary GROUP BY %s HAVING SUM(JobCount) > 0" % \
+               ( defString, defString )
     result = self._query( sqlCmd )
     if not result[ 'OK' ]:
       return result
@@ -80,6 +80,29 @@ CREATE TABLE Jobs (
     PRIMARY KEY (JobID)
 ) ENGINE = InnoDB;
 
+-- ------------------------------------------------------------------------------
+-- Job counters per combination of the key fields, kept up to date by JobDB on every
+-- job insertion, removal and attribute change and rebuilt periodically from Jobs.
+-- SummaryKey is the MD5 of the key fields joined with '|'
+DROP TABLE IF EXISTS JobsSummary;
+CREATE TABLE JobsSummary (
+    SummaryKey CHAR(32) NOT NULL,
+    DIRACSetup VARCHAR(32) NOT NULL,
+    Status VARCHAR(32) NOT NULL DEFAULT 'Received',
+    INDEX (Status),
+    MinorStatus VARCHAR(128) NOT NULL DEFAULT 'Initial insertion',
+    Site VARCHAR(100) NOT NULL DEFAULT 'ANY',
+    INDEX (Site),
+    Owner VARCHAR(32) NOT NULL DEFAULT 'Unknown',
+    OwnerDN VARCHAR(255) NOT NULL DEFAULT 'Unknown',
+    OwnerGroup varchar(128) NOT NULL DEFAULT 'lhcb_user',
+    JobGroup VARCHAR(32) NOT NULL DEFAULT 'NoGroup',
+    JobSplitType ENUM ('Single','Master','Subjob','DAGNode') NOT NULL DEFAULT 'Single',
+    JobCount INTEGER NOT NULL DEFAULT 0,
+    RescheduleSum INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (SummaryKey)
+) ENGINE = InnoDB;
+
 -- ------------------------------------------------------------------------------
 DROP TABLE IF EXISTS JobJDLs;
 CREATE TABLE JobJDLs (
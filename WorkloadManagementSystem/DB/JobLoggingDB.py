@@ -2,6 +2,8 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
+    addLoggingRecordList()
     getJobLoggingInfo()
     getWMSTimeStamps()
 """
@@ -48,6 +50,17 @@ class JobLoggingDB( DB ):
     event = 'status/minor/app=%s/%s/%s' % ( status, minor, application )
     self.gLogger.info( "Adding record for job " + str( jobID ) + ": '" + event + "' from " + source )
 
+    _date, time_order = self.__getTimeOrder( date )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
+           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
+
+    return self._update( cmd )
+
+  def __getTimeOrder( self, date ):
+    """ Time stamp of a logging record and its order, date being as given to addLoggingRecord()
+    """
     if not date:
       # Make the UTC datetime string and float
       _date = Time.dateTime()
@@ -74,11 +87,63 @@ class JobLoggingDB( DB ):
         _date = Time.dateTime()
         epoc = time.mktime( _date.timetuple() ) - MAGIC_EPOC_NUMBER
         time_order = round( epoc, 3 )
+    return _date, time_order
+
+#############################################################################
+  def addLoggingRecordList( self, recordList ):
+    """ Add several entries to the JobLoggingDB table with a single multi-row insert.
+        recordList is a list of ( jobID, recordDict ) tuples, recordDict having the
+        status, minor, application, date and source keyword arguments of addLoggingRecord()
+    """
+    if not recordList:
+      return S_OK()
+
+    values = []
+    for jobID, record in recordList:
+      status = record.get( 'status', 'idem' )
+      minor = record.get( 'minor', 'idem' )
+      application = record.get( 'application', 'idem' )
+      source = record.get( 'source', 'Unknown' )
+      self.gLogger.verbose( "Adding record for job %s: 'status/minor/app=%s/%s/%s' from %s" % ( jobID, status, minor,
+                                                                                                 application, source ) )
+      _date, time_order = self.__getTimeOrder( record.get( 'date', '' ) )
+      result = self._escapeValues( [ status, minor, application, str( _date ) ] )
+      if not result['OK']:
+        return result
+      escaped = result['Value']
+      result = self._escapeString( source )
+      if not result['OK']:
+        return result
+      values.append( "(%d,%s,%f,%s)" % ( int( jobID ), ','.join( escaped ), time_order, result['Value'] ) )
 
     cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
-          "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')" % \
-           ( int( jobID ), status, minor, application, str( _date ), time_order, source )
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ', '.join( values )
+    return self._update( cmd )
 
+#############################################################################
+  def addLoggingRecords( self, jobIDList, statusDict, source = 'Unknown' ):
+    """ Add the initial logging records for a bunch of jobs with a single multi-row
+        insert. statusDict is a { jobID : { 'Status' : status, 'MinorStatus' : minor } }
+        dictionary, the records get the current UTC time stamp.
+    """
+    if not jobIDList:
+      return S_OK()
+
+    _date = Time.dateTime()
+    epoc = time.mktime( _date.timetuple() ) + _date.microsecond / 1000000. - MAGIC_EPOC_NUMBER
+    time_order = round( epoc, 3 )
+
+    values = []
+    for jobID in jobIDList:
+      status = statusDict[jobID]['Status']
+      minor = statusDict[jobID]['MinorStatus']
+      self.gLogger.verbose( "Adding record for job %s: 'status/minor/app=%s/%s/idem' from %s" % ( jobID, status,
+                                                                                                   minor, source ) )
+      values.append( "(%d,'%s','%s','idem','%s',%f,'%s')" % ( int( jobID ), status, minor, str( _date ),
+                                                               time_order, source ) )
+
+    cmd = "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, " + \
+          "StatusTime, StatusTimeOrder, StatusSource) VALUES %s" % ', '.join( values )
     return self._update( cmd )
 
 #############################################################################
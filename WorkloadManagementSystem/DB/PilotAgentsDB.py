@@ -9,6 +9,7 @@
     Available methods are:
 
     addPilotTQReference()
+    getPilotRequirements()
     setPilotStatus()
     deletePilot()
     clearPilots()
@@ -25,17 +26,23 @@
 
 __RCSID__ = "$Id$"
 
-from DIRAC  import gLogger, S_OK, S_ERROR
+from DIRAC  import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.Core.Base.DB import DB
 from DIRAC.Core.Utilities.SiteCEMapping import getSiteForCE, getCESiteMapping
+from DIRAC.Core.Utilities.DictCache import DictCache
 import DIRAC.Core.Utilities.Time as Time
 from DIRAC.Core.DISET.RPCClient import RPCClient
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getUsernameForDN, getDNForUsername
 from types import *
 import threading, time
+from hashlib import md5
 
 DEBUG = 1
 
+# Seconds a stored requirements document is known to be there without checking the DB, unused
+# documents are kept twice as long after their last storage
+REQUIREMENTS_CACHE_TIME = 3600
+
 #############################################################################
 class PilotAgentsDB( DB ):
 
@@ -43,45 +50,118 @@ class PilotAgentsDB( DB ):
 
     DB.__init__( self, 'PilotAgentsDB', 'WorkloadManagement/PilotAgentsDB', maxQueueSize )
     self.lock = threading.Lock()
+    self.__storedRequirements = DictCache()
+    self.__summaryCacheTime = gConfig.getValue( self.cs_path + '/PilotSummaryCacheTime', 60 )
+    self.__summarySnapshots = {}
+    self.__summaryRefreshing = set()
+    self.__summaryLock = threading.Lock()
+    result = self.__initializeDB()
+    if not result[ 'OK' ]:
+      raise Exception( "Can't create tables: %s" % result[ 'Message' ] )
+
+##########################################################################################
+  def __initializeDB( self ):
+    """ Create the tables of the pilot requirements documents if they are not there yet:
+        databases created before them keep their PilotRequirements table, still read by
+        getPilotRequirements()
+    """
+    result = self._query( "SHOW TABLES" )
+    if not result['OK']:
+      return result
+    tablesInDB = [ t[0] for t in result['Value'] ]
+
+    tablesDesc = {}
+    tablesDesc['PilotRequirementsDocs'] = { 'Fields' : { 'RequirementsHash' : 'CHAR(32) NOT NULL',
+                                                         'Requirements' : 'BLOB',
+                                                         'LastUpdateTime' : 'DATETIME NOT NULL' },
+                                            'PrimaryKey' : 'RequirementsHash' }
+    tablesDesc['PilotRequirementsRefs'] = { 'Fields' : { 'PilotID' : 'INTEGER NOT NULL',
+                                                         'RequirementsHash' : 'CHAR(32) NOT NULL' },
+                                            'PrimaryKey' : 'PilotID',
+                                            'Indexes' : { 'RequirementsHash' : [ 'RequirementsHash' ] } }
+
+    tablesToCreate = {}
+    for tableName in tablesDesc:
+      if not tableName in tablesInDB:
+        tablesToCreate[tableName] = tablesDesc[tableName]
+    return self._createTables( tablesToCreate )
 
 ##########################################################################################
   def addPilotTQReference( self, pilotRef, taskQueueID, ownerDN, ownerGroup, broker = 'Unknown',
                         gridType = 'DIRAC', requirements = 'Unknown', pilotStampDict = {} ):
-    """ Add a new pilot job reference """
+    """ Add new pilot job references, the whole list with multi-row statements. The requirements
+        document is stored once, keyed by its MD5 checksum, and referenced by each pilot
+    """
+
+    if not pilotRef:
+      return S_OK()
 
     err = 'PilotAgentsDB.addPilotTQReference: Failed to retrieve a new Id.'
 
-    result = self._escapeString( requirements )
+    result = self.__storeRequirements( requirements )
     if not result['OK']:
-      gLogger.warn( 'Failed to escape requirements string' )
-      e_requirements = "Failed to escape requirements string"
-    e_requirements = result['Value']
+      return result
+    requirementsHash = result['Value']
 
-    for ref in pilotRef:
-      stamp = ''
-      if ref in pilotStampDict:
-        stamp = pilotStampDict[ref]
+    result = self._escapeValues( [ ownerDN, ownerGroup, broker, gridType, pilotRef ] )
+    if not result['OK']:
+      return result
+    e_ownerDN, e_ownerGroup, e_broker, e_gridType, e_refString = result['Value']
+    result = self._escapeValues( pilotRef )
+    if not result['OK']:
+      return result
+    e_refList = result['Value']
+    result = self._escapeValues( [ pilotStampDict.get( ref, '' ) for ref in pilotRef ] )
+    if not result['OK']:
+      return result
+    e_stampList = result['Value']
+
+    rows = [ "(%s,%d,%s,%s,%s,%s,UTC_TIMESTAMP(),UTC_TIMESTAMP(),'Submitted',%s)" % \
+             ( e_ref, int( taskQueueID ), e_ownerDN, e_ownerGroup, e_broker, e_gridType, e_stamp )
+             for e_ref, e_stamp in zip( e_refList, e_stampList ) ]
+    req = "INSERT INTO PilotAgents( PilotJobReference, TaskQueueID, OwnerDN, " + \
+          "OwnerGroup, Broker, GridType, SubmissionTime, LastUpdateTime, Status, PilotStamp ) " + \
+          "VALUES %s" % ','.join( rows )
+    result = self._update( req )
+    if not result['OK']:
+      return result
 
-      req = "INSERT INTO PilotAgents( PilotJobReference, TaskQueueID, OwnerDN, " + \
-            "OwnerGroup, Broker, GridType, SubmissionTime, LastUpdateTime, Status, PilotStamp ) " + \
-            "VALUES ('%s',%d,'%s','%s','%s','%s',UTC_TIMESTAMP(),UTC_TIMESTAMP(),'Submitted','%s')" % \
-            ( ref, int( taskQueueID ), ownerDN, ownerGroup, broker, gridType, stamp )
+    if not 'lastRowId' in result:
+      return S_ERROR( '%s' % err )
 
-      result = self._update( req )
-      if not result['OK']:
-        return result
+    # The ID of the first row of a multi-row INSERT is returned, the pilots of the batch
+    # are those with the references of the batch from this ID on
+    firstPilotID = int( result['lastRowId'] )
+    req = "INSERT IGNORE INTO PilotRequirementsRefs (PilotID,RequirementsHash) " + \
+          "SELECT PilotID,'%s' FROM PilotAgents WHERE PilotID>=%d AND PilotJobReference IN %s" % \
+          ( requirementsHash, firstPilotID, e_refString )
+    result = self._update( req )
+    if not result['OK']:
+      return result
 
-      if not 'lastRowId' in result:
-        return S_ERROR( '%s' % err )
+    return S_OK()
 
-      pilotID = int( result['lastRowId'] )
+  def __storeRequirements( self, requirements ):
+    """ Store a pilot requirements document if it is not there yet and return its key
+    """
 
-      req = "INSERT INTO PilotRequirements (PilotID,Requirements) VALUES (%d,'%s')" % ( pilotID, e_requirements )
-      res = self._update( req )
-      if not res['OK']:
-        return res
+    requirementsHash = md5( str( requirements ) ).hexdigest()
+    if self.__storedRequirements.get( requirementsHash ):
+      return S_OK( requirementsHash )
+    result = self._escapeString( requirements )
+    if not result['OK']:
+      return S_ERROR( 'Failed to escape requirements string' )
+    e_requirements = result['Value']
 
-    return S_OK()
+    # A document already there gets its storage time refreshed, see clearPilots()
+    req = "INSERT INTO PilotRequirementsDocs (RequirementsHash,Requirements,LastUpdateTime) " + \
+          "VALUES ('%s',%s,UTC_TIMESTAMP()) ON DUPLICATE KEY UPDATE LastUpdateTime=UTC_TIMESTAMP()" % \
+          ( requirementsHash, e_requirements )
+    result = self._update( req )
+    if not result['OK']:
+      return result
+    self.__storedRequirements.add( requirementsHash, REQUIREMENTS_CACHE_TIME, True )
+    return S_OK( requirementsHash )
 
 ##########################################################################################
   def setPilotStatus( self, pilotRef, status, destination = None,
@@ -203,7 +283,8 @@ class PilotAgentsDB( DB ):
       return S_ERROR( 'Input argument is not a List' )
 
     failed = False
-    for table in ['PilotAgents', 'PilotOutput', 'PilotRequirements', 'JobToPilotMapping']:
+    for table in ['PilotAgents', 'PilotOutput', 'PilotRequirements', 'PilotRequirementsRefs',
+                  'JobToPilotMapping']:
       idString = ','.join( [ str( id ) for id in pilotIDs ] )
       req = "DELETE FROM %s WHERE PilotID in ( %s )" % ( table, idString )
       result = self._update( req, conn = conn )
@@ -244,6 +325,14 @@ class PilotAgentsDB( DB ):
         if not result['OK']:
           gLogger.warn( 'Error while deleting pilots' )
 
+    # Unused documents stored recently may be about to be referenced by a process having them cached
+    req = "DELETE FROM PilotRequirementsDocs WHERE " + \
+          "LastUpdateTime < DATE_SUB(UTC_TIMESTAMP(),INTERVAL %d SECOND) AND " % ( 2 * REQUIREMENTS_CACHE_TIME ) + \
+          "RequirementsHash NOT IN ( SELECT RequirementsHash FROM PilotRequirementsRefs )"
+    result = self._update( req )
+    if not result['OK']:
+      gLogger.warn( 'Error while deleting unused pilot requirements' )
+
     return S_OK()
 
 ##########################################################################################
@@ -357,14 +446,49 @@ class PilotAgentsDB( DB ):
     if not pilotID:
       return S_ERROR( 'Pilot reference not found %s' % pilotRef )
 
-    result = self._escapeString( requirements )
+    result = self.__storeRequirements( requirements )
     if not result['OK']:
-      return S_ERROR( 'Failed to escape requirements string' )
-    e_requirements = result['Value']
-    req = "UPDATE PilotRequirements SET Requirements='%s' WHERE PilotID=%d" % ( e_requirements, pilotID )
+      return result
+    req = "REPLACE INTO PilotRequirementsRefs (PilotID,RequirementsHash) VALUES (%d,'%s')" % \
+          ( pilotID, result['Value'] )
     result = self._update( req )
     return result
 
+##########################################################################################
+  def getPilotRequirements( self, pilotRef ):
+    """ Get the grid requirements of the pilot with reference pilotRef or of a list of references
+        as a dictionary keyed by reference. Pilots registered before the requirements documents
+        were shared have theirs in the PilotRequirements table
+    """
+
+    if type( pilotRef ) != ListType:
+      pilotRef = [ pilotRef ]
+    if not pilotRef:
+      return S_OK( {} )
+    result = self._escapeValues( [ pilotRef ] )
+    if not result['OK']:
+      return result
+    e_refString = result['Value'][0]
+
+    reqDict = {}
+    for req in ( "SELECT PilotAgents.PilotJobReference, PilotRequirementsDocs.Requirements " + \
+                 "FROM PilotAgents, PilotRequirementsRefs, PilotRequirementsDocs " + \
+                 "WHERE PilotAgents.PilotID=PilotRequirementsRefs.PilotID AND " + \
+                 "PilotRequirementsRefs.RequirementsHash=PilotRequirementsDocs.RequirementsHash AND " + \
+                 "PilotAgents.PilotJobReference IN %s" % e_refString,
+                 "SELECT PilotAgents.PilotJobReference, PilotRequirements.Requirements " + \
+                 "FROM PilotAgents, PilotRequirements WHERE PilotAgents.PilotID=PilotRequirements.PilotID AND " + \
+                 "PilotAgents.PilotJobReference IN %s" % e_refString ):
+      if len( reqDict ) == len( set( pilotRef ) ):
+        break
+      result = self._query( req )
+      if not result['OK']:
+        return result
+      for ref, requirements in result['Value']:
+        reqDict.setdefault( ref, requirements )
+
+    return S_OK( reqDict )
+
 ##########################################################################################
   def storePilotOutput( self, pilotRef, output, error ):
     """ Store standard output and error for a pilot with pilotRef
@@ -647,6 +771,113 @@ class PilotAgentsDB( DB ):
 
     return S_OK( summary_dict )
 
+##########################################################################################
+  def __getSummaryCounters( self, selectDict, lastUpdate, stateNames ):
+    """ Pilot counters by site and CE of getPilotSummaryWeb() from a snapshot taken less than
+        PilotSummaryCacheTime seconds ago. Up to 10 times this age, the previous snapshot is
+        returned while a new one is taken in the background
+    """
+    key = ( str( sorted( selectDict.items() ) ), str( lastUpdate ) )
+    self.__summaryLock.acquire()
+    try:
+      snapshot = self.__summarySnapshots.get( key )
+      if snapshot:
+        age = time.time() - snapshot[0]
+        if age > 10 * self.__summaryCacheTime:
+          snapshot = None
+        elif age > self.__summaryCacheTime and not key in self.__summaryRefreshing:
+          self.__summaryRefreshing.add( key )
+          refresh = threading.Thread( target = self.__refreshSummaryCounters,
+                                      args = ( key, dict( selectDict ), lastUpdate, stateNames ) )
+          refresh.setDaemon( True )
+          refresh.start()
+    finally:
+      self.__summaryLock.release()
+
+    if snapshot:
+      return S_OK( snapshot[1] )
+    return self.__refreshSummaryCounters( key, selectDict, lastUpdate, stateNames )
+
+  def __refreshSummaryCounters( self, key, selectDict, lastUpdate, stateNames ):
+    """ Take a snapshot of the pilot counters and keep it for the next requests
+    """
+    result = S_ERROR( 'Pilot summary not evaluated' )
+    try:
+      result = self.__summaryCounters( selectDict, lastUpdate, stateNames )
+    finally:
+      self.__summaryLock.acquire()
+      try:
+        self.__summaryRefreshing.discard( key )
+        if result['OK']:
+          now = time.time()
+          for oldKey, snapshot in self.__summarySnapshots.items():
+            if now - snapshot[0] > 10 * self.__summaryCacheTime:
+              del self.__summarySnapshots[oldKey]
+          self.__summarySnapshots[key] = ( now, result['Value'] )
+      finally:
+        self.__summaryLock.release()
+    if not result['OK']:
+      gLogger.warn( 'Failed to evaluate the pilot summary', result['Message'] )
+    return result
+
+  def __summaryCounters( self, selectDict, lastUpdate, stateNames ):
+    """ Pilot counters by site and CE in one scan of PilotAgents: pilots updated since lastUpdate
+        by status, Done and Aborted pilots of the last day, which replace the former when there are,
+        Aborted pilots of the last hour and Done pilots of the last day which did not run a job
+    """
+    try:
+      condition = self.buildCondition( selectDict )
+    except Exception, x:
+      return S_ERROR( x )
+    result = self._escapeValues( [ lastUpdate, Time.dateTime() - Time.hour, Time.dateTime() - Time.day ] )
+    if not result['OK']:
+      return result
+    e_lastUpdate, e_hour, e_day = result['Value']
+    count = "COUNT(*)"
+    if lastUpdate:
+      count = "SUM( LastUpdateTime >= %s )" % e_lastUpdate
+
+    # Rows are grouped by status, the conditions on the status are applied to the groups
+    req = "SELECT GridSite, DestinationSite, Status, %s, " % count + \
+          "SUM( LastUpdateTime >= %s ), SUM( LastUpdateTime >= %s ), " % ( e_day, e_hour ) + \
+          "SUM( CurrentJobID = 0 AND LastUpdateTime >= %s ) " % e_day + \
+          "FROM PilotAgents %s GROUP BY GridSite, DestinationSite, Status" % condition
+    result = self._query( req )
+    if not result['OK']:
+      return result
+
+    ceMap = {}
+    resMap = getCESiteMapping()
+    if resMap['OK']:
+      ceMap = resMap['Value']
+
+    resultDict = {}
+    recentDict = {}
+    for site, ce, state, count, day, hour, dayEmpty in result['Value']:
+      if site == 'Unknown' and ce != "Unknown" and ce != "Multiple" and ceMap.has_key( ce ):
+        site = ceMap[ce]
+      if count:
+        ceDict = resultDict.setdefault( site, {} )
+        if not ceDict.has_key( ce ):
+          ceDict[ce] = dict.fromkeys( stateNames, 0 )
+        ceDict[ce][state] = ceDict[ce].get( state, 0 ) + int( count )
+      recentCounters = recentDict.setdefault( ( site, ce ), dict.fromkeys( [ 'Done', 'Aborted', 'Aborted_Hour',
+                                                                             'Done_Empty' ], 0 ) )
+      if state in ( 'Done', 'Aborted' ):
+        recentCounters[state] += int( day or 0 )
+      if state == 'Aborted':
+        recentCounters['Aborted_Hour'] += int( hour or 0 )
+      if state == 'Done':
+        recentCounters['Done_Empty'] += int( dayEmpty or 0 )
+
+    for ( site, ce ), recentCounters in recentDict.items():
+      if resultDict.has_key( site ) and resultDict[site].has_key( ce ):
+        for state, count in recentCounters.items():
+          if count:
+            resultDict[site][ce][state] = count
+
+    return S_OK( resultDict )
+
 ##########################################################################################
   def getPilotSummaryWeb( self, selectDict, sortList, startItem, maxItems ):
     """ Get summary of the pilot jobs status by CE/site in a standard structure
@@ -681,88 +912,10 @@ class PilotAgentsDB( DB ):
       site_select = [expand_site]
       del selectDict['ExpandSite']
 
-    start = time.time()
-    # Get all the data from the database with various selections
-    result = self.getCounters( 'PilotAgents',
-                              ['GridSite', 'DestinationSite', 'Status'],
-                              selectDict, newer = last_update, timeStamp = 'LastUpdateTime' )
+    result = self.__getSummaryCounters( selectDict, last_update, allStateNames )
     if not result['OK']:
       return result
-
-    last_update = Time.dateTime() - Time.hour
-    selectDict['Status'] = 'Aborted'
-    resultHour = self.getCounters( 'PilotAgents',
-                                 ['GridSite', 'DestinationSite', 'Status'],
-                                 selectDict, newer = last_update, timeStamp = 'LastUpdateTime' )
-    if not resultHour['OK']:
-      return resultHour
-
-    last_update = Time.dateTime() - Time.day
-    selectDict['Status'] = ['Aborted', 'Done']
-    resultDay = self.getCounters( 'PilotAgents',
-                                 ['GridSite', 'DestinationSite', 'Status'],
-                                 selectDict, newer = last_update, timeStamp = 'LastUpdateTime' )
-    if not resultDay['OK']:
-      return resultDay
-    selectDict['CurrentJobID'] = 0
-    selectDict['Status'] = 'Done'
-    resultDayEmpty = self.getCounters( 'PilotAgents',
-                                 ['GridSite', 'DestinationSite', 'Status'],
-                                 selectDict, newer = last_update, timeStamp = 'LastUpdateTime' )
-    if not resultDayEmpty['OK']:
-      return resultDayEmpty
-
-    ceMap = {}
-    resMap = getCESiteMapping()
-    if resMap['OK']:
-      ceMap = resMap['Value']
-
-    # Sort out different counters
-    resultDict = {}
-    resultDict['Unknown'] = {}
-    for attDict, count in result['Value']:
-      site = attDict['GridSite']
-      ce = attDict['DestinationSite']
-      state = attDict['Status']
-      if site == 'Unknown' and ce != "Unknown" and ce != "Multiple" and ceMap.has_key( ce ):
-        site = ceMap[ce]
-      if not resultDict.has_key( site ):
-        resultDict[site] = {}
-      if not resultDict[site].has_key( ce ):
-        resultDict[site][ce] = {}
-        for p in allStateNames:
-          resultDict[site][ce][p] = 0
-
-      resultDict[site][ce][state] = count
-
-    for attDict, count in resultDay['Value']:
-      site = attDict['GridSite']
-      ce = attDict['DestinationSite']
-      state = attDict['Status']
-      if site == 'Unknown' and ce != "Unknown" and ceMap.has_key( ce ):
-        site = ceMap[ce]
-      if state == "Done":
-        resultDict[site][ce]["Done"] = count
-      if state == "Aborted":
-        resultDict[site][ce]["Aborted"] = count
-
-    for attDict, count in resultDayEmpty['Value']:
-      site = attDict['GridSite']
-      ce = attDict['DestinationSite']
-      state = attDict['Status']
-      if site == 'Unknown' and ce != "Unknown" and ceMap.has_key( ce ):
-        site = ceMap[ce]
-      if state == "Done":
-        resultDict[site][ce]["Done_Empty"] = count
-
-    for attDict, count in resultHour['Value']:
-      site = attDict['GridSite']
-      ce = attDict['DestinationSite']
-      state = attDict['Status']
-      if site == 'Unknown' and ce != "Unknown" and ceMap.has_key( ce ):
-        site = ceMap[ce]
-      if state == "Aborted":
-        resultDict[site][ce]["Aborted_Hour"] = count
+    resultDict = result['Value']
 
     records = []
     siteSumDict = {}
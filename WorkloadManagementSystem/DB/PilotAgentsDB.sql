@@ -81,3 +81,21 @@ CREATE TABLE PilotRequirements (
     Requirements BLOB,
     PRIMARY KEY (PilotID)
 );
+
+-- Requirements documents, stored once and keyed by their MD5 checksum,
+-- PilotRequirements is only read for the pilots registered before them
+DROP TABLE IF EXISTS PilotRequirementsDocs;
+CREATE TABLE PilotRequirementsDocs (
+    RequirementsHash CHAR(32) NOT NULL,
+    Requirements BLOB,
+    LastUpdateTime DATETIME NOT NULL,
+    PRIMARY KEY (RequirementsHash)
+) ENGINE = InnoDB;
+
+DROP TABLE IF EXISTS PilotRequirementsRefs;
+CREATE TABLE PilotRequirementsRefs (
+    PilotID INTEGER NOT NULL,
+    RequirementsHash CHAR(32) NOT NULL,
+    PRIMARY KEY (PilotID),
+    INDEX (RequirementsHash)
+) ENGINE = InnoDB;
@@ -0,0 +1,47 @@
+""" Commit of the changes of optimised jobs: the former path (one call per kind of change),
+    one transaction per job and one transaction per batch of jobs, on the sqlite stand-ins of
+    TestJobStateCommit, each statement costing a fixed latency (a round trip to the DB server)
+
+    usage: python JobStateCommitBenchmark.py [nJobs] [batchSize,batchSize...] [latency]
+"""
+
+__RCSID__ = "$Id$"
+
+import sys
+import time
+
+from DIRAC.WorkloadManagementSystem.Client.JobState.CachedJobState import CachedJobState
+
+from TestJobStateCommit import LocalDBs, optimisedJob, formerCommit
+
+def commitJobs( nJobs, latency, commit, batchSize = 1 ):
+  """ seconds and statements to commit nJobs optimised jobs batchSize at a time """
+  with LocalDBs( nJobs, latency ) as dbs:
+    jobs = [ optimisedJob( jid ) for jid in range( 1, nJobs + 1 ) ]
+    dbs.resetStatements()
+    start = time.time()
+    for first in range( 0, nJobs, batchSize ):
+      commit( jobs[first:first + batchSize] )
+    elapsed = time.time() - start
+    assert len( dbs.tq.jobs ) == nJobs
+    return elapsed, dbs.statements
+
+def benchmark( nJobs = 200, batchSizes = ( 10, 100 ), latency = 0.0005 ):
+  """ print statements per job and jobs committed per second """
+  print "%d jobs, %.4fs per statement" % ( nJobs, latency )
+  print "%-22s %16s %10s %10s" % ( "commit", "statements/job", "jobs/s", "speedup" )
+  paths = [ ( "former", lambda jobs: [ formerCommit( cjs ) for cjs in jobs ], 1 ),
+            ( "transaction per job", lambda jobs: [ cjs.commitChanges() for cjs in jobs ], 1 ) ]
+  paths += [ ( "batches of %d" % batchSize, CachedJobState.commitStates, batchSize ) for batchSize in batchSizes ]
+  formerTime = None
+  for name, commit, batchSize in paths:
+    elapsed, statements = commitJobs( nJobs, latency, commit, batchSize )
+    if formerTime is None:
+      formerTime = elapsed
+    print "%-22s %16.1f %10.1f %9.1fx" % ( name, statements / float( nJobs ), nJobs / elapsed, formerTime / elapsed )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 200,
+             [ int( batchSize ) for batchSize in args[1].split( "," ) ] if len( args ) > 1 else ( 10, 100 ),
+             float( args[2] ) if len( args ) > 2 else 0.0005 )
@@ -0,0 +1,52 @@
+""" Registration of pilots in PilotAgentsDB: the former path (two INSERTs per pilot, the requirements
+    stored with each of them) and the multi-row addPilotTQReference, on the sqlite stand-in of
+    TestPilotAgentsDB, each statement costing a fixed latency (a round trip to the DB server)
+
+    usage: python PilotRegistrationBenchmark.py [nPilots] [batchSize,batchSize...] [latency]
+"""
+
+__RCSID__ = "$Id$"
+
+import sys
+import time
+
+from TestPilotAgentsDB import SQLitePilotAgentsDB, formerRegistration, pilotRefs, REQUIREMENTS
+
+def registerPilots( nPilots, latency, register, batchSize ):
+  """ seconds, statements and stored requirements bytes to register nPilots pilots
+      batchSize at a time, as the directors submit them
+  """
+  db = SQLitePilotAgentsDB( latency )
+  refs = pilotRefs( 0, nPilots )
+  start = time.time()
+  for first in range( 0, nPilots, batchSize ):
+    batch = refs[first:first + batchSize]
+    result = register( db, batch, 12, '/DC=org/CN=pilot', 'lhcb_pilot', 'Unknown', 'CREAM', REQUIREMENTS,
+                       dict( [ ( ref, ref[-8:] ) for ref in batch ] ) )
+    assert result['OK'], result
+  elapsed = time.time() - start
+  assert len( db.getPilotRequirements( refs )['Value'] ) == nPilots
+  stored = db.connection.execute( "SELECT COALESCE( SUM( LENGTH( Requirements ) ), 0 ) FROM PilotRequirements" )
+  storedDocs = db.connection.execute( "SELECT COALESCE( SUM( LENGTH( Requirements ) ), 0 ) FROM PilotRequirementsDocs" )
+  return elapsed, db.statements, stored.fetchone()[0] + storedDocs.fetchone()[0]
+
+def benchmark( nPilots = 1000, batchSizes = ( 1, 10, 100 ), latency = 0.0005 ):
+  """ print statements per pilot and pilots registered per second """
+  print "%d pilots, %.4fs per statement" % ( nPilots, latency )
+  print "%-10s %-10s %16s %16s %10s %9s" % ( "batch", "path", "statements/pilot", "requirements (B)",
+                                             "pilots/s", "speedup" )
+  for batchSize in batchSizes:
+    formerTime = None
+    for name, register in ( ( "former", formerRegistration ),
+                            ( "multi-row", SQLitePilotAgentsDB.addPilotTQReference ) ):
+      elapsed, statements, stored = registerPilots( nPilots, latency, register, batchSize )
+      if formerTime is None:
+        formerTime = elapsed
+      print "%-10d %-10s %16.2f %16d %10.1f %8.1fx" % ( batchSize, name, statements / float( nPilots ), stored,
+                                                        nPilots / elapsed, formerTime / elapsed )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 1000,
+             [ int( batchSize ) for batchSize in args[1].split( "," ) ] if len( args ) > 1 else ( 1, 10, 100 ),
+             float( args[2] ) if len( args ) > 2 else 0.0005 )
@@ -0,0 +1,56 @@
+""" Pilot monitoring summary of getPilotSummaryWeb on the sqlite stand-in of TestPilotAgentsDB
+    holding millions of pilots: the former four scans of PilotAgents, the single scan, and the
+    page load served from the snapshot, fresh or being refreshed in the background
+
+    usage: python PilotSummaryBenchmark.py [nPilots,nPilots...] [requests]
+"""
+
+__RCSID__ = "$Id$"
+
+import sys
+import time
+
+from DIRAC import S_OK
+import DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB as PilotAgentsDBModule
+
+from TestPilotAgentsDB import SQLitePilotAgentsDB, StubWMSAdministrator, addPilots, formerSummaryCounters, \
+                              ALL_STATES, CE_SITES
+
+def timed( function, *args ):
+  start = time.time()
+  result = function( *args )
+  assert result['OK'], result
+  return time.time() - start
+
+def pageLoads( db, nRequests ):
+  """ mean seconds of nRequests getPilotSummaryWeb requests """
+  start = time.time()
+  for _i in range( nRequests ):
+    assert db.getPilotSummaryWeb( {}, [], 0, 0 )['OK']
+  return ( time.time() - start ) / nRequests
+
+def benchmark( nPilotsList = ( 1000000, 3000000 ), nRequests = 100 ):
+  """ print the time of an evaluation of the counters and of a page load """
+  PilotAgentsDBModule.RPCClient = StubWMSAdministrator
+  PilotAgentsDBModule.getCESiteMapping = lambda: S_OK( CE_SITES )
+  print "%-10s %12s %12s %14s %16s" % ( "pilots", "4 scans", "1 scan", "cached page", "refreshing page" )
+  for nPilots in nPilotsList:
+    db = SQLitePilotAgentsDB()
+    addPilots( db, nPilots )
+    former = timed( formerSummaryCounters, db, {}, None, CE_SITES )
+    single = timed( db._PilotAgentsDB__summaryCounters, {}, None, ALL_STATES )
+    # First request takes the snapshot
+    assert db.getPilotSummaryWeb( {}, [], 0, 0 )['OK']
+    cached = pageLoads( db, nRequests )
+    snapshots = db._PilotAgentsDB__summarySnapshots
+    for key, ( taken, counters ) in snapshots.items():
+      snapshots[key] = ( taken - 61, counters )
+    refreshing = pageLoads( db, nRequests )
+    while db._PilotAgentsDB__summaryRefreshing:
+      time.sleep( 0.1 )
+    print "%-10d %11.3fs %11.3fs %13.5fs %15.5fs" % ( nPilots, former, single, cached, refreshing )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( [ int( nPilots ) for nPilots in args[0].split( "," ) ] if len( args ) > 0 else ( 1000000, 3000000 ),
+             int( args[1] ) if len( args ) > 1 else 100 )
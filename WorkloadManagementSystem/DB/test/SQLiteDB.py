@@ -0,0 +1,100 @@
+""" MySQL methods of the DB class on an in memory sqlite database, the stand-in of the MySQL
+    tables used by the DB test cases and benchmarks of this directory
+"""
+
+__RCSID__ = "$Id$"
+
+import datetime
+import hashlib
+import re
+import sqlite3
+import time
+
+from DIRAC import S_OK, S_ERROR, gLogger
+
+class SQLiteDB( object ):
+  """ MySQL methods of the DB class on an in memory sqlite database, counting the statements,
+      each costing latency seconds. Statements containing failOn fail.
+  """
+
+  mysqlIdioms = [ ( re.compile( r' FOR UPDATE$' ), '' ),
+                  ( re.compile( r'^REPLACE (?!INTO )' ), 'REPLACE INTO ' ),
+                  ( re.compile( r' ON DUPLICATE KEY UPDATE ' ), ' ON CONFLICT DO UPDATE SET ' ),
+                  ( re.compile( r'VALUES\((\w+)\)' ), r'excluded.\1' ),
+                  ( re.compile( r'^INSERT IGNORE ' ), 'INSERT OR IGNORE ' ),
+                  ( re.compile( r'DATE_SUB\(UTC_TIMESTAMP\(\),\s*INTERVAL (\d+) (\w+)\)' ), r"datetime('now','-\1 \2')" ) ]
+  insertTable = re.compile( r'^INSERT (?:IGNORE )?INTO (\w+)' )
+
+  def _initSQLite( self, schema, latency = 0. ):
+    self.log = gLogger.getSubLogger( self.__class__.__name__ )
+    self.latency = latency
+    self.statements = 0
+    self.failOn = None
+    # The connection may be used by the threads of the DB, as the MySQL connection pool
+    self.connection = sqlite3.connect( ':memory:', isolation_level = None, check_same_thread = False )
+    self.connection.text_factory = str
+    self.connection.create_function( 'UTC_TIMESTAMP', 0,
+                                     lambda: datetime.datetime.utcnow().strftime( '%Y-%m-%d %H:%M:%S' ) )
+    self.connection.create_function( 'MD5', 1, lambda value: hashlib.md5( value ).hexdigest() )
+    self.connection.create_function( 'CONCAT_WS', -1,
+                                     lambda sep, *values: sep.join( [ str( v ) for v in values if v is not None ] ) )
+    self.connection.executescript( schema )
+
+  def _execute( self, cmd ):
+    self.statements += 1
+    if self.latency:
+      time.sleep( self.latency )
+    if self.failOn and self.failOn in cmd:
+      raise sqlite3.OperationalError( 'Injected failure' )
+    if cmd.split( ' ', 1 )[0] in ( 'INSERT', 'REPLACE', 'SELECT', 'DELETE' ):
+      for idiom, sqliteIdiom in self.mysqlIdioms:
+        cmd = idiom.sub( sqliteIdiom, cmd )
+    return self.connection.execute( cmd )
+
+  def _query( self, cmd, conn = None, debug = False ):
+    try:
+      return S_OK( tuple( self._execute( cmd ).fetchall() ) )
+    except sqlite3.Error, x:
+      return S_ERROR( '%s: %s' % ( x, cmd ) )
+
+  def _update( self, cmd, conn = None, debug = False ):
+    table = self.insertTable.match( cmd )
+    if table:
+      table = table.group( 1 )
+      lastRowId = self.connection.execute( 'SELECT MAX(rowid) FROM %s' % table ).fetchone()[0] or 0
+    try:
+      cursor = self._execute( cmd )
+    except sqlite3.Error, x:
+      return S_ERROR( '%s: %s' % ( x, cmd ) )
+    result = S_OK( cursor.rowcount )
+    if table:
+      # MySQL returns the ID of the first row inserted by the statement, if any
+      firstRowId = self.connection.execute( 'SELECT MIN(rowid) FROM %s WHERE rowid > %d' % \
+                                            ( table, lastRowId ) ).fetchone()[0]
+      if firstRowId:
+        result['lastRowId'] = firstRowId
+    elif cursor.lastrowid:
+      result['lastRowId'] = cursor.lastrowid
+    return result
+
+  def _escapeString( self, value, conn = None ):
+    return S_OK( "'%s'" % str( value ).replace( "'", "''" ) )
+
+  def _MySQL__escapeString( self, value ):
+    return self._escapeString( value )
+
+  def transactionStart( self ):
+    return self._update( 'BEGIN' )
+
+  def transactionCommit( self ):
+    return self._update( 'COMMIT' )
+
+  def transactionRollback( self ):
+    return self._update( 'ROLLBACK' )
+
+  def dump( self, table, skip = () ):
+    """ rows of table, without the skip columns """
+    cursor = self.connection.execute( 'SELECT * FROM %s' % table )
+    names = [ column[0] for column in cursor.description ]
+    return sorted( [ tuple( [ value for name, value in zip( names, row ) if name not in skip ] )
+                     for row in cursor.fetchall() ] )
@@ -0,0 +1,122 @@
+""" Test cases for JobDB.insertNewJobsIntoDB on an in memory sqlite stand-in of the MySQL tables:
+    the JobIDs of the bunch being read back when other submissions get IDs in between, and
+    nothing being left behind by a failed insertion
+"""
+
+__RCSID__ = "$Id$"
+
+import unittest
+
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
+from DIRAC.WorkloadManagementSystem.DB.JobDB            import JobDB
+
+from SQLiteDB import SQLiteDB
+
+JOBDB_SCHEMA = """
+CREATE TABLE Jobs ( JobID INTEGER PRIMARY KEY, JobType VARCHAR(32) NOT NULL DEFAULT 'user',
+  DIRACSetup VARCHAR(32) NOT NULL DEFAULT 'Test', JobGroup VARCHAR(32) NOT NULL DEFAULT '00000000',
+  JobSplitType VARCHAR(32) NOT NULL DEFAULT 'Single', JobName VARCHAR(128) NOT NULL DEFAULT 'Unknown',
+  Site VARCHAR(100) NOT NULL DEFAULT 'ANY', Owner VARCHAR(32) NOT NULL DEFAULT 'Unknown',
+  OwnerDN VARCHAR(255) NOT NULL DEFAULT 'Unknown', OwnerGroup VARCHAR(128) NOT NULL DEFAULT 'lhcb_user',
+  SubmissionTime DATETIME, LastUpdateTime DATETIME, UserPriority INTEGER NOT NULL DEFAULT 0,
+  VerifiedFlag VARCHAR(5) NOT NULL DEFAULT 'False', Status VARCHAR(32) NOT NULL DEFAULT 'Received',
+  MinorStatus VARCHAR(128) NOT NULL DEFAULT 'Unknown', RescheduleCounter INTEGER NOT NULL DEFAULT 0 );
+CREATE TABLE JobsSummary ( SummaryKey CHAR(32) PRIMARY KEY, DIRACSetup VARCHAR(32), Status VARCHAR(32),
+  MinorStatus VARCHAR(128), Site VARCHAR(100), Owner VARCHAR(32), OwnerDN VARCHAR(255), OwnerGroup VARCHAR(128),
+  JobGroup VARCHAR(32), JobSplitType VARCHAR(32), JobCount INTEGER NOT NULL DEFAULT 0,
+  RescheduleSum INTEGER NOT NULL DEFAULT 0 );
+CREATE TABLE JobJDLs ( JobID INTEGER PRIMARY KEY AUTOINCREMENT, JDL BLOB NOT NULL DEFAULT '',
+  JobRequirements BLOB NOT NULL DEFAULT '', OriginalJDL BLOB NOT NULL DEFAULT '' );
+CREATE TABLE InputData ( JobID INTEGER NOT NULL, Status VARCHAR(32) NOT NULL DEFAULT 'AprioriGood',
+  LFN VARCHAR(255), PRIMARY KEY (JobID, LFN) );
+CREATE TABLE JobParameters ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL,
+  PRIMARY KEY (JobID, Name) );
+"""
+
+# Another submission getting the JobID after each of the inserted rows, as with innodb_autoinc_lock_mode = 2
+INTERLEAVED_SUBMISSION = """
+CREATE TRIGGER InterleavedSubmission AFTER INSERT ON JobJDLs WHEN NEW.OriginalJDL LIKE '%insertNewJobsIntoDB%'
+BEGIN
+  INSERT INTO JobJDLs (JDL, OriginalJDL) VALUES ('[ JobName = "other"; ]', '[ JobName = "other"; ]');
+END;
+"""
+
+def parametricJDLs( nJobs ):
+  """ JDLs of nJobs jobs of a parametric submission """
+  return [ '[ Executable = "my.sh"; JobName = "insertNewJobsIntoDB_%d"; Arguments = "%%j"; '
+           'InputData = { "/lhcb/data/file%d.dst" }; ]' % ( i, i )
+           for i in range( nJobs ) ]
+
+class SQLiteJobDB( SQLiteDB, JobDB ):
+  """ JobDB on sqlite """
+
+  def __init__( self ):
+    self._initSQLite( JOBDB_SCHEMA )
+    self.jobAttributeNames = [ row[1] for row in self.connection.execute( 'PRAGMA table_info(Jobs)' ) ]
+    self.nJobAttributeNames = len( self.jobAttributeNames )
+
+class InsertNewJobs( unittest.TestCase ):
+  """ JobDB.insertNewJobsIntoDB """
+
+  def setUp( self ):
+    gConfigurationData.setOptionInCFG( '/DIRAC/Setup', 'Test' )
+    gConfigurationData.setOptionInCFG( '/DIRAC/Setups/Test/WorkloadManagement', 'Test' )
+    self.db = SQLiteJobDB()
+
+  def insertJobs( self, nJobs ):
+    return self.db.insertNewJobsIntoDB( parametricJDLs( nJobs ), 'owner', '/DC=org/CN=owner', 'lhcb_user', 'Test' )
+
+  def checkJobs( self, jobIDs ):
+    """ the rows of the jobs are those of their JDL """
+    jobNames = dict( self.db.connection.execute( 'SELECT JobID, JobName FROM Jobs' ) )
+    self.assertEqual( sorted( jobNames ), sorted( jobIDs ) )
+    for i, jobID in enumerate( jobIDs ):
+      self.assertEqual( jobNames[jobID], 'insertNewJobsIntoDB_%d' % i )
+      jdl, originalJDL = self.db.connection.execute( 'SELECT JDL, OriginalJDL FROM JobJDLs WHERE JobID=?',
+                                                     ( jobID, ) ).fetchone()
+      self.assert_( 'insertNewJobsIntoDB_%d"' % i in originalJDL )
+      self.assert_( 'insertNewJobsIntoDB_%d"' % i in jdl )
+      self.assert_( 'JobID = %d;' % jobID in jdl )
+      self.assert_( 'Arguments = "%d"' % jobID in jdl )
+    self.assertEqual( self.db.dump( 'InputData' ),
+                      sorted( [ ( jobID, 'AprioriGood', '/lhcb/data/file%d.dst' % i ) for i, jobID in enumerate( jobIDs ) ] ) )
+    self.assertEqual( self.db.connection.execute( 'SELECT SUM(JobCount) FROM JobsSummary' ).fetchone()[0],
+                      len( jobIDs ) )
+
+  def test_consecutiveIDs( self ):
+    result = self.insertJobs( 10 )
+    self.assert_( result['OK'], result )
+    self.assertEqual( result['Value'], range( 1, 11 ) )
+    self.assertEqual( result['JobStatus'][1], { 'Status' : 'Received', 'MinorStatus' : 'Job accepted' } )
+    self.checkJobs( result['Value'] )
+
+  def test_interleavedIDs( self ):
+    self.db.connection.executescript( INTERLEAVED_SUBMISSION )
+    result = self.insertJobs( 10 )
+    self.assert_( result['OK'], result )
+    self.assertEqual( result['Value'], range( 1, 21, 2 ) )
+    self.checkJobs( result['Value'] )
+    # The JDLs of the other submission are left alone
+    otherJDLs = self.db.connection.execute( 'SELECT JDL FROM JobJDLs WHERE JobID % 2 = 0' ).fetchall()
+    self.assertEqual( otherJDLs, [ ( '[ JobName = "other"; ]', ) ] * 10 )
+
+  def test_rollback( self ):
+    self.db.failOn = 'INSERT INTO Jobs'
+    result = self.insertJobs( 10 )
+    self.failIf( result['OK'] )
+    for table in ( 'Jobs', 'JobsSummary', 'JobJDLs', 'InputData', 'JobParameters' ):
+      self.assertEqual( self.db.dump( table ), [] )
+
+  def test_collision( self ):
+    # A Jobs row left with the ID of one of the new jobs makes the whole insertion fail
+    self.db.connection.execute( "INSERT INTO Jobs (JobID, JobName) VALUES (5, 'stale')" )
+    result = self.insertJobs( 10 )
+    self.failIf( result['OK'] )
+    self.assertEqual( self.db.dump( 'Jobs', ( 'SubmissionTime', 'LastUpdateTime' ) )[0][:1], ( 5, ) )
+    self.assertEqual( len( self.db.dump( 'Jobs' ) ), 1 )
+    for table in ( 'JobJDLs', 'InputData', 'JobParameters' ):
+      self.assertEqual( self.db.dump( table ), [] )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( InsertNewJobs )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -0,0 +1,261 @@
+""" Test cases for the commit of CachedJobState changes: JobDB.commitJobChanges,
+    JobLoggingDB.addLoggingRecordList and CachedJobState.commitStates, checked against
+    the former commit path on in memory sqlite stand-ins of the MySQL tables counting
+    their statements
+"""
+
+__RCSID__ = "$Id$"
+
+import unittest
+
+from DIRAC                                                        import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.DB.JobDB                      import JobDB
+from DIRAC.WorkloadManagementSystem.DB.JobLoggingDB               import JobLoggingDB
+from DIRAC.WorkloadManagementSystem.Client.JobState.JobState      import JobState
+from DIRAC.WorkloadManagementSystem.Client.JobState.CachedJobState import CachedJobState
+
+from SQLiteDB import SQLiteDB
+
+JOBDB_SCHEMA = """
+CREATE TABLE Jobs ( JobID INTEGER PRIMARY KEY, JobType VARCHAR(32) NOT NULL DEFAULT 'user',
+  DIRACSetup VARCHAR(32) NOT NULL DEFAULT 'Test', JobGroup VARCHAR(32) NOT NULL DEFAULT '00001234',
+  JobSplitType VARCHAR(32) NOT NULL DEFAULT 'Single', Site VARCHAR(100) NOT NULL DEFAULT 'ANY',
+  Owner VARCHAR(32) NOT NULL DEFAULT 'owner', OwnerDN VARCHAR(255) NOT NULL DEFAULT '/DC=org/CN=owner',
+  OwnerGroup VARCHAR(128) NOT NULL DEFAULT 'user', Status VARCHAR(32) NOT NULL DEFAULT 'Received',
+  MinorStatus VARCHAR(128) NOT NULL DEFAULT 'Job accepted', ApplicationStatus VARCHAR(255) NOT NULL DEFAULT 'Unknown',
+  LastUpdateTime DATETIME, RescheduleCounter INTEGER NOT NULL DEFAULT 0 );
+CREATE TABLE JobsSummary ( SummaryKey CHAR(32) PRIMARY KEY, DIRACSetup VARCHAR(32), Status VARCHAR(32),
+  MinorStatus VARCHAR(128), Site VARCHAR(100), Owner VARCHAR(32), OwnerDN VARCHAR(255), OwnerGroup VARCHAR(128),
+  JobGroup VARCHAR(32), JobSplitType VARCHAR(32), JobCount INTEGER NOT NULL DEFAULT 0,
+  RescheduleSum INTEGER NOT NULL DEFAULT 0 );
+CREATE TABLE JobJDLs ( JobID INTEGER PRIMARY KEY, JDL BLOB NOT NULL DEFAULT '',
+  JobRequirements BLOB NOT NULL DEFAULT '', OriginalJDL BLOB NOT NULL DEFAULT '' );
+CREATE TABLE InputData ( JobID INTEGER NOT NULL, Status VARCHAR(32) NOT NULL DEFAULT 'AprioriGood',
+  LFN VARCHAR(255), PRIMARY KEY (JobID, LFN) );
+CREATE TABLE JobParameters ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL,
+  PRIMARY KEY (JobID, Name) );
+CREATE TABLE OptimizerParameters ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL,
+  PRIMARY KEY (JobID, Name) );
+"""
+
+JOBLOGGINGDB_SCHEMA = """
+CREATE TABLE LoggingInfo ( SeqNum INTEGER PRIMARY KEY AUTOINCREMENT, JobID INTEGER NOT NULL,
+  Status VARCHAR(32) NOT NULL DEFAULT '', MinorStatus VARCHAR(128) NOT NULL DEFAULT '',
+  ApplicationStatus VARCHAR(255) NOT NULL DEFAULT '', StatusTime DATETIME NOT NULL,
+  StatusTimeOrder DOUBLE(12,3) NOT NULL, StatusSource VARCHAR(32) NOT NULL DEFAULT 'Unknown' );
+"""
+
+JOB_JDL = '[ Executable = "my.sh"; JobRequirements = [ OwnerDN = "/DC=org/CN=owner"; OwnerGroup = "user"; ' \
+          'Setup = "Test"; CPUTime = 86400; Sites = { "LCG.CERN.ch", "LCG.CNAF.it" }; ]; ]'
+
+class SQLiteJobDB( SQLiteDB, JobDB ):
+  """ JobDB on sqlite """
+
+  def __init__( self, latency = 0. ):
+    self._initSQLite( JOBDB_SCHEMA, latency )
+    self.jobAttributeNames = [ row[1] for row in self.connection.execute( 'PRAGMA table_info(Jobs)' ) ]
+    self.nJobAttributeNames = len( self.jobAttributeNames )
+
+  def addJobs( self, nJobs, status = 'Checking', minorStatus = 'JobSanity' ):
+    """ nJobs jobs with their JDL, counted in the JobsSummary """
+    for jobID in range( 1, nJobs + 1 ):
+      self.connection.execute( "INSERT INTO Jobs (JobID, Status, MinorStatus, LastUpdateTime) VALUES "
+                               "(?, ?, ?, '2014-01-01 00:00:00')", ( jobID, status, minorStatus ) )
+      self.connection.execute( "INSERT INTO JobJDLs (JobID, JDL, OriginalJDL) VALUES (?, ?, ?)",
+                               ( jobID, JOB_JDL, JOB_JDL ) )
+    fields = 'DIRACSetup, Status, MinorStatus, Site, Owner, OwnerDN, OwnerGroup, JobGroup, JobSplitType'
+    self.connection.execute( "INSERT INTO JobsSummary SELECT MD5(CONCAT_WS('|', %s)), %s, COUNT(*), "
+                             "SUM(RescheduleCounter) FROM Jobs GROUP BY %s" % ( fields, fields, fields ) )
+
+class SQLiteJobLoggingDB( SQLiteDB, JobLoggingDB ):
+  """ JobLoggingDB on sqlite """
+
+  def __init__( self, latency = 0. ):
+    self._initSQLite( JOBLOGGINGDB_SCHEMA, latency )
+    self.gLogger = self.log
+
+class StubTaskQueueDB( object ):
+  """ TaskQueueDB recording the jobs inserted, one statement per job """
+
+  def __init__( self ):
+    self.jobs = {}
+    self.statements = 0
+
+  def getSingleValueTQDefFields( self ):
+    return ( 'OwnerDN', 'OwnerGroup', 'Setup', 'CPUTime' )
+
+  def getMultiValueTQDefFields( self ):
+    return ( 'Sites', 'GridCEs', 'BannedSites', 'Platforms' )
+
+  def insertJob( self, jobID, tqDefDict, jobPriority ):
+    self.statements += 1
+    self.jobs[jobID] = ( tqDefDict, jobPriority )
+    return S_OK()
+
+  def deleteJob( self, jobID ):
+    self.statements += 1
+    return S_OK( self.jobs.pop( jobID, None ) is not None )
+
+class LocalDBs( object ):
+  """ sqlite DBs used by JobState """
+
+  def __init__( self, nJobs, latency = 0. ):
+    self.job = SQLiteJobDB( latency )
+    self.job.addJobs( nJobs )
+    self.log = SQLiteJobLoggingDB( latency )
+    self.tq = StubTaskQueueDB()
+
+  def __enter__( self ):
+    dbHold = JobState._JobState__db
+    self.former = ( dbHold.checked, dbHold.job, dbHold.log, dbHold.tq )
+    dbHold.checked = True
+    dbHold.job, dbHold.log, dbHold.tq = self.job, self.log, self.tq
+    return self
+
+  def __exit__( self, *excInfo ):
+    dbHold = JobState._JobState__db
+    dbHold.checked, dbHold.job, dbHold.log, dbHold.tq = self.former
+    return False
+
+  @property
+  def statements( self ):
+    return self.job.statements + self.log.statements + self.tq.statements
+
+  def resetStatements( self ):
+    self.job.statements = self.log.statements = self.tq.statements = 0
+
+  def dump( self ):
+    """ content of the tables, the update and logging times apart """
+    tables = ( 'Jobs', 'JobsSummary', 'JobJDLs', 'InputData', 'JobParameters', 'OptimizerParameters' )
+    return [ self.job.dump( table, ( 'LastUpdateTime', ) ) for table in tables ] + \
+           [ self.log.dump( 'LoggingInfo', ( 'SeqNum', 'StatusTime', 'StatusTimeOrder' ) ),
+             sorted( self.tq.jobs.items() ) ]
+
+def optimisedJob( jid ):
+  """ CachedJobState of job jid changed as by an optimizer """
+  cjs = CachedJobState( jid )
+  manifest = cjs.getManifest()['Value']
+  manifest.setOption( 'JobRequirements/Sites', 'LCG.CERN.ch' )
+  manifest.setDirty()
+  cjs.setStatus( 'Waiting', 'Pilot Agent Submission', source = 'TaskQueue' )
+  cjs.setAttribute( 'Site', 'LCG.CERN.ch' )
+  cjs.setParameter( 'JobName', "job %s 'quoted'" % jid )
+  cjs.setOptParameters( { 'OptimizerChain' : 'JobPath,JobSanity,InputData,JobScheduling',
+                          'SiteCandidates' : 'LCG.CERN.ch' } )
+  cjs.setAppStatus( 'Unknown', source = 'TaskQueue' )
+  cjs.insertIntoTQ()
+  return cjs
+
+def formerCommit( cjs ):
+  """ the former CachedJobState.commitChanges: one call per kind of change, with one statement
+      per optimizer parameter and per logging record, then setManifest and insertIntoTQ
+  """
+  jid, initialState, cache, jobLog, manifest = cjs._CachedJobState__getChanges()
+  jobState = JobState( jid )
+  jobDB = JobState._JobState__db.job
+  logDB = JobState._JobState__db.log
+  if jobState.getAttributes( initialState.keys() )['Value'] != initialState:
+    return S_ERROR( "Initial state was different" )
+  attributes = [ ( key[4:], value ) for key, value in cache.items() if key.startswith( 'att.' ) ]
+  if attributes:
+    jobDB.setJobAttributes( jid, [ name for name, _value in attributes ], [ value for _name, value in attributes ],
+                            update = True )
+  parameters = [ ( key[5:], value ) for key, value in cache.items() if key.startswith( 'jobp.' ) ]
+  if parameters:
+    jobDB.setJobParameters( jid, parameters )
+  for key, value in cache.items():
+    if key.startswith( 'optp.' ):
+      jobDB.setJobOptParameter( jid, key[5:], value )
+  for record, updateTime, source in jobLog:
+    record = dict( record )
+    record['date'] = updateTime
+    record['source'] = source
+    logDB.addLoggingRecord( jid, **record )
+  jobState.getAttributes( initialState.keys() )
+  if manifest:
+    jobDB.setJobJDL( jid, manifest )
+  return jobState.insertIntoTQ()
+
+class JobStateCommitTests( unittest.TestCase ):
+  """ Changes committed in a single transaction as they were with the former path
+  """
+
+  def testCommit( self ):
+    formerStatements = 0
+    with LocalDBs( 5 ) as former:
+      for jid in range( 1, 6 ):
+        cjs = optimisedJob( jid )
+        former.resetStatements()
+        self.assert_( formerCommit( cjs )['OK'] )
+        formerStatements += former.statements
+    with LocalDBs( 5 ) as dbs:
+      cjs = optimisedJob( 1 )
+      dbs.resetStatements()
+      self.assertEqual( cjs.commitChanges(), S_OK() )
+      # BEGIN, SELECT, UPDATE Jobs and JobsSummary, 2 REPLACE, JobJDLs, SELECT, COMMIT, LoggingInfo, TQ
+      self.assertEqual( dbs.statements, 11 )
+      self.failIf( cjs.getDirtyKeys() )
+      self.assertEqual( cjs.commitChanges(), S_OK() )
+
+      cjsList = [ optimisedJob( jid ) for jid in range( 2, 6 ) ]
+      dbs.resetStatements()
+      result = CachedJobState.commitStates( cjsList )
+      self.assert_( result['OK'] )
+      self.assertEqual( result['Value'], dict( [ ( jid, S_OK() ) for jid in range( 2, 6 ) ] ) )
+      # the same statements, one TQ insertion per job
+      self.assertEqual( dbs.statements, 10 + 4 )
+      # 18 statements per job before, the status update being a transaction of its own
+      self.assertEqual( formerStatements, 5 * 18 )
+      self.assertEqual( dbs.dump(), former.dump() )
+      self.assertEqual( cjsList[0].getAttributes( [ 'Status', 'MinorStatus' ] )['Value'],
+                        { 'Status' : 'Waiting', 'MinorStatus' : 'Pilot Agent Submission' } )
+      self.assertEqual( dbs.job.getSummaryCounters( [ 'Status' ] )['Value'],
+                        [ ( { 'Status' : 'Waiting' }, 5 ) ] )
+
+  def testInitialState( self ):
+    with LocalDBs( 3 ) as dbs:
+      cjsList = [ optimisedJob( jid ) for jid in range( 1, 4 ) ]
+      dbs.job.setJobStatus( 2, 'Killed', 'Marked for termination' )
+      before = dbs.dump()
+      result = CachedJobState.commitStates( cjsList )
+      self.assert_( result['OK'] )
+      self.assertEqual( result['Value'][1], S_OK() )
+      self.assertEqual( result['Value'][2]['OK'], False )
+      self.assertEqual( result['Value'][3], S_OK() )
+      # nothing written for job 2
+      statuses = dict( dbs.job.connection.execute( 'SELECT JobID, Status FROM Jobs' ).fetchall() )
+      self.assertEqual( statuses, { 1 : 'Waiting', 2 : 'Killed', 3 : 'Waiting' } )
+      self.assertEqual( [ row for row in dbs.dump()[4] if row[0] == 2 ], [ row for row in before[4] if row[0] == 2 ] )
+      self.failIf( [ row for row in dbs.log.dump( 'LoggingInfo' ) if row[1] == 2 ] )
+      self.assertEqual( sorted( dbs.tq.jobs ), [ 1, 3 ] )
+      # the cached state of job 2 is reset
+      self.failIf( cjsList[1].getDirtyKeys() )
+      self.assertEqual( cjsList[1].getStatus()['Value'], ( 'Killed', 'Marked for termination' ) )
+
+  def testRollback( self ):
+    with LocalDBs( 3 ) as dbs:
+      cjsList = [ optimisedJob( jid ) for jid in range( 1, 4 ) ]
+      before = dbs.dump()
+      dbs.job.failOn = 'INTO JobJDLs'
+      result = CachedJobState.commitStates( cjsList )
+      self.assert_( result['OK'] )
+      for jid in range( 1, 4 ):
+        self.assertEqual( result['Value'][jid]['OK'], False )
+      self.assertEqual( dbs.dump(), before )
+
+      dbs.job.failOn = None
+      result = JobState.commitCaches( [ ( 1, { 'Status' : 'Checking' }, { 'att.Status' : 'Waiting',
+                                                                          'inputData' : [ '/a', '', '/b', '/a' ] },
+                                          [], None ) ] )
+      self.assertEqual( result, S_OK( { 1 : { 'Status' : 'Waiting' } } ) )
+      self.assertEqual( dbs.job.getInputData( 1 ), S_OK( [ '/a', '/b' ] ) )
+      result = dbs.job.commitJobChanges( { 1 : { 'InitialState' : { 'Status' : 'Waiting' },
+                                                 'Attributes' : { 'NoSuchAttribute' : 'x' } } } )
+      self.assertEqual( result['OK'], False )
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( JobStateCommitTests )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )
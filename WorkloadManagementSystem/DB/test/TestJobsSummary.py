@@ -0,0 +1,177 @@
+""" Test cases for the JobsSummary counters of JobDB on an in memory sqlite stand-in of the MySQL
+    tables: the deltas applied with the changes of the jobs, in the same transaction, and the
+    correction of their drift by reconcileJobsSummary
+"""
+
+__RCSID__ = "$Id$"
+
+import unittest
+
+from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB, JOB_SUMMARY_FIELDS
+
+from SQLiteDB import SQLiteDB
+
+JOBDB_SCHEMA = """
+CREATE TABLE Jobs ( JobID INTEGER PRIMARY KEY, JobType VARCHAR(32) NOT NULL DEFAULT 'user',
+  DIRACSetup VARCHAR(32) NOT NULL DEFAULT 'Test', JobGroup VARCHAR(32) NOT NULL DEFAULT '00000000',
+  JobSplitType VARCHAR(32) NOT NULL DEFAULT 'Single', Site VARCHAR(100) NOT NULL DEFAULT 'ANY',
+  Owner VARCHAR(32) NOT NULL DEFAULT 'owner', OwnerDN VARCHAR(255) NOT NULL DEFAULT '/DC=org/CN=owner',
+  OwnerGroup VARCHAR(128) NOT NULL DEFAULT 'user', Status VARCHAR(32) NOT NULL DEFAULT 'Received',
+  MinorStatus VARCHAR(128) NOT NULL DEFAULT 'Job accepted', ApplicationStatus VARCHAR(255) NOT NULL DEFAULT 'Unknown',
+  ApplicationNumStatus INTEGER NOT NULL DEFAULT 0, LastUpdateTime DATETIME, HeartBeatTime DATETIME,
+  RescheduleCounter INTEGER NOT NULL DEFAULT 0 );
+CREATE TABLE JobsSummary ( SummaryKey CHAR(32) PRIMARY KEY, DIRACSetup VARCHAR(32), Status VARCHAR(32),
+  MinorStatus VARCHAR(128), Site VARCHAR(100), Owner VARCHAR(32), OwnerDN VARCHAR(255), OwnerGroup VARCHAR(128),
+  JobGroup VARCHAR(32), JobSplitType VARCHAR(32), JobCount INTEGER NOT NULL DEFAULT 0,
+  RescheduleSum INTEGER NOT NULL DEFAULT 0 );
+CREATE TABLE JobJDLs ( JobID INTEGER PRIMARY KEY, JDL BLOB NOT NULL DEFAULT '',
+  JobRequirements BLOB NOT NULL DEFAULT '', OriginalJDL BLOB NOT NULL DEFAULT '' );
+CREATE TABLE InputData ( JobID INTEGER NOT NULL, LFN VARCHAR(255) );
+CREATE TABLE JobParameters ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL );
+CREATE TABLE AtticJobParameters ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL );
+CREATE TABLE HeartBeatLoggingInfo ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL );
+CREATE TABLE OptimizerParameters ( JobID INTEGER NOT NULL, Name VARCHAR(100) NOT NULL, Value BLOB NOT NULL );
+"""
+
+FIELDS = ', '.join( JOB_SUMMARY_FIELDS )
+
+class SQLiteJobDB( SQLiteDB, JobDB ):
+  """ JobDB on sqlite recording its statements """
+
+  def __init__( self ):
+    self._initSQLite( JOBDB_SCHEMA )
+    self.jobAttributeNames = [ row[1] for row in self.connection.execute( 'PRAGMA table_info(Jobs)' ) ]
+    self.nJobAttributeNames = len( self.jobAttributeNames )
+    self.commands = []
+
+  def _execute( self, cmd ):
+    self.commands.append( cmd )
+    return SQLiteDB._execute( self, cmd )
+
+  def addJobs( self, nJobs, status = 'Waiting' ):
+    """ nJobs jobs counted in the JobsSummary """
+    for jobID in range( 1, nJobs + 1 ):
+      self.connection.execute( "INSERT INTO Jobs (JobID, Status, Site, LastUpdateTime) VALUES "
+                               "(?, ?, ?, '2014-01-01 00:00:00')", ( jobID, status, 'LCG.Site%d.org' % ( jobID % 2 ) ) )
+    self.connection.execute( "INSERT INTO JobsSummary SELECT MD5(CONCAT_WS('|', %s)), %s, COUNT(*), "
+                             "SUM(RescheduleCounter) FROM Jobs GROUP BY %s" % ( FIELDS, FIELDS, FIELDS ) )
+    self.commands = []
+
+  def counters( self ):
+    """ non empty counters of the JobsSummary """
+    return sorted( self.connection.execute( "SELECT %s, JobCount, RescheduleSum FROM JobsSummary "
+                                            "WHERE JobCount != 0 OR RescheduleSum != 0" % FIELDS ).fetchall() )
+
+  def jobCounters( self ):
+    """ counters computed from the Jobs table """
+    return sorted( self.connection.execute( "SELECT %s, COUNT(*), SUM(RescheduleCounter) FROM Jobs "
+                                            "GROUP BY %s" % ( FIELDS, FIELDS ) ).fetchall() )
+
+class JobsSummaryTestCase( unittest.TestCase ):
+  """ Base class of the JobsSummary test cases """
+
+  def setUp( self ):
+    self.db = SQLiteJobDB()
+    self.db.addJobs( 10 )
+
+  def statusCount( self, status ):
+    return sum( [ row[-2] for row in self.db.counters() if row[1] == status ] )
+
+class JobsSummaryDeltas( JobsSummaryTestCase ):
+
+  def testSetJobStatus( self ):
+    """ the counters move with the status, the row of the job being locked in the transaction """
+    result = self.db.setJobStatus( 3, 'Running', 'Application' )
+    self.assert_( result['OK'], result )
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+    self.assertEqual( self.statusCount( 'Running' ), 1 )
+    self.assertEqual( self.statusCount( 'Waiting' ), 9 )
+    self.assertEqual( [ cmd.split()[0] for cmd in self.db.commands ], [ 'BEGIN', 'SELECT', 'UPDATE', 'INSERT', 'COMMIT' ] )
+    self.assert_( self.db.commands[1].endswith( ' FOR UPDATE' ) )
+
+  def testSuccessiveUpdates( self ):
+    """ each update moves the counters from the key left by the former one """
+    for status, minor in ( ( 'Matched', 'Assigned' ), ( 'Running', 'Application' ), ( 'Done', 'Execution Complete' ) ):
+      for jobID in ( 1, 2, 3 ):
+        self.assert_( self.db.setJobStatus( jobID, status, minor )['OK'] )
+      self.assertEqual( self.db.counters(), self.db.jobCounters() )
+    self.assertEqual( self.statusCount( 'Done' ), 3 )
+
+  def testRescheduleCounter( self ):
+    result = self.db.setJobAttributes( 4, [ 'Status', 'RescheduleCounter' ], [ 'Received', 2 ] )
+    self.assert_( result['OK'], result )
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+    self.assertEqual( sum( [ row[-1] for row in self.db.counters() ] ), 2 )
+
+  def testOtherAttributes( self ):
+    """ attributes out of the key are set with a single statement """
+    self.assert_( self.db.setJobAttribute( 5, 'ApplicationStatus', 'Running step 2' )['OK'] )
+    self.assertEqual( [ cmd.split()[0] for cmd in self.db.commands ], [ 'UPDATE' ] )
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+
+  def testNotMatched( self ):
+    """ the counters do not move if the job is not updated """
+    counters = self.db.counters()
+    result = self.db.setJobAttribute( 5, 'Status', 'Running', myDate = "'2000-01-01 00:00:00'" )
+    self.assert_( result['OK'], result )
+    self.assertEqual( self.db.counters(), counters )
+    self.assert_( self.db.setJobStatus( 99, 'Running' )['OK'] )
+    self.assertEqual( self.db.counters(), counters )
+
+  def testSummaryFailure( self ):
+    """ the job is not updated if its counters can not be moved """
+    self.db.failOn = 'INSERT INTO JobsSummary'
+    result = self.db.setJobStatus( 6, 'Running' )
+    self.failIf( result['OK'] )
+    self.assertEqual( self.db.connection.execute( 'SELECT Status FROM Jobs WHERE JobID=6' ).fetchone()[0], 'Waiting' )
+    self.db.failOn = None
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+
+  def testHeartBeat( self ):
+    self.assert_( self.db.setHeartBeatData( 7, {}, {} )['OK'] )
+    self.assertEqual( self.statusCount( 'Running' ), 1 )
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+
+  def testRemoval( self ):
+    result = self.db.removeJobFromDB( [ 1, 2, 3 ] )
+    self.assert_( result['OK'], result )
+    self.assertEqual( self.statusCount( 'Waiting' ), 7 )
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+
+class ReconcileJobsSummary( JobsSummaryTestCase ):
+
+  def testDrift( self ):
+    """ the drift is corrected, the empty counters deleted """
+    self.db.connection.execute( "UPDATE Jobs SET Status='Running' WHERE JobID IN (1, 2)" )
+    self.db.connection.execute( "UPDATE JobsSummary SET JobCount=JobCount+5, RescheduleSum=3 WHERE Site='LCG.Site0.org'" )
+    self.db.connection.execute( "INSERT INTO JobsSummary (SummaryKey, DIRACSetup, Status, JobCount) "
+                                "VALUES ('stale', 'Test', 'Killed', 0)" )
+    result = self.db.reconcileJobsSummary()
+    self.assert_( result['OK'], result )
+    self.assertEqual( result['Value'], 4 )
+    self.assertEqual( self.db.counters(), self.db.jobCounters() )
+    self.assertEqual( self.db.connection.execute( 'SELECT COUNT(*) FROM JobsSummary' ).fetchone()[0],
+                      len( self.db.jobCounters() ) )
+    # nothing to correct
+    self.assertEqual( self.db.reconcileJobsSummary()['Value'], 0 )
+
+  def testChangeDuringReconciliation( self ):
+    """ a job changed once the snapshot is read is counted once """
+    db = self.db
+    snapshotCommit = db.transactionCommit
+    def commitAndChange():
+      result = snapshotCommit()
+      db.transactionCommit = snapshotCommit
+      db.setJobStatus( 8, 'Running' )
+      return result
+    db.transactionCommit = commitAndChange
+    db.connection.execute( "UPDATE JobsSummary SET JobCount=JobCount+1 WHERE Site='LCG.Site1.org'" )
+    result = db.reconcileJobsSummary()
+    self.assert_( result['OK'], result )
+    self.assertEqual( db.counters(), db.jobCounters() )
+    self.assertEqual( self.statusCount( 'Running' ), 1 )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( JobsSummaryDeltas )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( ReconcileJobsSummary ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
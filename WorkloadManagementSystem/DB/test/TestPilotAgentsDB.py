@@ -0,0 +1,352 @@
+""" Test cases for PilotAgentsDB on an in memory sqlite stand-in of the MySQL tables: registration
+    of pilots with multi-row addPilotTQReference, the requirements documents being stored once,
+    getPilotRequirements for the pilots registered before, and the single scan, cached counters
+    of getPilotSummaryWeb checked against the former four scans
+"""
+
+__RCSID__ = "$Id$"
+
+import datetime
+import random
+import threading
+import time
+import unittest
+from hashlib import md5
+
+from DIRAC                                         import S_OK
+from DIRAC.Core.Utilities.DictCache              import DictCache
+import DIRAC.Core.Utilities.Time                  as Time
+from DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB import PilotAgentsDB
+import DIRAC.WorkloadManagementSystem.DB.PilotAgentsDB as PilotAgentsDBModule
+
+from SQLiteDB import SQLiteDB
+
+PILOTAGENTSDB_SCHEMA = """
+CREATE TABLE PilotAgents ( PilotID INTEGER PRIMARY KEY AUTOINCREMENT, CurrentJobID INTEGER NOT NULL DEFAULT 0,
+  TaskQueueID INTEGER NOT NULL DEFAULT 0, PilotJobReference VARCHAR(255) NOT NULL DEFAULT 'Unknown',
+  PilotStamp VARCHAR(32) NOT NULL DEFAULT '', DestinationSite VARCHAR(128) NOT NULL DEFAULT 'NotAssigned',
+  GridSite VARCHAR(128) NOT NULL DEFAULT 'Unknown', Broker VARCHAR(128) NOT NULL DEFAULT 'Unknown',
+  OwnerDN VARCHAR(255) NOT NULL, OwnerGroup VARCHAR(128) NOT NULL, GridType VARCHAR(32) NOT NULL DEFAULT 'LCG',
+  SubmissionTime DATETIME, LastUpdateTime DATETIME, Status VARCHAR(32) NOT NULL DEFAULT 'Unknown' );
+CREATE INDEX PilotJobReference ON PilotAgents ( PilotJobReference );
+CREATE INDEX Status ON PilotAgents ( Status );
+CREATE TABLE JobToPilotMapping ( PilotID INTEGER NOT NULL, JobID INTEGER NOT NULL, StartTime DATETIME NOT NULL );
+CREATE TABLE PilotOutput ( PilotID INTEGER PRIMARY KEY, StdOutput BLOB, StdError BLOB );
+CREATE TABLE PilotRequirements ( PilotID INTEGER PRIMARY KEY, Requirements BLOB );
+CREATE TABLE PilotRequirementsDocs ( RequirementsHash CHAR(32) PRIMARY KEY, Requirements BLOB,
+  LastUpdateTime DATETIME NOT NULL );
+CREATE TABLE PilotRequirementsRefs ( PilotID INTEGER PRIMARY KEY, RequirementsHash CHAR(32) NOT NULL );
+"""
+
+REQUIREMENTS = 'Requirements = other.GlueCEUniqueID == "ce.cern.ch:8443/cream-pbs-grid"; Rank = 1;'
+
+class SQLitePilotAgentsDB( SQLiteDB, PilotAgentsDB ):
+  """ PilotAgentsDB on sqlite """
+
+  def __init__( self, latency = 0. ):
+    self._initSQLite( PILOTAGENTSDB_SCHEMA, latency )
+    self._PilotAgentsDB__storedRequirements = DictCache()
+    self._PilotAgentsDB__summaryCacheTime = 60
+    self._PilotAgentsDB__summarySnapshots = {}
+    self._PilotAgentsDB__summaryRefreshing = set()
+    self._PilotAgentsDB__summaryLock = threading.Lock()
+    result = self._PilotAgentsDB__initializeDB()
+    assert result['OK'], result
+    self.statements = 0
+
+  def _query( self, cmd, conn = None, debug = False ):
+    if cmd == "SHOW TABLES":
+      cmd = "SELECT name FROM sqlite_master WHERE type='table'"
+    return SQLiteDB._query( self, cmd, conn, debug )
+
+def formerRegistration( db, pilotRef, taskQueueID, ownerDN, ownerGroup, broker = 'Unknown',
+                        gridType = 'DIRAC', requirements = 'Unknown', pilotStampDict = {} ):
+  """ The statements of the former addPilotTQReference: two INSERTs per pilot """
+  e_requirements = db._escapeString( requirements )['Value']
+  for ref in pilotRef:
+    result = db._update( "INSERT INTO PilotAgents( PilotJobReference, TaskQueueID, OwnerDN, "
+                         "OwnerGroup, Broker, GridType, SubmissionTime, LastUpdateTime, Status, PilotStamp ) "
+                         "VALUES ('%s',%d,'%s','%s','%s','%s',UTC_TIMESTAMP(),UTC_TIMESTAMP(),'Submitted','%s')" % \
+                         ( ref, int( taskQueueID ), ownerDN, ownerGroup, broker, gridType,
+                           pilotStampDict.get( ref, '' ) ) )
+    if not result['OK']:
+      return result
+    result = db._update( "INSERT INTO PilotRequirements (PilotID,Requirements) VALUES (%d,%s)" % \
+                         ( result['lastRowId'], e_requirements ) )
+    if not result['OK']:
+      return result
+  return S_OK()
+
+STATES = [ 'Submitted', 'Ready', 'Scheduled', 'Waiting', 'Running', 'Done', 'Aborted' ]
+ALL_STATES = STATES + [ 'Done_Empty', 'Aborted_Hour' ]
+CE_SITES = dict( [ ( 'ce%02d.site%02d.org' % ( ce, ce % 7 ), 'LCG.Site%02d.org' % ( ce % 7 ) ) for ce in range( 20 ) ] )
+
+def formerSummaryCounters( db, selectDict, lastUpdate, ceMap ):
+  """ The counters of the former getPilotSummaryWeb: four scans of PilotAgents """
+  selectDict = dict( selectDict )
+  result = db.getCounters( 'PilotAgents', ['GridSite', 'DestinationSite', 'Status'],
+                           selectDict, newer = lastUpdate, timeStamp = 'LastUpdateTime' )
+  selectDict['Status'] = 'Aborted'
+  resultHour = db.getCounters( 'PilotAgents', ['GridSite', 'DestinationSite', 'Status'],
+                               selectDict, newer = Time.dateTime() - Time.hour, timeStamp = 'LastUpdateTime' )
+  selectDict['Status'] = ['Aborted', 'Done']
+  resultDay = db.getCounters( 'PilotAgents', ['GridSite', 'DestinationSite', 'Status'],
+                              selectDict, newer = Time.dateTime() - Time.day, timeStamp = 'LastUpdateTime' )
+  selectDict['CurrentJobID'] = 0
+  selectDict['Status'] = 'Done'
+  resultDayEmpty = db.getCounters( 'PilotAgents', ['GridSite', 'DestinationSite', 'Status'],
+                                   selectDict, newer = Time.dateTime() - Time.day, timeStamp = 'LastUpdateTime' )
+  for res in ( result, resultHour, resultDay, resultDayEmpty ):
+    if not res['OK']:
+      return res
+
+  resultDict = {}
+  for attDict, count in result['Value']:
+    site, ce, state = attDict['GridSite'], attDict['DestinationSite'], attDict['Status']
+    if site == 'Unknown' and ce != "Unknown" and ce != "Multiple" and ceMap.has_key( ce ):
+      site = ceMap[ce]
+    if not resultDict.setdefault( site, {} ).has_key( ce ):
+      resultDict[site][ce] = dict.fromkeys( ALL_STATES, 0 )
+    resultDict[site][ce][state] = count
+  for res, states, counter in ( ( resultDay, ( 'Done', 'Aborted' ), None ),
+                                ( resultDayEmpty, ( 'Done', ), 'Done_Empty' ),
+                                ( resultHour, ( 'Aborted', ), 'Aborted_Hour' ) ):
+    for attDict, count in res['Value']:
+      site, ce, state = attDict['GridSite'], attDict['DestinationSite'], attDict['Status']
+      if site == 'Unknown' and ce != "Unknown" and ceMap.has_key( ce ):
+        site = ceMap[ce]
+      if state in states:
+        resultDict[site][ce][counter or state] = count
+  return S_OK( resultDict )
+
+def addPilots( db, nPilots, seed = 1234 ):
+  """ nPilots pilots updated in the last three days at the CEs of CE_SITES, the site of some of them
+      being known from their CE only
+  """
+  rand = random.Random( seed )
+  now = datetime.datetime.utcnow()
+  ces = sorted( CE_SITES )
+  def pilot( i ):
+    ce = ces[i % len( ces )]
+    site = 'Unknown' if ce < 'ce05' else CE_SITES[ce]
+    status = rand.choice( STATES )
+    updated = now - datetime.timedelta( seconds = rand.randint( 0, 3 * 86400 ) )
+    return ( 'https://%s:8443/CREAM%09d' % ( ce, i ), ce, site, status, updated.strftime( '%Y-%m-%d %H:%M:%S' ),
+             rand.choice( ( 0, i ) ), '/DC=org/CN=pilot', rand.choice( ( 'lhcb_pilot', 'lhcb_user' ) ) )
+  for first in range( 0, nPilots, 100000 ):
+    db.connection.executemany( "INSERT INTO PilotAgents ( PilotJobReference, DestinationSite, GridSite, Status, "
+                               "LastUpdateTime, CurrentJobID, OwnerDN, OwnerGroup ) VALUES (?,?,?,?,?,?,?,?)",
+                               ( pilot( i ) for i in range( first, min( first + 100000, nPilots ) ) ) )
+
+class StubWMSAdministrator( object ):
+
+  def __init__( self, *args, **kwargs ):
+    pass
+
+  def getSiteMask( self ):
+    return S_OK( [ 'LCG.Site00.org', 'LCG.Site01.org' ] )
+
+def pilotRefs( first, nPilots ):
+  return [ 'https://cream.cern.ch:8443/CREAM%08d' % i for i in range( first, first + nPilots ) ]
+
+class PilotRegistrationTestCase( unittest.TestCase ):
+  """ Base class for the PilotAgentsDB registration test cases """
+
+  def setUp( self ):
+    self.db = SQLitePilotAgentsDB()
+
+  def register( self, refs, requirements = REQUIREMENTS, taskQueueID = 12 ):
+    result = self.db.addPilotTQReference( refs, taskQueueID, '/DC=org/CN=pilot', 'lhcb_pilot', 'Unknown',
+                                          'CREAM', requirements, dict( [ ( ref, ref[-8:] ) for ref in refs ] ) )
+    self.assert_( result['OK'], result.get( 'Message' ) )
+
+class AddPilotTQReference( PilotRegistrationTestCase ):
+
+  def testRegistration( self ):
+    """ one row per pilot, one requirements document, a constant number of statements """
+    refs = pilotRefs( 0, 20 )
+    self.register( refs )
+    # document, pilots, references
+    self.assertEqual( self.db.statements, 3 )
+    pilots = self.db.dump( 'PilotAgents', ( 'PilotID', 'CurrentJobID', 'DestinationSite', 'GridSite',
+                                            'SubmissionTime', 'LastUpdateTime' ) )
+    self.assertEqual( pilots, sorted( [ ( 12, ref, ref[-8:], 'Unknown', '/DC=org/CN=pilot', 'lhcb_pilot', 'CREAM',
+                                          'Submitted' ) for ref in refs ] ) )
+    self.assertEqual( len( self.db.dump( 'PilotRequirementsDocs' ) ), 1 )
+    self.assertEqual( len( self.db.dump( 'PilotRequirementsRefs' ) ), 20 )
+    result = self.db.getPilotRequirements( refs )
+    self.assert_( result['OK'] )
+    self.assertEqual( result['Value'], dict( [ ( ref, REQUIREMENTS ) for ref in refs ] ) )
+
+  def testSharedDocuments( self ):
+    """ a requirements document is stored once whatever the number of batches referencing it """
+    self.register( pilotRefs( 0, 5 ) )
+    self.db.statements = 0
+    self.register( pilotRefs( 5, 5 ), taskQueueID = 13 )
+    # the document is known to be stored
+    self.assertEqual( self.db.statements, 2 )
+    self.register( pilotRefs( 10, 5 ), requirements = "Requirements = other.Site == 'LCG.CNAF.it';" )
+    self.assertEqual( len( self.db.dump( 'PilotRequirementsDocs' ) ), 2 )
+    requirements = self.db.getPilotRequirements( pilotRefs( 0, 15 ) )['Value']
+    self.assertEqual( requirements[pilotRefs( 7, 1 )[0]], REQUIREMENTS )
+    self.assertEqual( requirements[pilotRefs( 12, 1 )[0]], "Requirements = other.Site == 'LCG.CNAF.it';" )
+
+  def testSeveralDocuments( self ):
+    """ each pilot references the document of its batch """
+    self.register( pilotRefs( 0, 1 ) )
+    self.register( pilotRefs( 1, 2 ), requirements = 'Unknown' )
+    self.assertEqual( self.db.getPilotRequirements( pilotRefs( 0, 1 )[0] )['Value'],
+                      { pilotRefs( 0, 1 )[0] : REQUIREMENTS } )
+    self.assertEqual( self.db.dump( 'PilotRequirementsRefs' ),
+                      [ ( 1, md5( REQUIREMENTS ).hexdigest() ), ( 2, md5( 'Unknown' ).hexdigest() ),
+                        ( 3, md5( 'Unknown' ).hexdigest() ) ] )
+
+  def testEmpty( self ):
+    result = self.db.addPilotTQReference( [], 12, '/DC=org/CN=pilot', 'lhcb_pilot' )
+    self.assert_( result['OK'] )
+    self.assertEqual( self.db.statements, 0 )
+
+  def testFailure( self ):
+    """ a failed registration is reported, the pilots are not referencing the document """
+    self.db.failOn = 'INSERT INTO PilotAgents'
+    result = self.db.addPilotTQReference( pilotRefs( 0, 5 ), 12, '/DC=org/CN=pilot', 'lhcb_pilot' )
+    self.failIf( result['OK'] )
+    self.assertEqual( self.db.dump( 'PilotAgents' ), [] )
+    self.assertEqual( self.db.dump( 'PilotRequirementsRefs' ), [] )
+
+class PilotRequirements( PilotRegistrationTestCase ):
+
+  def testFormerRegistration( self ):
+    """ requirements of the pilots registered in the PilotRequirements table """
+    refs = pilotRefs( 0, 3 )
+    formerRegistration( self.db, refs, 12, '/DC=org/CN=pilot', 'lhcb_pilot', requirements = 'Former' )
+    self.register( pilotRefs( 3, 2 ) )
+    result = self.db.getPilotRequirements( pilotRefs( 0, 5 ) + [ 'https://unknown' ] )
+    self.assert_( result['OK'] )
+    expected = dict( [ ( ref, 'Former' ) for ref in refs ] + [ ( ref, REQUIREMENTS ) for ref in pilotRefs( 3, 2 ) ] )
+    self.assertEqual( result['Value'], expected )
+
+  def testSetPilotRequirements( self ):
+    """ new requirements of a pilot, whether registered before or after the documents were shared """
+    formerRegistration( self.db, pilotRefs( 0, 1 ), 12, '/DC=org/CN=pilot', 'lhcb_pilot', requirements = 'Former' )
+    self.register( pilotRefs( 1, 2 ) )
+    for ref in pilotRefs( 0, 2 ):
+      result = self.db.setPilotRequirements( ref, 'New' )
+      self.assert_( result['OK'], result.get( 'Message' ) )
+    self.assertEqual( self.db.getPilotRequirements( pilotRefs( 0, 3 ) )['Value'],
+                      dict( zip( pilotRefs( 0, 3 ), ( 'New', 'New', REQUIREMENTS ) ) ) )
+    self.assertEqual( len( self.db.dump( 'PilotRequirementsDocs' ) ), 2 )
+
+  def testDeletePilots( self ):
+    self.register( pilotRefs( 0, 3 ) )
+    result = self.db.deletePilots( [ 1, 2 ] )
+    self.assert_( result['OK'] )
+    self.assertEqual( self.db.dump( 'PilotRequirementsRefs' ), [ ( 3, md5( REQUIREMENTS ).hexdigest() ) ] )
+    self.assertEqual( self.db.getPilotRequirements( pilotRefs( 0, 3 ) )['Value'],
+                      { pilotRefs( 2, 1 )[0] : REQUIREMENTS } )
+
+  def testClearPilots( self ):
+    """ unused documents are deleted once they have not been stored for twice the time they are cached """
+    self.register( pilotRefs( 0, 3 ) )
+    self.register( pilotRefs( 3, 1 ), requirements = 'Unknown' )
+    self.assert_( self.db.deletePilots( [ 1, 2, 3 ] )['OK'] )
+    # stored just now, possibly cached by another process
+    self.assert_( self.db.clearPilots()['OK'] )
+    self.assertEqual( len( self.db.dump( 'PilotRequirementsDocs' ) ), 2 )
+    self.db.connection.execute( "UPDATE PilotRequirementsDocs SET LastUpdateTime=datetime('now','-3 hours')" )
+    self.assert_( self.db.clearPilots()['OK'] )
+    self.assertEqual( [ doc[0] for doc in self.db.dump( 'PilotRequirementsDocs' ) ], [ md5( 'Unknown' ).hexdigest() ] )
+    self.assertEqual( self.db.getPilotRequirements( pilotRefs( 3, 1 ) )['Value'], { pilotRefs( 3, 1 )[0] : 'Unknown' } )
+
+  def testStorageTimeRefreshed( self ):
+    """ an old document stored again by a process that did not cache it is kept by clearPilots """
+    self.register( pilotRefs( 0, 1 ) )
+    self.db.connection.execute( "UPDATE PilotRequirementsDocs SET LastUpdateTime=datetime('now','-3 hours')" )
+    self.db._PilotAgentsDB__storedRequirements = DictCache()
+    self.register( pilotRefs( 1, 1 ) )
+    self.assert_( self.db.deletePilots( [ 1, 2 ] )['OK'] )
+    self.assert_( self.db.clearPilots()['OK'] )
+    self.assertEqual( len( self.db.dump( 'PilotRequirementsDocs' ) ), 1 )
+
+class PilotSummary( unittest.TestCase ):
+
+  def setUp( self ):
+    self.db = SQLitePilotAgentsDB()
+    addPilots( self.db, 5000 )
+    self.patched = PilotAgentsDBModule.RPCClient, PilotAgentsDBModule.getCESiteMapping
+    PilotAgentsDBModule.RPCClient = StubWMSAdministrator
+    PilotAgentsDBModule.getCESiteMapping = lambda: S_OK( CE_SITES )
+
+  def tearDown( self ):
+    PilotAgentsDBModule.RPCClient, PilotAgentsDBModule.getCESiteMapping = self.patched
+
+  def addRunningPilots( self, nPilots ):
+    for i in range( nPilots ):
+      self.db.connection.execute( "INSERT INTO PilotAgents ( DestinationSite, GridSite, Status, LastUpdateTime, "
+                                  "OwnerDN, OwnerGroup ) VALUES ( 'ce10.site03.org', 'LCG.Site03.org', 'Running', "
+                                  "UTC_TIMESTAMP(), '/DC=org/CN=pilot', 'lhcb_pilot' )" )
+
+  def summary( self, selectDict = {} ):
+    result = self.db.getPilotSummaryWeb( dict( selectDict ), [], 0, 0 )
+    self.assert_( result['OK'], result.get( 'Message' ) )
+    return result['Value']
+
+  def testCounters( self ):
+    """ the counters of the single scan are those of the former four scans """
+    lastUpdate = Time.dateTime() - 2 * Time.day
+    for selectDict, newer in ( ( {}, None ), ( { 'OwnerGroup' : 'lhcb_pilot' }, None ), ( {}, lastUpdate ) ):
+      former = formerSummaryCounters( self.db, selectDict, newer, CE_SITES )
+      self.assert_( former['OK'], former.get( 'Message' ) )
+      self.db.statements = 0
+      result = self.db._PilotAgentsDB__summaryCounters( selectDict, newer, ALL_STATES )
+      self.assert_( result['OK'], result.get( 'Message' ) )
+      self.assertEqual( self.db.statements, 1 )
+      self.assertEqual( result['Value'], former['Value'] )
+
+  def testSummary( self ):
+    summary = self.summary()
+    self.assertEqual( summary['TotalRecords'], 7 )
+    self.assertEqual( sorted( [ record[:2] for record in summary['Records'] ] ),
+                      [ [ 'LCG.Site%02d.org' % site, 'Multiple' ] for site in range( 7 ) ] )
+    self.assertEqual( summary['Extras']['Total'], sum( [ record[11] for record in summary['Records'] ] ) )
+    expanded = self.summary( { 'ExpandSite' : 'LCG.Site01.org' } )
+    self.assertEqual( sorted( [ record[1] for record in expanded['Records'] ] ), [ 'ce01.site01.org', 'ce08.site01.org',
+                                                                         'ce15.site01.org' ] )
+
+  def testSnapshot( self ):
+    """ requests are served from the snapshot, a new one being taken in the background when it is old """
+    summary = self.summary()
+    self.db.statements = 0
+    self.assertEqual( self.summary(), summary )
+    self.assertEqual( self.db.statements, 0 )
+
+    self.addRunningPilots( 10 )
+    snapshots = self.db._PilotAgentsDB__summarySnapshots
+    for key, ( taken, counters ) in snapshots.items():
+      snapshots[key] = ( taken - 61, counters )
+    self.db.latency = 0.2
+    start = time.time()
+    self.assertEqual( self.summary(), summary )
+    self.assert_( time.time() - start < 0.2 )
+    while self.db._PilotAgentsDB__summaryRefreshing:
+      time.sleep( 0.05 )
+    self.assertEqual( self.db.statements, 1 )
+    self.assertEqual( self.summary()['Extras']['Total'], summary['Extras']['Total'] + 10 )
+    self.assertEqual( self.db.statements, 1 )
+
+  def testExpiredSnapshot( self ):
+    """ a snapshot older than 10 times its life time is not served """
+    summary = self.summary()
+    self.addRunningPilots( 10 )
+    snapshots = self.db._PilotAgentsDB__summarySnapshots
+    for key, ( taken, counters ) in snapshots.items():
+      snapshots[key] = ( taken - 601, counters )
+    self.db.statements = 0
+    self.assertEqual( self.summary()['Extras']['Total'], summary['Extras']['Total'] + 10 )
+    self.assertEqual( self.db.statements, 1 )
+
+if __name__ == '__main__':
+  suite = unittest.defaultTestLoader.loadTestsFromTestCase( AddPilotTQReference )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( PilotRequirements ) )
+  suite.addTest( unittest.defaultTestLoader.loadTestsFromTestCase( PilotSummary ) )
+  testResult = unittest.TextTestRunner( verbosity = 2 ).run( suite )
@@ -18,6 +18,7 @@ from DIRAC.Core.Utilities.SiteSEMapping                              import getS
 from DIRAC.Core.Utilities.List                                       import uniqueElements
 from DIRAC                                                           import S_OK, S_ERROR
 from DIRAC.DataManagementSystem.Client.DataManager                   import DataManager
+from DIRAC.WorkloadManagementSystem.private.InputDataCoalescer       import InputDataCoalescer
 
 
 class InputData( OptimizerExecutor ):
@@ -59,9 +60,21 @@ class InputData( OptimizerExecutor ):
     cls.__lastCacheUpdate = 0
     cls.__cacheLifeTime = 600
 
+    # Catalog lookups of the jobs optimised at the same time are made together
+    cls.__coalescer = InputDataCoalescer( cls.__dataMan.getActiveReplicas, cls.__fc.getFileMetadata,
+                                          window = cls.ex_getOption( 'LookupWindow', 0.5 ),
+                                          cacheLifeTime = cls.ex_getOption( 'LookupCacheLifeTime', 60 ) )
+
     return S_OK()
 
   def optimizeJob( self, jid, jobState ):
+    self.__coalescer.jobStarted()
+    try:
+      return self.__optimizeJob( jid, jobState )
+    finally:
+      self.__coalescer.jobDone()
+
+  def __optimizeJob( self, jid, jobState ):
     result = jobState.getInputData()
     if not result[ 'OK' ]:
       self.jobLog.error( "Cannot retrieve input data: %s" % result[ 'Message' ] )
@@ -107,18 +120,14 @@ class InputData( OptimizerExecutor ):
 
 
     startTime = time.time()
-
-    print "LFNS", lfns
-
-    result = self.__dataMan.getActiveReplicas( lfns )  # This will return already active replicas, excluding banned SEs
-    self.jobLog.info( 'Catalog replicas lookup time: %.2f seconds ' % ( time.time() - startTime ) )
+    checkFileMetadata = self.ex_getOption( 'CheckFileMetadata', True )
+    # Replicas are the active ones, excluding banned SEs
+    result = self.__coalescer.resolve( lfns, metadata = checkFileMetadata )
+    self.jobLog.info( 'Catalog lookup time: %.2f seconds ' % ( time.time() - startTime ) )
     if not result['OK']:
       self.log.warn( result['Message'] )
       return result
-
-    replicaDict = result['Value']
-
-    print "REPLICA DICT", replicaDict
+    replicaDict, metadataDict = result['Value']
 
     result = self.__checkReplicas( jobState, replicaDict )
 
@@ -127,14 +136,8 @@ class InputData( OptimizerExecutor ):
       return result
     siteCandidates = result[ 'Value' ]
 
-    if self.ex_getOption( 'CheckFileMetadata', True ):
-      start = time.time()
-      guidDict = self.__fc.getFileMetadata( lfns )
-      self.jobLog.info( 'Catalog Metadata Lookup Time: %.2f seconds ' % ( time.time() - startTime ) )
-
-      if not guidDict['OK']:
-        self.log.warn( guidDict['Message'] )
-        return guidDict
+    if checkFileMetadata:
+      guidDict = S_OK( metadataDict )
 
       failed = guidDict['Value']['Failed']
       if failed:
@@ -144,6 +147,8 @@ class InputData( OptimizerExecutor ):
       for lfn in replicaDict['Successful']:
         replicas = replicaDict['Successful'][ lfn ]
         guidDict['Value']['Successful'][lfn].update( replicas )
+    else:
+      guidDict = S_OK( replicaDict )
 
     resolvedData = {}
     resolvedData['Value'] = guidDict
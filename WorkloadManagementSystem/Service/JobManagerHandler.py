@@ -4,6 +4,7 @@
     The following methods are available in the Service interface
 
     submitJob()
+    submitJobs()
     rescheduleJob()
     deleteJob()
     killJob()
@@ -33,6 +34,7 @@ gJobLoggingDB = False
 gtaskQueueDB = False
 
 MAX_PARAMETRIC_JOBS = 20
+MAX_BULK_JOBS = 500
 
 def initializeJobManagerHandler( serviceInfo ):
 
@@ -68,6 +70,7 @@ class JobManagerHandler( RequestHandler ):
     self.peerUsesLimitedProxy = credDict[ 'isLimitedProxy' ]
     self.diracSetup = self.serviceInfoDict['clientSetup']
     self.maxParametricJobs = self.srv_getCSOption( 'MaxParametricJobs', MAX_PARAMETRIC_JOBS )
+    self.maxBulkJobs = self.srv_getCSOption( 'MaxBulkJobs', MAX_BULK_JOBS )
     self.jobPolicy = JobPolicy( self.ownerDN, self.ownerGroup, self.userProperties )
     self.jobPolicy.setJobDB( gJobDB )
     return S_OK()
@@ -93,23 +96,12 @@ class JobManagerHandler( RequestHandler ):
     """ Submit a single job to DIRAC WMS
     """
 
-    if self.peerUsesLimitedProxy:
-      return S_ERROR( "Can't submit using a limited proxy! (bad boy!)" )
-
-    # Check job submission permission
-    result = self.jobPolicy.getJobPolicy()
+    result = self.__checkSubmissionRights()
     if not result['OK']:
-      return S_ERROR( 'Failed to get job policies' )
-    policyDict = result['Value']
-    if not policyDict[ RIGHT_SUBMIT ]:
-      return S_ERROR( 'Job submission not authorized' )
+      return result
 
     #jobDesc is JDL for now
-    jobDesc = jobDesc.strip()
-    if jobDesc[0] != "[":
-      jobDesc = "[%s" % jobDesc
-    if jobDesc[-1] != "]":
-      jobDesc = "%s]" % jobDesc
+    jobDesc = self.__normaliseJDL( jobDesc )
 
     # Check if the job is a parameteric one
     jobClassAd = ClassAd( jobDesc )
@@ -178,23 +170,10 @@ class JobManagerHandler( RequestHandler ):
     else:
       jobDescList = [ jobDesc ]
 
-    jobIDList = []
-    for jobDescription in jobDescList:
-      result = gJobDB.insertNewJobIntoDB( jobDescription, self.owner, self.ownerDN, self.ownerGroup, self.diracSetup )
-      if not result['OK']:
-        return result
-
-      jobID = result['JobID']
-      gLogger.info( 'Job %s added to the JobDB for %s/%s' % ( jobID, self.ownerDN, self.ownerGroup ) )
-
-      gJobLoggingDB.addLoggingRecord( jobID, result['Status'], result['MinorStatus'], source = 'JobManager' )
-
-      jobIDList.append( jobID )
-
-    #Set persistency flag
-    retVal = gProxyManager.getUserPersistence( self.ownerDN, self.ownerGroup )
-    if 'Value' not in retVal or not retVal[ 'Value' ]:
-      gProxyManager.setPersistency( self.ownerDN, self.ownerGroup, True )
+    result = self.__insertNewJobs( jobDescList )
+    if not result['OK']:
+      return result
+    jobIDList = result['Value']
 
     if parametricJob:
       result = S_OK( jobIDList )
@@ -203,9 +182,102 @@ class JobManagerHandler( RequestHandler ):
 
     result['JobID'] = result['Value']
     result[ 'requireProxyUpload' ] = self.__checkIfProxyUploadIsRequired()
-    self.__sendJobsToOptimizationMind( [ jobID ] )
+    self.__sendJobsToOptimizationMind( jobIDList )
+    return result
+
+  ###########################################################################
+  types_submitJobs = [ ListType ]
+  def export_submitJobs( self, jobDescs ):
+    """ Submit a bunch of jobs to DIRAC WMS, e.g. the tasks of a transformation.
+        All the JDLs are checked before any job is inserted, the jobs being inserted
+        with multi-row statements. Parametric jobs have to be submitted with submitJob.
+
+        :return: S_OK( jobIDList ), the JobIDs being in the order of jobDescs. An error is flagged
+                 with Rejected, no job having been inserted: the client may submit the jobs again
+    """
+    result = self.__submitJobs( jobDescs )
+    if not result['OK']:
+      result['Rejected'] = True
+    return result
+
+  def __submitJobs( self, jobDescs ):
+    """ Check and insert the jobs of export_submitJobs, the insertion being a single transaction
+    """
+    result = self.__checkSubmissionRights()
+    if not result['OK']:
+      return result
+
+    if not jobDescs:
+      return S_OK( [] )
+    if len( jobDescs ) > self.maxBulkJobs:
+      return S_ERROR( 'The number of jobs exceeded the limit of %d' % self.maxBulkJobs )
+
+    jobDescList = []
+    for jobDesc in jobDescs:
+      if type( jobDesc ) != StringType or not jobDesc.strip():
+        return S_ERROR( 'Invalid job description' )
+      jobDesc = self.__normaliseJDL( jobDesc )
+      if ClassAd( jobDesc ).lookupAttribute( 'Parameters' ):
+        return S_ERROR( 'Parametric jobs can not be submitted in bulk' )
+      jobDescList.append( jobDesc )
+
+    result = self.__insertNewJobs( jobDescList )
+    if not result['OK']:
+      return result
+    jobIDList = result['Value']
+
+    result = S_OK( jobIDList )
+    result['JobID'] = jobIDList
+    result[ 'requireProxyUpload' ] = self.__checkIfProxyUploadIsRequired()
+    self.__sendJobsToOptimizationMind( jobIDList )
     return result
 
+###########################################################################
+  def __checkSubmissionRights( self ):
+    """ Check that the peer may submit jobs
+    """
+    if self.peerUsesLimitedProxy:
+      return S_ERROR( "Can't submit using a limited proxy! (bad boy!)" )
+
+    # Check job submission permission
+    result = self.jobPolicy.getJobPolicy()
+    if not result['OK']:
+      return S_ERROR( 'Failed to get job policies' )
+    policyDict = result['Value']
+    if not policyDict[ RIGHT_SUBMIT ]:
+      return S_ERROR( 'Job submission not authorized' )
+    return S_OK()
+
+  @staticmethod
+  def __normaliseJDL( jobDesc ):
+    """ JDL with its enclosing brackets
+    """
+    jobDesc = jobDesc.strip()
+    if jobDesc[0] != "[":
+      jobDesc = "[%s" % jobDesc
+    if jobDesc[-1] != "]":
+      jobDesc = "%s]" % jobDesc
+    return jobDesc
+
+  def __insertNewJobs( self, jobDescList ):
+    """ Insert the jobs into the JobDB and their first logging records into the JobLoggingDB
+    """
+    result = gJobDB.insertNewJobsIntoDB( jobDescList, self.owner, self.ownerDN, self.ownerGroup, self.diracSetup )
+    if not result['OK']:
+      return result
+    jobIDList = result['Value']
+    gLogger.info( 'Jobs %s added to the JobDB for %s/%s' % ( ','.join( [ str( j ) for j in jobIDList ] ),
+                                                             self.ownerDN, self.ownerGroup ) )
+
+    gJobLoggingDB.addLoggingRecords( jobIDList, result['JobStatus'], source = 'JobManager' )
+
+    #Set persistency flag
+    retVal = gProxyManager.getUserPersistence( self.ownerDN, self.ownerGroup )
+    if 'Value' not in retVal or not retVal[ 'Value' ]:
+      gProxyManager.setPersistency( self.ownerDN, self.ownerGroup, True )
+
+    return S_OK( jobIDList )
+
 ###########################################################################
   def __checkIfProxyUploadIsRequired( self ):
     result = gProxyManager.userHasProxy( self.ownerDN, self.ownerGroup, validSeconds = 18000 )
@@ -172,6 +172,8 @@ class JobMonitoringHandler( RequestHandler ):
     if not attrDict:
       attrDict = {}
 
+    if not cutDate:
+      return gJobDB.getSummaryCounters( attrList, attrDict )
     return gJobDB.getCounters( 'Jobs', attrList, attrDict, newer = cutDate, timeStamp = 'LastUpdateTime' )
 
 ##############################################################################
@@ -184,11 +186,15 @@ class JobMonitoringHandler( RequestHandler ):
 
     if not attrDict:
       attrDict = {}
-    result = gJobDB.getCounters( 'Jobs', ['Status'], attrDict, timeStamp = 'LastUpdateTime' )
+    result = gJobDB.getSummaryCounters( ['Status'], attrDict )
     if not result['OK']:
       return result
     last_update = Time.dateTime() - Time.day
-    resultDay = gJobDB.getCounters( 'Jobs', ['Status'], attrDict, newer = last_update,
+    # Only the final states are taken from the last day counters
+    dayAttrDict = dict( attrDict )
+    if not 'Status' in dayAttrDict:
+      dayAttrDict['Status'] = FINAL_STATES
+    resultDay = gJobDB.getCounters( 'Jobs', ['Status'], dayAttrDict, newer = last_update,
                                    timeStamp = 'LastUpdateTime' )
     if not resultDay['OK']:
       return resultDay
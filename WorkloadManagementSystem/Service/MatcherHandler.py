@@ -565,6 +565,22 @@ class MatcherHandler( RequestHandler ):
       negativeCond = self.__limiter.getNegativeCond()
     return gTaskQueueDB.retrieveTaskQueuesThatMatch( resourceDict, negativeCond = negativeCond )
 
+##############################################################################
+  types_getBulkMatchingTaskQueues = [ DictType ]
+  def export_getBulkMatchingTaskQueues( self, resourceDicts ):
+    """ Return the task queues matching each of the resource descriptions
+
+    :param dict resourceDicts: { key : resourceDict }, e.g. one resourceDict per CE queue
+    :return: S_OK( { key : S_OK( task queues ) or S_ERROR } )
+    """
+    result = {}
+    for key, resourceDict in resourceDicts.items():
+      if type( resourceDict ) != DictType:
+        result[key] = S_ERROR( "Resource description is not a dictionary" )
+        continue
+      result[key] = self.export_getMatchingTaskQueues( resourceDict )
+    return S_OK( result )
+
 ##############################################################################
   types_matchAndGetTaskQueue = [ DictType ]
   def export_matchAndGetTaskQueue( self, resourceDict ):
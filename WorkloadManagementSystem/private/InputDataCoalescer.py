@@ -0,0 +1,191 @@
+""" Coalescing of the catalog lookups of the jobs optimised at the same time
+
+    The InputData executor optimises several jobs at once (one per thread). Jobs of a transformation
+    often share input files and reach the executor within seconds of each other: instead of two
+    catalog calls per job, the LFNs of the jobs in flight are gathered into a batch, resolved with one
+    replica lookup and one metadata lookup, the results being given back to each job for its LFNs.
+
+    A batch is closed when all the jobs in flight have joined it or after a short window, so a lone
+    job does not wait. Replicas and metadata are kept in a short lived cache keyed by LFN, purged
+    of its expired entries at each batch.
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+
+from DIRAC                                import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.DictCache       import DictCache
+
+class _Batch( object ):
+  """ LFNs of the jobs joining a batch and the results of their lookups
+  """
+
+  def __init__( self ):
+    self.lfns = { 'Replicas' : set(), 'Metadata' : set() }
+    self.results = {}
+    self.jobs = 0
+    self.done = threading.Event()
+
+class InputDataCoalescer( object ):
+  """ Replica and metadata lookups for the LFNs of the jobs in flight
+  """
+
+  def __init__( self, replicaLookup, metadataLookup, window = 0.5, cacheLifeTime = 60 ):
+    """ replicaLookup and metadataLookup take a list of LFNs and return
+        S_OK( { 'Successful' : { lfn : value }, 'Failed' : { lfn : error } } ), as
+        DataManager.getActiveReplicas and FileCatalog.getFileMetadata do.
+        window is the max time in seconds to gather a batch, successful lookups are cached
+        for cacheLifeTime seconds (0 to disable the cache)
+    """
+    self.__replicaLookup = replicaLookup
+    self.__metadataLookup = metadataLookup
+    self.__window = window
+    self.__cacheLifeTime = cacheLifeTime
+    self.__log = gLogger.getSubLogger( "InputDataCoalescer" )
+    self.__replicaCache = DictCache()
+    self.__metadataCache = DictCache()
+    self.__cond = threading.Condition( threading.Lock() )
+    self.__batch = None
+    # Jobs in flight which did not ask for their LFNs yet
+    self.__expected = 0
+    self.__jobData = threading.local()
+    self.lookups = { 'Replicas' : 0, 'Metadata' : 0 }
+
+  def jobStarted( self ):
+    """ Announce a job in flight which is going to resolve its input data
+    """
+    self.__cond.acquire()
+    try:
+      if not getattr( self.__jobData, 'expected', False ):
+        self.__jobData.expected = True
+        self.__expected += 1
+    finally:
+      self.__cond.release()
+
+  def jobDone( self ):
+    """ The job in flight is over, whether it resolved its input data or not
+    """
+    self.__cond.acquire()
+    try:
+      self.__joined()
+    finally:
+      self.__cond.release()
+
+  def __joined( self ):
+    """ The job of the calling thread is no longer expected, lock held
+    """
+    if getattr( self.__jobData, 'expected', False ):
+      self.__jobData.expected = False
+      self.__expected -= 1
+      self.__cond.notifyAll()
+
+  def resolve( self, lfns, metadata = True ):
+    """ Active replicas and, if metadata, metadata of lfns
+
+        :return: S_OK( ( replicaDict, metadataDict ) ) with the 'Successful' and 'Failed' dictionaries
+                 of the lookups for lfns, metadataDict being None if metadata is False
+    """
+    lfns = list( set( lfns ) )
+    # Values are taken from the cache once, as they may expire while the batch is gathered
+    cached = { 'Replicas' : self.__fromCache( lfns, self.__replicaCache ),
+               'Metadata' : self.__fromCache( lfns, self.__metadataCache ) if metadata else {} }
+    missing = { 'Replicas' : [ lfn for lfn in lfns if lfn not in cached['Replicas'] ],
+                'Metadata' : [ lfn for lfn in lfns if metadata and lfn not in cached['Metadata'] ] }
+
+    results = {}
+    if missing['Replicas'] or missing['Metadata']:
+      self.__cond.acquire()
+      try:
+        self.__joined()
+        leader = self.__batch is None
+        if leader:
+          self.__batch = _Batch()
+        batch = self.__batch
+        for name in missing:
+          batch.lfns[name].update( missing[name] )
+        batch.jobs += 1
+        if leader:
+          # Wait for the other jobs in flight, at most window seconds
+          end = time.time() + self.__window
+          while self.__expected > 0 and time.time() < end:
+            self.__cond.wait( end - time.time() )
+          self.__batch = None
+      finally:
+        self.__cond.release()
+      if leader:
+        self.__lookup( batch )
+      else:
+        batch.done.wait()
+      results = batch.results
+    else:
+      self.jobDone()
+
+    replicas = self.__results( lfns, cached['Replicas'], results.get( 'Replicas' ) )
+    if not replicas['OK']:
+      return replicas
+    metadataDict = None
+    if metadata:
+      result = self.__results( lfns, cached['Metadata'], results.get( 'Metadata' ) )
+      if not result['OK']:
+        return result
+      metadataDict = result['Value']
+    return S_OK( ( replicas['Value'], metadataDict ) )
+
+  def __lookup( self, batch ):
+    """ Lookups of the LFNs of a batch, their successful results being cached
+    """
+    try:
+      # Expired values are only dropped by a purge, the LFNs of the former batches would pile up
+      self.__replicaCache.purgeExpired()
+      self.__metadataCache.purgeExpired()
+      for name, lookup, cache in ( ( 'Replicas', self.__replicaLookup, self.__replicaCache ),
+                                   ( 'Metadata', self.__metadataLookup, self.__metadataCache ) ):
+        lfns = sorted( batch.lfns[name] )
+        if not lfns:
+          continue
+        self.__log.verbose( "%s lookup of %d LFNs for %d jobs" % ( name, len( lfns ), batch.jobs ) )
+        self.lookups[name] += 1
+        try:
+          result = lookup( lfns )
+        except Exception, x:
+          self.__log.exception( "%s lookup failed" % name, '', x )
+          result = S_ERROR( "%s lookup failed: %s" % ( name, str( x ) ) )
+        if result['OK']:
+          for lfn, value in result['Value']['Successful'].items():
+            cache.add( lfn, self.__cacheLifeTime, value )
+        batch.results[name] = result
+    finally:
+      batch.done.set()
+
+  @staticmethod
+  def __fromCache( lfns, cache ):
+    """ { lfn : value } for the lfns in cache
+    """
+    values = {}
+    for lfn in lfns:
+      value = cache.get( lfn )
+      if value is not False:
+        values[lfn] = value
+    return values
+
+  @staticmethod
+  def __results( lfns, cached, result ):
+    """ 'Successful' and 'Failed' dictionaries for lfns, from the batch result else from the cache,
+        values being copied as callers update them
+    """
+    successful = {}
+    failed = {}
+    for lfn in lfns:
+      if result and result['OK'] and lfn in result['Value']['Successful']:
+        successful[lfn] = dict( result['Value']['Successful'][lfn] )
+      elif result and result['OK'] and lfn in result['Value']['Failed']:
+        failed[lfn] = result['Value']['Failed'][lfn]
+      elif lfn in cached:
+        successful[lfn] = dict( cached[lfn] )
+      elif result and not result['OK']:
+        return result
+      else:
+        failed[lfn] = 'Not returned by the lookup'
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
@@ -0,0 +1,110 @@
+""" Catalog calls per job optimised by the InputData executor, with a lookup per job or with
+    InputDataCoalescer, against a stub catalog answering after a fixed latency plus a time per
+    LFN, with a few service threads.
+
+    The jobs of a transformation, sharing some of their input files with the next ones, are
+    queued at once and optimised by nThreads threads (the executor MaxTasks), each job spending
+    a few milliseconds in the job state calls before resolving its input data.
+
+    usage: python InputDataCoalescerBenchmark.py [nJobs] [nThreads,nThreads...] [latency] [catalogThreads]
+"""
+
+__RCSID__ = "$Id$"
+
+import Queue
+import sys
+import threading
+import time
+
+from DIRAC.WorkloadManagementSystem.private.InputDataCoalescer  import InputDataCoalescer
+from InputDataCoalescerTests                                    import StubCatalog, jobLFNs
+
+class ServerCatalog( StubCatalog ):
+  """ stub catalog serving catalogThreads calls at a time, each LFN costing lfnTime seconds """
+
+  def __init__( self, nFiles, latency, catalogThreads, lfnTime = 0.001 ):
+    StubCatalog.__init__( self, nFiles, latency )
+    self.slots = threading.Semaphore( catalogThreads )
+    self.lfnTime = lfnTime
+    self.lookedUp = 0
+
+  def __serve( self, lookup, lfns ):
+    with self.slots:
+      self.lookedUp += len( lfns )
+      time.sleep( self.lfnTime * len( lfns ) )
+      return lookup( self, lfns )
+
+  def getActiveReplicas( self, lfns ):
+    return self.__serve( StubCatalog.getActiveReplicas, lfns )
+
+  def getFileMetadata( self, lfns ):
+    return self.__serve( StubCatalog.getFileMetadata, lfns )
+
+class PerJobLookups( object ):
+  """ former executor lookups: replicas then metadata for each job """
+
+  def __init__( self, catalog ):
+    self.catalog = catalog
+
+  def jobStarted( self ):
+    pass
+
+  def jobDone( self ):
+    pass
+
+  def resolve( self, lfns, metadata = True ):
+    replicas = self.catalog.getActiveReplicas( lfns )
+    if metadata:
+      self.catalog.getFileMetadata( lfns )
+    return replicas
+
+def optimise( resolver, nJobs, nThreads, jobStateTime = 0.005 ):
+  """ optimise nJobs in nThreads threads, return elapsed time """
+  jobs = Queue.Queue()
+  for job in range( nJobs ):
+    jobs.put( job )
+  def worker():
+    while True:
+      try:
+        job = jobs.get_nowait()
+      except Queue.Empty:
+        return
+      resolver.jobStarted()
+      try:
+        time.sleep( jobStateTime )
+        result = resolver.resolve( jobLFNs( job ) )
+        assert result['OK']
+      finally:
+        resolver.jobDone()
+  start = time.time()
+  threads = [ threading.Thread( target = worker ) for _i in range( nThreads ) ]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return time.time() - start
+
+def benchmark( nJobs = 400, threadsList = ( 1, 5, 20 ), latency = 0.05, catalogThreads = 4 ):
+  """ print catalog calls and LFNs looked up per job and jobs per second """
+  print "%d jobs, %.3fs per catalog call, %d catalog threads" % ( nJobs, latency, catalogThreads )
+  print "%-8s %-12s %14s %14s %10s %10s" % ( "threads", "lookups", "calls per job", "LFNs per job", "jobs/s",
+                                             "speedup" )
+  for nThreads in threadsList:
+    times = {}
+    for name in ( "per job", "coalesced" ):
+      catalog = ServerCatalog( 5 * nJobs, latency, catalogThreads )
+      if name == "per job":
+        resolver = PerJobLookups( catalog )
+      else:
+        resolver = InputDataCoalescer( catalog.getActiveReplicas, catalog.getFileMetadata )
+      times[name] = optimise( resolver, nJobs, nThreads )
+      print "%-8d %-12s %14.3f %14.1f %10.1f %9.1fx" % ( nThreads, name, sum( catalog.calls.values() ) / float( nJobs ),
+                                                         catalog.lookedUp / float( nJobs ), nJobs / times[name],
+                                                         times["per job"] / times[name] )
+
+if __name__ == "__main__":
+  args = sys.argv[1:]
+  benchmark( int( args[0] ) if len( args ) > 0 else 400,
+             [ int( nThreads ) for nThreads in args[1].split( "," ) ] if len( args ) > 1 else ( 1, 5, 20 ),
+             float( args[2] ) if len( args ) > 2 else 0.05,
+             int( args[3] ) if len( args ) > 3 else 4 )
@@ -0,0 +1,168 @@
+""" Test cases for InputDataCoalescer: jobs optimised at the same time, checked against
+    a stub catalog counting its calls
+"""
+
+__RCSID__ = "$Id$"
+
+import threading
+import time
+import unittest
+
+from DIRAC                                                      import S_OK, S_ERROR
+from DIRAC.WorkloadManagementSystem.private.InputDataCoalescer  import InputDataCoalescer
+
+class StubCatalog( object ):
+  """ Replicas and metadata of LFNs /lhcb/data/<n>.raw, n < nFiles, answered after latency seconds
+  """
+  def __init__( self, nFiles = 1000, latency = 0. ):
+    self.latency = latency
+    self.calls = { 'getActiveReplicas' : 0, 'getFileMetadata' : 0 }
+    self.lfns = set( [ lfnName( n ) for n in range( nFiles ) ] )
+    self.error = None
+    self.lock = threading.Lock()
+
+  def __lookup( self, method, lfns, value ):
+    with self.lock:
+      self.calls[method] += 1
+    time.sleep( self.latency )
+    if self.error:
+      return S_ERROR( self.error )
+    successful = dict( [ ( lfn, value( lfn ) ) for lfn in lfns if lfn in self.lfns ] )
+    failed = dict( [ ( lfn, 'No such file or directory' ) for lfn in lfns if lfn not in self.lfns ] )
+    return S_OK( { 'Successful' : successful, 'Failed' : failed } )
+
+  def getActiveReplicas( self, lfns ):
+    return self.__lookup( 'getActiveReplicas', lfns,
+                          lambda lfn: { 'CERN-RAW' : 'srm://cern.ch' + lfn, 'CNAF-RAW' : 'srm://cnaf.it' + lfn } )
+
+  def getFileMetadata( self, lfns ):
+    return self.__lookup( 'getFileMetadata', lfns, lambda lfn: { 'GUID' : lfn[-8:], 'Size' : len( lfn ) } )
+
+def lfnName( n ):
+  """ LFN of the n-th file """
+  return '/lhcb/data/%08d.raw' % n
+
+def jobLFNs( job, nFiles = 5, overlap = 2 ):
+  """ LFNs of a job, sharing overlap files with the next one """
+  first = job * ( nFiles - overlap )
+  return [ lfnName( n ) for n in range( first, first + nFiles ) ]
+
+def optimiseJobs( coalescer, lfnsList, metadata = True ):
+  """ resolve lfnsList from one thread per job, as the executor does, once all the jobs are in flight:
+      results in the order of lfnsList
+  """
+  results = [ None ] * len( lfnsList )
+  inFlight = []
+  go = threading.Event()
+  def job( i ):
+    coalescer.jobStarted()
+    inFlight.append( i )
+    try:
+      go.wait()
+      results[i] = coalescer.resolve( lfnsList[i], metadata )
+    finally:
+      coalescer.jobDone()
+  threads = [ threading.Thread( target = job, args = ( i, ) ) for i in range( len( lfnsList ) ) ]
+  for thread in threads:
+    thread.start()
+  while len( inFlight ) < len( threads ):
+    time.sleep( 0.01 )
+  go.set()
+  for thread in threads:
+    thread.join()
+  return results
+
+class InputDataCoalescerTests( unittest.TestCase ):
+  """
+  .. class:: InputDataCoalescerTests
+  """
+  def setUp( self ):
+    """ test setup """
+    self.catalog = StubCatalog()
+
+  def coalescer( self, window = 1., cacheLifeTime = 60 ):
+    return InputDataCoalescer( self.catalog.getActiveReplicas, self.catalog.getFileMetadata,
+                               window = window, cacheLifeTime = cacheLifeTime )
+
+  def direct( self, lfns ):
+    """ per job lookups, as done without coalescer """
+    catalog = StubCatalog()
+    return catalog.getActiveReplicas( lfns )['Value'], catalog.getFileMetadata( lfns )['Value']
+
+  def testCoalescing( self ):
+    """ jobs in flight resolved with one lookup of each kind """
+    lfnsList = [ jobLFNs( job ) for job in range( 20 ) ]
+    lfnsList[3] = lfnsList[3] + [ '/lhcb/data/missing.raw' ]
+    results = optimiseJobs( self.coalescer(), lfnsList )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 1, 'getFileMetadata' : 1 } )
+    for lfns, result in zip( lfnsList, results ):
+      self.assert_( result['OK'] )
+      self.assertEqual( result['Value'], self.direct( lfns ) )
+    self.assertEqual( results[3]['Value'][0]['Failed'], { '/lhcb/data/missing.raw' : 'No such file or directory' } )
+
+  def testLoneJob( self ):
+    """ a job alone in flight does not wait for the window """
+    coalescer = self.coalescer( window = 10. )
+    start = time.time()
+    self.assert_( optimiseJobs( coalescer, [ jobLFNs( 0 ) ] )[0]['OK'] )
+    # a job in flight not resolving its input data is not waited for either
+    coalescer.jobStarted()
+    other = threading.Thread( target = lambda: ( coalescer.jobStarted(), time.sleep( 0.2 ), coalescer.jobDone() ) )
+    other.start()
+    time.sleep( 0.1 )
+    self.assert_( coalescer.resolve( jobLFNs( 1 ) )['OK'] )
+    coalescer.jobDone()
+    other.join()
+    self.assert_( time.time() - start < 2. )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 2, 'getFileMetadata' : 2 } )
+
+  def testCache( self ):
+    """ replicas and metadata cached per LFN """
+    coalescer = self.coalescer()
+    first = coalescer.resolve( jobLFNs( 0 ) )
+    # only the new LFNs are looked up
+    second = coalescer.resolve( jobLFNs( 1 ) )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 2, 'getFileMetadata' : 2 } )
+    self.assertEqual( second['Value'], self.direct( jobLFNs( 1 ) ) )
+    # callers updating the results do not change the cache
+    first['Value'][1]['Successful'][jobLFNs( 0 )[0]].update( first['Value'][0]['Successful'][jobLFNs( 0 )[0]] )
+    self.assertEqual( coalescer.resolve( jobLFNs( 0 ) )['Value'], self.direct( jobLFNs( 0 ) ) )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 2, 'getFileMetadata' : 2 } )
+    # without metadata
+    result = coalescer.resolve( jobLFNs( 0 ) + [ lfnName( 999 ) ], metadata = False )
+    self.assertEqual( result['Value'][1], None )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 3, 'getFileMetadata' : 2 } )
+
+    # no cache
+    coalescer = self.coalescer( cacheLifeTime = 0 )
+    for _i in range( 3 ):
+      coalescer.resolve( jobLFNs( 0 ) )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 6, 'getFileMetadata' : 5 } )
+
+  def testCachePurge( self ):
+    """ expired values dropped at each batch """
+    coalescer = self.coalescer( cacheLifeTime = 1 )
+    for job in range( 3 ):
+      coalescer.resolve( jobLFNs( 3 * job, overlap = 0 ) )
+      time.sleep( 1.1 )
+    for cache in ( coalescer._InputDataCoalescer__replicaCache, coalescer._InputDataCoalescer__metadataCache ):
+      self.assertEqual( sorted( cache._DictCache__cache ), jobLFNs( 6, overlap = 0 ) )
+
+  def testFailures( self ):
+    """ failed lookups returned to every job of the batch """
+    self.catalog.error = 'Catalog not available'
+    results = optimiseJobs( self.coalescer(), [ jobLFNs( job ) for job in range( 5 ) ] )
+    self.assertEqual( [ result['OK'] for result in results ], [ False ] * 5 )
+    self.assertEqual( self.catalog.calls, { 'getActiveReplicas' : 1, 'getFileMetadata' : 1 } )
+    # exceptions of the lookups
+    self.catalog.error = None
+    coalescer = InputDataCoalescer( self.catalog.getActiveReplicas, None )
+    result = coalescer.resolve( jobLFNs( 0 ) )
+    self.assertEqual( result['OK'], False )
+
+# # test execution
+if __name__ == "__main__":
+  gTestLoader = unittest.TestLoader()
+  gSuite = gTestLoader.loadTestsFromTestCase( InputDataCoalescerTests )
+  gSuite = unittest.TestSuite( [ gSuite ] )
+  unittest.TextTestRunner( verbosity = 3 ).run( gSuite )